@@ -1,5 +1,9 @@
 // backend/services/mlService.js
 const axios = require('axios');
+const zlib = require('zlib');
+const { promisify } = require('util');
+
+const gzip = promisify(zlib.gzip);
 
 const mlEngineBaseUrl = process.env.ML_ENGINE_URL || 'http://ml-engine:5002'; // From .env or docker-compose
 
@@ -25,7 +29,7 @@ const analyzeTextContent = async (text, metadata = {}) => {
             text_content: text,
             metadata: metadata
         });
-        return response.data; // e.g., { sensitivity_score: 0.8, classification: 'Confidential', keywords_found: ['ssn'] }
+        return response.data; // e.g., { prediction_label: 'Confidential', probability: 0.8, model_version, keywords_found: [{ keyword: 'ssn', count: 2, positions: [[10, 13], [40, 43]] }], pii_found: { credit_card: { count: 1, spans: [[52, 71]] } }, edm_matches: { matched_records: 1, records: [{ record: 1042, columns: ['full_name', 'phone'], spans: [[80, 92], [100, 116]] }] } }
     } catch (error) {
         console.error('Error calling ML engine for text analysis:', error.message);
         // Handle different types of errors (network, ML engine error response)
@@ -50,9 +54,13 @@ const analyzeUserBehavior = async (activityData) => {
     try {
         const response = await mlApiClient.post('/predict/user_anomaly', {
             activity_features: activityData
-            // e.g., activityData: { login_frequency: 5, data_accessed_volume: 1024, unusual_time: true }
+            // activityData: one raw activity event or an array of them, e.g.
+            // { user_id: 'jdoe', timestamp: '2024-01-01T23:10:00Z', bytes: 1048576, destination: 'usb' }
         });
-        return response.data; // e.g., { anomaly_score: 0.95, is_anomalous: true, contributing_factors: ['unusual_time'] }
+        // e.g., { results: [{ user_id: 'jdoe', anomaly_score: 0.12, is_anomalous: true, features: {...},
+        //     contributing_factors: [{ feature: 'data_volume_log', value: 21.3, contribution: 4.2, method: 'baseline_zscore', baseline_mean: 14.1 }] }],
+        //   errors: [], model_version: '...' }
+        return response.data;
     } catch (error) {
         console.error('Error calling ML engine for user behavior analysis:', error.message);
         if (error.response) {
@@ -67,10 +75,41 @@ const analyzeUserBehavior = async (activityData) => {
     }
 };
 
+/**
+ * Uploads a batch of raw activity events for UEBA as gzip-compressed NDJSON.
+ * The ML engine updates per-user state from every event but only returns users above the threshold.
+ * @param {Array<object>} events Raw activity events (same shape as for analyzeUserBehavior).
+ * @param {number} [threshold] Minimum anomaly score to report; defaults to the model's own decision.
+ * @returns {Promise<object>} e.g. { events_received, events_ingested, anomalies: [...], errors: [], model_version }
+ */
+const ingestUserEvents = async (events, threshold) => {
+    try {
+        const body = await gzip(events.map((event) => JSON.stringify(event)).join('\n'));
+        const response = await mlApiClient.post('/ingest/user_events', body, {
+            params: threshold === undefined ? {} : { threshold },
+            headers: { 'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip' },
+            timeout: 120000 // large uploads take longer than single predictions
+        });
+        return response.data;
+    } catch (error) {
+        console.error('Error calling ML engine for user event ingest:', error.message);
+        if (error.response) {
+            console.error('ML Engine Response Error:', error.response.status, error.response.data);
+            throw new Error(`ML Engine error: ${error.response.data.error || error.response.status}`);
+        } else if (error.request) {
+            console.error('ML Engine No Response:', error.request);
+            throw new Error('No response from ML Engine service.');
+        } else {
+            throw new Error(`Failed to ingest user events: ${error.message}`);
+        }
+    }
+};
+
 // Add more functions to interact with other ML endpoints as needed
 // e.g., image analysis, data exfiltration detection, etc.
 
 module.exports = {
     analyzeTextContent,
-    analyzeUserBehavior
+    analyzeUserBehavior,
+    ingestUserEvents
 };
\ No newline at end of file
@@ -1,7 +1,10 @@
 # ml-engine/app.py
+import functools
+import hmac
 import os
+import threading
+import zlib
 from flask import Flask, request, jsonify
-import joblib
 import pandas as pd
 from dotenv import load_dotenv
 
@@ -13,7 +16,20 @@ from prometheus_flask_exporter import PrometheusMetrics # Убедитесь, ч
 load_dotenv()
 
 from scripts.preprocess import preprocess_text
-from scripts.predict_utils import make_prediction_text_classification
+from scripts.predict_utils import make_prediction_text_classification, make_prediction_text_classification_batch
+from scripts.micro_batching import MicroBatcher
+from scripts.streaming_classifier import StreamingDocumentClassifier, StreamingNotSupportedError
+from scripts.prediction_cache import PredictionCache, CachedTextModel, create_redis_client
+from scripts.model_registry import ModelRegistry
+from scripts.ueba_engine import UebaEngine, FEATURE_NAMES as UEBA_FEATURE_NAMES
+from scripts.event_ingest import NdjsonEventIngestor, IngestLimitExceeded
+from scripts.user_baselines import UserBaselines
+from scripts.ueba_explain import contributing_factors
+from scripts.identity_index import IdentityIndex, user_export_aliases
+from scripts.policy_engine import load_policy_engine, save_policies
+from scripts.regex_set import RegexSandbox
+from scripts.pii_detectors import PiiScanner, PII_TYPES
+from scripts.edm_index import EdmIndex
 
 app = Flask(__name__)
 
@@ -28,51 +44,676 @@ metrics.info('ml_engine_app_info', 'ML Engine application information', version=
 
 MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
 
-try:
-    text_classifier_model_path = os.path.join(MODEL_DIR, 'sample_text_classifier.joblib')
-    if os.path.exists(text_classifier_model_path):
-        text_classifier_model = joblib.load(text_classifier_model_path)
+# Ограничения пакетного эндпоинта /predict/document_sensitivity/batch
+BATCH_MAX_DOCUMENTS = int(os.environ.get("ML_ENGINE_BATCH_MAX_DOCUMENTS", 1000))
+BATCH_CHUNK_SIZE = int(os.environ.get("ML_ENGINE_BATCH_CHUNK_SIZE", 64))
+
+# Динамический микро-батчинг одиночных запросов /predict/document_sensitivity.
+# Имеет смысл при многопоточных воркерах gunicorn (например, GUNICORN_CMD_ARGS="--threads 8").
+MICROBATCH_ENABLED = os.environ.get("ML_ENGINE_MICROBATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+MICROBATCH_MAX_BATCH_SIZE = int(os.environ.get("ML_ENGINE_MICROBATCH_MAX_BATCH_SIZE", 32))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("ML_ENGINE_MICROBATCH_MAX_WAIT_MS", 5))
+MICROBATCH_TIMEOUT_SECONDS = float(os.environ.get("ML_ENGINE_MICROBATCH_TIMEOUT_SECONDS", 30))
+
+# Потоковая классификация больших документов (/predict/document_sensitivity/stream)
+STREAM_SEGMENT_CHARS = int(os.environ.get("ML_ENGINE_STREAM_SEGMENT_CHARS", 1 << 20))
+STREAM_READ_BLOCK_BYTES = int(os.environ.get("ML_ENGINE_STREAM_READ_BLOCK_BYTES", 1 << 16))
+
+# Кэш результатов классификации: локальный LRU/TTL уровень и необязательный общий уровень в Redis
+CACHE_ENABLED = os.environ.get("ML_ENGINE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.environ.get("ML_ENGINE_CACHE_MAX_ENTRIES", 10000))
+CACHE_TTL_SECONDS = float(os.environ.get("ML_ENGINE_CACHE_TTL_SECONDS", 3600))
+CACHE_REDIS_ENABLED = os.environ.get("ML_ENGINE_CACHE_REDIS_ENABLED", "false").lower() in ("1", "true", "yes")
+CACHE_REDIS_TTL_SECONDS = int(os.environ.get("ML_ENGINE_CACHE_REDIS_TTL_SECONDS", 86400))
+REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+
+# Хранилище моделей: отображение массивов в память ('r') и прогрев при старте вместо ленивой загрузки
+MODEL_MMAP_MODE = os.environ.get("ML_ENGINE_MODEL_MMAP_MODE", "r") or None
+MODEL_WARMUP = os.environ.get("ML_ENGINE_MODEL_WARMUP", "false").lower() in ("1", "true", "yes")
+# Горячая перезагрузка: период проверки файла модели (0 - не следить) и токен админских эндпоинтов
+MODEL_WATCH_INTERVAL_SECONDS = float(os.environ.get("ML_ENGINE_MODEL_WATCH_INTERVAL_SECONDS", 10))
+ADMIN_TOKEN = os.environ.get("ML_ENGINE_ADMIN_TOKEN", "")
+
+# Модель загружается лениво при первом запросе; numpy-массивы отображаются из файла (mmap)
+# и разделяются между воркерами gunicorn. ML_ENGINE_MODEL_WARMUP=true загружает и прогревает ее при старте.
+# Новая версия файла (после train_model.py) подхватывается реестром без рестарта воркеров.
+text_classifier_model_path = os.path.join(MODEL_DIR, 'sample_text_classifier.joblib')
+text_classifier_registry = ModelRegistry(
+    text_classifier_model_path,
+    name='text_classifier',
+    mmap_mode=MODEL_MMAP_MODE,
+    warmup_input=["ML engine warm-up document"],
+    watch_interval=MODEL_WATCH_INTERVAL_SECONDS
+)
+if not os.path.exists(text_classifier_model_path):
+    print(f"Warning: Text classification model not found at {text_classifier_model_path}. Endpoint /predict/document_sensitivity will not work.")
+elif MODEL_WARMUP:
+    if text_classifier_registry.current() is not None:
         print(f"Text classification model loaded successfully from {text_classifier_model_path}")
     else:
-        text_classifier_model = None
-        print(f"Warning: Text classification model not found at {text_classifier_model_path}. Endpoint /predict/document_sensitivity will not work.")
-except Exception as e:
-    print(f"Error loading ML model(s): {e}")
-    text_classifier_model = None
+        print(f"Error loading ML model from {text_classifier_model_path}")
+
+# Модель UEBA (например, IsolationForest по признакам из scripts/ueba_engine.py); тоже перезагружается без рестарта
+UEBA_MAX_EVENTS = int(os.environ.get("ML_ENGINE_UEBA_MAX_EVENTS", 10000))
+# Массовая загрузка событий (/ingest/user_events): размер пакета учета и оценки, предел распакованного тела
+INGEST_BATCH_EVENTS = int(os.environ.get("ML_ENGINE_INGEST_BATCH_EVENTS", 5000))
+INGEST_MAX_BYTES = int(os.environ.get("ML_ENGINE_INGEST_MAX_BYTES", 1 << 30))
+ueba_model_path = os.path.join(MODEL_DIR, 'ueba_model.joblib')
+ueba_registry = ModelRegistry(
+    ueba_model_path,
+    name='ueba',
+    mmap_mode=MODEL_MMAP_MODE,
+    watch_interval=MODEL_WATCH_INTERVAL_SECONDS
+)
+if not os.path.exists(ueba_model_path):
+    print(f"Warning: UEBA model not found at {ueba_model_path}. Endpoint /predict/user_anomaly will only accumulate user state.")
+# Базовые линии пользователей (публикует scripts/train_ueba_model.py рядом с моделью) - для объяснения аномалий;
+# без них аномалии объясняются путями изоляции в лесу
+ueba_baselines_registry = ModelRegistry(
+    os.path.join(MODEL_DIR, 'ueba_baselines.npz'),
+    name='ueba_baselines',
+    watch_interval=MODEL_WATCH_INTERVAL_SECONDS,
+    loader=UserBaselines.load
+)
+# Набор политик DLP (выгрузка политик backend), скомпилированный в план вычисления; перекомпилируется
+# при изменении файла, запросы работают со снимком набора, как с версией модели
+POLICIES_PATH = os.environ.get("ML_ENGINE_POLICIES_PATH", os.path.join(MODEL_DIR, 'policies.json'))
+POLICY_MAX_EVENTS = int(os.environ.get("ML_ENGINE_POLICY_MAX_EVENTS", 10000))
+# Автоматы ключевых слов политик (.npy через mmap, общие для воркеров); пустое значение - без кэша
+AUTOMATON_CACHE_DIR = os.environ.get(
+    "ML_ENGINE_AUTOMATON_CACHE_DIR", os.path.join(os.path.dirname(__file__), 'state', 'automata')
+)
+# Ограничение времени проверки регулярного выражения политики: склонные к перебору с возвратами и медленные
+# выражения проверяются в отдельном процессе и прерываются по истечении времени; 0 - без песочницы
+REGEX_TIMEOUT_SECONDS = float(os.environ.get("ML_ENGINE_REGEX_TIMEOUT_SECONDS", 0.5))
+regex_sandbox = RegexSandbox(REGEX_TIMEOUT_SECONDS) if REGEX_TIMEOUT_SECONDS > 0 else None
+# Поле событий политик с текстом документа: его подстроки из условий contains ищутся в документах (keywords_found)
+KEYWORDS_FIELD = os.environ.get("ML_ENGINE_KEYWORDS_FIELD", "content")
+# Типы структурированных данных (карты, IBAN, ИИН/ИНН/СНИЛС/SSN, email, телефоны, секреты), которые ищутся
+# в документах с проверкой контрольных сумм (pii_found); через запятую, пустое значение - без поиска
+PII_TYPES_ENABLED = [name.strip() for name in os.environ.get("ML_ENGINE_PII_TYPES", ",".join(PII_TYPES)).split(",")
+                     if name.strip()]
+pii_scanner = PiiScanner(PII_TYPES_ENABLED) if PII_TYPES_ENABLED else None
+# Индекс exact data match: отпечатки ячеек защищаемой таблицы (python -m scripts.edm_index customers.csv
+# models/edm_index.edm), открывается через mmap; в ответе - записи, значения не менее чем EDM_MIN_COLUMNS
+# столбцов которых встретились в документе (edm_matches)
+EDM_INDEX_PATH = os.environ.get("ML_ENGINE_EDM_INDEX_PATH", os.path.join(MODEL_DIR, 'edm_index.edm'))
+EDM_MIN_COLUMNS = int(os.environ.get("ML_ENGINE_EDM_MIN_COLUMNS", 2))
+edm_registry = ModelRegistry(
+    EDM_INDEX_PATH,
+    name='edm_index',
+    watch_interval=MODEL_WATCH_INTERVAL_SECONDS,
+    loader=EdmIndex.load
+) if EDM_INDEX_PATH else None
+policy_registry = ModelRegistry(
+    POLICIES_PATH,
+    name='policies',
+    watch_interval=MODEL_WATCH_INTERVAL_SECONDS,
+    loader=functools.partial(
+        load_policy_engine, automaton_cache_dir=AUTOMATON_CACHE_DIR or None, regex_sandbox=regex_sandbox
+    )
+)
+# Скользящее состояние пользователей в памяти процесса с периодическими снимками на диск:
+# после рестарта движок продолжает с сохраненного состояния
+UEBA_STATE_DIR = os.environ.get("ML_ENGINE_UEBA_STATE_DIR", os.path.join(os.path.dirname(__file__), 'state', 'ueba'))
+UEBA_SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get("ML_ENGINE_UEBA_SNAPSHOT_INTERVAL_SECONDS", 300))
+ueba_engine = None
+if UEBA_STATE_DIR and os.path.exists(os.path.join(UEBA_STATE_DIR, 'meta.json')):
+    try:
+        ueba_engine = UebaEngine.restore(UEBA_STATE_DIR)
+        print(f"UEBA state for {len(ueba_engine)} users restored from {UEBA_STATE_DIR}")
+    except Exception as e:
+        print(f"Error restoring UEBA state from {UEBA_STATE_DIR}: {e}")
+if ueba_engine is None:
+    ueba_engine = UebaEngine()
+# Индекс псевдонимов (UPN, SAM, email, имя хоста) -> учетная запись для событий UEBA
+# (собирается python -m scripts.identity_index, изменения - через /admin/identities); как и политики,
+# перезагружается при изменении файла, пакет событий разрешается одним снимком индекса
+IDENTITY_INDEX_PATH = os.environ.get("ML_ENGINE_IDENTITY_INDEX_PATH", os.path.join(MODEL_DIR, 'identity_index.npz'))
+identity_registry = ModelRegistry(
+    IDENTITY_INDEX_PATH,
+    name='identity_index',
+    watch_interval=MODEL_WATCH_INTERVAL_SECONDS,
+    loader=IdentityIndex.load
+) if IDENTITY_INDEX_PATH else None
+_identity_update_lock = threading.Lock()
+if UEBA_STATE_DIR:
+    ueba_engine.schedule_snapshots(UEBA_STATE_DIR, UEBA_SNAPSHOT_INTERVAL_SECONDS)
+
+# Отпечаток загруженного файла модели входит в ключ кэша: после переобучения старые записи не используются
+prediction_cache = PredictionCache(
+    model_version=lambda: text_classifier_registry.fingerprint,
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    redis_client=create_redis_client(REDIS_HOST, REDIS_PORT) if CACHE_REDIS_ENABLED else None,
+    redis_ttl_seconds=CACHE_REDIS_TTL_SECONDS
+) if CACHE_ENABLED else None
+
+def get_text_classifier():
+    """
+    Возвращает (snapshot, predictor): снимок текущей версии модели (LoadedModel: model, version, ...)
+    и объект для предсказаний (модель за кэшем, если он включен). (None, None), если модель не загружена.
+    Запрос берет снимок один раз, поэтому замена модели посреди запроса на него не влияет.
+    """
+    snapshot = text_classifier_registry.current()
+    if snapshot is None:
+        return None, None
+    model = snapshot.model
+    return snapshot, CachedTextModel(model, prediction_cache, model_version=snapshot.fingerprint) if prediction_cache else model
+
+def _score_document_batch(texts):
+    """
+    Оценивает пакет, собранный MicroBatcher: результат - (метка, вероятность, версия модели);
+    ошибки отдельных текстов возвращаются как исключения.
+    """
+    snapshot, predictor = get_text_classifier()
+    if snapshot is None:
+        error = RuntimeError("Text classification model is not loaded.")
+        return [error] * len(texts)
+    results, errors = make_prediction_text_classification_batch(
+        predictor, texts, chunk_size=MICROBATCH_MAX_BATCH_SIZE
+    )
+    return [
+        ValueError(errors[index]) if index in errors else (*result, snapshot.version)
+        for index, result in enumerate(results)
+    ]
+
+document_batcher = MicroBatcher(
+    _score_document_batch,
+    max_batch_size=MICROBATCH_MAX_BATCH_SIZE,
+    max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+    name='document_sensitivity'
+) if MICROBATCH_ENABLED else None
+
+def _current_ueba_baselines():
+    snapshot = ueba_baselines_registry.current()
+    return snapshot.model if snapshot else None
+
+def _current_identity_index():
+    snapshot = identity_registry.current() if identity_registry is not None else None
+    return snapshot.model if snapshot else None
+
+def _score_users(user_ids):
+    """
+    Оценивает пользователей текущей моделью UEBA одним вызовом.
+    Возвращает (снимок модели, {user_id: результат}) или (None, None), если модель не загружена.
+    """
+    snapshot = ueba_registry.current()
+    if snapshot is None:
+        return None, None
+    features, is_anomalous, anomaly_scores = ueba_engine.score(snapshot.model, user_ids)
+    factors = contributing_factors(snapshot.model, features, is_anomalous, user_ids, _current_ueba_baselines())
+    return snapshot, {
+        user_id: {
+            "user_id": user_id,
+            "anomaly_score": float(anomaly_scores[row]),
+            "is_anomalous": bool(is_anomalous[row]),
+            "features": dict(zip(UEBA_FEATURE_NAMES, features[row].tolist())),
+            "contributing_factors": factors[row]
+        }
+        for row, user_id in enumerate(user_ids)
+    }
+
+def _score_user_batch(requests_user_ids):
+    """
+    Оценивает пакет запросов, собранный MicroBatcher (элемент - список user_id одного запроса):
+    пользователи всех запросов оцениваются одним вызовом модели. Результат - (результаты, версия модели).
+    """
+    unique_user_ids = list(dict.fromkeys(user_id for user_ids in requests_user_ids for user_id in user_ids))
+    snapshot, scored = _score_users(unique_user_ids)
+    if snapshot is None:
+        error = RuntimeError("UEBA model is not loaded.")
+        return [error] * len(requests_user_ids)
+    return [([scored[user_id] for user_id in user_ids], snapshot.version) for user_ids in requests_user_ids]
+
+# Вызов модели UEBA (IsolationForest) стоит миллисекунды независимо от числа строк,
+# поэтому одновременные запросы с единичными событиями выгодно оценивать вместе
+user_anomaly_batcher = MicroBatcher(
+    _score_user_batch,
+    max_batch_size=MICROBATCH_MAX_BATCH_SIZE,
+    max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+    name='user_anomaly'
+) if MICROBATCH_ENABLED else None
+
+# --- Обработчики запросов ---
+# Не зависят от веб-фреймворка: принимают разобранный JSON и возвращают (тело ответа, HTTP-статус).
+# Используются маршрутами Flask ниже и ASGI-приложением (asgi_app.py) с теми же JSON-контрактами.
+
+def handle_health_check():
+    return {"status": "UP", "service": "ML Engine"}, 200
+
+def find_policy_keywords(text):
+    """Ключевые слова из условий contains текущего набора политик, найденные в документе (keywords_found)."""
+    snapshot = policy_registry.current()
+    automaton = snapshot.model.keyword_automaton(KEYWORDS_FIELD) if snapshot is not None else None
+    return automaton.scan(text) if automaton is not None and isinstance(text, str) else []
+
+def find_pii(text):
+    """Подтвержденные контрольными суммами вхождения структурированных данных: {тип: {count, spans}} (pii_found)."""
+    return pii_scanner.summary(text) if pii_scanner is not None and isinstance(text, str) else {}
+
+def find_edm_matches(text):
+    """Записи защищаемой таблицы, значения нескольких столбцов которых есть в документе (edm_matches)."""
+    snapshot = edm_registry.current() if edm_registry is not None else None
+    if snapshot is None:
+        return {"matched_records": 0, "records": []}
+    return snapshot.model.match(text, min_columns=EDM_MIN_COLUMNS)
+
+def find_document_findings(text):
+    """Поля ответа по содержимому документа: keywords_found, pii_found, edm_matches."""
+    return {
+        "keywords_found": find_policy_keywords(text),
+        "pii_found": find_pii(text),
+        "edm_matches": find_edm_matches(text)
+    }
+
+def classify_documents(texts, fingerprint=None):
+    """
+    Классифицирует тексты моделью этого процесса: (results, errors, версия модели), как
+    make_prediction_text_classification_batch. Другого состояния процесса не использует, поэтому
+    вызывается и в пуле процессов ASGI-режима (classify в обработчиках документов). `fingerprint` -
+    отпечаток модели у вызывающего процесса: если здесь загружена другая версия, файл перечитывается.
+    """
+    if fingerprint is not None and text_classifier_registry.fingerprint != fingerprint:
+        text_classifier_registry.reload()
+    snapshot, predictor = get_text_classifier()
+    if snapshot is None:
+        raise RuntimeError("Text classification model is not loaded.")
+    results, errors = make_prediction_text_classification_batch(predictor, texts, chunk_size=BATCH_CHUNK_SIZE)
+    return results, errors, snapshot.version
+
+def handle_predict_document_sensitivity(data, classify=None):
+    """`classify(texts)` - оценка текстов вне процесса (см. classify_documents); по умолчанию - в этом процессе."""
+    snapshot, predictor = get_text_classifier()
+    if snapshot is None:
+        return {"error": "Text classification model is not loaded."}, 503
+    try:
+        if not data or 'text_content' not in data:
+            return {"error": "Missing 'text_content' in request body"}, 400
+        text_content = data['text_content']
+        if classify is not None:
+            results, errors, model_version = classify([text_content])
+            if errors:
+                raise ValueError(errors[0])
+            label, probability = results[0]
+        elif document_batcher is not None:
+            # Пакет оценивается той версией модели, что актуальна в момент его сборки
+            label, probability, model_version = document_batcher.predict(text_content, timeout=MICROBATCH_TIMEOUT_SECONDS)
+        else:
+            prediction, probabilities = make_prediction_text_classification(predictor, [text_content])
+            label, probability, model_version = prediction[0], float(probabilities[0]), snapshot.version
+        # metrics.counter('ml_engine_predictions_total', 'Total number of predictions made', labels={'type': 'doc_sensitivity'}).inc() # Инкремент счетчика
+        return {
+            "prediction_label": label,
+            "probability": probability,
+            "model_version": model_version,
+            **find_document_findings(text_content)
+        }, 200
+    except Exception as e:
+        app.logger.error(f"Error in /predict/document_sensitivity: {e}")
+        # metrics.counter('ml_engine_prediction_errors_total', 'Total prediction errors', labels={'type': 'doc_sensitivity'}).inc()
+        return {"error": "An error occurred during prediction.", "details": str(e)}, 500
+
+def handle_predict_document_sensitivity_batch(data, classify=None):
+    snapshot, predictor = get_text_classifier()
+    if snapshot is None:
+        return {"error": "Text classification model is not loaded."}, 503
+    if not data or 'documents' not in data:
+        return {"error": "Missing 'documents' in request body"}, 400
+    documents = data['documents']
+    if not isinstance(documents, list):
+        return {"error": "'documents' must be a list"}, 400
+    if len(documents) > BATCH_MAX_DOCUMENTS:
+        return {"error": f"Too many documents in batch (max {BATCH_MAX_DOCUMENTS})."}, 413
+
+    try:
+        # Валидация отдельных документов: невалидные попадают в errors, а не роняют пакет
+        errors = []
+        valid_indices, valid_texts = [], []
+        for index, document in enumerate(documents):
+            document_id = document.get('id', index) if isinstance(document, dict) else index
+            if not isinstance(document, dict) or 'text_content' not in document:
+                errors.append({"id": document_id, "index": index, "error": "Missing 'text_content' in document"})
+            elif not isinstance(document['text_content'], str):
+                errors.append({"id": document_id, "index": index, "error": "'text_content' must be a string"})
+            else:
+                valid_indices.append(index)
+                valid_texts.append(document['text_content'])
+
+        if classify is not None:
+            predictions, prediction_errors, model_version = classify(valid_texts)
+        else:
+            predictions, prediction_errors = make_prediction_text_classification_batch(
+                predictor, valid_texts, chunk_size=BATCH_CHUNK_SIZE
+            )
+            model_version = snapshot.version
+
+        results = []
+        for position, index in enumerate(valid_indices):
+            document = documents[index]
+            document_id = document.get('id', index)
+            if position in prediction_errors:
+                errors.append({"id": document_id, "index": index, "error": prediction_errors[position]})
+                continue
+            label, probability = predictions[position]
+            results.append({
+                "id": document_id,
+                "index": index,
+                "prediction_label": label,
+                "probability": probability,
+                "metadata": document.get('metadata', {}),
+                **find_document_findings(document['text_content'])
+            })
+        errors.sort(key=lambda error: error["index"])
+
+        return {
+            "results": results,
+            "errors": errors,
+            "total": len(documents),
+            "model_version": model_version
+        }, 200
+    except Exception as e:
+        app.logger.error(f"Error in /predict/document_sensitivity/batch: {e}")
+        return {"error": "An error occurred during batch prediction.", "details": str(e)}, 500
+
+def open_document_stream(args):
+    """
+    Создает потоковый классификатор для /predict/document_sensitivity/stream.
+    Возвращает (classifier, None) или (None, (тело ответа с ошибкой, HTTP-статус)).
+    Параметры запроса: breakdown=true - оценка по сегментам, segment_chars - размер сегмента.
+    Сегменты по мере чтения проверяются и на структурированные данные (pii_found в ответе).
+    """
+    snapshot, _ = get_text_classifier()
+    if snapshot is None:
+        return None, ({"error": "Text classification model is not loaded."}, 503)
+    try:
+        segment_chars = int(args.get('segment_chars', STREAM_SEGMENT_CHARS))
+        if segment_chars < 1:
+            raise ValueError()
+    except (TypeError, ValueError):
+        return None, ({"error": "'segment_chars' must be a positive integer"}, 400)
+    breakdown = str(args.get('breakdown', 'false')).lower() in ('1', 'true', 'yes')
+    try:
+        return StreamingDocumentClassifier(
+            snapshot.model, segment_chars=segment_chars, breakdown=breakdown, model_version=snapshot.version,
+            segment_scanners={"pii_found": pii_scanner.stream()} if pii_scanner is not None else None
+        ), None
+    except StreamingNotSupportedError as e:
+        return None, ({"error": "Loaded model does not support streaming classification.", "details": str(e)}, 422)
+
+def finish_document_stream(classifier):
+    result = classifier.finish()
+    result["model_version"] = classifier.model_version
+    result.setdefault("pii_found", {})
+    return result, 200
+
+def handle_predict_user_anomaly(data):
+    """
+    Принимает сырые события активности ({"events": [...]}; для совместимости с backend
+    также {"activity_features": <событие или список событий>}), обновляет состояние
+    пользователей и оценивает каждого затронутого пользователя.
+    События учитываются, даже если модель UEBA еще не загружена (ответ 503).
+    """
+    if not data or not ('events' in data or 'activity_features' in data):
+        return {"error": "Missing 'events' in request body"}, 400
+    events = data['events'] if 'events' in data else data['activity_features']
+    if isinstance(events, dict):
+        events = [events]
+    if not isinstance(events, list):
+        return {"error": "'events' must be a list"}, 400
+    if len(events) > UEBA_MAX_EVENTS:
+        return {"error": f"Too many events in request (max {UEBA_MAX_EVENTS})."}, 413
+
+    try:
+        user_ids, errors = ueba_engine.ingest(events, identity_index=_current_identity_index())
+        events_ingested = len(events) - len(errors)
+        if ueba_registry.current() is None:
+            return {"error": "UEBA model is not loaded.", "events_ingested": events_ingested, "errors": errors}, 503
+        if user_anomaly_batcher is not None and user_ids:
+            results, model_version = user_anomaly_batcher.predict(user_ids, timeout=MICROBATCH_TIMEOUT_SECONDS)
+        else:
+            snapshot, scored = _score_users(user_ids)
+            results, model_version = [scored[user_id] for user_id in user_ids], snapshot.version
+        return {
+            "results": results,
+            "errors": errors,
+            "events_ingested": events_ingested,
+            "model_version": model_version
+        }, 200
+    except Exception as e:
+        app.logger.error(f"Error in /predict/user_anomaly: {e}")
+        return {"error": "An error occurred during anomaly scoring.", "details": str(e)}, 500
+
+def handle_evaluate_policies(data):
+    """
+    Вычисляет политики DLP над событиями ({"event": {...}} или {"events": [...]}).
+    Для каждого события - список сработавших политик с их действиями.
+    """
+    if not data or not ('events' in data or 'event' in data):
+        return {"error": "Missing 'events' in request body"}, 400
+    events = data['events'] if 'events' in data else [data['event']]
+    if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+        return {"error": "'events' must be a list of objects"}, 400
+    if len(events) > POLICY_MAX_EVENTS:
+        return {"error": f"Too many events in request (max {POLICY_MAX_EVENTS})."}, 413
+    snapshot = policy_registry.current()
+    if snapshot is None:
+        return {"error": "DLP policies are not loaded."}, 503
+    engine = snapshot.model
+    try:
+        return {
+            "results": [[policy.describe() for policy in engine.evaluate(event)] for event in events],
+            "policy_set_version": engine.version,
+            "policies": len(engine)
+        }, 200
+    except Exception as e:
+        app.logger.error(f"Error in /policies/evaluate: {e}")
+        return {"error": "An error occurred during policy evaluation.", "details": str(e)}, 500
+
+def open_event_ingest(args):
+    """
+    Создает загрузчик событий для /ingest/user_events.
+    Возвращает (ingestor, None) или (None, (тело ответа с ошибкой, HTTP-статус)).
+    Параметр запроса threshold - минимальный anomaly_score пользователей в ответе
+    (по умолчанию - все, кого модель считает аномальными).
+    """
+    threshold = args.get('threshold')
+    if threshold is not None:
+        try:
+            threshold = float(threshold)
+        except (TypeError, ValueError):
+            return None, ({"error": "'threshold' must be a number"}, 400)
+    snapshot = ueba_registry.current()
+    return NdjsonEventIngestor(
+        ueba_engine,
+        model=snapshot.model if snapshot else None,
+        model_version=snapshot.version if snapshot else None,
+        threshold=threshold,
+        baselines=_current_ueba_baselines(),
+        batch_events=INGEST_BATCH_EVENTS,
+        max_bytes=INGEST_MAX_BYTES,
+        identity_index=_current_identity_index()
+    ), None
+
+def finish_event_ingest(ingestor):
+    result = ingestor.finish()
+    if ingestor.model is None:
+        # События учтены в состоянии, но оценить их нечем
+        result["error"] = "UEBA model is not loaded."
+        return result, 503
+    return result, 200
+
+def handle_admin_identities(data, token):
+    """
+    Изменения индекса псевдонимов без полной пересборки: {"add": {псевдоним: учетная запись},
+    "remove": [псевдонимы], "users": [пользователи из выгрузки backend]}. Изменения применяются к индексу
+    из файла ML_ENGINE_IDENTITY_INDEX_PATH, он сохраняется и перезагружается в этом процессе;
+    остальные воркеры подхватят файл сами (ML_ENGINE_MODEL_WATCH_INTERVAL_SECONDS).
+    """
+    error = _check_admin_token(token)
+    if error:
+        return error
+    data = data or {}
+    add, remove, users = data.get('add') or {}, data.get('remove') or [], data.get('users') or []
+    if not isinstance(add, dict) or not isinstance(remove, list) or not isinstance(users, list):
+        return {"error": "'add' must be an object, 'remove' and 'users' must be lists"}, 400
+    if identity_registry is None:
+        return {"error": "Identity index is disabled. Set ML_ENGINE_IDENTITY_INDEX_PATH to enable it."}, 503
+    add = {str(alias): str(identity) for alias, identity in add.items()}
+    for user in users:
+        if isinstance(user, dict):
+            add.update(user_export_aliases(user))
+    with _identity_update_lock:
+        # Изменения - к последней версии файла, а не к снимку этого воркера: он может отставать от файла,
+        # который только что сохранил другой воркер
+        index = IdentityIndex.load(IDENTITY_INDEX_PATH) if os.path.exists(IDENTITY_INDEX_PATH) else IdentityIndex()
+        result = index.apply_delta(add, [str(alias) for alias in remove])
+        index.save(IDENTITY_INDEX_PATH)
+        snapshot = identity_registry.reload()
+    if snapshot is None:
+        return {"error": "Identity index could not be loaded."}, 500
+    return {**result, "identity_index_version": snapshot.version}, 200
+
+def handle_admin_policies(data, token):
+    """
+    Публикует набор политик ({"policies": [...]} - как в GET /api/policies backend) и компилирует его
+    в этом процессе; остальные воркеры подхватят файл сами (ML_ENGINE_MODEL_WATCH_INTERVAL_SECONDS).
+    """
+    error = _check_admin_token(token)
+    if error:
+        return error
+    policies = (data or {}).get('policies')
+    if not isinstance(policies, list):
+        return {"error": "'policies' must be a list"}, 400
+    save_policies(policies, POLICIES_PATH)
+    snapshot = policy_registry.reload()
+    if snapshot is None:
+        return {"error": "DLP policies could not be compiled."}, 500
+    engine = snapshot.model
+    return {"policy_set_version": engine.version, "policies": len(engine), "errors": engine.errors}, 200
+
+def _check_admin_token(token):
+    if not ADMIN_TOKEN:
+        return {"error": "Admin endpoints are disabled. Set ML_ENGINE_ADMIN_TOKEN to enable them."}, 403
+    # Сравнение за постоянное время; байты - compare_digest не принимает строки не из ASCII
+    if not hmac.compare_digest((token or '').encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return {"error": "Invalid admin token."}, 401
+    return None
+
+def handle_admin_models(token):
+    error = _check_admin_token(token)
+    if error:
+        return error
+    snapshot = text_classifier_registry.current()
+    return {"text_classifier": snapshot.describe() if snapshot else None}, 200
+
+def handle_admin_reload_models(data, token):
+    """
+    Перезагружает модель в воркере, принявшем запрос. Остальные воркеры gunicorn
+    подхватывают новый файл сами (ML_ENGINE_MODEL_WATCH_INTERVAL_SECONDS).
+    По умолчанию загрузка идет в фоне (202); {"wait": true} - дождаться и вернуть новую версию.
+    """
+    error = _check_admin_token(token)
+    if error:
+        return error
+    data = data or {}
+    force = bool(data.get('force', False))
+    if not data.get('wait', False):
+        text_classifier_registry.reload_in_background(force=force)
+        return {"status": "reloading", "model_version": text_classifier_registry.version}, 202
+    previous_version = text_classifier_registry.version
+    snapshot = text_classifier_registry.reload(force=force)
+    if snapshot is None:
+        return {"error": "Text classification model could not be loaded."}, 503
+    return {
+        "status": "reloaded" if snapshot.version != previous_version or force else "unchanged",
+        "previous_model_version": previous_version,
+        **snapshot.describe()
+    }, 200
+
+# --- Маршруты Flask ---
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "UP", "service": "ML Engine"}), 200
+    body, status = handle_health_check()
+    return jsonify(body), status
 
 @app.route('/predict/document_sensitivity', methods=['POST'])
 # @metrics.gauge('ml_engine_active_predictions', 'Number of active predictions') # Пример кастомной метрики (gauge)
 # @metrics.counter('ml_engine_predictions_total', 'Total number of predictions made', labels={'type': 'doc_sensitivity'}) # Пример кастомной метрики (counter)
 def predict_document_sensitivity():
-    if not text_classifier_model:
-        return jsonify({"error": "Text classification model is not loaded."}), 503
+    body, status = handle_predict_document_sensitivity(request.get_json(silent=True))
+    return jsonify(body), status
+
+@app.route('/predict/document_sensitivity/batch', methods=['POST'])
+def predict_document_sensitivity_batch():
+    body, status = handle_predict_document_sensitivity_batch(request.get_json(silent=True))
+    return jsonify(body), status
+
+@app.route('/predict/document_sensitivity/stream', methods=['POST'])
+def predict_document_sensitivity_stream():
+    # Тело запроса (raw или Transfer-Encoding: chunked) читается блоками, а не целиком в память
+    classifier, error = open_document_stream(request.args)
+    if error:
+        return jsonify(error[0]), error[1]
     try:
-        data = request.get_json()
-        if not data or 'text_content' not in data:
-            return jsonify({"error": "Missing 'text_content' in request body"}), 400
-        text_content = data['text_content']
-        prediction, probability = make_prediction_text_classification(text_classifier_model, [text_content])
-        # metrics.counter('ml_engine_predictions_total', 'Total number of predictions made', labels={'type': 'doc_sensitivity'}).inc() # Инкремент счетчика
-        return jsonify({
-            "prediction_label": prediction[0],
-            "probability": float(probability[0]),
-            "model_version": "1.0.0"
-        }), 200
+        for block in iter(lambda: request.stream.read(STREAM_READ_BLOCK_BYTES), b''):
+            classifier.feed(block)
+        body, status = finish_document_stream(classifier)
+        return jsonify(body), status
     except Exception as e:
-        app.logger.error(f"Error in /predict/document_sensitivity: {e}")
-        # metrics.counter('ml_engine_prediction_errors_total', 'Total prediction errors', labels={'type': 'doc_sensitivity'}).inc()
-        return jsonify({"error": "An error occurred during prediction.", "details": str(e)}), 500
+        app.logger.error(f"Error in /predict/document_sensitivity/stream: {e}")
+        return jsonify({"error": "An error occurred during streaming prediction.", "details": str(e)}), 500
 
 @app.route('/predict/user_anomaly', methods=['POST'])
 def predict_user_anomaly():
-    return jsonify({
-        "message": "UEBA model endpoint placeholder. Model not yet implemented.",
-        "received_data": request.get_json()
-    }), 200
+    body, status = handle_predict_user_anomaly(request.get_json(silent=True))
+    return jsonify(body), status
+
+@app.route('/policies/evaluate', methods=['POST'])
+def evaluate_policies():
+    body, status = handle_evaluate_policies(request.get_json(silent=True))
+    return jsonify(body), status
+
+@app.route('/ingest/user_events', methods=['POST'])
+def ingest_user_events():
+    # NDJSON (можно gzip) читается и учитывается блоками, а не целиком в память
+    ingestor, error = open_event_ingest(request.args)
+    if error:
+        return jsonify(error[0]), error[1]
+    try:
+        for block in iter(lambda: request.stream.read(STREAM_READ_BLOCK_BYTES), b''):
+            ingestor.feed(block)
+        body, status = finish_event_ingest(ingestor)
+        return jsonify(body), status
+    except IngestLimitExceeded as e:
+        return jsonify({"error": str(e), "events_ingested": ingestor.events_ingested}), 413
+    except zlib.error as e:
+        return jsonify({"error": "Invalid gzip body.", "details": str(e), "events_ingested": ingestor.events_ingested}), 400
+    except Exception as e:
+        app.logger.error(f"Error in /ingest/user_events: {e}")
+        return jsonify({"error": "An error occurred during event ingest.", "details": str(e)}), 500
+
+@app.route('/admin/models', methods=['GET'])
+def admin_models():
+    body, status = handle_admin_models(request.headers.get('X-Admin-Token'))
+    return jsonify(body), status
+
+@app.route('/admin/policies', methods=['PUT'])
+def admin_policies():
+    body, status = handle_admin_policies(request.get_json(silent=True), request.headers.get('X-Admin-Token'))
+    return jsonify(body), status
+
+@app.route('/admin/identities', methods=['POST'])
+def admin_identities():
+    body, status = handle_admin_identities(request.get_json(silent=True), request.headers.get('X-Admin-Token'))
+    return jsonify(body), status
+
+@app.route('/admin/models/reload', methods=['POST'])
+def admin_reload_models():
+    body, status = handle_admin_reload_models(request.get_json(silent=True), request.headers.get('X-Admin-Token'))
+    return jsonify(body), status
 
 if __name__ == '__main__':
     port = int(os.environ.get("ML_ENGINE_PORT", 5002))
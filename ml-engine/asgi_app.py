@@ -0,0 +1,222 @@
+# ml-engine/asgi_app.py
+"""
+ASGI-режим ML-движка: те же маршруты и JSON-контракты, что и у Flask-приложения (app.py).
+
+CPU-тяжелая оценка выполняется в ограниченном пуле потоков, поэтому один медленный большой
+документ не блокирует остальные запросы. Когда пул и его очередь заполнены, запрос сразу
+получает 429 с заголовком Retry-After.
+
+ML_ENGINE_ASGI_EXECUTOR=process дополнительно выносит классификацию текстов в пул процессов.
+Туда уходит только она (app.classify_documents): состояние пользователей UEBA, политики,
+индекс псевдонимов и админские операции остаются в этом процессе.
+
+Запуск:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5002
+"""
+import asyncio
+import contextlib
+import functools
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter, Gauge, make_asgi_app
+
+import app as flask_app
+from scripts.event_ingest import IngestLimitExceeded
+
+ASGI_EXECUTOR = os.environ.get("ML_ENGINE_ASGI_EXECUTOR", "thread").lower()  # thread | process
+ASGI_WORKERS = int(os.environ.get("ML_ENGINE_ASGI_WORKERS", os.cpu_count() or 1))
+ASGI_MAX_QUEUE = int(os.environ.get("ML_ENGINE_ASGI_MAX_QUEUE", 64))
+ASGI_RETRY_AFTER_SECONDS = int(os.environ.get("ML_ENGINE_ASGI_RETRY_AFTER_SECONDS", 1))
+
+PENDING_TASKS = Gauge('ml_engine_asgi_pending_tasks', 'Scoring tasks running or queued in the ASGI worker pool')
+REJECTED_REQUESTS = Counter('ml_engine_asgi_rejected_total', 'Requests rejected with 429 because the worker pool queue is full')
+
+
+class PoolQueueFull(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    Пул исполнителей с ограничением на число одновременно выполняемых и ожидающих задач.
+    Счетчик ведется в цикле событий, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, executor, max_pending: int):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.pending = 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Занимает место в пуле или сразу выбрасывает PoolQueueFull."""
+        if self.pending >= self.max_pending:
+            REJECTED_REQUESTS.inc()
+            raise PoolQueueFull()
+        self.pending += 1
+        PENDING_TASKS.inc()
+        try:
+            yield
+        finally:
+            self.pending -= 1
+            PENDING_TASKS.dec()
+
+    async def run(self, func, *args):
+        async with self.slot():
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+
+scoring_pool = BoundedExecutor(
+    ThreadPoolExecutor(max_workers=ASGI_WORKERS, thread_name_prefix='ml-engine-scoring'),
+    max_pending=ASGI_WORKERS + ASGI_MAX_QUEUE
+)
+# Каждый процесс пула загружает модель из того же файла; версию сверяет с моделью этого процесса
+text_process_pool = ProcessPoolExecutor(max_workers=ASGI_WORKERS) if ASGI_EXECUTOR == 'process' else None
+
+
+def _classify_in_process_pool(texts):
+    # Вызывается из потока scoring_pool, который ждет результат процесса
+    fingerprint = flask_app.text_classifier_registry.fingerprint
+    return text_process_pool.submit(flask_app.classify_documents, texts, fingerprint).result()
+
+
+def _document_handler(handler):
+    if text_process_pool is None:
+        return handler
+    return functools.partial(handler, classify=_classify_in_process_pool)
+
+app = FastAPI(title="DLP ML Engine")
+app.mount("/metrics", make_asgi_app())
+
+
+async def _read_json(request: Request):
+    # Поведение как у request.get_json(silent=True) во Flask: невалидное тело -> None
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+
+def _overloaded_response():
+    return JSONResponse(
+        {"error": "ML Engine is overloaded, retry later."},
+        status_code=429,
+        headers={"Retry-After": str(ASGI_RETRY_AFTER_SECONDS)}
+    )
+
+
+async def _offload(handler, data):
+    try:
+        body, status = await scoring_pool.run(handler, data)
+    except PoolQueueFull:
+        return _overloaded_response()
+    return JSONResponse(body, status_code=status)
+
+
+@app.get('/health')
+async def health_check():
+    body, status = flask_app.handle_health_check()
+    return JSONResponse(body, status_code=status)
+
+
+@app.post('/predict/document_sensitivity')
+async def predict_document_sensitivity(request: Request):
+    return await _offload(_document_handler(flask_app.handle_predict_document_sensitivity), await _read_json(request))
+
+
+@app.post('/predict/document_sensitivity/batch')
+async def predict_document_sensitivity_batch(request: Request):
+    return await _offload(_document_handler(flask_app.handle_predict_document_sensitivity_batch), await _read_json(request))
+
+
+@app.post('/predict/document_sensitivity/stream')
+async def predict_document_sensitivity_stream(request: Request):
+    classifier, error = flask_app.open_document_stream(request.query_params)
+    if error:
+        return JSONResponse(error[0], status_code=error[1])
+    # Состояние классификатора живет в этом процессе, поэтому куски тела
+    # обрабатываются в потоках по умолчанию, а пул дает только контроль нагрузки.
+    try:
+        async with scoring_pool.slot():
+            async for block in request.stream():
+                await asyncio.to_thread(classifier.feed, block)
+            body, status = await asyncio.to_thread(flask_app.finish_document_stream, classifier)
+    except PoolQueueFull:
+        return _overloaded_response()
+    except Exception as e:
+        flask_app.app.logger.error(f"Error in /predict/document_sensitivity/stream: {e}")
+        return JSONResponse({"error": "An error occurred during streaming prediction.", "details": str(e)}, status_code=500)
+    return JSONResponse(body, status_code=status)
+
+
+@app.post('/predict/user_anomaly')
+async def predict_user_anomaly(request: Request):
+    return await _offload(flask_app.handle_predict_user_anomaly, await _read_json(request))
+
+
+@app.post('/policies/evaluate')
+async def evaluate_policies(request: Request):
+    return await _offload(flask_app.handle_evaluate_policies, await _read_json(request))
+
+
+@app.post('/ingest/user_events')
+async def ingest_user_events(request: Request):
+    ingestor, error = flask_app.open_event_ingest(request.query_params)
+    if error:
+        return JSONResponse(error[0], status_code=error[1])
+    try:
+        async with scoring_pool.slot():
+            async for block in request.stream():
+                await asyncio.to_thread(ingestor.feed, block)
+            body, status = await asyncio.to_thread(flask_app.finish_event_ingest, ingestor)
+    except PoolQueueFull:
+        return _overloaded_response()
+    except IngestLimitExceeded as e:
+        return JSONResponse({"error": str(e), "events_ingested": ingestor.events_ingested}, status_code=413)
+    except zlib.error as e:
+        return JSONResponse({"error": "Invalid gzip body.", "details": str(e), "events_ingested": ingestor.events_ingested}, status_code=400)
+    except Exception as e:
+        flask_app.app.logger.error(f"Error in /ingest/user_events: {e}")
+        return JSONResponse({"error": "An error occurred during event ingest.", "details": str(e)}, status_code=500)
+    return JSONResponse(body, status_code=status)
+
+
+@app.get('/admin/models')
+async def admin_models(request: Request):
+    body, status = flask_app.handle_admin_models(request.headers.get('X-Admin-Token'))
+    return JSONResponse(body, status_code=status)
+
+
+@app.put('/admin/policies')
+async def admin_policies(request: Request):
+    body, status = await asyncio.to_thread(
+        flask_app.handle_admin_policies, await _read_json(request), request.headers.get('X-Admin-Token')
+    )
+    return JSONResponse(body, status_code=status)
+
+
+@app.post('/admin/identities')
+async def admin_identities(request: Request):
+    body, status = await asyncio.to_thread(
+        flask_app.handle_admin_identities, await _read_json(request), request.headers.get('X-Admin-Token')
+    )
+    return JSONResponse(body, status_code=status)
+
+
+@app.post('/admin/models/reload')
+async def admin_reload_models(request: Request):
+    # Загрузка и прогрев модели с {"wait": true} - блокирующая операция, поэтому в отдельном потоке
+    body, status = await asyncio.to_thread(
+        flask_app.handle_admin_reload_models, await _read_json(request), request.headers.get('X-Admin-Token')
+    )
+    return JSONResponse(body, status_code=status)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get("ML_ENGINE_PORT", 5002))
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1,118 @@
+# ml-engine/benchmarks/bench_edm_index.py
+"""
+Индекс exact data match (scripts/edm_index.py): сборка из CSV синтетической клиентской базы
+(время, пиковая память процесса, размер индекса) и поиск записей в документах разного размера,
+в которые вставлены значения нескольких столбцов случайных записей: время, пропускная способность,
+найдены ли вставленные записи и сколько записей найдено сверх них.
+
+Запуск: python -m benchmarks.bench_edm_index [--cells 5000000]
+(требование к памяти проверяется с --cells 50000000: пиковый RSS сборки и поиска - в выводе)
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import tempfile
+import time
+
+from benchmarks.common import best_of
+from scripts.edm_index import EdmIndex
+
+COLUMNS = ['customer_id', 'full_name', 'phone', 'email', 'iin', 'card', 'birth_date', 'city', 'address', 'account']
+FIRST_NAMES = ['Айдар', 'Ержан', 'Иван', 'Анна', 'Дина', 'Асель', 'Мария', 'Олжас', 'Сергей', 'Алия', 'John', 'Emma']
+LAST_NAMES = ['Ахметов', 'Иванов', 'Петрова', 'Смагулов', 'Ким', 'Садыкова', 'Нургалиев', 'Smith', 'Brown', 'Омаров']
+CITIES = ['Алматы', 'Астана', 'Шымкент', 'Караганда', 'Актобе', 'Павлодар']
+STREETS = ['Абая', 'Достык', 'Сатпаева', 'Толе би', 'Жибек жолы', 'Аль-Фараби']
+
+
+def make_record(number: int, rng: random.Random):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return [
+        str(10_000_000 + number),
+        f"{first} {last}-{number % 997}",
+        f"+7 7{rng.randint(0, 99):02d} {rng.randint(100, 999)} {rng.randint(10, 99)} {rng.randint(10, 99)}",
+        f"{first.lower()}.{number}@mail.example",
+        f"{rng.randint(10**11, 10**12 - 1)}",
+        f"4{rng.randint(10**14, 10**15 - 1)}",
+        f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1950, 2005)}",
+        rng.choice(CITIES),
+        f"ул. {rng.choice(STREETS)} {rng.randint(1, 300)}, кв. {rng.randint(1, 400)}",
+        f"KZ{rng.randint(10**17, 10**18 - 1)}",
+    ]
+
+
+def write_csv(path: str, n_records: int):
+    rng = random.Random(0)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for number in range(n_records):
+            writer.writerow(make_record(number, rng))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cells', type=int, default=5_000_000)
+    args = parser.parse_args()
+    n_records = args.cells // len(COLUMNS)
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'customers.csv')
+        index_path = os.path.join(directory, 'customers.edm')
+        started = time.perf_counter()
+        write_csv(csv_path, n_records)
+        print(f"{n_records} records x {len(COLUMNS)} columns = {n_records * len(COLUMNS)} cells, "
+              f"CSV {os.path.getsize(csv_path) / 2**20:.0f} MiB, generated in {time.perf_counter() - started:.0f} s")
+
+        started = time.perf_counter()
+        index = EdmIndex.from_csv(csv_path)
+        index.save(index_path)
+        build_seconds = time.perf_counter() - started
+        print(f"build: {build_seconds:.0f} s ({n_records * len(COLUMNS) / build_seconds / 1e6:.2f} M cells/s), "
+              f"index {index.memory_bytes / 2**20:.0f} MiB ({len(index)} cells, "
+              f"{index.memory_bytes / max(len(index), 1):.1f} B/cell), "
+              f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10:.0f} MiB")
+        print(f"skipped: {index.stats}")
+        del index
+
+        index = EdmIndex.load(index_path)
+        # Значения записей для вставки в документы: записи перечитываются из CSV
+        rng = random.Random(1)
+        wanted = set(rng.sample(range(n_records), 200))
+        values = {}
+        with open(csv_path, encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            next(reader)
+            for number, row in enumerate(reader):
+                if number in wanted:
+                    values[number] = row
+
+        print(f"{'document':>10} {'leaked':>7} {'ms':>9} {'MB/s':>7} {'found leaked':>13} {'other records':>14}")
+        words = ('отчет клиент платеж договор счет заявка номер дата сумма адрес телефон статус '
+                 'report customer payment order invoice total amount').split()
+        for size, n_leaked in ((2_000, 1), (100_000, 10), (1_000_000, 100)):
+            leaked = rng.sample(sorted(values), n_leaked)
+            parts, length = [], 0
+            while length < size:
+                parts.append(rng.choice(words) if rng.random() < 0.95 else str(rng.randint(0, 10**6)))
+                length += len(parts[-1]) + 1
+            for number in leaked:
+                # 2-4 столбца записи, кроме города и даты рождения: при миллионах записей они общие
+                # для сотен записей и не индексируются (skipped_common)
+                columns = rng.sample([c for c in range(len(COLUMNS)) if COLUMNS[c] not in ('city', 'birth_date')],
+                                     rng.randint(2, 4))
+                for column in columns:
+                    parts.insert(rng.randrange(len(parts) + 1), values[number][column])
+            document = ' '.join(parts)
+            result = index.match(document, max_records=n_leaked * 2)
+            found = {record["record"] for record in result["records"]}
+            repeat = 20 if size < 10_000 else 1
+            seconds = best_of(lambda: [index.match(document) for _ in range(repeat)], repeat=3) / repeat
+            print(f"{len(document):>10} {n_leaked:>7} {seconds * 1000:>9.2f} {len(document) / seconds / 1e6:>7.1f} "
+                  f"{len(found & set(leaked)):>13} {result['matched_records'] - len(found & set(leaked)):>14}")
+        print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10:.0f} MiB")
+
+
+if __name__ == '__main__':
+    main()
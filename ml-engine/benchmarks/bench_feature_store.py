@@ -0,0 +1,108 @@
+# ml-engine/benchmarks/bench_feature_store.py
+"""
+Память на пользователя и скорость обновления состояния UEBA:
+столбцовое хранилище (scripts/feature_store.py) против объектов с __slots__
+и словарем адресов на пользователя (прежняя реализация ueba_engine).
+
+Запуск: python -m benchmarks.bench_feature_store [--users 200000]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.common import EVENTS_START
+from scripts.ueba_engine import UebaEngine
+
+
+class LegacyUserState:
+    __slots__ = ('last_seen', 'event_count', 'bytes_total', 'off_hours_count', 'destinations')
+
+    def __init__(self, timestamp):
+        self.last_seen = timestamp
+        self.event_count = 0.0
+        self.bytes_total = 0.0
+        self.off_hours_count = 0.0
+        self.destinations = {}
+
+
+def legacy_update(users, user_id, timestamp, n_bytes, destination, half_life=86400.0):
+    state = users.get(user_id)
+    if state is None:
+        state = users[user_id] = LegacyUserState(timestamp)
+    factor = 2.0 ** (-(timestamp - state.last_seen) / half_life)
+    state.event_count = state.event_count * factor + 1
+    state.bytes_total = state.bytes_total * factor + n_bytes
+    state.last_seen = timestamp
+    state.destinations.pop(destination, None)
+    state.destinations[destination] = timestamp
+
+
+def make_columns(n_events, n_users, seed):
+    rng = np.random.default_rng(seed)
+    user_ids = [f"user{user}" for user in rng.integers(0, n_users, n_events)]
+    timestamps = np.sort(rng.uniform(EVENTS_START, EVENTS_START + 86400, n_events))
+    volumes = rng.lognormal(11, 1.5, n_events)
+    destinations = [f"host{destination}" for destination in rng.integers(0, 50, n_events)]
+    return user_ids, timestamps, volumes, destinations
+
+
+def measure_memory(func):
+    tracemalloc.start()
+    result = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--events-per-user', type=int, default=5)
+    args = parser.parse_args()
+
+    n_events = args.users * args.events_per_user
+    # Заполнение: каждый пользователь получает события, адреса - из пула в 50 хостов
+    user_ids, timestamps, volumes, destinations = make_columns(n_events, args.users, seed=0)
+
+    def fill_columnar():
+        engine = UebaEngine()
+        engine.update(user_ids, timestamps, volumes, destinations)
+        return engine
+
+    def fill_legacy():
+        users = {}
+        for user_id, timestamp, n_bytes, destination in zip(user_ids, timestamps.tolist(), volumes.tolist(), destinations):
+            legacy_update(users, user_id, timestamp, n_bytes, destination)
+        return users
+
+    engine, columnar_bytes = measure_memory(fill_columnar)
+    legacy, legacy_bytes = measure_memory(fill_legacy)
+    print(f"{len(engine)} users, {n_events} events")
+    print(f"{'layout':>28} {'bytes/user':>11}")
+    print(f"{'__slots__ objects + dicts':>28} {legacy_bytes / len(legacy):>11.0f}")
+    print(f"{'columnar (incl. id index)':>28} {columnar_bytes / len(engine):>11.0f}")
+    print(f"{'columnar arrays only':>28} {engine.store.nbytes / engine.store.capacity:>11.0f}")
+
+    stream = make_columns(200_000, args.users, seed=1)
+    print(f"\n{'update path':>28} {'events/s':>11}")
+    started = time.perf_counter()
+    for user_id, timestamp, n_bytes, destination in zip(stream[0], stream[1].tolist(), stream[2].tolist(), stream[3]):
+        legacy_update(legacy, user_id, timestamp, n_bytes, destination)
+    print(f"{'legacy, per event':>28} {len(stream[0]) / (time.perf_counter() - started):>11.0f}")
+    for batch_size in (1, 64, 4096):
+        events = 5000 if batch_size == 1 else len(stream[0])
+        started = time.perf_counter()
+        for start in range(0, events, batch_size):
+            end = start + batch_size
+            engine.update(stream[0][start:end], stream[1][start:end], stream[2][start:end], stream[3][start:end])
+        print(f"{f'columnar, batch {batch_size}':>28} {events / (time.perf_counter() - started):>11.0f}")
+
+    started = time.perf_counter()
+    engine.features(engine.store.user_ids)
+    print(f"\nfeatures() for all {len(engine)} users: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
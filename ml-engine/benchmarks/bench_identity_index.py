@@ -0,0 +1,60 @@
+# ml-engine/benchmarks/bench_identity_index.py
+"""
+Индекс псевдонимов (scripts/identity_index.py) против словаря Python {нормализованный псевдоним: учетная запись}:
+память, сборка, разрешение пакетов псевдонимов разного размера и применение изменений.
+
+Запуск: python -m benchmarks.bench_identity_index [--aliases 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.common import best_of
+from scripts.identity_index import IdentityIndex, normalize_alias
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--aliases', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # 4 псевдонима на учетную запись: email, UPN, SAM, имя хоста
+    aliases = [
+        (f"user{i // 4}@corp.example", f"user{i // 4}.upn@corp.example", f"CORP\\user{i // 4}", f"WS-{i // 4:07d}")[i % 4]
+        for i in range(args.aliases)
+    ]
+    identities = [f"user{i // 4}" for i in range(args.aliases)]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    mapping = {normalize_alias(alias): identity for alias, identity in zip(aliases, identities)}
+    dict_build = time.perf_counter() - started
+    dict_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    index = IdentityIndex.from_pairs(zip(aliases, identities))
+    index_build = time.perf_counter() - started
+    print(f"{args.aliases} aliases, {len(index.identities)} identities")
+    print(f"{'dict':>14}: build {dict_build:6.2f}s, memory {dict_memory / 2**20:7.1f} MiB (keys + dict)")
+    print(f"{'IdentityIndex':>14}: build {index_build:6.2f}s, memory {index.memory_bytes / 2**20:7.1f} MiB (hash table)")
+
+    rng = np.random.default_rng(0)
+    print(f"{'batch':>6} {'dict, us/alias':>15} {'index, us/alias':>16}")
+    for batch_size in (1, 64, 4096):
+        batch = [aliases[i].upper() for i in rng.integers(0, args.aliases, batch_size).tolist()]
+        dict_time = best_of(lambda: [mapping.get(normalize_alias(alias), alias) for alias in batch], repeat=20)
+        index_time = best_of(lambda: index.canonicalize(batch), repeat=20)
+        print(f"{batch_size:>6} {dict_time / batch_size * 1e6:>15.2f} {index_time / batch_size * 1e6:>16.2f}")
+
+    delta = {f"new{i}@corp.example": f"user{i}" for i in range(10_000)}
+    removed = aliases[:10_000]
+    started = time.perf_counter()
+    index.apply_delta(delta, removed)
+    print(f"delta (+10000 / -10000 aliases): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# ml-engine/benchmarks/bench_ingest.py
+"""
+Загрузка событий NDJSON (scripts/event_ingest.py) в одном потоке: только разбор,
+разбор + учет в UebaEngine и полный путь с оценкой моделью. Результат - событий/с на ядро.
+
+Запуск: python -m benchmarks.bench_ingest [--events 500000] [--users 5000] [--block 65536]
+"""
+import argparse
+import gzip
+import json
+import time
+
+from benchmarks.common import build_sample_ueba_model, make_user_events
+from scripts.event_ingest import NdjsonEventIngestor
+from scripts.ueba_engine import UebaEngine
+
+
+class _ParseOnlyIngestor(NdjsonEventIngestor):
+    def _process(self, batch):
+        self._batch_start += len(batch)
+
+
+def run(ingestor, body: bytes, block_size: int) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(body), block_size):
+        ingestor.feed(body[start:start + block_size])
+    ingestor.finish()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=500_000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--block', type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    body = "".join(json.dumps(event) + "\n" for event in make_user_events(args.events, args.users)).encode("utf-8")
+    compressed = gzip.compress(body, compresslevel=6)
+    model = build_sample_ueba_model()
+    print(f"{args.events} events, {args.users} users, NDJSON {len(body) / 2**20:.1f} MiB, gzip {len(compressed) / 2**20:.1f} MiB")
+
+    cases = [
+        ("parse only", lambda: _ParseOnlyIngestor(UebaEngine()), body),
+        ("parse + ingest", lambda: NdjsonEventIngestor(UebaEngine()), body),
+        ("parse + ingest + score", lambda: NdjsonEventIngestor(UebaEngine(), model=model, threshold=0.0), body),
+        ("gzip + parse + ingest + score", lambda: NdjsonEventIngestor(UebaEngine(), model=model, threshold=0.0), compressed),
+    ]
+    for name, make_ingestor, payload in cases:
+        elapsed = run(make_ingestor(), payload, args.block)
+        print(f"{name:>32}: {args.events / elapsed:>10,.0f} events/s per core")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# ml-engine/benchmarks/bench_keyword_matcher.py
+"""
+Поиск ключевых слов (scripts/keyword_matcher.py) против проверки "слово in текст" по каждому слову
+(как условия contains без автомата): пропускная способность на длинном документе и время на
+короткое значение поля при росте числа слов; сборка автомата и размер его таблиц.
+
+Запуск: python -m benchmarks.bench_keyword_matcher [--megabytes 10]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import best_of
+from scripts.keyword_matcher import KeywordAutomaton
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megabytes', type=float, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 12)))
+                  for _ in range(50000)]
+    # Документ - из 80% словаря: часть искомых слов в нем не встречается, и проверка "in" проходит его целиком
+    present = vocabulary[:40000]
+    words = []
+    size = 0
+    while size < args.megabytes * 1e6:
+        words.append(rng.choice(present))
+        size += len(words[-1]) + 1
+    document = ' '.join(words)
+    short = ' '.join(rng.choice(present) for _ in range(8))
+
+    print(f"document {len(document) / 1e6:.1f} MB, short value {len(short)} chars")
+    print(f"{'keywords':>9} {'build, s':>9} {'table, MB':>10} {'automaton, MB/s':>16} {'naive, MB/s':>12} "
+          f"{'short: automaton, us':>21} {'naive, us':>10}")
+    for count in (10, 100, 1000, 10000):
+        keywords = rng.sample(vocabulary, count)
+        started = time.perf_counter()
+        automaton = KeywordAutomaton.build(keywords)
+        build = time.perf_counter() - started
+
+        automaton_mbs = len(document) / best_of(lambda: automaton.found(document), repeat=3) / 1e6
+        lowered = document.lower()
+        naive_keywords = keywords[:max(10, count // 100)]  # наивный проход - по части слов, с пересчетом на все
+        naive_seconds = best_of(lambda: [keyword for keyword in naive_keywords if keyword in lowered], repeat=3)
+        naive_mbs = len(document) / (naive_seconds * count / len(naive_keywords)) / 1e6
+
+        repeat = 2000
+        short_automaton = best_of(lambda: [automaton.found(short) for _ in range(repeat)], repeat=3) / repeat * 1e6
+        short_naive = best_of(lambda: [[k for k in keywords if k in short.lower()] for _ in range(repeat // 10)],
+                              repeat=3) / (repeat // 10) * 1e6
+        print(f"{count:>9} {build:>9.2f} {automaton.memory_bytes / 2**20:>10.1f} {automaton_mbs:>16.1f} "
+              f"{naive_mbs:>12.1f} {short_automaton:>21.1f} {short_naive:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
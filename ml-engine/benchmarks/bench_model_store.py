@@ -0,0 +1,99 @@
+# ml-engine/benchmarks/bench_model_store.py
+"""
+Память на воркер и время холодного старта: joblib.load целиком в процесс
+против загрузки через model_store (mmap_mode='r').
+
+Запускает N процессов-"воркеров" одновременно. Каждый загружает модель,
+делает одно предсказание и, дождавшись остальных, читает свои
+/proc/self/status (RSS) и /proc/self/smaps_rollup (PSS - доля с учетом общих страниц).
+
+Запуск: python -m benchmarks.bench_model_store [--workers 4] [--features 400000]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import joblib
+import numpy as np
+
+from scripts.model_store import load_model, save_model
+
+
+def build_large_model(n_features: int, n_classes: int):
+    """Пайплайн TF-IDF + линейный классификатор (SGD, log_loss) с большим словарем на синтетических данных."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.pipeline import Pipeline
+
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(n_features)]
+    texts = [" ".join(vocabulary[i:i + 50]) for i in range(0, n_features, 50)]
+    labels = [f"class{rng.randrange(n_classes)}" for _ in texts]
+    model = Pipeline([
+        ('tfidf', TfidfVectorizer()),
+        ('classifier', SGDClassifier(loss='log_loss', max_iter=5, tol=None, random_state=0)),
+    ])
+    model.fit(texts, labels)
+    return model
+
+
+def _memory_kb():
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                values['rss'] = int(line.split()[1])
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                values['pss'] = int(line.split()[1])
+    return values
+
+
+def _worker(path, use_mmap, barrier, results):
+    started = time.perf_counter()
+    model = load_model(path) if use_mmap else joblib.load(path)
+    model.predict_proba(["term1 term2 term3"])
+    cold_start = time.perf_counter() - started
+    barrier.wait()  # все воркеры держат модель одновременно
+    memory = _memory_kb()
+    results.put((cold_start, memory['rss'], memory.get('pss', 0)))
+    barrier.wait()
+
+
+def measure(path, use_mmap, workers):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(path, use_mmap, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return np.mean(samples, axis=0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--features', type=int, default=400_000)
+    parser.add_argument('--classes', type=int, default=20)
+    args = parser.parse_args()
+
+    model = build_large_model(args.features, args.classes)
+    with tempfile.TemporaryDirectory() as directory:
+        path = save_model(model, os.path.join(directory, 'model.joblib'))
+        size_mb = os.path.getsize(path) / 2 ** 20
+        print(f"Model: {args.features} features, {args.classes} classes, file {size_mb:.1f} MB, {args.workers} workers")
+        print(f"{'mode':>14} {'cold start, s':>14} {'RSS/worker, MB':>15} {'PSS/worker, MB':>15}")
+        for label, use_mmap in (("joblib.load", False), ("mmap_mode='r'", True)):
+            cold_start, rss, pss = measure(path, use_mmap, args.workers)
+            print(f"{label:>14} {cold_start:>14.2f} {rss / 1024:>15.1f} {pss / 1024:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
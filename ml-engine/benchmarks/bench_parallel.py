@@ -0,0 +1,39 @@
+# ml-engine/benchmarks/bench_parallel.py
+"""
+Кривая масштабирования ParallelBatchPipeline: предобработка и оценка
+корпуса на 1..N процессах.
+
+Запуск: python -m benchmarks.bench_parallel [--documents 20000] [--max-workers N]
+"""
+import argparse
+import os
+
+from benchmarks.common import best_of, build_sample_text_model, make_document
+from scripts.parallel_pipeline import ParallelBatchPipeline
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', type=int, default=20_000)
+    parser.add_argument('--words', type=int, default=300)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    args = parser.parse_args()
+
+    model = build_sample_text_model()
+    corpus = [make_document(args.words, seed=i) for i in range(args.documents)]
+    print(f"{args.documents} documents x {args.words} words, chunk size {args.chunk_size}, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'preprocess, s':>14} {'predict, s':>11} {'speedup':>8}")
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        with ParallelBatchPipeline(model=model, workers=workers, chunk_size=args.chunk_size) as pipeline:
+            pipeline.predict(corpus[:args.chunk_size * workers])  # прогрев пула
+            preprocess_time = best_of(lambda: pipeline.preprocess(corpus), repeat=2)
+            predict_time = best_of(lambda: pipeline.predict(corpus), repeat=2)
+        baseline = baseline or predict_time
+        print(f"{workers:>8} {preprocess_time:>14.2f} {predict_time:>11.2f} {baseline / predict_time:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# ml-engine/benchmarks/bench_peer_groups.py
+"""
+Базовые линии групп сравнения (scripts/peer_groups.py): полный пересчет всех групп,
+пересчет только измененных групп и pandas groupby().quantile() для сравнения.
+
+Запуск: python -m benchmarks.bench_peer_groups [--users 200000] [--groups 1000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.peer_groups import PeerGroupBaselines
+from scripts.ueba_engine import FEATURE_NAMES
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--groups', type=int, default=1000)
+    parser.add_argument('--changed', type=float, default=0.01, help="Share of users whose features change between runs")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    user_ids = [f"user{i}" for i in range(args.users)]
+    user_groups = rng.integers(0, args.groups, args.users)
+    features = np.column_stack([
+        rng.lognormal(3, 1, args.users), rng.normal(13, 2, args.users), rng.random(args.users) * 0.3, rng.integers(1, 50, args.users)
+    ])
+
+    baselines = PeerGroupBaselines(capacity=args.users)
+    baselines.set_membership(user_ids, [[f"group{group}"] for group in user_groups.tolist()])
+    baselines.update(user_ids, features)
+    started = time.perf_counter()
+    baselines.recompute()
+    print(f"{args.users} users, {args.groups} groups")
+    print(f"{'full recompute':>36}: {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+    frame = pd.DataFrame(features, columns=FEATURE_NAMES)
+    frame['group'] = user_groups
+    started = time.perf_counter()
+    frame.groupby('group')[list(FEATURE_NAMES)].quantile([0.05, 0.25, 0.5, 0.75, 0.95])
+    print(f"{'pandas groupby().quantile()':>36}: {(time.perf_counter() - started) * 1000:8.1f} ms (без MAD)")
+
+    changed = rng.choice(args.users, int(args.users * args.changed), replace=False)
+    baselines.update([user_ids[i] for i in changed.tolist()], features[changed] * 1.1)
+    dirty_groups = len(baselines.dirty)
+    started = time.perf_counter()
+    baselines.recompute()
+    print(f"{f'incremental ({dirty_groups} dirty groups)':>36}: {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+    started = time.perf_counter()
+    baselines.score(user_ids[:10_000])
+    print(f"{'score 10000 users':>36}: {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# ml-engine/benchmarks/bench_pii_detectors.py
+"""
+Детекторы структурированных данных (scripts/pii_detectors.py) на смешанном корпусе: пропускная
+способность выражения каждого детектора по всему тексту, детектора целиком (окна якоря, выражение
+по окнам и проверка кандидатов) и всего набора (окна якорей общие), число кандидатов и подтвержденных
+вхождений.
+
+Корпус - слова (латиница и кириллица), числа разной длины, даты и суммы, среди которых 1% фрагментов -
+номера карт, IBAN, ИИН, ИНН, СНИЛС, SSN, email, телефоны и ключи; половина номеров - с неверной
+контрольной суммой.
+
+Запуск: python -m benchmarks.bench_pii_detectors [--megabytes 100]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import best_of
+from scripts.pii_detectors import DETECTORS, PiiScanner
+
+
+def make_samples(rng: random.Random):
+    """Значения данных: действительные и с измененной последней цифрой."""
+    valid = ['4111 1111 1111 1111', '5500-0000-0000-0004', '378282246310005', 'GB82 WEST 1234 5698 7654 32',
+             'KZ86125KZT5004100100', '900101300007', '7707083893', '500100732259', '112-233-445 95',
+             '123-45-6789']
+    samples = valid + [value[:-1] + str((int(value[-1]) + 1) % 10) for value in valid]
+    samples += ['ivan.petrov@example.kz', 'a.smith@corp.example.com', '+7 701 123 45 67', '(495) 123-45-67',
+                '+1-202-555-0143', "api_key='q8Zr2LmX9vTb4KwP'", 'password: changeme_please_123',
+                'AKIA' + ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ234567') for _ in range(16)),
+                'ghp_' + ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789')
+                                 for _ in range(36))]
+    return samples
+
+
+def make_corpus(size: int, rng: random.Random) -> str:
+    letters = 'abcdefghijklmnopqrstuvwxyzабвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+    words = [''.join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(20000)]
+    numbers = [str(rng.randint(0, 10 ** rng.randint(1, 14))) for _ in range(5000)]
+    dates = [f'{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1990, 2030)}' for _ in range(1000)]
+    amounts = [f'{rng.randint(1, 10**6):,}.{rng.randint(0, 99):02d}'.replace(',', ' ') for _ in range(1000)]
+    samples = make_samples(rng)
+    # Корпус собирается блоками, чтобы не держать список из всех фрагментов
+    chunks, length = [], 0
+    while length < size:
+        block = rng.choices(words, k=90000) + rng.choices(numbers, k=5000) + rng.choices(dates, k=2000) \
+            + rng.choices(amounts, k=2000) + rng.choices(samples, k=1000)
+        rng.shuffle(block)
+        chunks.append(' '.join(block))
+        length += len(chunks[-1]) + 1
+    return '\n'.join(chunks)[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megabytes', type=float, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    started = time.perf_counter()
+    corpus = make_corpus(int(args.megabytes * 1e6), rng)
+    size_mb = len(corpus.encode('utf-8')) / 1e6
+    print(f"corpus {len(corpus) / 1e6:.1f} M chars ({size_mb:.1f} MB UTF-8), generated in "
+          f"{time.perf_counter() - started:.1f} s")
+
+    print(f"{'detector':>12} {'full-text regex, MB/s':>22} {'detector, MB/s':>15} {'candidates':>11} {'confirmed':>10}")
+    for detector in DETECTORS:
+        candidates = sum(1 for _ in detector.pattern.finditer(corpus))
+        regex_seconds = best_of(lambda: [None for _ in detector.pattern.finditer(corpus)], repeat=1)
+        starts, _ = detector.find(corpus)
+        find_seconds = best_of(lambda: detector.find(corpus), repeat=1)
+        print(f"{detector.name:>12} {size_mb / regex_seconds:>22.1f} {size_mb / find_seconds:>15.1f} "
+              f"{candidates:>11} {len(starts):>10}")
+
+    scanner = PiiScanner()
+    found = scanner.scan(corpus)
+    seconds = best_of(lambda: scanner.scan(corpus), repeat=1)
+    print(f"all detectors: {size_mb / seconds:.1f} MB/s ({seconds:.1f} s), "
+          + ", ".join(f"{name} {len(spans)}" for name, spans in found.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# ml-engine/benchmarks/bench_policy_engine.py
+"""
+Вычисление политик DLP (scripts/policy_engine.py) над событием при росте числа политик:
+скомпилированный план против наивного обхода всех политик и условий (регулярные выражения
+в наивном варианте тоже скомпилированы заранее).
+
+Политика: канал передачи плюс 1-2 условия из списков групп/расширений, порогов размера,
+префиксов имени файла, подстрок получателя (10%) и регулярных выражений по имени файла (5%).
+
+Запуск: python -m benchmarks.bench_policy_engine [--events 2000]
+"""
+import argparse
+import random
+import re
+import time
+
+from scripts.policy_engine import PolicyEngine
+
+WORDS = [f"w{i}" for i in range(2000)]
+CHANNELS = ["email", "usb", "cloud", "print", "web", "chat"]
+GROUPS = [f"group{i}" for i in range(300)]
+EXTENSIONS = ["docx", "xlsx", "pdf", "txt", "zip", "csv", "pptx"]
+
+
+def make_policies(count: int, rng: random.Random):
+    def condition():
+        kind = rng.random()
+        if kind < 0.2:
+            return {"field": "user_group", "operator": "is_one_of", "value": rng.sample(GROUPS, 5)}
+        if kind < 0.65:
+            return {"field": "size", "operator": "greater_than", "value": rng.randint(10**6, 10**8), "dataType": "number"}
+        if kind < 0.75:
+            return {"field": "extension", "operator": "is_not_one_of", "value": rng.sample(EXTENSIONS, 2)}
+        if kind < 0.85:
+            return {"field": "filename", "operator": "starts_with", "value": rng.choice(WORDS)}
+        if kind < 0.95:
+            return {"field": "recipient", "operator": "contains", "value": rng.choice(WORDS)}
+        return {"field": "filename", "operator": "matches_regex", "value": rf"{rng.choice(WORDS)}_\d+"}
+
+    return [
+        {"_id": str(i), "name": f"policy{i}", "conditions": [
+            {"field": "channel", "operator": "equals", "value": rng.choice(CHANNELS)},
+            *(condition() for _ in range(rng.randint(1, 2)))
+        ]}
+        for i in range(count)
+    ]
+
+
+def make_events(count: int, rng: random.Random):
+    return [{
+        "channel": rng.choice(CHANNELS),
+        "user_group": rng.choice(GROUPS),
+        "size": int(rng.lognormvariate(12, 2)),  # медиана ~160 КБ
+        "extension": rng.choice(EXTENSIONS),
+        "filename": f"{rng.choice(WORDS)}_{rng.randint(0, 99)}.{rng.choice(EXTENSIONS)}",
+        "recipient": f"{rng.choice(WORDS)}@partner.example",
+        "user_id": f"user{rng.randint(0, 10**5)}"
+    } for _ in range(count)]
+
+
+def naive_evaluator(policies):
+    compiled = [[(c["field"], c["operator"], c["value"], re.compile(c["value"]) if c["operator"] == "matches_regex" else None)
+                 for c in policy["conditions"]] for policy in policies]
+
+    def holds(field, operator, value, pattern, event):
+        actual = event.get(field)
+        if actual is None:
+            return False
+        if operator == "equals":
+            return str(actual).casefold() == str(value).casefold()
+        if operator == "is_one_of":
+            return str(actual).casefold() in {str(item).casefold() for item in value}
+        if operator == "is_not_one_of":
+            return str(actual).casefold() not in {str(item).casefold() for item in value}
+        if operator == "greater_than":
+            return float(actual) > float(value)
+        if operator == "starts_with":
+            return str(actual).casefold().startswith(str(value).casefold())
+        if operator == "contains":
+            return str(value).casefold() in str(actual).casefold()
+        return pattern.search(str(actual)) is not None
+
+    def evaluate(event):
+        return [index for index, conditions in enumerate(compiled)
+                if all(holds(*condition, event) for condition in conditions)]
+    return evaluate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    events = make_events(args.events, rng)
+    print(f"{'policies':>9} {'compile, ms':>12} {'compiled, us/event':>19} {'naive, us/event':>16} {'matches/event':>14}")
+    for count in (100, 1000, 5000, 20000):
+        policies = make_policies(count, rng)
+        started = time.perf_counter()
+        engine = PolicyEngine.compile(policies)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        matches = sum(len(engine.evaluate(event)) for event in events)
+        compiled_us = (time.perf_counter() - started) / len(events) * 1e6
+
+        naive = naive_evaluator(policies)
+        sample = events[:max(20, args.events * 100 // count)]
+        started = time.perf_counter()
+        for event in sample:
+            naive(event)
+        naive_us = (time.perf_counter() - started) / len(sample) * 1e6
+        print(f"{count:>9} {compile_ms:>12.1f} {compiled_us:>19.1f} {naive_us:>16.1f} {matches / len(events):>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# ml-engine/benchmarks/bench_predict.py
+"""
+Сравнение двухпроходного (predict + predict_proba) и однопроходного
+инференса make_prediction_text_classification на больших документах.
+
+Запуск: python -m benchmarks.bench_predict
+"""
+import numpy as np
+
+from benchmarks.common import best_of, build_sample_text_model, make_document
+from scripts.predict_utils import make_prediction_text_classification
+
+
+def two_pass_prediction(model, texts):
+    """Прежняя реализация: TF-IDF преобразование выполняется дважды."""
+    predictions = model.predict(texts)
+    probabilities = model.predict_proba(texts)
+    return predictions, np.max(probabilities, axis=1)
+
+
+def main():
+    model = build_sample_text_model()
+    print(f"{'words/doc':>10} {'docs':>5} {'two-pass, ms':>13} {'single-pass, ms':>16} {'speedup':>8}")
+    for n_words in (1_000, 10_000, 100_000, 1_000_000):
+        texts = [make_document(n_words, seed=i) for i in range(4)]
+        old = best_of(lambda: two_pass_prediction(model, texts), repeat=3)
+        new = best_of(lambda: make_prediction_text_classification(model, texts), repeat=3)
+        print(f"{n_words:>10} {len(texts):>5} {old * 1000:>13.1f} {new * 1000:>16.1f} {old / new:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# ml-engine/benchmarks/bench_preprocess.py
+"""
+Микро-бенчмарк preprocess_text: исходная многопроходная реализация
+против текущей (скомпилированные паттерны, пропуск ненужных re.sub).
+
+Запуск: python -m benchmarks.bench_preprocess
+"""
+import re
+import string
+
+from benchmarks.common import best_of, make_document
+from scripts.preprocess import preprocess_text, preprocess_texts
+
+
+def legacy_preprocess_text(text):
+    text = text.lower()
+    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\S*@\S*\s?', '', text)
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    processed_text = " ".join(text.split()).strip()
+    return re.sub(r'\s+', ' ', processed_text)
+
+
+def main():
+    print(f"{'doc size':>10} {'kind':>8} {'legacy, ms':>11} {'current, ms':>12} {'speedup':>8}")
+    for n_words in (10, 100, 10_000, 1_000_000):
+        plain = make_document(n_words).title() + "."
+        with_links = plain + " Contact admin@corp.kz or visit https://intranet.corp.kz/wiki."
+        for kind, text in (("plain", plain), ("links", with_links)):
+            repeat = max(1, 20_000 // n_words)
+            old = best_of(lambda: [legacy_preprocess_text(text) for _ in range(repeat)], repeat=3) / repeat
+            new = best_of(lambda: [preprocess_text(text) for _ in range(repeat)], repeat=3) / repeat
+            print(f"{len(text):>10} {kind:>8} {old * 1000:>11.4f} {new * 1000:>12.4f} {old / new:>7.2f}x")
+
+    corpus = [make_document(50, seed=i) for i in range(10_000)]
+    elapsed = best_of(lambda: preprocess_texts(corpus), repeat=3)
+    print(f"\npreprocess_texts: {len(corpus)} docs x 50 words in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# ml-engine/benchmarks/bench_regex_set.py
+"""
+Проверка набора регулярных выражений политик (scripts/regex_set.py) против отдельного re.search
+по каждому выражению: время на документ при росте числа выражений, для короткого значения поля
+и для длинного документа.
+
+Выражения: 70% - слово-литерал с номером ("project_1234"), 20% - фраза из двух слов без учета регистра,
+10% - без обязательных литералов (числа заданной длины); префильтр пропускает первые две группы,
+если слов нет в документе, а третья проверяется объединенными альтернациями.
+
+Запуск: python -m benchmarks.bench_regex_set [--kilobytes 1000]
+"""
+import argparse
+import random
+import re
+
+from benchmarks.common import best_of
+from scripts.regex_set import RegexSet
+
+
+def make_patterns(count: int, vocabulary, rng: random.Random):
+    patterns = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.7:
+            source = rf"{rng.choice(vocabulary)}[-_ ]?\d{{3,6}}"
+        elif kind < 0.9:
+            source = rf"(?i)\b{rng.choice(vocabulary)}\s+{rng.choice(vocabulary)}\b"
+        else:
+            source = rf"\b\d{{{rng.randint(12, 30)}}}\b"
+        patterns.append(re.compile(source))
+    return patterns
+
+
+def make_document(size: int, vocabulary, rng: random.Random):
+    words = []
+    length = 0
+    while length < size:
+        words.append(rng.choice(vocabulary) if rng.random() < 0.9 else str(rng.randint(0, 10**8)))
+        length += len(words[-1]) + 1
+    return ' '.join(words)[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kilobytes', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10)))
+                  for _ in range(20000)]
+    # Документы - из половины словаря: выражения со словами из другой половины в них не совпадают
+    present = vocabulary[:10000]
+    documents = {"field (200 B)": make_document(200, present, rng),
+                 f"document ({args.kilobytes} KB)": make_document(args.kilobytes * 1000, present, rng)}
+
+    print(f"{'patterns':>9} {'text':>20} {'regex set, ms':>14} {'re.search each, ms':>19} {'matched':>8}")
+    for count in (10, 100, 1000):
+        patterns = make_patterns(count, vocabulary, rng)
+        regex_set = RegexSet(patterns)
+        for name, text in documents.items():
+            repeat = 200 if len(text) < 10000 else 1
+            matched = regex_set.search(text)
+            assert matched == {index for index, pattern in enumerate(patterns) if pattern.search(text)}
+            set_ms = best_of(lambda: [regex_set.search(text) for _ in range(repeat)], repeat=3) / repeat * 1000
+            each_ms = best_of(lambda: [[p for p in patterns if p.search(text)] for _ in range(repeat)],
+                              repeat=3) / repeat * 1000
+            print(f"{count:>9} {name:>20} {set_ms:>14.3f} {each_ms:>19.3f} {len(matched):>8}")
+
+
+if __name__ == '__main__':
+    main()
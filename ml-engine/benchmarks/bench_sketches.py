@@ -0,0 +1,104 @@
+# ml-engine/benchmarks/bench_sketches.py
+"""
+Скетчи (scripts/sketches.py) против точного подсчета: память, скорость и фактическая ошибка.
+
+Запуск: python -m benchmarks.bench_sketches [--events 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+
+from scripts.sketches import CountMinSketch, HyperLogLog, HyperLogLogArray, SpaceSaving, TDigest, hash64
+
+
+def measure(func):
+    """(результат, секунды, байт выделено и не освобождено) - память точных структур; для скетчей берется размер состояния."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+
+def report(name, n_events, elapsed, memory, error):
+    print(f"{name:>34} {n_events / elapsed:>12.0f} {memory / 1024:>12.0f} {error:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    n = args.events
+
+    print(f"{n} events")
+    print(f"{'structure':>34} {'events/s':>12} {'state KiB':>12} {'error':>12}")
+
+    # Различные адреса назначения: всего и по пользователям
+    destinations = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in rng.integers(0, n // 4, n).tolist()]
+    exact, elapsed, memory = measure(lambda: set(destinations))
+    report("distinct: exact set", n, elapsed, memory, "0")
+    sketch, elapsed, _ = measure(lambda: HyperLogLog(12).add(destinations))
+    report("distinct: HyperLogLog(12)", n, elapsed, len(sketch.to_bytes()), f"{abs(sketch.estimate() / len(exact) - 1):.2%}")
+    hashes = hash64(destinations)
+    _, elapsed, _ = measure(lambda: HyperLogLog(12).add_hashes(hashes))
+    report("  add_hashes (hash precomputed)", n, elapsed, sketch.registers.nbytes, "")
+
+    users = rng.integers(0, args.users, n)
+
+    def exact_per_user():
+        sets = {}
+        for user, destination in zip(users.tolist(), destinations):
+            sets.setdefault(user, set()).add(destination)
+        return sets
+
+    sets, elapsed, memory = measure(exact_per_user)
+    report("per-user distinct: dict of sets", n, elapsed, memory, "0")
+    sketches, elapsed, _ = measure(lambda: HyperLogLogArray(precision=8, capacity=args.users).add(users, destinations))
+    truth = np.array([len(sets.get(user, ())) for user in range(args.users)])
+    errors = np.abs(sketches.estimate(np.arange(args.users)) / np.maximum(truth, 1) - 1)
+    report("per-user: HyperLogLogArray(8)", n, elapsed, sketches.registers.nbytes, f"{np.median(errors):.2%} p50")
+
+    # Частые значения (типы файлов, распределение Ципфа)
+    file_types = [f"ext{value}" for value in (rng.zipf(1.2, n) % 100_000).tolist()]
+    counts, elapsed, memory = measure(lambda: Counter(file_types))
+    report("heavy hitters: exact Counter", n, elapsed, memory, "0")
+    top = counts.most_common(20)
+    space_saving, elapsed, _ = measure(lambda: SpaceSaving(capacity=200).add(file_types))
+    recall = len({item for item, _ in top} & {item for item, _, _ in space_saving.top(20)}) / 20
+    max_error = max(space_saving.estimate(item) - count for item, count in top)
+    report("heavy hitters: SpaceSaving(200)", n, elapsed, len(space_saving.to_bytes()), f"{max_error} (recall {recall:.0%})")
+    count_min, elapsed, _ = measure(lambda: CountMinSketch.from_error(0.0005, 0.01).add(file_types))
+    max_error = int(max(count_min.estimate([item for item, _ in top]) - np.array([count for _, count in top])))
+    report("frequency: CountMin(e=5e-4)", n, elapsed, count_min.counts.nbytes, f"{max_error}")
+
+    # Квантили объема передачи
+    volumes = rng.lognormal(11, 1.5, n)
+    quantiles = np.array([0.5, 0.9, 0.99, 0.999])
+    values, elapsed, memory = measure(lambda: np.sort(volumes))
+    report("quantiles: exact (sorted copy)", n, elapsed, memory, "0")
+    digest, elapsed, _ = measure(lambda: TDigest(compression=200).add(volumes))
+    rank_errors = np.abs(np.searchsorted(values, digest.quantile(quantiles)) / n - quantiles)
+    report("quantiles: TDigest(200)", n, elapsed, len(digest.to_bytes()), f"{rank_errors.max():.4f} rank")
+
+    def add_in_batches():
+        batched = TDigest(compression=200)
+        for part in np.array_split(volumes, 1000):
+            batched.add(part)
+        return batched.quantile(quantiles)
+
+    _, elapsed, _ = measure(add_in_batches)
+    report("  in 1000 batches", n, elapsed, len(digest.to_bytes()), "")
+
+    print(f"\nserialized: HLL(12) {len(sketch.to_bytes())} B, SpaceSaving(200) {len(space_saving.to_bytes())} B, "
+          f"CountMin {len(count_min.to_bytes())} B, TDigest(200) {len(digest.to_bytes())} B")
+
+
+if __name__ == '__main__':
+    main()
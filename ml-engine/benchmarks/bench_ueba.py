@@ -0,0 +1,51 @@
+# ml-engine/benchmarks/bench_ueba.py
+"""
+Задержка потоковой оценки UEBA на событие при десятках тысяч активных пользователей.
+
+Сначала состояние прогревается историей событий всех пользователей, затем
+поток событий подается пакетами разного размера: обновление состояния +
+оценка затронутых пользователей одним вызовом модели (IsolationForest, 100 деревьев).
+
+Запуск: python -m benchmarks.bench_ueba [--users 50000]
+"""
+import argparse
+import time
+
+from benchmarks.common import EVENTS_START, build_sample_ueba_model, make_user_events
+from scripts.ueba_engine import UebaEngine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50_000)
+    parser.add_argument('--events', type=int, default=20_000)
+    args = parser.parse_args()
+
+    model = build_sample_ueba_model()
+    engine = UebaEngine()
+    history = make_user_events(args.users * 4, args.users, seed=1)
+    started = time.perf_counter()
+    engine.ingest(history)
+    elapsed = time.perf_counter() - started
+    print(f"Warm-up: {len(history)} events for {len(engine)} users, "
+          f"{elapsed / len(history) * 1e6:.2f} us/event (state update only)")
+
+    stream = make_user_events(args.events, args.users, seed=2, start=EVENTS_START + 86400)
+    print(f"{'batch':>6} {'us/event':>9} {'events/s':>10} {'batch p50, ms':>14}")
+    for batch_size in (1, 16, 256, 4096):
+        events = stream[:max(batch_size * 20, 2000)] if batch_size == 1 else stream
+        latencies = []
+        started = time.perf_counter()
+        for start in range(0, len(events), batch_size):
+            batch_started = time.perf_counter()
+            user_ids, _ = engine.ingest(events[start:start + batch_size])
+            engine.score(model, user_ids)
+            latencies.append(time.perf_counter() - batch_started)
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        print(f"{batch_size:>6} {elapsed / len(events) * 1e6:>9.1f} {len(events) / elapsed:>10.0f} "
+              f"{latencies[len(latencies) // 2] * 1000:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# ml-engine/benchmarks/bench_ueba_explain.py
+"""
+Стоимость объяснений UEBA (scripts/ueba_explain.py) на пакете пользователей: оценка моделью
+и contributing_factors при разной доле аномальных строк. Объясняются только аномальные строки,
+поэтому при обычной доле аномалий объяснение почти ничего не добавляет к оценке.
+
+Запуск: python -m benchmarks.bench_ueba_explain [--rows 100000]
+"""
+import argparse
+
+import numpy as np
+
+from benchmarks.common import best_of, build_sample_ueba_model
+from scripts.predict_utils import make_prediction_ueba
+from scripts.ueba_explain import contributing_factors
+from scripts.user_baselines import UserBaselines
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    model = build_sample_ueba_model()
+    features = np.column_stack([
+        rng.uniform(1, 40, args.rows), rng.uniform(8, 18, args.rows),
+        rng.uniform(0, 0.3, args.rows), rng.integers(1, 20, args.rows)
+    ])
+    user_ids = [f"user{i}" for i in range(args.rows)]
+    baselines = UserBaselines(capacity=args.rows)
+    # Базовые линии есть у половины пользователей
+    for _ in range(5):
+        baselines.update(user_ids[::2], features[::2] * rng.uniform(0.8, 1.2, features[::2].shape))
+
+    scoring = best_of(lambda: make_prediction_ueba(model, features), repeat=3)
+    print(f"{args.rows} rows, model scoring: {scoring * 1000:.1f} ms")
+    print(f"{'anomalous':>10} {'paths only, ms':>15} {'with baselines, ms':>19}")
+    for share in (0.001, 0.01, 0.1, 1.0):
+        is_anomalous = rng.random(args.rows) < share
+        paths_only = best_of(lambda: contributing_factors(model, features, is_anomalous), repeat=3)
+        with_baselines = best_of(lambda: contributing_factors(model, features, is_anomalous, user_ids, baselines), repeat=3)
+        print(f"{share:>10.1%} {paths_only * 1000:>15.1f} {with_baselines * 1000:>19.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# ml-engine/benchmarks/bench_ueba_population.py
+"""
+Оценка всей популяции строк пользователь-день моделью UEBA (IsolationForest):
+прежний make_prediction_ueba (predict + decision_function по всему DataFrame)
+против однопроходного make_prediction_ueba_chunks.
+
+Запуск: python -m benchmarks.bench_ueba_population [--rows 1000000] [--chunk-size 65536]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import build_sample_ueba_model
+from scripts.predict_utils import make_prediction_ueba_chunks
+from scripts.ueba_engine import FEATURE_NAMES
+
+
+def legacy_make_prediction_ueba(model, feature_dataframe):
+    predictions = model.predict(feature_dataframe)
+    anomaly_scores = model.decision_function(feature_dataframe)
+    return predictions, anomaly_scores
+
+
+def make_population(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'user_id': rng.integers(0, 200_000, n_rows),
+        'day': rng.integers(0, 30, n_rows),
+        FEATURE_NAMES[0]: rng.uniform(1, 40, n_rows),
+        FEATURE_NAMES[1]: rng.uniform(8, 18, n_rows),
+        FEATURE_NAMES[2]: np.where(rng.random(n_rows) < 0.5, 0, rng.uniform(0, 0.3, n_rows)),
+        FEATURE_NAMES[3]: rng.integers(1, 20, n_rows).astype(np.float64),
+    })
+
+
+def run(func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=65536)
+    args = parser.parse_args()
+
+    model = build_sample_ueba_model()
+    population = make_population(args.rows)
+    features = population[list(FEATURE_NAMES)]
+
+    def chunked():
+        # Результаты чанков не накапливаются (как при записи в файл), считается только число аномалий
+        return sum(int((predictions == -1).sum()) for _, predictions, _ in
+                   make_prediction_ueba_chunks(model, features, chunk_size=args.chunk_size))
+
+    def legacy():
+        predictions, _ = legacy_make_prediction_ueba(model, features.to_numpy())
+        return int((predictions == -1).sum())
+
+    print(f"{args.rows} user-day rows, IsolationForest({model.n_estimators} trees)")
+    print(f"{'mode':>34} {'seconds':>8} {'rows/s':>9} {'peak MB':>8} {'anomalies':>10}")
+    for label, func in (("predict + decision_function", legacy), (f"single pass, chunks of {args.chunk_size}", chunked)):
+        anomalies, elapsed, peak = run(func)
+        print(f"{label:>34} {elapsed:>8.2f} {args.rows / elapsed:>9.0f} {peak / 2 ** 20:>8.1f} {anomalies:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# ml-engine/benchmarks/bench_windows.py
+"""
+Пропускная способность оконной агрегации (scripts/windows.py) в событиях в секунду:
+потоковые пакеты разного размера и массовая загрузка исторических событий.
+
+Запуск: python -m benchmarks.bench_windows [--events 1000000] [--keys 10000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import EVENTS_START
+from scripts.windows import SessionWindowAggregator, SlidingWindowAggregator, TumblingWindowAggregator
+
+AGGREGATORS = {
+    'sliding 1h (60 x 1 min)': lambda: SlidingWindowAggregator(slot_seconds=60, n_slots=60, allowed_lateness=300),
+    'sliding 30d (30 x 1 day)': lambda: SlidingWindowAggregator(slot_seconds=86400, n_slots=30, allowed_lateness=300),
+    'tumbling 1h': lambda: TumblingWindowAggregator(window_seconds=3600, allowed_lateness=300),
+    'session, gap 30 min': lambda: SessionWindowAggregator(gap_seconds=1800, allowed_lateness=300),
+}
+
+
+def make_columns(n_events, n_keys, seed=0, span_seconds=7 * 86400):
+    rng = np.random.default_rng(seed)
+    timestamps = np.sort(rng.uniform(EVENTS_START, EVENTS_START + span_seconds, n_events))
+    keys = [f"user{key}" for key in rng.integers(0, n_keys, n_events)]
+    values = rng.lognormal(11, 1.5, n_events)
+    return keys, timestamps, values
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--keys', type=int, default=10_000)
+    args = parser.parse_args()
+
+    keys, timestamps, values = make_columns(args.events, args.keys)
+    print(f"{args.events} events, {args.keys} keys")
+    print(f"{'aggregator':>26} {'path':>14} {'events/s':>12}")
+    for name, factory in AGGREGATORS.items():
+        for batch_size in (1, 1000, 100_000):
+            aggregator = factory()
+            events = min(20_000, args.events) if batch_size == 1 else args.events
+            started = time.perf_counter()
+            for start in range(0, events, batch_size):
+                end = start + batch_size
+                aggregator.update(keys[start:end], timestamps[start:end], values[start:end])
+            print(f"{name:>26} {f'batch {batch_size}':>14} {events / (time.perf_counter() - started):>12.0f}")
+
+        # Исторические события в произвольном порядке
+        order = np.random.default_rng(1).permutation(args.events)
+        shuffled_keys = [keys[i] for i in order.tolist()]
+        aggregator = factory()
+        started = time.perf_counter()
+        aggregator.backfill(shuffled_keys, timestamps[order], values[order])
+        print(f"{name:>26} {'backfill':>14} {args.events / (time.perf_counter() - started):>12.0f}")
+        print(f"{'':>26} {'state bytes/key':>14} {aggregator.nbytes / aggregator.capacity:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# ml-engine/benchmarks/common.py
+"""
+Общие утилиты для бенчмарков ML-движка.
+
+Бенчмарки запускаются из директории ml-engine как модули, например:
+    python -m benchmarks.bench_predict
+"""
+import random
+import time
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline
+
+WORDS = (
+    "confidential internal public financial merger acquisition report employee handbook "
+    "source code credentials access keys server project proposal marketing campaign "
+    "press release customer billing strategy meeting minutes secret salary contract "
+    "invoice passport budget roadmap architecture password database export backup"
+).split()
+
+LABELS = ['Confidential', 'Internal', 'Public']
+
+
+def make_document(n_words: int, seed: int = 0) -> str:
+    """Генерирует синтетический документ из `n_words` слов."""
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def build_sample_text_model(n_samples: int = 300, seed: int = 42) -> Pipeline:
+    """
+    Обучает пайплайн той же структуры, что и scripts/train_model.py,
+    на синтетических данных, чтобы бенчмарки не зависели от файла модели.
+    """
+    rng = random.Random(seed)
+    texts = [make_document(rng.randint(5, 40), seed=seed + i) for i in range(n_samples)]
+    labels = [LABELS[i % len(LABELS)] for i in range(n_samples)]
+    model = Pipeline([
+        ('tfidf', TfidfVectorizer(stop_words='english', ngram_range=(1, 2), max_df=0.95, min_df=1)),
+        ('classifier', MultinomialNB(alpha=0.1)),
+    ])
+    model.fit(texts, labels)
+    return model
+
+
+# Понедельник, 2024-01-01 00:00 UTC - начало синтетического потока событий UEBA
+EVENTS_START = 1704067200
+
+
+def make_user_events(n_events: int, n_users: int, seed: int = 0, start: float = EVENTS_START, span_seconds: float = 86400) -> list[dict]:
+    """Генерирует поток сырых событий активности (как на входе /predict/user_anomaly), упорядоченный по времени."""
+    rng = np.random.default_rng(seed)
+    timestamps = np.sort(rng.uniform(start, start + span_seconds, n_events))
+    users = rng.integers(0, n_users, n_events)
+    volumes = rng.lognormal(11, 1.5, n_events).astype(np.int64)
+    destinations = rng.integers(0, 50, n_events)
+    return [
+        {"user_id": f"user{user}", "timestamp": float(timestamp), "bytes": int(volume), "destination": f"host{destination}"}
+        for timestamp, user, volume, destination in zip(timestamps, users, volumes, destinations)
+    ]
+
+
+def build_sample_ueba_model(n_samples: int = 5000, seed: int = 42) -> IsolationForest:
+    """IsolationForest по признакам scripts/ueba_engine.FEATURE_NAMES на синтетических "нормальных" пользователях."""
+    rng = np.random.default_rng(seed)
+    features = np.column_stack([
+        rng.uniform(1, 40, n_samples),
+        rng.uniform(8, 18, n_samples),
+        np.where(rng.random(n_samples) < 0.5, 0, rng.uniform(0, 0.3, n_samples)),
+        rng.integers(1, 20, n_samples),
+    ])
+    return IsolationForest(n_estimators=100, random_state=seed).fit(features)
+
+
+def best_of(func, repeat: int = 5) -> float:
+    """Возвращает лучшее время (в секундах) из `repeat` запусков `func`."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
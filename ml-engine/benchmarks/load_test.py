@@ -0,0 +1,72 @@
+# ml-engine/benchmarks/load_test.py
+"""
+Нагрузочный тест /predict/document_sensitivity для сравнения режимов запуска.
+
+Смешанная нагрузка: в основном короткие документы и небольшая доля очень
+больших. Для коротких документов отдельно считаются задержки, чтобы было
+видно, блокируют ли большие документы остальные запросы.
+
+Пример сравнения (из директории ml-engine):
+    gunicorn --bind 127.0.0.1:5002 app:app &                 # sync-воркеры (текущий режим)
+    python -m benchmarks.load_test --url http://127.0.0.1:5002
+    uvicorn asgi_app:app --host 127.0.0.1 --port 5003 &      # ASGI-режим
+    python -m benchmarks.load_test --url http://127.0.0.1:5003
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.common import make_document
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5002')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--large-fraction', type=float, default=0.05)
+    parser.add_argument('--large-words', type=int, default=200_000)
+    args = parser.parse_args()
+
+    small_document = make_document(60)
+    large_document = make_document(args.large_words)
+    rng = random.Random(0)
+    plan = [rng.random() < args.large_fraction for _ in range(args.requests)]
+    session_per_thread = {}
+
+    def send(is_large):
+        session = session_per_thread.setdefault(threading.get_ident(), requests.Session())
+        text = large_document if is_large else small_document
+        started = time.perf_counter()
+        response = session.post(f"{args.url}/predict/document_sensitivity", json={"text_content": text}, timeout=120)
+        return is_large, response.status_code, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(send, plan))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for _, status, _ in outcomes)
+    small_latencies = [latency for is_large, status, latency in outcomes if not is_large and status == 200]
+    large_latencies = [latency for is_large, status, latency in outcomes if is_large and status == 200]
+    print(f"URL: {args.url}  requests: {args.requests}  concurrency: {args.concurrency}")
+    print(f"Throughput: {len(outcomes) / elapsed:.1f} req/s  wall time: {elapsed:.2f}s  statuses: {dict(statuses)}")
+    print(f"Small docs  p50: {percentile(small_latencies, 50) * 1000:.1f} ms  "
+          f"p95: {percentile(small_latencies, 95) * 1000:.1f} ms  p99: {percentile(small_latencies, 99) * 1000:.1f} ms")
+    print(f"Large docs  p50: {percentile(large_latencies, 50) * 1000:.1f} ms  count: {len(large_latencies)}")
+
+
+if __name__ == '__main__':
+    main()
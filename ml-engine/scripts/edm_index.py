@@ -0,0 +1,485 @@
+# ml-engine/scripts/edm_index.py
+"""
+Exact data match (EDM): поиск в документах значений из строк защищаемой таблицы (выгрузка
+клиентской базы в CSV) без хранения самих значений в ML-движке.
+
+Сборка (EdmIndex.from_csv): значение каждой ячейки нормализуется и разбивается на токены
+(слова без учета регистра; числа - без разделителей, "+7 (701) 123-45-67" -> "77011234567").
+Токен хэшируется ключевым BLAKE2b с солью индекса (64 бита), хэши токенов ячейки сворачиваются
+в отпечаток ячейки. Индекс - отсортированный массив отпечатков uint64 и параллельные массивы
+номера записи (uint32) и столбца (uint8): 13 байт на ячейку (50M ячеек - ~650 МБ), плюс фильтр
+Блума (10 бит на отпечаток, ~2% ложных срабатываний), отсекающий последовательности токенов
+документа, которых нет в таблице, до бинарного поиска. Не индексируются ячейки короче
+MIN_CELL_CHARS, длиннее MAX_CELL_TOKENS токенов и значения, встречающиеся больше чем
+в MAX_RECORDS_PER_VALUE ячейках (город, пол - они не выделяют запись).
+
+Поиск (EdmIndex.match): токены документа хэшируются так же, отпечатки всех последовательностей
+из 1..max_tokens подряд идущих токенов (и частей чисел, слитых в документе с соседними числами)
+проверяются пакетами по окнам документа в MATCH_WINDOW_TOKENS токенов (фильтр Блума, затем searchsorted);
+найденные ячейки группируются по записи, и запись сообщается, если в документе встретились
+значения не менее чем min_columns ее разных столбцов.
+
+Соль хранится в файле индекса: она исключает заранее посчитанные таблицы хэшей и сопоставление
+индексов разных установок, но значения с малой энтропией (даты, короткие номера) по файлу индекса
+можно перебрать - файл нужно защищать так же, как модели.
+"""
+import csv
+import hashlib
+import itertools
+import json
+import os
+import re
+import secrets
+
+import numpy as np
+
+from scripts.model_store import replace_atomically
+from scripts.sketches import splitmix64
+
+MAGIC = b'EDM1'
+MIN_CELL_CHARS = 3
+MAX_CELL_TOKENS = 8
+MAX_RECORDS_PER_VALUE = 100
+MAX_COLUMNS = 255
+DEFAULT_MIN_COLUMNS = 2
+DEFAULT_MAX_RECORDS = 10
+BLOOM_BITS_PER_VALUE = 10
+BLOOM_HASHES = 4
+# Ячейки CSV обрабатываются пакетами: память сборки - массивы индекса плюс один пакет
+BUILD_CHUNK_CELLS = 200_000
+# Число документа из стольких групп цифр и меньше проверяется и по частям (см. match)
+MAX_NUMBER_GROUPS = 12
+# Документ проверяется окнами по столько токенов: память поиска - на окно, а не на весь документ
+MATCH_WINDOW_TOKENS = 1 << 14
+_ALIGNMENT = 64
+
+# Числа вместе с разделителями групп (пробел, скобки, точка, дефис, "/"); слова - вместе с внутренними
+# ".", "@", "'", "+", "-" (email, составные фамилии)
+_TOKEN = re.compile(r"[0-9]+(?:[ ().+/-]{1,2}[0-9]+)*|[^\W_]+(?:[.@'+-][^\W_]+)*")
+# Разделители групп внутри числа (удаляются при нормализации)
+_NUMBER_SEPARATORS = re.compile(r'([0-9])[ ().+/-]{1,2}(?=[0-9])')
+_DIGIT_GROUP = re.compile(r'[0-9]+')
+_PRIME = np.uint64(0x100000001B3)
+
+
+def normalize_tokens(raw_tokens) -> list:
+    """
+    Нормализация токенов (найденных _TOKEN): без учета регистра, числа - без разделителей групп.
+    Выполняется для всего списка сразу - над строкой токенов через перевод строки (его нет в токенах).
+    """
+    if not raw_tokens:
+        return []
+    return _NUMBER_SEPARATORS.sub(r'\1', '\n'.join(raw_tokens).casefold()).split('\n')
+
+
+def normalize_cell(value: str) -> list:
+    """Нормализованные токены значения ячейки (так же разбивается текст документа)."""
+    return normalize_tokens(_TOKEN.findall(value))
+
+
+def _number_parts(raw_tokens, raw_lengths: np.ndarray, tokens):
+    """
+    Части чисел документа из нескольких групп цифр: подряд идущие группы без первой или последней
+    ("ИНН 1234 +7 701 123 45 67" разбирается одним числом, в нем есть и телефон). Возвращает
+    (строки цифр, номера токенов, начала и концы частей относительно начала токена).
+    """
+    parts, owners, part_starts, part_ends = [], [], [], []
+    # Кандидаты - токены, укоротившиеся при нормализации (у чисел удалены разделители)
+    lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+    for position in np.flatnonzero(lengths < raw_lengths).tolist():
+        raw = raw_tokens[position]
+        if '0' <= raw[0] <= '9':
+            groups = [(match.group(), match.start(), match.end()) for match in _DIGIT_GROUP.finditer(raw)]
+            if len(groups) > MAX_NUMBER_GROUPS:
+                continue
+            for first in range(len(groups)):
+                for last in range(first + 1, len(groups) + 1):
+                    if last - first < len(groups):
+                        parts.append(''.join(group[0] for group in groups[first:last]))
+                        owners.append(position)
+                        part_starts.append(groups[first][1])
+                        part_ends.append(groups[last - 1][2])
+    return parts, owners, part_starts, part_ends
+
+
+def _token_hashes(tokens, salt: bytes) -> np.ndarray:
+    """Ключевой BLAKE2b (64 бита) каждого токена: без соли отпечатки нельзя сопоставить со словарем значений."""
+    keyed = hashlib.blake2b(digest_size=8, key=salt)
+
+    def digest(token):
+        state = keyed.copy()  # копия состояния с ключом дешевле нового объекта с ключом
+        state.update(token.encode('utf-8'))
+        return state.digest()
+
+    return np.frombuffer(b''.join([digest(token) for token in tokens]), dtype='<u8').astype(np.uint64)
+
+
+def _document_token_hashes(tokens, salt: bytes) -> np.ndarray:
+    """То же для токенов документа: слова в документе повторяются, хэшируются только различные."""
+    ids = {token: position for position, token in enumerate(dict.fromkeys(tokens))}
+    positions = np.fromiter(map(ids.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    return _token_hashes(list(ids), salt)[positions]
+
+
+def _fold(previous: np.ndarray, token_hashes: np.ndarray) -> np.ndarray:
+    """Отпечаток последовательности токенов: отпечаток без последнего токена, свернутый с его хэшем."""
+    return splitmix64((previous * _PRIME) ^ token_hashes)
+
+
+def _bloom_words(fingerprints: np.ndarray, n_words: int):
+    """
+    Фильтр Блума с блоками в одно 64-битное слово: слово - по старшим битам отпечатка, BLOOM_HASHES
+    битов в нем - по младшим (по 6 бит на позицию). Проверка отпечатка - одно обращение к памяти.
+    Возвращает (номера слов, маски битов).
+    """
+    words = ((fingerprints >> np.uint64(32)) & np.uint64(n_words - 1)).astype(np.int64)
+    masks = np.zeros(len(fingerprints), dtype=np.uint64)
+    for i in range(BLOOM_HASHES):
+        masks |= np.uint64(1) << ((fingerprints >> np.uint64(6 * i)) & np.uint64(63))
+    return words, masks
+
+
+class EdmIndex:
+    """
+    Индекс отпечатков ячеек защищаемой таблицы (см. описание модуля). Массивы можно открыть через mmap
+    (load): воркеры делят одну копию индекса в page cache.
+    """
+
+    def __init__(self, salt: bytes, columns, fingerprints, records, column_ids, bloom,
+                 max_tokens: int, n_records: int, stats: dict = None):
+        self.salt = salt
+        self.columns = list(columns)
+        self.fingerprints = fingerprints
+        self.records = records
+        self.column_ids = column_ids
+        self.bloom = bloom
+        self.max_tokens = max_tokens
+        self.n_records = n_records
+        self.stats = stats or {}
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.fingerprints.nbytes + self.records.nbytes + self.column_ids.nbytes + self.bloom.nbytes
+
+    @classmethod
+    def build(cls, rows, columns, salt: bytes = None):
+        """
+        Индекс из записей `rows` (последовательности значений в порядке `columns`).
+        Номер записи в отчетах - ее порядковый номер в `rows` (с нуля).
+        """
+        if len(columns) > MAX_COLUMNS:
+            raise ValueError(f"Too many columns for EDM index (max {MAX_COLUMNS})")
+        salt = salt or secrets.token_bytes(16)
+        parts = []
+        stats = {"cells": 0, "skipped_short": 0, "skipped_long": 0}
+        n_records = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) * len(columns) >= BUILD_CHUNK_CELLS:
+                parts.append(cls._hash_chunk(chunk, n_records, len(columns), salt, stats))
+                n_records += len(chunk)
+                chunk = []
+        if chunk:
+            parts.append(cls._hash_chunk(chunk, n_records, len(columns), salt, stats))
+            n_records += len(chunk)
+        max_tokens = max([part[3] for part in parts], default=1)
+
+        # Память сборки 50M ячеек: части склеиваются по одному массиву (650 МБ), затем перестановка
+        # сортировки (400 МБ) и переставленные номера записей; отпечатки сортируются на месте
+        fingerprints, records, column_ids = (
+            cls._concatenate(parts, i, dtype) for i, dtype in enumerate((np.uint64, np.uint32, np.uint8)))
+        order = np.argsort(fingerprints)
+        records = records[order]
+        column_ids = column_ids[order]
+        del order
+        fingerprints.sort()
+
+        # Значения, общие для многих записей, не выделяют запись: их ячейки не индексируются.
+        # В отсортированном массиве значение повторяется более MAX_RECORDS_PER_VALUE раз, если
+        # совпадает с элементом через MAX_RECORDS_PER_VALUE позиций - без массивов границ всех значений
+        repeated = fingerprints[MAX_RECORDS_PER_VALUE:] == fingerprints[:-MAX_RECORDS_PER_VALUE]
+        common = np.unique(fingerprints[:-MAX_RECORDS_PER_VALUE][repeated]) if repeated.any() else []
+        del repeated
+        n_values = int(np.count_nonzero(fingerprints[1:] != fingerprints[:-1])) + bool(len(fingerprints))
+        stats["common_values"] = len(common)
+        stats["skipped_common"] = 0
+        if len(common):
+            lo = np.searchsorted(fingerprints, common, side='left')
+            hi = np.searchsorted(fingerprints, common, side='right')
+            stats["skipped_common"] = int((hi - lo).sum())
+            bounds = np.zeros(len(fingerprints) + 1, dtype=np.int8)
+            # Конец одного значения может совпасть с началом следующего - отметки складываются
+            np.add.at(bounds, lo, 1)
+            np.add.at(bounds, hi, -1)
+            keep = np.cumsum(bounds[:-1], dtype=np.int8) == 0
+            del bounds
+            fingerprints, records, column_ids = fingerprints[keep], records[keep], column_ids[keep]
+            del keep
+        n_values -= len(common)
+
+        # Повторы отпечатка ставят те же биты - фильтр строится по всем ячейкам, без копии уникальных значений
+        n_words = 1 << max(0, int(np.ceil(np.log2(max(n_values, 1) * BLOOM_BITS_PER_VALUE / 64))))
+        bloom = np.zeros(n_words, dtype=np.uint64)
+        for start in range(0, len(fingerprints), 1 << 20):
+            words, masks = _bloom_words(fingerprints[start:start + (1 << 20)], n_words)
+            np.bitwise_or.at(bloom, words, masks)
+        stats["indexed"] = len(fingerprints)
+        return cls(salt, columns, fingerprints, records, column_ids, bloom, max_tokens, n_records, stats)
+
+    @staticmethod
+    def _concatenate(parts, position: int, dtype) -> np.ndarray:
+        """Склеивает массивы `position` частей, освобождая их по ходу (части - списки)."""
+        arrays = [part[position] for part in parts]
+        for part in parts:
+            part[position] = None
+        return np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+
+    @staticmethod
+    def _hash_chunk(chunk, first_record: int, n_columns: int, salt: bytes, stats: dict):
+        """Отпечатки ячеек пакета записей: (отпечатки, записи, столбцы, наибольшее число токенов в ячейке)."""
+        raw_tokens, counts, cell_records, cell_columns = [], [], [], []
+        for offset, row in enumerate(chunk):
+            for column, value in enumerate(row[:n_columns]):
+                tokens = _TOKEN.findall(value) if value and len(value) >= MIN_CELL_CHARS else ()
+                if not tokens or len(tokens) > MAX_CELL_TOKENS:
+                    stats["skipped_long" if tokens else "skipped_short"] += 1
+                    continue
+                raw_tokens.extend(tokens)
+                counts.append(len(tokens))
+                cell_records.append(first_record + offset)
+                cell_columns.append(column)
+            stats["cells"] += min(len(row), n_columns)
+        empty = np.zeros(0, dtype=np.uint64)
+        if not counts:
+            return empty, empty.astype(np.uint32), empty.astype(np.uint8), 1
+        tokens = normalize_tokens(raw_tokens)
+        lengths = np.array(counts, dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        # Ячейки, короткие после нормализации ("(1)" -> "1"), не индексируются
+        chars = np.add.reduceat(np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens)), offsets)
+        flat = _token_hashes(tokens, salt)
+        # Свертка по позициям токенов: у ячейки из L токенов - L - 1 шагов, как у последовательности токенов документа
+        fingerprints = flat[offsets]
+        for position in range(1, int(lengths.max())):
+            longer = lengths > position
+            fingerprints[longer] = _fold(fingerprints[longer], flat[offsets[longer] + position])
+        kept = chars >= MIN_CELL_CHARS
+        stats["skipped_short"] += int(len(kept) - kept.sum())
+        return [fingerprints[kept], np.array(cell_records, dtype=np.uint32)[kept],
+                np.array(cell_columns, dtype=np.uint8)[kept], int(lengths[kept].max(initial=1))]
+
+    @classmethod
+    def from_csv(cls, path: str, columns=None, salt: bytes = None):
+        """Индекс из CSV с заголовком; `columns` - индексируемые столбцы (по умолчанию все)."""
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            columns = list(columns or header)
+            missing = set(columns) - set(header)
+            if missing:
+                raise ValueError(f"Columns not found in {path}: {sorted(missing)}")
+            positions = [header.index(column) for column in columns]
+            if positions == list(range(len(columns))):
+                return cls.build(reader, columns, salt)
+            return cls.build(([row[i] if i < len(row) else '' for i in positions] for row in reader), columns, salt)
+
+    def _lookup(self, fingerprints: np.ndarray):
+        """Для отпечатков: (номера отпечатков, найденных в индексе, диапазоны [lo, hi) их ячеек)."""
+        words, masks = _bloom_words(fingerprints, len(self.bloom))
+        candidates = np.flatnonzero(self.bloom[words] & masks == masks)
+        lo = np.searchsorted(self.fingerprints, fingerprints[candidates], side='left')
+        hi = np.searchsorted(self.fingerprints, fingerprints[candidates], side='right')
+        found = hi > lo
+        return candidates[found], lo[found], hi[found]
+
+    def _match_window(self, token_matches):
+        """
+        Ячейки индекса, значения которых есть среди токенов окна (совпадения _TOKEN в документе):
+        (записи, столбцы, начала, концы вхождений в документе) или None, если ничего не найдено.
+        """
+        raw_tokens = [token.group() for token in token_matches]
+        tokens = normalize_tokens(raw_tokens)
+        token_hashes = _document_token_hashes(tokens, self.salt)
+        token_lengths = np.fromiter(map(len, raw_tokens), dtype=np.int64, count=len(raw_tokens))
+        # Проверяемые отпечатки - блоками; позиции вычисляются только для найденных: у блока функция
+        # (номера в блоке) -> (первый токен, сдвиг от его начала, последний токен, сдвиг конца от его начала)
+        blocks = []
+        # Последовательности из 1..max_tokens токенов: отпечаток длины L получается сверткой отпечатка длины L - 1
+        ngram_hashes = []
+        current = token_hashes
+        for length in range(1, min(self.max_tokens, len(tokens)) + 1):
+            if length > 1:
+                current = _fold(current[:-1], token_hashes[length - 1:])
+            ngram_hashes.append(current)
+            blocks.append((current, lambda i, length=length: (i, 0, i + length - 1, token_lengths[i + length - 1])))
+        parts, owners, part_starts, part_ends = _number_parts(raw_tokens, token_lengths, tokens)
+        if parts:
+            part_hashes = _document_token_hashes(parts, self.salt)
+            owners = np.array(owners, dtype=np.int64)
+            part_starts = np.array(part_starts, dtype=np.int64)
+            part_ends = np.array(part_ends, dtype=np.int64)
+            blocks.append((part_hashes, lambda i: (owners[i], part_starts[i], owners[i], part_ends[i])))
+            # Число в конце значения ("кв. 11") сливается со следующим числом документа, в начале - с предыдущим:
+            # начало слитого числа завершает последовательность токенов, конец - начинает ее
+            prefixes = np.flatnonzero(part_starts == 0)
+            suffixes = np.flatnonzero(part_ends == token_lengths[owners])
+            for length in range(1, min(self.max_tokens, len(tokens))):
+                before = prefixes[owners[prefixes] >= length]
+                blocks.append((
+                    _fold(ngram_hashes[length - 1][owners[before] - length], part_hashes[before]),
+                    lambda i, before=before, length=length: (
+                        owners[before[i]] - length, 0, owners[before[i]], part_ends[before[i]])
+                ))
+            current = part_hashes[suffixes]
+            for length in range(1, min(self.max_tokens, len(tokens))):
+                after = owners[suffixes] + length < len(tokens)
+                suffixes, current = suffixes[after], current[after]
+                current = _fold(current, token_hashes[owners[suffixes] + length])
+                blocks.append((current, lambda i, suffixes=suffixes, length=length: (
+                    owners[suffixes[i]], part_starts[suffixes[i]], owners[suffixes[i]] + length,
+                    token_lengths[owners[suffixes[i]] + length])))
+        del ngram_hashes, current
+
+        found, lo, hi = self._lookup(np.concatenate([hashes for hashes, _ in blocks]))
+        if not len(found):
+            return None
+        token_starts = np.fromiter((token.start() for token in token_matches), dtype=np.int64, count=len(token_matches))
+        block_ends = np.cumsum([len(hashes) for hashes, _ in blocks])
+        block_ids = np.searchsorted(block_ends, found, side='right')
+        sequence_starts = np.empty(len(found), dtype=np.int64)
+        sequence_ends = np.empty(len(found), dtype=np.int64)
+        for block_id in np.unique(block_ids).tolist():
+            selected = block_ids == block_id
+            hashes, positions = blocks[block_id]
+            first, start_shift, last, end_shift = positions(found[selected] - (block_ends[block_id] - len(hashes)))
+            sequence_starts[selected] = token_starts[first] + start_shift
+            sequence_ends[selected] = token_starts[last] + end_shift
+        # Каждый найденный отпечаток -> все ячейки с ним (записи и столбцы)
+        counts = hi - lo
+        cells = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return (self.records[cells].astype(np.int64), self.column_ids[cells].astype(np.int64),
+                np.repeat(sequence_starts, counts), np.repeat(sequence_ends, counts))
+
+    def match(self, text: str, min_columns: int = DEFAULT_MIN_COLUMNS, max_records: int = DEFAULT_MAX_RECORDS) -> dict:
+        """
+        Записи таблицы, значения min_columns и более столбцов которых встречаются в документе:
+        {"matched_records": число, "records": [{"record", "columns", "spans"}]} - первые max_records
+        по убыванию числа столбцов; spans - позиции первого вхождения значения каждого столбца.
+        """
+        empty = {"matched_records": 0, "records": []}
+        if not len(self.fingerprints) or not isinstance(text, str):
+            return empty
+        # Документ проверяется окнами по MATCH_WINDOW_TOKENS токенов, память поиска не зависит от его размера.
+        # Окно начинается с max_tokens - 1 последних токенов предыдущего: последовательность на границе окон
+        # целиком входит в следующее (повторные находки в перекрытии отбрасываются ниже вместе с остальными)
+        overlap = self.max_tokens - 1
+        token_matches = _TOKEN.finditer(text)
+        window, hits = [], []
+        while True:
+            fresh = list(itertools.islice(token_matches, MATCH_WINDOW_TOKENS))
+            if not fresh:
+                break
+            window = (window[-overlap:] if overlap else []) + fresh
+            window_hits = self._match_window(window)
+            if window_hits is not None:
+                hits.append(window_hits)
+        if not hits:
+            return empty
+        records, columns, starts, ends = (np.concatenate([window_hits[i] for window_hits in hits]) for i in range(4))
+
+        # Пары (запись, столбец) без повторов, с первым вхождением значения в документе
+        order = np.lexsort((starts, columns, records))
+        records, columns, starts, ends = records[order], columns[order], starts[order], ends[order]
+        first = np.concatenate([[True], (records[1:] != records[:-1]) | (columns[1:] != columns[:-1])])
+        records, columns, starts, ends = records[first], columns[first], starts[first], ends[first]
+        matched, record_starts, column_counts = np.unique(records, return_index=True, return_counts=True)
+        qualified = np.flatnonzero(column_counts >= min_columns)
+        if not len(qualified):
+            return empty
+        ranked = qualified[np.argsort(-column_counts[qualified], kind='stable')][:max_records]
+        return {
+            "matched_records": int(len(qualified)),
+            "records": [
+                {
+                    "record": int(matched[i]),
+                    "columns": [self.columns[column] for column in columns[record_starts[i]:record_starts[i] + column_counts[i]]],
+                    "spans": [[int(start), int(end)] for start, end in zip(
+                        starts[record_starts[i]:record_starts[i] + column_counts[i]],
+                        ends[record_starts[i]:record_starts[i] + column_counts[i]])],
+                }
+                for i in ranked
+            ],
+        }
+
+    def save(self, path: str):
+        """
+        Атомарно сохраняет индекс одним файлом: заголовок (JSON) и массивы с выравниванием,
+        пригодные для np.memmap (load). Исходные значения в файл не попадают.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"fingerprints": self.fingerprints, "records": self.records,
+                  "column_ids": self.column_ids, "bloom": self.bloom}
+        header = {"salt": self.salt.hex(), "columns": self.columns, "max_tokens": self.max_tokens,
+                  "n_records": self.n_records, "stats": self.stats, "arrays": {}}
+        offset = 0
+        for name, array in arrays.items():
+            header["arrays"][name] = {"dtype": array.dtype.str, "length": len(array), "offset": offset}
+            offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+        encoded = json.dumps(header).encode('utf-8')
+        data_offset = -(-(len(MAGIC) + 8 + len(encoded)) // _ALIGNMENT) * _ALIGNMENT
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(MAGIC + len(encoded).to_bytes(8, 'little') + encoded)
+                for name, array in arrays.items():
+                    f.seek(data_offset + header["arrays"][name]["offset"])
+                    f.write(np.ascontiguousarray(array).tobytes())
+
+        replace_atomically(directory, '.edm', path, write)
+        return path
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r'):
+        """Открывает индекс; с mmap_mode массивы читаются из файла по мере обращения (None - в память)."""
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not an EDM index: {path}")
+            size = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(size))
+        data_offset = -(-(len(MAGIC) + 8 + size) // _ALIGNMENT) * _ALIGNMENT
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            if not spec["length"]:
+                arrays[name] = np.zeros(0, dtype=spec["dtype"])
+            elif mmap_mode:
+                arrays[name] = np.memmap(path, dtype=spec["dtype"], mode=mmap_mode,
+                                         offset=data_offset + spec["offset"], shape=(spec["length"],))
+            else:
+                arrays[name] = np.fromfile(path, dtype=spec["dtype"], count=spec["length"],
+                                           offset=data_offset + spec["offset"])
+        return cls(bytes.fromhex(header["salt"]), header["columns"], arrays["fingerprints"], arrays["records"],
+                   arrays["column_ids"], arrays["bloom"], header["max_tokens"], header["n_records"], header["stats"])
+
+
+if __name__ == '__main__':
+    # Сборка индекса: python -m scripts.edm_index customers.csv models/edm_index.edm [--columns name,phone,email]
+    import argparse
+    import resource
+    import time
+
+    parser = argparse.ArgumentParser(description="Build the exact data match (EDM) index from a CSV of sensitive records.")
+    parser.add_argument('input', help="CSV with a header row")
+    parser.add_argument('output')
+    parser.add_argument('--columns', help="Comma-separated columns to index (default: all)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = EdmIndex.from_csv(args.input, args.columns.split(',') if args.columns else None)
+    index.save(args.output)
+    print(f"{index.n_records} records, {index.stats} -> {args.output}: {index.memory_bytes / 2**20:.1f} MiB, "
+          f"{time.perf_counter() - started:.1f}s, peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10:.0f} MiB")
@@ -0,0 +1,179 @@
+# ml-engine/scripts/event_ingest.py
+import json
+import zlib
+
+import numpy as np
+
+from scripts.ueba_engine import FEATURE_NAMES
+from scripts.ueba_explain import contributing_factors
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class IngestLimitExceeded(ValueError):
+    """Распакованное тело запроса больше допустимого размера."""
+
+
+class NdjsonEventIngestor:
+    """
+    Потоковая загрузка событий активности в формате NDJSON (по событию UebaEngine на строку),
+    в том числе сжатых gzip (определяется по сигнатуре; несколько gzip-потоков подряд тоже допустимы).
+
+    Тело поступает кусками байтов (feed): кусок распаковывается, режется на строки,
+    события копятся до `batch_events` и учитываются в UebaEngine пакетом, после чего
+    затронутые пользователи оцениваются одним вызовом модели. В памяти - один пакет событий
+    и результаты только по аномальным пользователям: для каждого хранится самая высокая оценка
+    за загрузку, если она не ниже `threshold` (без порога - если модель считает пользователя аномальным).
+
+    Для отобранных пользователей вычисляются contributing_factors (по базовым линиям `baselines`,
+    если они есть, иначе по путям изоляции) - только для них, а не для всех оцененных.
+
+    Без модели (model=None) события только учитываются в состоянии. Псевдонимы user_id разрешаются
+    индексом `identity_index`, взятым в начале загрузки (по умолчанию - индекс самого движка).
+    """
+
+    def __init__(self, engine, model=None, model_version=None, threshold: float = None, baselines=None,
+                 batch_events: int = 5000, max_bytes: int = 1 << 30, max_errors: int = 100, identity_index=None):
+        self.engine = engine
+        self.model = model
+        # Версия модели, взятой в начале загрузки: все пакеты оцениваются ею
+        self.model_version = model_version
+        self.threshold = threshold
+        self.baselines = baselines
+        self.identity_index = identity_index
+        self.batch_events = batch_events
+        self.max_bytes = max_bytes
+        self.max_errors = max_errors
+
+        self.events_received = 0
+        self.events_ingested = 0
+        self.users_scored = 0
+        self.bytes_received = 0
+        self.error_count = 0
+        self.errors = []
+        self.anomalies = {}
+
+        self._decompressor = None
+        self._compressed = None
+        self._pending = b''
+        self._batch = []
+        self._batch_start = 0
+
+    def feed(self, block: bytes):
+        if not block:
+            return
+        if self._compressed is None:
+            self._compressed = block[:2] == GZIP_MAGIC
+            if self._compressed:
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._feed_decompressed(self._decompress(block) if self._compressed else block)
+
+    def _decompress(self, block: bytes) -> bytes:
+        parts = []
+        while block:
+            # Ограничение размера проверяется до распаковки всего куска (защита от "gzip-бомб")
+            limit = self.max_bytes - self.bytes_received - sum(map(len, parts)) + 1
+            parts.append(self._decompressor.decompress(block, limit))
+            if sum(map(len, parts)) + self.bytes_received > self.max_bytes:
+                raise IngestLimitExceeded(f"Decompressed body exceeds {self.max_bytes} bytes")
+            if self._decompressor.unconsumed_tail:
+                block = self._decompressor.unconsumed_tail
+            elif self._decompressor.eof and self._decompressor.unused_data:
+                # Следующий gzip-поток (например, склеенные файлы агентов)
+                block = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                block = b''
+        return b''.join(parts)
+
+    def _feed_decompressed(self, data: bytes):
+        self.bytes_received += len(data)
+        if self.bytes_received > self.max_bytes:
+            raise IngestLimitExceeded(f"Body exceeds {self.max_bytes} bytes")
+        lines = (self._pending + data).split(b'\n')
+        self._pending = lines.pop()
+        self._add_lines(lines)
+
+    def _add_lines(self, lines):
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            return
+        events = self._parse(lines)
+        self.events_received += len(events)
+        self._batch.extend(events)
+        while len(self._batch) >= self.batch_events:
+            batch, self._batch = self._batch[:self.batch_events], self._batch[self.batch_events:]
+            self._process(batch)
+
+    def _parse(self, lines):
+        # Все строки куска разбираются одним вызовом json.loads; если кусок не разобрался
+        # (или строк и значений не поровну), строки разбираются по одной
+        try:
+            events = json.loads(b'[' + b','.join(lines) + b']')
+            if len(events) == len(lines):
+                return events
+        except ValueError:
+            pass
+        events = []
+        for line in lines:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                events.append(None)  # UebaEngine.ingest вернет ошибку с номером события
+        return events
+
+    def _record_errors(self, errors):
+        self.error_count += len(errors)
+        room = self.max_errors - len(self.errors)
+        if room > 0:
+            self.errors.extend(
+                {"index": error["index"] + self._batch_start, "error": error["error"]} for error in errors[:room]
+            )
+
+    def _process(self, batch):
+        user_ids, errors = self.engine.ingest(batch, identity_index=self.identity_index)
+        self._record_errors(errors)
+        self._batch_start += len(batch)
+        self.events_ingested += len(batch) - len(errors)
+        if self.model is None or not user_ids:
+            return
+
+        features, is_anomalous, scores = self.engine.score(self.model, user_ids)
+        self.users_scored += len(user_ids)
+        flagged = np.array(is_anomalous if self.threshold is None else scores >= self.threshold, dtype=bool)
+        # Объяснение нужно только тем, чья оценка выше уже сохраненной за эту загрузку
+        for row in flagged.nonzero()[0].tolist():
+            previous = self.anomalies.get(user_ids[row])
+            if previous is not None and scores[row] <= previous["anomaly_score"]:
+                flagged[row] = False
+        factors = contributing_factors(self.model, features, flagged, user_ids, self.baselines)
+        for row in flagged.nonzero()[0].tolist():
+            self.anomalies[user_ids[row]] = {
+                "user_id": user_ids[row],
+                "anomaly_score": float(scores[row]),
+                "is_anomalous": bool(is_anomalous[row]),
+                "features": dict(zip(FEATURE_NAMES, features[row].tolist())),
+                "contributing_factors": factors[row],
+                # Номер события в загрузке, после пакета с которым получена оценка
+                "after_event": self._batch_start - 1
+            }
+
+    def finish(self) -> dict:
+        if self._compressed and self._decompressor is not None and not self._decompressor.eof:
+            raise zlib.error("Truncated gzip stream")
+        if self._pending:
+            pending, self._pending = self._pending, b''
+            self._add_lines([pending])
+        if self._batch:
+            batch, self._batch = self._batch, []
+            self._process(batch)
+        return {
+            "events_received": self.events_received,
+            "events_ingested": self.events_ingested,
+            "users_scored": self.users_scored,
+            "anomalies": sorted(self.anomalies.values(), key=lambda result: result["anomaly_score"], reverse=True),
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "threshold": self.threshold,
+            "model_version": self.model_version
+        }
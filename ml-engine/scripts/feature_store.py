@@ -0,0 +1,300 @@
+# ml-engine/scripts/feature_store.py
+import json
+import os
+import shutil
+import tempfile
+import zlib
+
+import numpy as np
+
+from scripts.sketches import HyperLogLogArray
+
+# Точность HyperLogLog адресов назначения одного временного сегмента: 2^6 регистров по байту, ошибка ~13%
+DESTINATION_PRECISION = 6
+
+# Сдвиг опорного времени (rebase), когда множитель затухания превышает 2**REBASE_EXPONENT
+REBASE_EXPONENT = 256
+
+
+def destination_hash(destination: str) -> int:
+    """Стабильный между процессами хэш адреса (hash() строк рандомизирован), сохраняется в снимках."""
+    return zlib.crc32(destination.encode('utf-8', 'surrogatepass'))
+
+
+class UserRecord:
+    """Представление одной строки хранилища: атрибуты читают столбцы, копии данных нет."""
+
+    __slots__ = ('_store', 'index')
+
+    def __init__(self, store, index: int):
+        self._store = store
+        self.index = index
+
+    @property
+    def user_id(self) -> str:
+        return self._store.user_ids[self.index]
+
+    @property
+    def last_seen(self) -> float:
+        return float(self._store.last_seen[self.index])
+
+    @property
+    def event_count(self) -> float:
+        return float(self._store.decayed('event_count', [self.index])[0])
+
+    @property
+    def bytes_total(self) -> float:
+        return float(self._store.decayed('bytes_total', [self.index])[0])
+
+    @property
+    def off_hours_count(self) -> float:
+        return float(self._store.decayed('off_hours_count', [self.index])[0])
+
+    @property
+    def distinct_destinations(self) -> float:
+        return float(self._store.distinct_destinations([self.index])[0])
+
+    def __repr__(self):
+        return f"UserRecord(user_id={self.user_id!r}, last_seen={self.last_seen}, event_count={self.event_count:.3f})"
+
+
+class UserFeatureStore:
+    """
+    Столбцовое хранилище поведенческого состояния пользователей UEBA.
+
+    Пользователь получает плотный целочисленный индекс (user_index), каждое поле - numpy-массив,
+    строка которого - этот индекс. На пользователя приходится ~540 байт в массивах (почти все -
+    регистры HyperLogLog адресов) вместо Python-объекта со словарем адресов.
+
+    Затухающие счетчики хранятся относительно опорного времени reference_time:
+        S = sum(w * 2 ** ((t - reference_time) / half_life)),
+    а значение на момент t равно S * 2 ** (-(t - reference_time) / half_life).
+    Поэтому обновление - это сложение, не зависящее от порядка событий: пакет событий
+    учитывается одним векторизованным np.add.at, включая повторы пользователя и опоздавшие события.
+
+    Адреса назначения за окно считаются приближенно: окно делится на `destination_buckets`
+    временных сегментов, в каждом - HyperLogLog с 2^destination_precision регистрами (строка
+    user_index * destination_buckets + сегмент в HyperLogLogArray); число разных адресов оценивается
+    по объединению скетчей сегментов окна. В отличие от битовой карты с линейным подсчетом,
+    оценка не насыщается при сотнях адресов.
+
+    snapshot()/restore() сохраняют состояние в каталог .npy-файлов, восстановление идет через mmap.
+    Класс не потокобезопасен: синхронизация - на стороне вызывающего (UebaEngine).
+    """
+
+    DECAYED_COLUMNS = ('event_count', 'bytes_total', 'off_hours_count')
+
+    def __init__(self, half_life_seconds: float = 86400, destination_window_seconds: float = 7 * 86400,
+                 destination_buckets: int = 7, capacity: int = 1024,
+                 destination_precision: int = DESTINATION_PRECISION):
+        self.half_life_seconds = half_life_seconds
+        self.destination_buckets = destination_buckets
+        self.destination_precision = destination_precision
+        self.bucket_seconds = destination_window_seconds / destination_buckets
+        self.reference_time = None
+        self.user_index = {}
+        self.user_ids = []
+        self._allocate(max(1, capacity))
+
+    def _allocate(self, capacity: int):
+        self.last_seen = np.full(capacity, -np.inf)
+        self.event_count = np.zeros(capacity)
+        self.bytes_total = np.zeros(capacity)
+        self.off_hours_count = np.zeros(capacity)
+        self.destination_sketches = HyperLogLogArray(self.destination_precision, capacity * self.destination_buckets)
+        self.destination_bucket_ids = np.full((capacity, self.destination_buckets), -1, dtype=np.int64)
+
+    def _columns(self) -> dict:
+        return {
+            'last_seen': self.last_seen,
+            'event_count': self.event_count,
+            'bytes_total': self.bytes_total,
+            'off_hours_count': self.off_hours_count,
+            # Представление матрицы регистров скетчей (пользователь, сегмент, регистр) без копии
+            'destination_registers': self.destination_sketches.registers.reshape(
+                -1, self.destination_buckets, 1 << self.destination_precision),
+            'destination_bucket_ids': self.destination_bucket_ids,
+        }
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.last_seen)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self._columns().values())
+
+    def _grow(self, required: int):
+        capacity = self.capacity
+        while capacity < required:
+            capacity *= 2
+        old_columns = self._columns()
+        self._allocate(capacity)
+        for name, column in self._columns().items():
+            column[:len(old_columns[name])] = old_columns[name]
+
+    def indices(self, user_ids, create: bool = True) -> np.ndarray:
+        """Плотные индексы пользователей; новые пользователи добавляются (create) или получают -1."""
+        index = self.user_index
+        result = np.empty(len(user_ids), dtype=np.int64)
+        for position, user_id in enumerate(user_ids):
+            row = index.get(user_id)
+            if row is None:
+                if not create:
+                    row = -1
+                else:
+                    row = index[user_id] = len(self.user_ids)
+                    self.user_ids.append(user_id)
+            result[position] = row
+        if len(self.user_ids) > self.capacity:
+            self._grow(len(self.user_ids))
+        return result
+
+    def record(self, user_id: str):
+        """UserRecord для пользователя или None, если он неизвестен."""
+        row = self.user_index.get(user_id)
+        return None if row is None else UserRecord(self, row)
+
+    def _scale(self, timestamps) -> np.ndarray:
+        return np.exp2((np.asarray(timestamps, dtype=np.float64) - self.reference_time) / self.half_life_seconds)
+
+    def _rebase(self, new_reference_time: float):
+        factor = np.exp2((self.reference_time - new_reference_time) / self.half_life_seconds)
+        for name in self.DECAYED_COLUMNS:
+            getattr(self, name)[:len(self)] *= factor
+        self.reference_time = new_reference_time
+
+    def update(self, rows, timestamps, n_bytes=None, off_hours=None, destination_hashes=None):
+        """
+        Векторизованное обновление пакетом событий. rows - индексы из indices(),
+        destination_hashes - хэши адресов (destination_hash) или -1 для событий без адреса.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        latest = float(timestamps.max())
+        if self.reference_time is None:
+            self.reference_time = float(timestamps.min())
+        if (latest - self.reference_time) / self.half_life_seconds > REBASE_EXPONENT:
+            self._rebase(latest)
+
+        weights = self._scale(timestamps)
+        np.maximum.at(self.last_seen, rows, timestamps)
+        np.add.at(self.event_count, rows, weights)
+        if n_bytes is not None:
+            np.add.at(self.bytes_total, rows, weights * np.asarray(n_bytes, dtype=np.float64))
+        if off_hours is not None:
+            off_hours = np.asarray(off_hours, dtype=bool)
+            np.add.at(self.off_hours_count, rows[off_hours], weights[off_hours])
+        if destination_hashes is not None:
+            self._update_destinations(rows, timestamps, np.asarray(destination_hashes, dtype=np.int64))
+
+    def _update_destinations(self, rows, timestamps, hashes):
+        present = hashes >= 0
+        rows, timestamps, hashes = rows[present], timestamps[present], hashes[present]
+        bucket_ids = np.floor(timestamps / self.bucket_seconds).astype(np.int64)
+        slots = bucket_ids % self.destination_buckets
+        current_ids = self.destination_bucket_ids[rows, slots]
+        # Событие старее, чем сегмент в этом слоте, вне окна - пропускается
+        fresh = bucket_ids >= current_ids
+        rows, slots, bucket_ids, hashes = rows[fresh], slots[fresh], bucket_ids[fresh], hashes[fresh]
+        # При нескольких событиях пакета в одном слоте побеждает самый новый сегмент,
+        # а слот с более старым сегментом очищается
+        _, slot_groups = np.unique(rows * self.destination_buckets + slots, return_inverse=True)
+        newest = np.full(slot_groups.max() + 1 if len(slot_groups) else 0, -1, dtype=np.int64)
+        np.maximum.at(newest, slot_groups, bucket_ids)
+        keep = bucket_ids == newest[slot_groups]
+        rows, slots, bucket_ids, hashes = rows[keep], slots[keep], bucket_ids[keep], hashes[keep]
+        sketch_rows = rows * self.destination_buckets + slots
+        stale = self.destination_bucket_ids[rows, slots] != bucket_ids
+        self.destination_sketches.registers[sketch_rows[stale]] = 0
+        self.destination_bucket_ids[rows, slots] = bucket_ids
+        self.destination_sketches.add(sketch_rows, hashes)
+
+    def decayed(self, column: str, rows) -> np.ndarray:
+        """Значения затухающего счетчика на момент последнего события каждого пользователя."""
+        rows = np.asarray(rows, dtype=np.int64)
+        values = getattr(self, column)[rows]
+        if self.reference_time is None:
+            return values
+        # Множитель последнего события уходит в 0, если оно старше опорного времени на ~1000 периодов
+        # полураспада (или событий не было): сумма тогда тоже обнулилась - счетчик полностью затух
+        scale = self._scale(self.last_seen[rows])
+        return np.divide(values, scale, out=np.zeros(len(rows)), where=scale > 0)
+
+    def distinct_destinations(self, rows) -> np.ndarray:
+        """Оценка числа разных адресов назначения за окно, заканчивающееся последним событием пользователя."""
+        rows = np.asarray(rows, dtype=np.int64)
+        last_bucket = np.floor(self.last_seen[rows] / self.bucket_seconds)
+        in_window = self.destination_bucket_ids[rows] > (last_bucket - self.destination_buckets)[:, None]
+        sketch_rows = rows[:, None] * self.destination_buckets + np.arange(self.destination_buckets)
+        return self.destination_sketches.estimate_union(np.where(in_window, sketch_rows, -1))
+
+    def snapshot(self, directory: str):
+        """
+        Атомарно сохраняет состояние в каталог: по .npy-файлу на столбец (только занятые строки)
+        и meta.json со списком пользователей и параметрами.
+        """
+        directory = os.path.abspath(directory)
+        parent = os.path.dirname(directory)
+        os.makedirs(parent, exist_ok=True)
+        tmp_directory = tempfile.mkdtemp(dir=parent, prefix='.tmp-snapshot-')
+        try:
+            size = len(self)
+            for name, column in self._columns().items():
+                target = np.lib.format.open_memmap(
+                    os.path.join(tmp_directory, f"{name}.npy"), mode='w+', dtype=column.dtype, shape=(size,) + column.shape[1:]
+                )
+                target[:] = column[:size]
+                target.flush()
+                del target
+            with open(os.path.join(tmp_directory, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "half_life_seconds": self.half_life_seconds,
+                    "bucket_seconds": self.bucket_seconds,
+                    "destination_buckets": self.destination_buckets,
+                    "destination_precision": self.destination_precision,
+                    "reference_time": self.reference_time,
+                    "user_ids": self.user_ids
+                }, f, ensure_ascii=False)
+            # Старый снимок отодвигается и удаляется только после того, как новый на месте
+            old_directory = None
+            if os.path.exists(directory):
+                old_directory = tempfile.mkdtemp(dir=parent, prefix='.old-snapshot-')
+                os.replace(directory, os.path.join(old_directory, 'snapshot'))
+            os.replace(tmp_directory, directory)
+            if old_directory:
+                shutil.rmtree(old_directory, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            raise
+        return directory
+
+    @classmethod
+    def restore(cls, directory: str, capacity: int = 1024):
+        """Восстанавливает хранилище из снимка; столбцы читаются через mmap и копируются в память."""
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        store = cls(
+            half_life_seconds=meta['half_life_seconds'],
+            destination_window_seconds=meta['bucket_seconds'] * meta['destination_buckets'],
+            destination_buckets=meta['destination_buckets'],
+            capacity=max(capacity, len(meta['user_ids'])),
+            destination_precision=meta.get('destination_precision', DESTINATION_PRECISION)
+        )
+        store.reference_time = meta['reference_time']
+        store.user_ids = list(meta['user_ids'])
+        store.user_index = {user_id: row for row, user_id in enumerate(store.user_ids)}
+        size = len(store.user_ids)
+        for name, column in store._columns().items():
+            path = os.path.join(directory, f"{name}.npy")
+            # В снимках до перехода на HyperLogLog адреса хранились битовыми картами: окно адресов
+            # начинается заново, остальные признаки восстанавливаются
+            if name == 'destination_registers' and not os.path.exists(path):
+                continue
+            column[:size] = np.load(path, mmap_mode='r')
+        return store
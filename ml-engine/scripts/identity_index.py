@@ -0,0 +1,326 @@
+# ml-engine/scripts/identity_index.py
+import csv
+import gzip
+import json
+import os
+import threading
+
+import numpy as np
+
+from scripts.model_store import replace_atomically
+from scripts.sketches import hash64
+
+# Служебные значения ключей таблицы: пустая ячейка и удаленный псевдоним (хэши псевдонимов их не принимают)
+EMPTY = np.uint64(0)
+DELETED = np.uint64(1)
+# Максимальная доля занятых (включая удаленные) ячеек; при 1M псевдонимов таблица - 2^21 ячеек, ~25 МБ
+MAX_LOAD = 0.7
+# Поля выгрузки пользователей backend, значения которых - псевдонимы пользователя (строки или списки строк)
+ALIAS_FIELDS = ('username', 'email', 'upn', 'userPrincipalName', 'sam', 'samAccountName', 'aliases', 'devices', 'hostnames')
+
+
+def normalize_alias(alias) -> str:
+    """UPN, email, имена SAM (DOMAIN\\user) и имена хостов сравниваются без учета регистра и пробелов по краям."""
+    return str(alias).strip().casefold()
+
+
+def alias_hashes(aliases) -> np.ndarray:
+    hashes = hash64([normalize_alias(alias) for alias in aliases])
+    return np.where(hashes <= DELETED, hashes + np.uint64(2), hashes)
+
+
+_MASK64 = (1 << 64) - 1
+_FNV_OFFSET = 0xCBF29CE484222325
+_FNV_PRIME = 0x100000001B3
+# Пакеты до стольких псевдонимов разрешаются скалярным кодом: накладные расходы numpy
+# на пакет (десятки микросекунд) больше, чем поиск по одному псевдониму
+SCALAR_LOOKUP_MAX = 8
+
+
+def _alias_hash_scalar(alias) -> int:
+    """То же значение, что alias_hashes([alias])[0] (hash64 из scripts/sketches.py), без numpy."""
+    data = normalize_alias(alias).encode('utf-8')
+    value = _FNV_OFFSET
+    for start in range(0, len(data), 8):
+        value = ((value ^ int.from_bytes(data[start:start + 8], 'little')) * _FNV_PRIME) & _MASK64
+    value = (value ^ len(data)) + 0x9E3779B97F4A7C15 & _MASK64
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & _MASK64
+    value ^= value >> 31
+    return value + 2 if value <= 1 else value
+
+
+def _table_capacity(n_aliases: int) -> int:
+    capacity = 1024
+    while capacity * MAX_LOAD < n_aliases:
+        capacity *= 2
+    return capacity
+
+
+class IdentityIndex:
+    """
+    Индекс псевдонимов пользователей и устройств (UPN, SAM, email, имя хоста) -> каноническая учетная запись.
+
+    Псевдоним хранится 64-битным хэшем нормализованной строки в хэш-таблице с открытой адресацией
+    (линейное пробирование): массив ключей uint64 и массив плотных id учетных записей int32,
+    12 байт на ячейку вместо сотен байт на строку-ключ словаря. Строки хранятся только для
+    канонических имен (identities[id]). Случайное совпадение хэшей двух псевдонимов при 1M
+    псевдонимов маловероятно (~1e-8).
+
+    Поиск, вставка и удаление векторизованы по пакету псевдонимов: шаг пробирования выполняется
+    сразу для всех еще не разрешенных псевдонимов пакета (пакеты до SCALAR_LOOKUP_MAX псевдонимов,
+    например одно событие, разрешаются скалярным кодом). Изменения (apply_delta) применяются
+    на месте; таблица перестраивается только при превышении MAX_LOAD (удаленные ячейки при этом
+    освобождаются). Чтение не блокируется: перестроенная таблица подменяется одним присваиванием.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._table = self._empty_table(_table_capacity(capacity))
+        self.identities = []
+        self.identity_ids = {}
+        self.size = 0
+        self.deleted = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty_table(capacity: int):
+        return np.zeros(capacity, dtype=np.uint64), np.full(capacity, -1, dtype=np.int32)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self) -> int:
+        return len(self._table[0])
+
+    @property
+    def memory_bytes(self) -> int:
+        keys, values = self._table
+        return keys.nbytes + values.nbytes
+
+    @staticmethod
+    def _probe(table, hashes: np.ndarray) -> np.ndarray:
+        """Ячейки псевдонимов в таблице; -1 - псевдонима нет."""
+        keys, _ = table
+        mask = np.uint64(len(keys) - 1)
+        slots = (hashes & mask).astype(np.int64)
+        result = np.full(len(hashes), -1, dtype=np.int64)
+        pending = np.arange(len(hashes))
+        while len(pending):
+            found = keys[slots[pending]]
+            hit = found == hashes[pending]
+            result[pending[hit]] = slots[pending[hit]]
+            # Удаленные ячейки пробирование пропускает, пустая - конец цепочки
+            pending = pending[~hit & (found != EMPTY)]
+            slots[pending] = (slots[pending] + 1) & (len(keys) - 1)
+        return result
+
+    @staticmethod
+    def _insert(table, hashes: np.ndarray, ids: np.ndarray) -> int:
+        """Вставляет отсутствующие в таблице уникальные хэши. Возвращает число занятых удаленных ячеек."""
+        keys, values = table
+        slots = (hashes & np.uint64(len(keys) - 1)).astype(np.int64)
+        pending = np.arange(len(hashes))
+        reused = 0
+        while len(pending):
+            free = keys[slots[pending]] <= DELETED
+            # Из претендентов на одну свободную ячейку ее занимает первый, остальные идут дальше
+            claimed, first = np.unique(slots[pending[free]], return_index=True)
+            winners = pending[free][first]
+            reused += int(np.count_nonzero(keys[claimed] == DELETED))
+            values[claimed] = ids[winners]
+            keys[claimed] = hashes[winners]
+            placed = np.zeros(len(hashes), dtype=bool)
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            slots[pending] = (slots[pending] + 1) & (len(keys) - 1)
+        return reused
+
+    def _identity_id(self, identities) -> np.ndarray:
+        ids = np.empty(len(identities), dtype=np.int32)
+        for position, identity in enumerate(identities):
+            identity_id = self.identity_ids.get(identity)
+            if identity_id is None:
+                identity_id = self.identity_ids[identity] = len(self.identities)
+                self.identities.append(identity)
+            ids[position] = identity_id
+        return ids
+
+    def add(self, aliases, identities):
+        """Связывает псевдонимы aliases[i] с учетными записями identities[i]; при повторе псевдонима побеждает последний."""
+        if not len(aliases):
+            return
+        with self._lock:
+            hashes = alias_hashes(aliases)
+            ids = self._identity_id([str(identity) for identity in identities])
+            _, last = np.unique(hashes[::-1], return_index=True)
+            unique = len(hashes) - 1 - last
+            hashes, ids = hashes[unique], ids[unique]
+
+            slots = self._probe(self._table, hashes)
+            known = slots >= 0
+            self._table[1][slots[known]] = ids[known]
+            new_hashes, new_ids = hashes[~known], ids[~known]
+            if self.size + self.deleted + len(new_hashes) > self.capacity * MAX_LOAD:
+                self._rebuild(self.size + len(new_hashes))
+            self.deleted -= self._insert(self._table, new_hashes, new_ids)
+            self.size += len(new_hashes)
+
+    def remove(self, aliases) -> int:
+        """Удаляет псевдонимы. Возвращает число удаленных (неизвестные пропускаются)."""
+        if not len(aliases):
+            return 0
+        with self._lock:
+            slots = np.unique(self._probe(self._table, alias_hashes(aliases)))
+            slots = slots[slots >= 0]
+            keys, values = self._table
+            keys[slots] = DELETED
+            values[slots] = -1
+            self.size -= len(slots)
+            self.deleted += len(slots)
+            return len(slots)
+
+    def apply_delta(self, add: dict = None, remove=None):
+        """Применяет изменения: сначала удаляет псевдонимы `remove`, затем добавляет `add` ({псевдоним: учетная запись})."""
+        removed = self.remove(list(remove or ()))
+        add = add or {}
+        self.add(list(add.keys()), list(add.values()))
+        return {"removed": removed, "added": len(add), "aliases": self.size}
+
+    def _rebuild(self, n_aliases: int):
+        keys, values = self._table
+        live = keys > DELETED
+        table = self._empty_table(_table_capacity(n_aliases))
+        self._insert(table, keys[live], values[live])
+        self._table = table
+        self.deleted = 0
+
+    def _lookup_scalar(self, table, alias) -> int:
+        keys, values = table
+        key = _alias_hash_scalar(alias)
+        mask = len(keys) - 1
+        slot = key & mask
+        while True:
+            found = int(keys[slot])
+            if found == key:
+                return int(values[slot])
+            if found == 0:
+                return -1
+            slot = (slot + 1) & mask
+
+    def lookup(self, aliases) -> np.ndarray:
+        """Плотные id учетных записей псевдонимов (int32); -1 - псевдоним неизвестен."""
+        table = self._table
+        if len(aliases) <= SCALAR_LOOKUP_MAX:
+            return np.array([self._lookup_scalar(table, alias) for alias in aliases], dtype=np.int32)
+        slots = self._probe(table, alias_hashes(aliases))
+        ids = table[1][slots]
+        ids[slots < 0] = -1
+        return ids
+
+    def canonicalize(self, aliases) -> list:
+        """Канонические имена учетных записей; неизвестные псевдонимы возвращаются как есть."""
+        if len(aliases) <= SCALAR_LOOKUP_MAX:
+            table = self._table
+            ids = [self._lookup_scalar(table, alias) for alias in aliases]
+        else:
+            ids = self.lookup(aliases).tolist()
+        return [self.identities[identity_id] if identity_id >= 0 else alias for alias, identity_id in zip(aliases, ids)]
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        pairs = list(pairs)
+        index = cls(capacity=len(pairs))
+        if pairs:
+            aliases, identities = zip(*pairs)
+            index.add(aliases, identities)
+        return index
+
+    def save(self, path: str):
+        """Атомарно сохраняет индекс в .npz (только хэши псевдонимов, без исходных строк)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        keys, values = self._table
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, keys=keys, values=values, identities=np.asarray(self.identities, dtype=str),
+                         counts=np.array([self.size, self.deleted]))
+
+        replace_atomically(directory, '.npz', path, write)
+        return path
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            index = cls()
+            index._table = (data['keys'].copy(), data['values'].copy())
+            index.identities = data['identities'].tolist()
+            index.size, index.deleted = (int(count) for count in data['counts'])
+        index.identity_ids = {identity: identity_id for identity_id, identity in enumerate(index.identities)}
+        return index
+
+
+def user_export_aliases(user):
+    """Пары (псевдоним, учетная запись) пользователя из выгрузки backend; учетная запись - username (или user_id)."""
+    identity = user.get('username') or user.get('user_id')
+    if not identity:
+        return []
+    pairs = [(identity, identity)]
+    for field in ALIAS_FIELDS:
+        values = user.get(field)
+        for value in values if isinstance(values, list) else [values]:
+            if value:
+                pairs.append((value, identity))
+    return pairs
+
+
+def read_alias_file(path: str):
+    """
+    Пары (псевдоним, учетная запись) из файла (можно .gz):
+    - .csv - столбцы alias и identity;
+    - .json - массив пользователей из выгрузки backend; .jsonl - по пользователю на строку.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    name = path[:-3] if path.endswith('.gz') else path
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        if name.endswith('.csv'):
+            for row in csv.DictReader(f):
+                yield row['alias'], row['identity']
+        elif name.endswith('.json'):
+            for user in json.load(f):
+                yield from user_export_aliases(user)
+        else:
+            for line in f:
+                if line.strip():
+                    yield from user_export_aliases(json.loads(line))
+
+
+if __name__ == '__main__':
+    # Сборка индекса: python -m scripts.identity_index users.json models/identity_index.npz
+    # Изменения к существующему индексу: ... --delta removed_aliases.txt (по псевдониму на строку) и/или новые пары во входном файле
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build or update the UEBA identity index.")
+    parser.add_argument('input', nargs='?', help="CSV (alias,identity) or backend user export (.json / .jsonl)")
+    parser.add_argument('output')
+    parser.add_argument('--update', action='store_true', help="Apply input as additions to the existing index at OUTPUT")
+    parser.add_argument('--remove', help="File with aliases to remove, one per line")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    pairs = list(read_alias_file(args.input)) if args.input else []
+    if args.update or args.remove:
+        index = IdentityIndex.load(args.output) if os.path.exists(args.output) else IdentityIndex()
+        removed = []
+        if args.remove:
+            with open(args.remove, encoding='utf-8') as f:
+                removed = [line.strip() for line in f if line.strip()]
+        result = index.apply_delta(dict(pairs), removed)
+    else:
+        index = IdentityIndex.from_pairs(pairs)
+        result = {"aliases": len(index)}
+    index.save(args.output)
+    print(f"{result} -> {args.output}: {len(index.identities)} identities, "
+          f"{index.memory_bytes / 2**20:.1f} MiB table, {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,289 @@
+# ml-engine/scripts/keyword_matcher.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import deque
+
+import numpy as np
+
+# Документы короче этого (в байтах UTF-8) сканируются скалярным циклом по таблице переходов:
+# у векторизованного прохода фиксированные накладные расходы numpy на каждый шаг
+SHORT_TEXT_BYTES = 4096
+# Длинный документ режется на столько параллельно сканируемых полос (не меньше MIN_STRIPE_BYTES каждая)
+MAX_STRIPES = 4096
+MIN_STRIPE_BYTES = 64
+# Длинные документы обрабатываются сегментами: матрица состояний сегмента - 4 байта на байт текста
+SEGMENT_BYTES = 1 << 22
+
+_ARRAYS = ('class_map', 'transitions', 'output_indptr', 'output_patterns', 'pattern_lengths')
+
+
+def keywords_fingerprint(keywords) -> str:
+    return hashlib.sha1(json.dumps(list(keywords), ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+class KeywordAutomaton:
+    """
+    Автомат Ахо-Корасик для поиска всех ключевых слов за один проход по документу.
+
+    Сравнение без учета регистра (str.lower) по байтам UTF-8. Переходы - полная таблица DFA
+    по классам байтов: байты, которых нет ни в одном слове, сведены в класс 0, поэтому классов
+    столько, сколько разных байтов в словах, плюс один. Таблица плоская (int32), и состояние
+    представлено смещением своей строки (номер * n_classes): шаг - transitions[состояние + класс],
+    без умножения. Состояния, в которых заканчиваются слова, пронумерованы последними,
+    поэтому проверка совпадения - одно сравнение с границей. Слова, заканчивающиеся
+    в состоянии (с учетом суффиксных ссылок), хранятся в формате CSR.
+
+    Короткий документ проходится скалярным циклом по таблице (memoryview, без numpy на шаг).
+    Длинный - векторизованно: текст режется на полосы, которые шагают по автомату одновременно
+    (один шаг numpy на позицию для всех полос); каждая полоса начинается на max_length - 1
+    байтов раньше своей границы, поэтому совпадения на стыках не теряются и не дублируются
+    (совпадение засчитывается полосе, в которой оно заканчивается).
+
+    Массивы автомата можно сохранить в каталог .npy (save) и открыть через mmap (load):
+    процессы-воркеры с одним набором слов делят одну копию таблицы в page cache (build_cached).
+    """
+
+    def __init__(self, keywords, class_map, transitions, output_indptr, output_patterns, pattern_lengths):
+        self.keywords = list(keywords)
+        self.class_map = class_map
+        self.transitions = transitions
+        self.output_indptr = output_indptr
+        self.output_patterns = output_patterns
+        self.pattern_lengths = pattern_lengths
+        self.n_classes = int(class_map.max()) + 1
+        self.max_length = int(pattern_lengths.max()) if len(pattern_lengths) else 0
+        self.fingerprint = keywords_fingerprint(self.keywords)
+        # Смещение первого состояния, в котором заканчивается хотя бы одно слово
+        self.first_output = int(np.count_nonzero(np.diff(output_indptr) == 0)) * self.n_classes
+        # Для скалярного цикла: таблица без копирования (в т.ч. при mmap)
+        self._transitions_view = memoryview(transitions)
+        self._class_list = class_map.tolist()
+        # Классы байтов для векторизованного прохода - в самом узком типе (их транспонирование - основная работа с памятью)
+        self._symbol_map = class_map.astype(np.uint8 if self.n_classes <= 256 else np.uint16)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    @classmethod
+    def build(cls, keywords):
+        """Строит автомат по словам; пустые слова отбрасываются, совпадающие без учета регистра - объединяются."""
+        keywords = list(dict.fromkeys(keyword.lower() for keyword in keywords if keyword))
+        patterns = [keyword.encode('utf-8') for keyword in keywords]
+        used = sorted({byte for pattern in patterns for byte in pattern})
+        class_map = np.zeros(256, dtype=np.int32)
+        class_map[used] = np.arange(1, len(used) + 1)
+        n_classes = len(used) + 1
+
+        # Бор
+        goto = [{}]
+        outputs = [[]]
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for byte in pattern:
+                symbol = int(class_map[byte])
+                following = goto[state].get(symbol)
+                if following is None:
+                    following = goto[state][symbol] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                state = following
+            outputs[state].append(pattern_id)
+
+        # Суффиксные ссылки и полная таблица переходов в порядке обхода в ширину
+        delta = np.zeros((len(goto), n_classes), dtype=np.int32)
+        fail = [0] * len(goto)
+        for symbol, following in goto[0].items():
+            delta[0, symbol] = following
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            delta[state] = delta[fail[state]]
+            for symbol, following in goto[state].items():
+                delta[state, symbol] = following
+                fail[following] = int(delta[fail[state], symbol]) if state else 0
+                queue.append(following)
+            outputs[state] = outputs[state] + outputs[fail[state]]
+
+        # Перенумерация: состояния без слов (корень - первый) перед состояниями со словами
+        order = sorted(range(len(goto)), key=lambda state: bool(outputs[state]))
+        new_ids = np.empty(len(goto), dtype=np.int64)
+        new_ids[order] = np.arange(len(goto))
+        transitions = (new_ids[delta[order]] * n_classes).astype(np.int32).reshape(-1)
+        outputs = [outputs[state] for state in order]
+        output_indptr = np.zeros(len(goto) + 1, dtype=np.int64)
+        output_indptr[1:] = np.cumsum([len(output) for output in outputs])
+        output_patterns = np.array([pattern for output in outputs for pattern in output], dtype=np.int32)
+        pattern_lengths = np.array([len(pattern) for pattern in patterns], dtype=np.int32)
+        return cls(keywords, class_map, transitions, output_indptr, output_patterns, pattern_lengths)
+
+    def _matched_states_short(self, data: bytes) -> set:
+        transitions, classes, first_output = self._transitions_view, self._class_list, self.first_output
+        matched = set()
+        state = 0
+        for byte in data:
+            state = transitions[state + classes[byte]]
+            if state >= first_output:
+                matched.add(state)
+        return matched
+
+    def _scan_short(self, data: bytes):
+        transitions, classes, first_output = self._transitions_view, self._class_list, self.first_output
+        ends, states = [], []
+        state = 0
+        for position, byte in enumerate(data):
+            state = transitions[state + classes[byte]]
+            if state >= first_output:
+                ends.append(position)
+                states.append(state)
+        return np.array(ends, dtype=np.int64), np.array(states, dtype=np.int64) // self.n_classes
+
+    def _scan_segment(self, symbols: np.ndarray, start: int, end: int):
+        """Совпадения, заканчивающиеся в [start, end) (позиции - индексы в symbols)."""
+        overlap = max(self.max_length - 1, 0)
+        length = end - start
+        stripe = max(MIN_STRIPE_BYTES, overlap, -(-length // MAX_STRIPES))
+        n_stripes = -(-length // stripe)
+        # Сегмент с overlap байтами перед ним, дополненный классом 0 (сброс в корень) до целого числа полос;
+        # столбец step матрицы columns - байт step каждой полосы (полоса начинается за overlap байтов до себя)
+        padded = np.zeros(overlap + n_stripes * stripe, dtype=symbols.dtype)
+        lead = min(overlap, start)
+        padded[overlap - lead:overlap + length] = symbols[start - lead:end]
+        columns = np.lib.stride_tricks.as_strided(
+            padded, shape=(overlap + stripe, n_stripes), strides=(padded.itemsize, stripe * padded.itemsize)
+        ).copy()
+
+        transitions = self.transitions
+        states = np.zeros(n_stripes, dtype=np.int32)
+        step_input = np.empty(n_stripes, dtype=np.int32)
+        visited = np.empty((stripe, n_stripes), dtype=np.int32)
+        for step in range(overlap):
+            states = transitions.take(np.add(states, columns[step], out=step_input), mode='clip')
+        for step in range(stripe):
+            states = transitions.take(np.add(states, columns[overlap + step], out=step_input),
+                                      out=visited[step], mode='clip')
+        steps, stripes = np.nonzero(visited >= self.first_output)
+        positions = start + stripes.astype(np.int64) * stripe + steps
+        keep = positions < end
+        order = np.argsort(positions[keep], kind='stable')
+        return positions[keep][order], visited[steps[keep], stripes[keep]][order].astype(np.int64) // self.n_classes
+
+    def find_all(self, text: str):
+        """
+        Все вхождения слов: (pattern_ids, starts, ends) - номера слов в self.keywords и границы
+        вхождений [start, end) в символах документа (для text.lower() той же длины, что text - почти всегда),
+        по возрастанию конца вхождения.
+        """
+        lowered = text.lower()
+        data = lowered.encode('utf-8')
+        empty = np.zeros(0, dtype=np.int64)
+        if not self.keywords or not data:
+            return empty.astype(np.int32), empty, empty
+        if len(data) <= SHORT_TEXT_BYTES:
+            end_bytes, states = self._scan_short(data)
+        else:
+            symbols = self._symbol_map[np.frombuffer(data, dtype=np.uint8)]
+            parts = [self._scan_segment(symbols, start, min(start + SEGMENT_BYTES, len(data)))
+                     for start in range(0, len(data), SEGMENT_BYTES)]
+            end_bytes = np.concatenate([part[0] for part in parts])
+            states = np.concatenate([part[1] for part in parts])
+
+        counts = self.output_indptr[states + 1] - self.output_indptr[states]
+        first = np.repeat(self.output_indptr[states] - np.cumsum(counts) + counts, counts)
+        pattern_ids = self.output_patterns[first + np.arange(len(first))]
+        end_bytes = np.repeat(end_bytes, counts)
+        start_bytes = end_bytes - self.pattern_lengths[pattern_ids] + 1
+
+        if len(data) == len(lowered):  # ASCII: байт = символ
+            return pattern_ids, start_bytes, end_bytes + 1
+        # Номер символа каждого байта: считаются байты, не являющиеся продолжением символа UTF-8
+        char_index = np.cumsum((np.frombuffer(data, dtype=np.uint8) & 0xC0) != 0x80) - 1
+        return pattern_ids, char_index[start_bytes], char_index[end_bytes] + 1
+
+    def found(self, text: str) -> list:
+        """Номера слов, встречающихся в документе, по возрастанию (без повторов и без позиций)."""
+        data = text.lower().encode('utf-8')
+        if not self.keywords or len(data) > SHORT_TEXT_BYTES:
+            return np.unique(self.find_all(text)[0]).tolist() if self.keywords and data else []
+        indptr, patterns, n_classes = self.output_indptr, self.output_patterns, self.n_classes
+        found = set()
+        for state in self._matched_states_short(data):
+            state //= n_classes
+            found.update(patterns[indptr[state]:indptr[state + 1]].tolist())
+        return sorted(found)
+
+    def scan(self, text: str, max_positions: int = 10) -> list:
+        """
+        Найденные слова для ответа API (поле keywords_found): [{"keyword", "count", "positions"}]
+        по убыванию числа вхождений; positions - первые `max_positions` пар [start, end).
+        """
+        pattern_ids, starts, ends = self.find_all(text)
+        if not len(pattern_ids):
+            return []
+        order = np.lexsort((starts, pattern_ids))
+        pattern_ids, starts, ends = pattern_ids[order], starts[order], ends[order]
+        unique, first, counts = np.unique(pattern_ids, return_index=True, return_counts=True)
+        results = [
+            {
+                "keyword": self.keywords[pattern_id],
+                "count": count,
+                "positions": np.column_stack([starts[offset:offset + min(count, max_positions)],
+                                              ends[offset:offset + min(count, max_positions)]]).tolist()
+            }
+            for pattern_id, offset, count in zip(unique.tolist(), first.tolist(), counts.tolist())
+        ]
+        results.sort(key=lambda result: -result["count"])
+        return results
+
+    def save(self, directory: str):
+        """Сохраняет автомат в каталог (.npy + keywords.json); каталог появляется атомарно."""
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_directory = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+        try:
+            for name in _ARRAYS:
+                np.save(os.path.join(tmp_directory, f'{name}.npy'), getattr(self, name))
+            with open(os.path.join(tmp_directory, 'keywords.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.keywords, f, ensure_ascii=False)
+            os.replace(tmp_directory, directory)
+        except OSError:
+            # Каталог уже сохранен другим процессом с тем же набором слов
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            if not os.path.exists(os.path.join(directory, 'keywords.json')):
+                raise
+        return directory
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = 'r'):
+        with open(os.path.join(directory, 'keywords.json'), encoding='utf-8') as f:
+            keywords = json.load(f)
+        arrays = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in _ARRAYS]
+        return cls(keywords, *arrays)
+
+    @classmethod
+    def build_cached(cls, keywords, cache_dir: str = None):
+        """
+        Автомат для набора слов из кэша `cache_dir/<отпечаток набора>` (через mmap) или построенный
+        и сохраненный туда. Без cache_dir - просто build().
+        """
+        if not cache_dir:
+            return cls.build(keywords)
+        normalized = list(dict.fromkeys(keyword.lower() for keyword in keywords if keyword))
+        directory = os.path.join(cache_dir, keywords_fingerprint(normalized))
+        if os.path.exists(os.path.join(directory, 'keywords.json')):
+            try:
+                return cls.load(directory)
+            except (OSError, ValueError):
+                pass
+        automaton = cls.build(normalized)
+        try:
+            automaton.save(directory)
+            return cls.load(directory)
+        except OSError:
+            return automaton
@@ -0,0 +1,120 @@
+# ml-engine/scripts/micro_batching.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from prometheus_client import Histogram
+
+# Метрики динамического батчинга (попадают в общий /metrics вместе с метриками Flask)
+BATCH_SIZE_HISTOGRAM = Histogram(
+    'ml_engine_microbatch_size',
+    'Number of requests scored together in one micro-batch',
+    ['batcher'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+BATCH_FILL_HISTOGRAM = Histogram(
+    'ml_engine_microbatch_fill_ratio',
+    'Micro-batch size divided by max_batch_size',
+    ['batcher'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+)
+QUEUE_WAIT_HISTOGRAM = Histogram(
+    'ml_engine_microbatch_queue_wait_seconds',
+    'Time a request spent in the micro-batching queue before scoring',
+    ['batcher'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+
+
+class MicroBatcher:
+    """
+    Динамический батчинг запросов инференса внутри процесса.
+
+    Конкурентные запросы (например, потоки gthread-воркера gunicorn) кладут
+    свои элементы в общую очередь. Фоновый поток собирает их в пакет, пока
+    не наберется `max_batch_size` элементов или не истечет `max_wait_ms`
+    с момента прихода первого элемента, оценивает пакет одним вызовом
+    `predict_batch` и возвращает каждому вызывающему его собственный ответ.
+
+    `predict_batch(items)` должна вернуть список результатов той же длины,
+    что и `items`. Экземпляр Exception на месте результата означает ошибку
+    только для этого элемента.
+    """
+
+    def __init__(self, predict_batch, max_batch_size: int = 32, max_wait_ms: float = 5.0, name: str = 'default'):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be a positive integer.")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be non-negative.")
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+    def submit(self, item) -> Future:
+        """Ставит элемент в очередь и возвращает Future с его результатом."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def predict(self, item, timeout: float = None):
+        """Синхронная обертка над submit(): блокируется до получения результата."""
+        return self.submit(item).result(timeout=timeout)
+
+    def _ensure_worker(self):
+        # Поток запускается лениво и перезапускается после fork (gunicorn --preload),
+        # так как потоки родительского процесса в дочерний не наследуются.
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+                if self._worker_pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._worker_pid = os.getpid()
+                self._worker = threading.Thread(target=self._run, name=f"microbatcher-{self.name}", daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                QUEUE_WAIT_HISTOGRAM.labels(self.name).observe(started - enqueued_at)
+            BATCH_SIZE_HISTOGRAM.labels(self.name).observe(len(batch))
+            BATCH_FILL_HISTOGRAM.labels(self.name).observe(len(batch) / self.max_batch_size)
+
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.predict_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"predict_batch returned {len(results)} results for {len(items)} items.")
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,192 @@
+# ml-engine/scripts/model_registry.py
+import json
+import logging
+import os
+import threading
+import time
+
+from prometheus_client import Counter, Gauge
+
+from scripts.model_store import load_model, metadata_path
+from scripts.prediction_cache import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+MODEL_RELOADS = Counter('ml_engine_model_reloads_total', 'Model (re)load attempts', ['model', 'result'])
+MODEL_LOADED_AT = Gauge('ml_engine_model_loaded_timestamp_seconds', 'Unix time when the current model version was loaded', ['model'])
+
+
+class LoadedModel:
+    """Неизменяемый снимок загруженной версии модели."""
+
+    __slots__ = ('model', 'version', 'fingerprint', 'path', 'loaded_at', 'load_seconds')
+
+    def __init__(self, model, version, fingerprint, path, loaded_at, load_seconds):
+        self.model = model
+        self.version = version
+        self.fingerprint = fingerprint
+        self.path = path
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+
+    def describe(self) -> dict:
+        return {
+            "model_version": self.version,
+            "fingerprint": self.fingerprint,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3)
+        }
+
+
+class ModelRegistry:
+    """
+    Реестр версий модели с горячей перезагрузкой без рестарта воркеров.
+
+    - Модель загружается лениво при первом обращении к current().
+    - Новая версия загружается в фоне (файл изменился - это видит поток-наблюдатель,
+      либо вызван reload() из админского эндпоинта), прогревается и атомарно
+      подменяет текущую: присваивание ссылки на снимок атомарно.
+    - Запрос берет снимок через current() один раз и до конца работает с ним,
+      поэтому запросы, начатые до подмены, завершаются на старой версии.
+    - Если новая версия не загрузилась, продолжает работать старая.
+
+    Версия берется из метаданных (<модель>.meta.json, пишет save_model), если они
+    относятся именно к этому файлу, иначе версией считается отпечаток содержимого файла.
+
+    Файлы не в формате joblib (например, базовые линии UEBA в .npz) загружаются функцией `loader(path)`.
+    """
+
+    def __init__(self, path: str, name: str = 'model', mmap_mode: str = 'r',
+                 warmup_input=None, watch_interval: float = 0, loader=None):
+        self.path = path
+        self.name = name
+        self.mmap_mode = mmap_mode
+        self.loader = loader
+        self.warmup_input = warmup_input
+        self.watch_interval = watch_interval
+        self._current = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+        self._last_failed_stat = None
+
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def current(self):
+        """Возвращает текущий снимок LoadedModel или None, если модель недоступна."""
+        self._ensure_watcher()
+        snapshot = self._current
+        if snapshot is None:
+            snapshot = self.reload()
+        return snapshot
+
+    @property
+    def version(self):
+        snapshot = self._current
+        return snapshot.version if snapshot else None
+
+    @property
+    def fingerprint(self):
+        snapshot = self._current
+        return snapshot.fingerprint if snapshot else None
+
+    def reload(self, force: bool = False):
+        """
+        Загружает файл модели и подменяет текущую версию. Возвращает актуальный снимок.
+        Без force файл, который уже загружен (тот же отпечаток) или не загрузился
+        в прошлый раз без изменений, повторно не читается.
+        """
+        with self._lock:
+            file_stat = self._file_stat()
+            if file_stat is None:
+                if self._current is None:
+                    logger.warning(f"Model file not found at {self.path}")
+                return self._current
+            if not force and file_stat == self._last_failed_stat:
+                return self._current
+            try:
+                fingerprint = file_fingerprint(self.path)
+                if not force and self._current is not None and fingerprint == self._current.fingerprint:
+                    return self._current
+                started = time.perf_counter()
+                if self.loader is not None:
+                    model = self.loader(self.path)
+                else:
+                    model = load_model(self.path, mmap_mode=self.mmap_mode)
+                if self.warmup_input is not None and hasattr(model, 'predict_proba'):
+                    model.predict_proba(self.warmup_input)
+                load_seconds = time.perf_counter() - started
+            except Exception as e:
+                self._last_failed_stat = file_stat
+                MODEL_RELOADS.labels(self.name, 'error').inc()
+                logger.error(f"Error loading model '{self.name}' from {self.path}: {e}")
+                return self._current
+
+            snapshot = LoadedModel(
+                model=model,
+                version=self._read_version(fingerprint),
+                fingerprint=fingerprint,
+                path=self.path,
+                loaded_at=time.time(),
+                load_seconds=load_seconds
+            )
+            previous = self._current
+            self._current = snapshot
+            self._last_failed_stat = None
+            MODEL_RELOADS.labels(self.name, 'success').inc()
+            MODEL_LOADED_AT.labels(self.name).set(snapshot.loaded_at)
+            logger.info(
+                f"Model '{self.name}' version {snapshot.version} loaded from {self.path} in {load_seconds:.3f}s"
+                + (f" (replaced {previous.version})" if previous else "")
+            )
+            return snapshot
+
+    def reload_in_background(self, force: bool = False) -> threading.Thread:
+        thread = threading.Thread(target=self.reload, kwargs={'force': force}, name=f"model-reload-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def _read_version(self, fingerprint: str) -> str:
+        try:
+            with open(metadata_path(self.path), encoding='utf-8') as f:
+                metadata = json.load(f)
+            # Метаданные от другого файла (например, записанные до замены модели) не используются
+            if metadata.get('fingerprint') == fingerprint and metadata.get('version'):
+                return str(metadata['version'])
+        except (OSError, ValueError):
+            pass
+        return fingerprint
+
+    def _ensure_watcher(self):
+        # Поток-наблюдатель запускается лениво в каждом процессе (в т.ч. после fork воркера gunicorn)
+        if self.watch_interval <= 0:
+            return
+        if self._watcher is not None and self._watcher_pid == os.getpid() and self._watcher.is_alive():
+            return
+        with self._lock:
+            if self._watcher is None or self._watcher_pid != os.getpid() or not self._watcher.is_alive():
+                self._watcher_pid = os.getpid()
+                self._watcher = threading.Thread(target=self._watch, name=f"model-watch-{self.name}", daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        last_stat = self._file_stat()
+        pending_stat = None
+        while True:
+            time.sleep(self.watch_interval)
+            file_stat = self._file_stat()
+            if file_stat == last_stat or file_stat is None:
+                pending_stat = None
+                continue
+            # Перезагружаем, только когда файл не менялся между двумя проверками (копирование завершено)
+            if file_stat != pending_stat:
+                pending_stat = file_stat
+                continue
+            last_stat, pending_stat = file_stat, None
+            self.reload()
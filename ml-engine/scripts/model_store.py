@@ -0,0 +1,87 @@
+# ml-engine/scripts/model_store.py
+import json
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.base import BaseEstimator
+
+from scripts.prediction_cache import file_fingerprint
+
+# 'r' - numpy-массивы модели отображаются из файла в память только для чтения.
+# Все воркеры gunicorn, открывшие один файл, делят одни и те же страницы page cache.
+DEFAULT_MMAP_MODE = 'r'
+
+
+def _make_arrays_contiguous(estimator):
+    """Приводит numpy-атрибуты модели (и вложенных шагов пайплайна) к C-порядку, чтобы joblib мог отобразить их в память."""
+    for name, value in vars(estimator).items():
+        if isinstance(value, np.ndarray) and value.dtype != object and not value.flags.c_contiguous:
+            setattr(estimator, name, np.ascontiguousarray(value))
+        elif isinstance(value, BaseEstimator):
+            _make_arrays_contiguous(value)
+    for _, step in getattr(estimator, 'steps', []):
+        if isinstance(step, BaseEstimator):
+            _make_arrays_contiguous(step)
+
+
+def metadata_path(path: str) -> str:
+    """Путь к файлу метаданных модели (версия, отпечаток файла, время сохранения)."""
+    return os.path.splitext(path)[0] + '.meta.json'
+
+
+def replace_atomically(directory: str, suffix: str, path: str, write):
+    """
+    Атомарная замена файла: write(tmp_path) пишет временный файл в `directory` (та же файловая система),
+    затем он переименовывается в `path`. При ошибке временный файл удаляется, старый `path` остается.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=suffix)
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_model(model, path: str, version: str = None):
+    """
+    Сохраняет модель в формате, пригодном для joblib.load(mmap_mode='r'):
+    без сжатия, с непрерывными numpy-массивами. Запись атомарная (временный файл + os.replace),
+    поэтому читатели никогда не видят частично записанный файл.
+
+    Рядом пишутся метаданные (<модель>.meta.json) с версией и отпечатком файла модели;
+    ModelRegistry отдает эту версию в ответах как model_version.
+    Без `version` версией становится время сохранения (UTC).
+    """
+    _make_arrays_contiguous(model)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    def write_model(tmp_path):
+        joblib.dump(model, tmp_path, compress=0)
+        # Метаданные заменяются раньше модели: наблюдатель реестра реагирует на файл модели
+        metadata = {
+            "version": version or time.strftime('%Y.%m.%d-%H%M%S', time.gmtime()),
+            "fingerprint": file_fingerprint(tmp_path),
+            "saved_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        }
+        replace_atomically(directory, '.json', metadata_path(path), lambda meta_tmp: write_json(meta_tmp, metadata))
+
+    replace_atomically(directory, '.joblib', path, write_model)
+    return path
+
+
+def write_json(path: str, data: dict):
+    """Пишет `data` в JSON (UTF-8, с отступами); для атомарной записи - внутри replace_atomically."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def load_model(path: str, mmap_mode: str = DEFAULT_MMAP_MODE):
+    """Загружает модель; крупные numpy-массивы отображаются в память, а не копируются в процесс."""
+    return joblib.load(path, mmap_mode=mmap_mode)
@@ -0,0 +1,149 @@
+# ml-engine/scripts/parallel_pipeline.py
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+
+from scripts.preprocess import preprocess_texts
+from scripts.predict_utils import make_prediction_text_classification
+
+DEFAULT_WORKERS = int(os.environ.get("ML_ENGINE_PARALLEL_WORKERS", os.cpu_count() or 1))
+DEFAULT_CHUNK_SIZE = int(os.environ.get("ML_ENGINE_PARALLEL_CHUNK_SIZE", 256))
+
+# Модель в процессе-воркере. При старте через fork воркеры наследуют модель родителя
+# (copy-on-write, без сериализации), при spawn - загружают ее из файла один раз.
+_worker_model = None
+
+
+def _init_worker(model, model_path):
+    global _worker_model
+    _worker_model = model if model is not None else (joblib.load(model_path) if model_path else None)
+
+
+def _run_in_worker(func, texts):
+    """Обработка чанка в процессе пула: модель - та, что получил воркер при старте."""
+    return func(_worker_model, texts)
+
+
+def _preprocess_chunk(model, texts):
+    return preprocess_texts(texts)
+
+
+def _transform_chunk(model, texts):
+    # Все шаги пайплайна, кроме последнего (классификатора), - например, TF-IDF
+    return model[:-1].transform(texts)
+
+
+def _predict_chunk(model, texts):
+    predictions, probabilities = make_prediction_text_classification(model, texts)
+    return np.asarray(predictions), np.asarray(probabilities)
+
+
+class ParallelBatchPipeline:
+    """
+    Параллельная пакетная обработка корпуса документов на нескольких ядрах.
+
+    Список документов режется на чанки по `chunk_size`, чанки распределяются
+    по пулу процессов, а результаты собираются обратно в исходном порядке.
+    Каждый воркер получает модель один раз: через fork (copy-on-write) или
+    загрузкой из `model_path` при других способах запуска процессов.
+    При workers=1 пул не создается и обработка идет в текущем процессе.
+
+    Использование:
+        with ParallelBatchPipeline(model_path=MODEL_PATH, workers=4) as pipeline:
+            labels, probabilities = pipeline.predict(texts)
+    """
+
+    def __init__(self, model=None, model_path: str = None, workers: int = None, chunk_size: int = None):
+        self.model = model if model is not None else (joblib.load(model_path) if model_path else None)
+        self.model_path = model_path
+        self.workers = max(1, workers or DEFAULT_WORKERS)
+        self.chunk_size = max(1, chunk_size or DEFAULT_CHUNK_SIZE)
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            context = multiprocessing.get_context()
+            if context.get_start_method() == 'fork':
+                # При fork аргументы процесса не сериализуются: воркер видит ту же модель (copy-on-write)
+                initargs = (self.model, None)
+            else:
+                if self.model is not None and self.model_path is None:
+                    raise ValueError("model_path is required when worker processes are not started with fork.")
+                initargs = (None, self.model_path)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context,
+                initializer=_init_worker, initargs=initargs
+            )
+        return self._executor
+
+    def _map_chunks(self, func, texts):
+        texts = list(texts)
+        chunks = [texts[start:start + self.chunk_size] for start in range(0, len(texts), self.chunk_size)]
+        if self.workers == 1 or len(chunks) <= 1:
+            return [func(self.model, chunk) for chunk in chunks]
+        # map() возвращает результаты в порядке чанков
+        return list(self._get_executor().map(functools.partial(_run_in_worker, func), chunks))
+
+    def preprocess(self, texts) -> list[str]:
+        """Параллельная preprocess_text для списка документов."""
+        return [text for chunk in self._map_chunks(_preprocess_chunk, texts) for text in chunk]
+
+    def transform(self, texts):
+        """Параллельное преобразование текстов в матрицу признаков (все шаги пайплайна, кроме классификатора)."""
+        self._require_model()
+        parts = self._map_chunks(_transform_chunk, texts)
+        if not parts:
+            return self.model[:-1].transform([])
+        return sp.vstack(parts, format='csr') if sp.issparse(parts[0]) else np.vstack(parts)
+
+    def predict(self, texts):
+        """Параллельный аналог make_prediction_text_classification: (метки, вероятности)."""
+        self._require_model()
+        parts = self._map_chunks(_predict_chunk, texts)
+        if not parts:
+            return np.asarray([], dtype=object), np.asarray([], dtype=float)
+        return np.concatenate([labels for labels, _ in parts]), np.concatenate([probs for _, probs in parts])
+
+    def _require_model(self):
+        if self.model is None:
+            raise ValueError("ParallelBatchPipeline was created without a model.")
+
+
+if __name__ == '__main__':
+    # Массовая оценка: python -m scripts.parallel_pipeline input.jsonl output.jsonl [--workers N]
+    # Вход - JSON Lines с полями 'id' и 'text_content'.
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Bulk document sensitivity scoring on multiple cores.")
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--model', default=os.path.join(os.path.dirname(__file__), '..', 'models', 'sample_text_classifier.joblib'))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with open(args.input, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    with ParallelBatchPipeline(model_path=args.model, workers=args.workers, chunk_size=args.chunk_size) as pipeline:
+        labels, probabilities = pipeline.predict([record.get('text_content', '') for record in records])
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for record, label, probability in zip(records, labels, probabilities):
+            f.write(json.dumps({"id": record.get('id'), "prediction_label": str(label), "probability": float(probability)}) + "\n")
+    print(f"Scored {len(records)} documents with {args.workers} worker(s) -> {args.output}")
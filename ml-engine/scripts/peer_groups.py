@@ -0,0 +1,265 @@
+# ml-engine/scripts/peer_groups.py
+import os
+
+import numpy as np
+
+from scripts.model_store import replace_atomically
+from scripts.ueba_engine import FEATURE_NAMES
+
+# Перцентили, которые хранятся для каждой группы и признака
+DEFAULT_PERCENTILES = (0.05, 0.25, 0.75, 0.95)
+# MAD * 1.4826 - оценка стандартного отклонения для нормального распределения
+MAD_SCALE = 1.4826
+
+
+def grouped_quantiles(groups: np.ndarray, values: np.ndarray, n_groups: int, quantiles) -> np.ndarray:
+    """
+    Квантили значений по группам без цикла по группам: сортировка по (группа, значение)
+    на признак и линейная интерполяция внутри отрезка группы (как np.quantile по умолчанию).
+    groups - номер группы строки (0..n_groups-1), values - (n, n_features).
+    Возвращает (len(quantiles), n_groups, n_features); у пустых групп - nan.
+    """
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(groups), -1)
+    result = np.full((len(quantiles), n_groups, values.shape[1]), np.nan)
+    sizes = np.bincount(groups, minlength=n_groups)
+    present = np.flatnonzero(sizes)
+    if not len(present):
+        return result
+    starts = np.cumsum(sizes) - sizes
+    positions = starts[present, None] + quantiles[None, :] * (sizes[present, None] - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    fraction = positions - lower
+    # Сортировка по значению, затем устойчивая по группе: для номеров групп в uint16 numpy берет
+    # поразрядную сортировку - заметно быстрее, чем np.lexsort по паре ключей
+    group_keys = groups.astype(np.uint16) if n_groups <= np.iinfo(np.uint16).max else groups
+    by_value = np.argsort(values, axis=0)
+    for feature in range(values.shape[1]):
+        order = by_value[:, feature]
+        ordered = values[order[np.argsort(group_keys[order], kind='stable')], feature]
+        result[:, present, feature] = (ordered[lower] * (1 - fraction) + ordered[upper] * fraction).T
+    return result
+
+
+class PeerGroupBaselines:
+    """
+    Базовые линии групп сравнения (peer groups) - например, групп из Policy.scope.userGroups.
+
+    Для каждой группы и признака хранятся медиана, MAD и перцентили признаков ее участников;
+    отклонение пользователя - робастная z-оценка (x - медиана) / (1.4826 * MAD) относительно группы.
+    Пользователь может состоять в нескольких группах; итоговая оценка берется по группе,
+    относительно которой он выглядит наиболее обычно (разнородная группа не дает ложных тревог).
+
+    Пересчитываются только "грязные" группы: те, где изменился состав или признаки
+    хотя бы одного участника. Статистики всех грязных групп считаются одной векторизованной
+    группировкой (grouped_quantiles), а не циклом по группам.
+    """
+
+    def __init__(self, n_features: int = len(FEATURE_NAMES), percentiles=DEFAULT_PERCENTILES, capacity: int = 1024):
+        self.n_features = n_features
+        self.percentiles = tuple(percentiles)
+        self.user_index = {}
+        self.user_ids = []
+        self.user_groups = {}      # строка пользователя -> кортеж номеров групп
+        self.group_index = {}
+        self.group_names = []
+        self.members = []          # номер группы -> множество строк пользователей
+        self.dirty = set()
+        self._allocate_users(max(1, capacity))
+        self._allocate_groups(16)
+
+    def _allocate_users(self, capacity: int):
+        self.features = np.zeros((capacity, self.n_features))
+        self.has_features = np.zeros(capacity, dtype=bool)
+
+    def _allocate_groups(self, capacity: int):
+        self.group_sizes = np.zeros(capacity, dtype=np.int64)
+        self.medians = np.full((capacity, self.n_features), np.nan)
+        self.mads = np.full((capacity, self.n_features), np.nan)
+        self.percentile_values = np.full((capacity, len(self.percentiles), self.n_features), np.nan)
+
+    def _user_rows(self, user_ids) -> np.ndarray:
+        rows = np.empty(len(user_ids), dtype=np.int64)
+        for position, user_id in enumerate(user_ids):
+            row = self.user_index.get(user_id)
+            if row is None:
+                row = self.user_index[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+            rows[position] = row
+        if len(self.user_ids) > len(self.features):
+            capacity = len(self.features)
+            while capacity < len(self.user_ids):
+                capacity *= 2
+            features, has_features = self.features, self.has_features
+            self._allocate_users(capacity)
+            self.features[:len(features)] = features
+            self.has_features[:len(has_features)] = has_features
+        return rows
+
+    def _group_id(self, group: str) -> int:
+        group_id = self.group_index.get(group)
+        if group_id is None:
+            group_id = self.group_index[group] = len(self.group_names)
+            self.group_names.append(group)
+            self.members.append(set())
+            if group_id >= len(self.group_sizes):
+                old = (self.group_sizes, self.medians, self.mads, self.percentile_values)
+                self._allocate_groups(len(self.group_sizes) * 2)
+                for new_column, old_column in zip((self.group_sizes, self.medians, self.mads, self.percentile_values), old):
+                    new_column[:len(old_column)] = old_column
+        return group_id
+
+    def set_membership(self, user_ids, groups):
+        """Задает группы пользователей: groups[i] - список групп user_ids[i] (заменяет прежний)."""
+        for row, user_groups in zip(self._user_rows(user_ids).tolist(), groups):
+            new = tuple(dict.fromkeys(self._group_id(group) for group in user_groups))
+            old = self.user_groups.get(row, ())
+            if new == old:
+                continue
+            for group_id in set(old) - set(new):
+                self.members[group_id].discard(row)
+                self.dirty.add(group_id)
+            for group_id in set(new) - set(old):
+                self.members[group_id].add(row)
+                self.dirty.add(group_id)
+            self.user_groups[row] = new
+
+    def update(self, user_ids, features):
+        """Запоминает текущие признаки пользователей (например, UebaEngine.features) и помечает их группы."""
+        rows = self._user_rows(user_ids)
+        features = np.asarray(features, dtype=np.float64).reshape(len(rows), self.n_features)
+        changed = ~self.has_features[rows] | (self.features[rows] != features).any(axis=1)
+        self.features[rows] = features
+        self.has_features[rows] = True
+        for row in rows[changed].tolist():
+            self.dirty.update(self.user_groups.get(row, ()))
+
+    def recompute(self) -> list:
+        """Пересчитывает статистики грязных групп. Возвращает их имена."""
+        if not self.dirty:
+            return []
+        dirty = np.fromiter(self.dirty, dtype=np.int64, count=len(self.dirty))
+        self.dirty = set()
+        member_rows = [np.fromiter(self.members[group_id], dtype=np.int64, count=len(self.members[group_id])) for group_id in dirty.tolist()]
+        groups = np.repeat(np.arange(len(dirty)), [len(rows) for rows in member_rows])
+        rows = np.concatenate(member_rows) if member_rows else np.zeros(0, dtype=np.int64)
+        with_features = self.has_features[rows]
+        groups, rows = groups[with_features], rows[with_features]
+        values = self.features[rows]
+
+        stats = grouped_quantiles(groups, values, len(dirty), (0.5,) + self.percentiles)
+        medians = stats[0]
+        deviations = np.abs(values - medians[groups])
+        self.mads[dirty] = grouped_quantiles(groups, deviations, len(dirty), (0.5,))[0]
+        self.medians[dirty] = medians
+        self.percentile_values[dirty] = stats[1:].transpose(1, 0, 2)
+        self.group_sizes[dirty] = np.bincount(groups, minlength=len(dirty))
+        return [self.group_names[group_id] for group_id in dirty.tolist()]
+
+    def _scales(self, group_ids) -> np.ndarray:
+        """Масштаб отклонения: 1.4826 * MAD; при нулевом MAD - разброс между крайними перцентилями, иначе 1."""
+        scales = MAD_SCALE * self.mads[group_ids]
+        spread = (self.percentile_values[group_ids, -1] - self.percentile_values[group_ids, 0]) / 3.29
+        scales = np.where(scales > 0, scales, spread)
+        return np.where(scales > 0, scales, 1.0)
+
+    def group_stats(self, group: str) -> dict:
+        group_id = self.group_index[group]
+        return {
+            "group": group,
+            "size": int(self.group_sizes[group_id]),
+            "median": dict(zip(FEATURE_NAMES, self.medians[group_id].tolist())),
+            "mad": dict(zip(FEATURE_NAMES, self.mads[group_id].tolist())),
+            "percentiles": {
+                f"p{round(q * 100)}": dict(zip(FEATURE_NAMES, values))
+                for q, values in zip(self.percentiles, self.percentile_values[group_id].tolist())
+            }
+        }
+
+    def score(self, user_ids, features=None):
+        """
+        Отклонение пользователей от их групп (пересчитывает грязные группы).
+        features - текущие признаки (по умолчанию - сохраненные в update()).
+        Возвращает (z (n, n_features), peer_score (n,), группы): peer_score - max |z| по признакам
+        относительно самой "своей" группы; у пользователей без групп или признаков - nan и None.
+        """
+        self.recompute()
+        rows = np.fromiter((self.user_index.get(user_id, -1) for user_id in user_ids), dtype=np.int64, count=len(user_ids))
+        if features is None:
+            known = rows >= 0
+            known[known] = self.has_features[rows[known]]
+            features = np.full((len(user_ids), self.n_features), np.nan)
+            features[known] = self.features[rows[known]]
+        features = np.asarray(features, dtype=np.float64).reshape(len(user_ids), self.n_features)
+
+        # Пары (пользователь, группа) одной матрицей
+        pair_users, pair_groups = [], []
+        for position, row in enumerate(rows.tolist()):
+            for group_id in self.user_groups.get(row, ()):
+                if self.group_sizes[group_id]:
+                    pair_users.append(position)
+                    pair_groups.append(group_id)
+        pair_users = np.asarray(pair_users, dtype=np.int64)
+        pair_groups = np.asarray(pair_groups, dtype=np.int64)
+        pair_z = (features[pair_users] - self.medians[pair_groups]) / self._scales(pair_groups)
+        with np.errstate(invalid='ignore'):
+            pair_scores = np.abs(pair_z).max(axis=1) if len(pair_z) else np.zeros(0)
+        pair_scores = np.where(np.isnan(pair_scores), np.inf, pair_scores)
+
+        # Для каждого пользователя - пара с наименьшей оценкой
+        order = np.lexsort((pair_scores, pair_users))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = pair_users[order][1:] != pair_users[order][:-1]
+        best = order[first]
+
+        z = np.full((len(user_ids), self.n_features), np.nan)
+        peer_scores = np.full(len(user_ids), np.nan)
+        best_groups = [None] * len(user_ids)
+        z[pair_users[best]] = pair_z[best]
+        peer_scores[pair_users[best]] = np.where(np.isinf(pair_scores[best]), np.nan, pair_scores[best])
+        for position, group_id in zip(pair_users[best].tolist(), pair_groups[best].tolist()):
+            best_groups[position] = self.group_names[group_id]
+        return z, peer_scores, best_groups
+
+    def save(self, path: str):
+        """Атомарно сохраняет состав групп, признаки и статистики в .npz."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        pairs = np.array([(row, group_id) for row, group_ids in self.user_groups.items() for group_id in group_ids], dtype=np.int64).reshape(-1, 2)
+        n_users, n_groups = len(self.user_ids), len(self.group_names)
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    user_ids=np.asarray(self.user_ids, dtype=str), group_names=np.asarray(self.group_names, dtype=str),
+                    percentiles=np.asarray(self.percentiles), memberships=pairs, dirty=np.asarray(sorted(self.dirty), dtype=np.int64),
+                    features=self.features[:n_users], has_features=self.has_features[:n_users],
+                    group_sizes=self.group_sizes[:n_groups], medians=self.medians[:n_groups],
+                    mads=self.mads[:n_groups], percentile_values=self.percentile_values[:n_groups]
+                )
+
+        replace_atomically(directory, '.npz', path, write)
+        return path
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            baselines = cls(n_features=data['features'].shape[1], percentiles=data['percentiles'].tolist(),
+                            capacity=max(1, len(data['user_ids'])))
+            baselines._user_rows(data['user_ids'].tolist())
+            for group in data['group_names'].tolist():
+                baselines._group_id(group)
+            n_users, n_groups = len(baselines.user_ids), len(baselines.group_names)
+            baselines.features[:n_users] = data['features']
+            baselines.has_features[:n_users] = data['has_features']
+            baselines.group_sizes[:n_groups] = data['group_sizes']
+            baselines.medians[:n_groups] = data['medians']
+            baselines.mads[:n_groups] = data['mads']
+            baselines.percentile_values[:n_groups] = data['percentile_values']
+            for row, group_id in data['memberships'].tolist():
+                baselines.user_groups[row] = baselines.user_groups.get(row, ()) + (group_id,)
+                baselines.members[group_id].add(row)
+            baselines.dirty = set(data['dirty'].tolist())
+        return baselines
@@ -0,0 +1,457 @@
+# ml-engine/scripts/pii_detectors.py
+"""
+Детекторы структурированных чувствительных данных в тексте документа:
+
+- credit_card - номера платежных карт (13-19 цифр, контрольная сумма Луна);
+- iban - международные номера счетов (длина по стране, контрольная сумма mod-97, ISO 13616);
+- kz_iin - ИИН Казахстана (дата рождения и контрольный разряд с двумя наборами весов);
+- ru_inn - ИНН России (10 и 12 цифр, контрольные разряды);
+- ru_snils - СНИЛС (контрольное число);
+- us_ssn - SSN США (ограничения на номер области, группы и серии);
+- email - адреса электронной почты (длины частей и меток домена);
+- phone - телефоны (10-15 цифр, формат разделителей);
+- secret - ключи API и секреты (AWS, GitHub, Slack, Stripe, Google, JWT, закрытые ключи,
+  присваивания password/api_key/... со значением высокой энтропии).
+
+Каждый детектор - два этапа: быстрый проход регулярным выражением находит кандидатов,
+затем кандидаты всего документа проверяются пакетом: контрольные суммы считаются
+векторизованно (numpy) по матрице цифр всех кандидатов сразу. Совпадения разных детекторов
+на одном фрагменте разрешаются по порядку детекторов: фрагмент остается за детектором
+с проверкой контрольной суммы (номер СНИЛС не засчитывается еще и телефоном).
+
+Выражения, начинающиеся с классов символов (\\d, [A-Za-z0-9...]), движок re проверяет в каждой позиции
+текста. Поэтому у таких детекторов есть якорь - символы, без которых совпадения не бывает (цифры,
+"@", ":" и "="): в длинном документе якоря находятся одним векторизованным проходом по кодам символов,
+и выражение выполняется только по окнам вокруг них, склеенным через "\\x00" (его не принимает ни одно
+выражение детекторов). Окна вокруг цифр общие для всех числовых детекторов.
+
+Значения найденных данных не возвращаются - только типы, количества и позиции.
+"""
+import base64
+import json
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+DEFAULT_MAX_SPANS = 10
+# Документы короче этого (в символах) проверяются выражениями целиком: у прохода по якорям
+# фиксированные накладные расходы numpy
+SHORT_TEXT_CHARS = 4096
+# Потоковая проверка (StreamingPiiScan): столько символов контекста с каждой стороны вхождения на стыке
+# сегментов (значения длиннее не находятся на стыке, например очень длинный закрытый ключ)
+STREAM_OVERLAP_CHARS = 4096
+_WINDOW_SEPARATOR = '\x00'
+
+_SEPARATORS = str.maketrans('', '', ' -().+')
+
+# Длины IBAN по странам (реестр SWIFT)
+IBAN_LENGTHS = {
+    'AD': 24, 'AE': 23, 'AL': 28, 'AT': 20, 'AZ': 28, 'BA': 20, 'BE': 16, 'BG': 22, 'BH': 22, 'BI': 27,
+    'BR': 29, 'BY': 28, 'CH': 21, 'CR': 22, 'CY': 28, 'CZ': 24, 'DE': 22, 'DJ': 27, 'DK': 18, 'DO': 28,
+    'EE': 20, 'EG': 29, 'ES': 24, 'FI': 18, 'FK': 18, 'FO': 18, 'FR': 27, 'GB': 22, 'GE': 22, 'GI': 23,
+    'GL': 18, 'GR': 27, 'GT': 28, 'HR': 21, 'HU': 28, 'IE': 22, 'IL': 23, 'IQ': 23, 'IS': 26, 'IT': 27,
+    'JO': 30, 'KW': 30, 'KZ': 20, 'LB': 28, 'LC': 32, 'LI': 21, 'LT': 20, 'LU': 20, 'LV': 21, 'LY': 25,
+    'MC': 27, 'MD': 24, 'ME': 22, 'MK': 19, 'MN': 20, 'MR': 27, 'MT': 31, 'MU': 30, 'NI': 28, 'NL': 18,
+    'NO': 15, 'OM': 23, 'PK': 24, 'PL': 28, 'PS': 29, 'PT': 25, 'QA': 29, 'RO': 24, 'RS': 22, 'RU': 33,
+    'SA': 24, 'SC': 31, 'SD': 18, 'SE': 24, 'SI': 19, 'SK': 24, 'SM': 27, 'SO': 23, 'ST': 25, 'SV': 28,
+    'TL': 23, 'TN': 24, 'TR': 26, 'UA': 29, 'VA': 22, 'VG': 24, 'XK': 20, 'YE': 30,
+}
+
+
+def _digit_matrix(values, width: int) -> np.ndarray:
+    """Цифры значений (только цифры, длина <= width) матрицей (n, width), выровненной вправо нулями."""
+    if not values:
+        return np.zeros((0, width), dtype=np.int64)
+    joined = ''.join(value.rjust(width, '0') for value in values).encode('ascii')
+    return (np.frombuffer(joined, dtype=np.uint8).reshape(len(values), width) - 48).astype(np.int64)
+
+
+def luhn_valid(values) -> np.ndarray:
+    """Контрольная сумма Луна для строк цифр (до 19): удваивается каждая вторая цифра справа."""
+    digits = _digit_matrix(values, 19)
+    doubled = digits * 2
+    doubled -= 9 * (doubled > 9)
+    every_second = (np.arange(19)[::-1] % 2 == 1)
+    return np.where(every_second, doubled, digits).sum(axis=1) % 10 == 0
+
+
+def iban_valid(values) -> np.ndarray:
+    """Проверка IBAN (прописные буквы и цифры без пробелов): длина для страны и остаток 1 по модулю 97."""
+    valid = np.array([IBAN_LENGTHS.get(value[:2]) == len(value) for value in values], dtype=bool)
+    if not valid.any():
+        return valid
+    # Первые 4 символа переносятся в конец, буквы заменяются числами 10-35 (по две цифры)
+    rearranged = [value[4:] + value[:4] for value in values]
+    width = max(map(len, rearranged))
+    codes = np.frombuffer(''.join(value.ljust(width) for value in rearranged).encode('ascii'), dtype=np.uint8)
+    codes = codes.reshape(len(values), width).astype(np.int64)
+    numbers = np.where(codes >= 65, codes - 55, codes - 48)
+    lengths = np.array([len(value) for value in rearranged])
+    remainder = np.zeros(len(values), dtype=np.int64)
+    for column in range(width):
+        number = numbers[:, column]
+        shifted = remainder * np.where(number >= 10, 100, 10) + number
+        remainder = np.where(column < lengths, shifted % 97, remainder)
+    return valid & (remainder == 1)
+
+
+_IIN_WEIGHTS = (np.arange(1, 12), np.array([3, 4, 5, 6, 7, 8, 9, 10, 11, 1, 2]))
+
+
+def kz_iin_valid(values) -> np.ndarray:
+    """ИИН: месяц и день рождения, разряд века и пола 0-6 и контрольный разряд (mod 11, второй набор весов при 10)."""
+    digits = _digit_matrix(values, 12)
+    month = digits[:, 2] * 10 + digits[:, 3]
+    day = digits[:, 4] * 10 + digits[:, 5]
+    checksum = (digits[:, :11] * _IIN_WEIGHTS[0]).sum(axis=1) % 11
+    checksum = np.where(checksum == 10, (digits[:, :11] * _IIN_WEIGHTS[1]).sum(axis=1) % 11, checksum)
+    return ((month >= 1) & (month <= 12) & (day >= 1) & (day <= 31) & (digits[:, 6] <= 6)
+            & (checksum != 10) & (checksum == digits[:, 11]))
+
+
+_INN10_WEIGHTS = np.array([2, 4, 10, 3, 5, 9, 4, 6, 8])
+_INN11_WEIGHTS = np.array([7, 2, 4, 10, 3, 5, 9, 4, 6, 8])
+_INN12_WEIGHTS = np.array([3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8])
+
+
+def ru_inn_valid(values) -> np.ndarray:
+    """ИНН: 10 цифр - один контрольный разряд, 12 цифр - два ((сумма с весами mod 11) mod 10)."""
+    lengths = np.array([len(value) for value in values])
+    digits = _digit_matrix(values, 12)
+    short = digits[:, 2:]  # 10-значный ИНН, выровненный вправо
+    valid10 = (short[:, :9] * _INN10_WEIGHTS).sum(axis=1) % 11 % 10 == short[:, 9]
+    valid12 = (((digits[:, :10] * _INN11_WEIGHTS).sum(axis=1) % 11 % 10 == digits[:, 10])
+               & ((digits[:, :11] * _INN12_WEIGHTS).sum(axis=1) % 11 % 10 == digits[:, 11]))
+    return np.where(lengths == 10, valid10, (lengths == 12) & valid12)
+
+
+def ru_snils_valid(values) -> np.ndarray:
+    """СНИЛС: сумма первых 9 цифр с весами 9..1 -> контрольное число (mod 101, 100 -> 00); номера выше 001-001-998."""
+    digits = _digit_matrix(values, 11)
+    total = (digits[:, :9] * np.arange(9, 0, -1)).sum(axis=1)
+    checksum = np.where(total < 100, total, total % 101)
+    checksum = np.where(checksum == 100, 0, checksum)
+    number = (digits[:, :9] * 10 ** np.arange(8, -1, -1)).sum(axis=1)
+    return (number > 1001998) & (checksum == digits[:, 9] * 10 + digits[:, 10])
+
+
+def us_ssn_valid(values) -> np.ndarray:
+    """SSN: область не 000, 666 и не 9xx, группа не 00, серия не 0000."""
+    digits = _digit_matrix(values, 9)
+    area = digits[:, 0] * 100 + digits[:, 1] * 10 + digits[:, 2]
+    group = digits[:, 3] * 10 + digits[:, 4]
+    serial = (digits[:, 5:] * np.array([1000, 100, 10, 1])).sum(axis=1)
+    return (area != 0) & (area != 666) & (area < 900) & (group != 0) & (serial != 0)
+
+
+def shannon_entropy(value: str) -> float:
+    """Энтропия Шеннона символов строки, бит на символ."""
+    counts = Counter(value)
+    return -sum(count / len(value) * math.log2(count / len(value)) for count in counts.values())
+
+
+def anchor_windows(text: str, anchor, codes=None):
+    """
+    Окна документа вокруг символов якоря `anchor` = (символы, до, после): (склеенный текст окон,
+    начала окон в документе, начала окон в склеенном тексте). `codes` - коды символов документа (uint32),
+    если уже посчитаны.
+    """
+    chars, before, after = anchor
+    if codes is None:
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    ords = sorted(map(ord, chars))
+    if ords[-1] - ords[0] + 1 == len(ords):
+        # Непрерывный диапазон (цифры): одно сравнение, коды меньше начала переполняются вверх
+        mask = (codes - np.uint32(ords[0])) < len(ords)
+    else:
+        mask = np.isin(codes, ords)
+    padded = np.zeros(len(mask) + 2, dtype=np.int8)
+    padded[1:-1] = mask
+    edges = np.flatnonzero(np.diff(padded))
+    empty = np.zeros(0, dtype=np.int64)
+    if not len(edges):
+        return '', empty, empty
+    starts = np.maximum(edges[0::2] - before, 0)
+    ends = np.minimum(edges[1::2] + after, len(mask))
+    # Пересекающиеся и соседние окна объединяются
+    breaks = np.flatnonzero(starts[1:] > ends[:-1])
+    window_starts = np.concatenate([starts[:1], starts[breaks + 1]])
+    window_ends = np.concatenate([ends[breaks], ends[-1:]])
+    lengths = window_ends - window_starts
+    joined_starts = np.concatenate([[0], np.cumsum(lengths[:-1] + 1)])
+    joined = _WINDOW_SEPARATOR.join(text[start:end] for start, end in zip(window_starts.tolist(), window_ends.tolist()))
+    return joined, window_starts, joined_starts
+
+
+class PiiDetector:
+    """
+    Детектор одного типа данных: `pattern` находит кандидатов (группа `group` - проверяемое значение
+    и его позиция), `validate(values)` возвращает маску подтвержденных кандидатов для их списка
+    (после `normalize`, например удаления разделителей). `anchor` - (символы, до, после): кандидаты
+    в длинном документе ищутся только в окнах вокруг этих символов (см. anchor_windows).
+    """
+
+    def __init__(self, name: str, pattern, validate, normalize=None, group: int = 0, anchor=None):
+        self.name = name
+        self.pattern = pattern
+        self.validate = validate
+        self.normalize = normalize
+        self.group = group
+        self.anchor = anchor
+
+    def find(self, text: str, windows=None):
+        """
+        Подтвержденные вхождения: массивы (starts, ends) в символах текста. `windows` - результат
+        anchor_windows(text, self.anchor), если уже посчитан для другого детектора с тем же якорем.
+        """
+        if windows is None and self.anchor is not None and len(text) >= SHORT_TEXT_CHARS:
+            windows = anchor_windows(text, self.anchor)
+        source = windows[0] if windows is not None else text
+        starts, ends, values = [], [], []
+        group = self.group
+        for match in self.pattern.finditer(source):
+            starts.append(match.start(group))
+            ends.append(match.end(group))
+            value = match.group(group)
+            values.append(self.normalize(value) if self.normalize else value)
+        if not values:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        valid = np.asarray(self.validate(values), dtype=bool)
+        starts = np.array(starts, dtype=np.int64)[valid]
+        ends = np.array(ends, dtype=np.int64)[valid]
+        if windows is not None:
+            # Позиции в склеенном тексте -> в документе: сдвиг окна, в котором найдено вхождение
+            _, window_starts, joined_starts = windows
+            shift = (window_starts - joined_starts)[np.searchsorted(joined_starts, starts, side='right') - 1]
+            starts, ends = starts + shift, ends + shift
+        return starts, ends
+
+
+def _strip_separators(value: str) -> str:
+    return value.translate(_SEPARATORS)
+
+
+def _card_valid(values) -> np.ndarray:
+    valid = np.array([13 <= len(value) <= 19 for value in values], dtype=bool)
+    if valid.any():
+        valid[valid] = luhn_valid([value for value, ok in zip(values, valid) if ok])
+    return valid
+
+
+def _email_valid(values) -> np.ndarray:
+    def valid(value):
+        local, _, domain = value.rpartition('@')
+        labels = domain.split('.')
+        return (len(local) <= 64 and len(value) <= 254 and not local.startswith('.') and '..' not in value
+                and all(label and len(label) <= 63 and label[0] != '-' and label[-1] != '-' for label in labels))
+    return np.array([valid(value) for value in values], dtype=bool)
+
+
+def _phone_valid(values) -> np.ndarray:
+    """Международный номер (E.164) - 11-15 цифр с кодом страны, без "+" - 10-11 цифр; не из 1-2 повторяющихся цифр."""
+    # Кандидаты - только ASCII-цифры и разделители: символы всех кандидатов разбираются одним массивом
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    chars = np.frombuffer(''.join(values).encode('ascii'), dtype=np.uint8)
+    is_digit = (chars - 48) < 10
+    digit_counts = np.add.reduceat(is_digit.astype(np.int64), offsets)
+    owners = np.repeat(np.arange(len(values)), lengths)[is_digit]
+    distinct = (np.bincount(owners * 10 + (chars[is_digit] - 48), minlength=len(values) * 10)
+                .reshape(len(values), 10) > 0).sum(axis=1)
+    international = chars[offsets] == ord('+')
+    return (np.where(international, (digit_counts >= 11) & (digit_counts <= 15), (digit_counts >= 10) & (digit_counts <= 11))
+            & (distinct > 2))
+
+
+# Значения-заглушки в примерах конфигураций не считаются секретами
+_PLACEHOLDER = re.compile(r'(?i)example|changeme|your[_-]|xxxx|\*{3}|<|\$\{|placeholder|dummy|redacted')
+# Альтернативы начинаются с литералов (без вложенных групп), чтобы re искал их по первому символу
+_KEY_PATTERNS = (
+    r'AKIA[0-9A-Z]{16}', r'ASIA[0-9A-Z]{16}',           # идентификаторы ключей доступа AWS
+    r'gh[pousr]_[A-Za-z0-9]{36}',                       # токены GitHub
+    r'github_pat_[A-Za-z0-9_]{82}',
+    r'xox[abprs]-[A-Za-z0-9-]{10,72}',                  # токены Slack
+    r'sk_(?:live|test)_[A-Za-z0-9]{24,99}',             # ключи Stripe
+    r'rk_(?:live|test)_[A-Za-z0-9]{24,99}',
+    r'AIza[0-9A-Za-z_-]{35}',                           # ключи Google API
+    r'eyJ[A-Za-z0-9_-]{8,}\.eyJ[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]{16,}',  # JWT
+    r'-----BEGIN (?:RSA |EC |DSA |OPENSSH |ENCRYPTED )?PRIVATE KEY-----',
+)
+_SECRET_ASSIGNMENT = (
+    r'(?i:api[_-]?key|secret(?:[_-]?key)?|access[_-]?token|auth[_-]?token|password|passwd|pwd)'
+    r'["\']?\s{0,3}[:=]\s{0,3}["\']?([^\s"\'<>\x00]{12,200})'
+)
+
+
+def _key_valid(values) -> np.ndarray:
+    def valid(value):
+        if value.startswith('-----BEGIN'):
+            return True
+        if value.startswith('eyJ'):
+            # Заголовок JWT - JSON с алгоритмом подписи
+            try:
+                header = value.split('.', 1)[0]
+                return 'alg' in json.loads(base64.urlsafe_b64decode(header + '=' * (-len(header) % 4)))
+            except (ValueError, TypeError):
+                return False
+        # Формат ключа провайдера достаточно специфичен: отсеиваются только заглушки и повторы символов
+        return not _PLACEHOLDER.search(value) and shannon_entropy(value) >= 3.0
+    return np.array([valid(value) for value in values], dtype=bool)
+
+
+def _assignment_valid(values) -> np.ndarray:
+    # Значение присваивания - случайная строка: высокая энтропия, не одни буквы (не слово и не фраза)
+    return np.array([not _PLACEHOLDER.search(value) and not value.isalpha() and shannon_entropy(value) >= 3.5
+                     for value in values], dtype=bool)
+
+
+# Якоря: окна вокруг цифр покрывают разделители групп номера и символ перед ним для проверок границ;
+# окна вокруг "@" - локальную часть и домен адреса; вокруг ":" и "=" - имя ключа и значение присваивания
+_DIGITS = ('0123456789', 4, 4)
+_AT = ('@', 64, 256)
+_ASSIGN = (':=', 16, 210)
+
+# Порядок - приоритет при пересечении фрагментов: детекторы с контрольной суммой раньше.
+# Границы номеров проверяются просмотром назад после первого символа: выражение, начинающееся с класса
+# символов, re пропускает до подходящего символа без попытки совпадения в каждой позиции. Цифры - только
+# ASCII ([0-9], а не \d с цифрами всех письменностей): их разбирают проверки контрольных сумм
+DETECTORS = (
+    PiiDetector('credit_card', re.compile(r'[2-6](?<![0-9-][2-6])[0-9]{3}(?:[ -]?[0-9]{2,4}){3,5}(?![0-9-])'),
+                _card_valid, normalize=_strip_separators, anchor=_DIGITS),
+    PiiDetector('iban', re.compile(r'[A-Z](?<![A-Za-z0-9].)[A-Z][0-9]{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b'),
+                iban_valid, normalize=_strip_separators),
+    PiiDetector('kz_iin', re.compile(r'[0-9](?<![0-9][0-9])[0-9]{11}(?![0-9])'), kz_iin_valid, anchor=_DIGITS),
+    PiiDetector('ru_inn', re.compile(r'[0-9](?<![0-9][0-9])[0-9]{9}(?:[0-9]{2})?(?![0-9])'), ru_inn_valid, anchor=_DIGITS),
+    PiiDetector('ru_snils', re.compile(r'[0-9](?<![0-9][0-9])[0-9]{2}-?[0-9]{3}-?[0-9]{3}[ -]?[0-9]{2}(?![0-9])'),
+                ru_snils_valid, normalize=_strip_separators, anchor=_DIGITS),
+    PiiDetector('us_ssn', re.compile(r'[0-9](?<![0-9][0-9])[0-9]{2}-[0-9]{2}-[0-9]{4}(?![0-9])'), us_ssn_valid,
+                normalize=_strip_separators, anchor=_DIGITS),
+    PiiDetector('secret', re.compile('|'.join(_KEY_PATTERNS)), _key_valid),
+    PiiDetector('secret', re.compile(_SECRET_ASSIGNMENT), _assignment_valid, group=1, anchor=_ASSIGN),
+    PiiDetector('email', re.compile(r'[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]{1,63}(?:\.[A-Za-z0-9-]{1,63})*\.[A-Za-z]{2,24}\b'),
+                _email_valid, anchor=_AT),
+    PiiDetector('phone', re.compile(
+        r'[+(0-9](?<![\w+(].)(?:(?<=\+)[0-9]{1,3}[ .-]?(?:\([0-9]{2,4}\)|[0-9]{2,4})|(?<=\()[0-9]{2,4}\)|(?<=[0-9])[0-9]{0,3})'
+        r'(?:[ .-]?[0-9]{2,4}){2,4}(?!\w)'
+    ),
+                _phone_valid, anchor=_DIGITS),
+)
+PII_TYPES = tuple(dict.fromkeys(detector.name for detector in DETECTORS))
+
+
+class PiiScanner:
+    """
+    Набор детекторов (по умолчанию - все, `types` ограничивает типы) для документа.
+    scan(text) - подтвержденные вхождения по типам, summary(text) - ответ API (поле pii_found).
+    """
+
+    def __init__(self, types=None):
+        unknown = set(types or ()) - set(PII_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown PII types: {sorted(unknown)}")
+        self.detectors = [detector for detector in DETECTORS if types is None or detector.name in types]
+
+    def scan(self, text: str) -> dict:
+        """{тип: массив (n, 2) пар [start, end)} по возрастанию start; фрагмент достается первому детектору."""
+        kept_starts = np.zeros(0, dtype=np.int64)
+        kept_ends = np.zeros(0, dtype=np.int64)
+        found = {}
+        # Коды символов и окна якорей считаются один раз на документ
+        codes = None
+        windows = {}
+        for detector in self.detectors:
+            anchor = detector.anchor
+            if anchor is not None and len(text) >= SHORT_TEXT_CHARS and anchor not in windows:
+                if codes is None:
+                    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+                windows[anchor] = anchor_windows(text, anchor, codes)
+            starts, ends = detector.find(text, windows.get(anchor))
+            if not len(starts):
+                continue
+            if len(kept_starts):
+                # Пересечение с принятым фрагментом: ближайший принятый, начинающийся до конца кандидата
+                order = np.argsort(kept_starts)
+                kept_starts, kept_ends = kept_starts[order], kept_ends[order]
+                before = np.searchsorted(kept_starts, ends, side='left') - 1
+                latest_end = np.maximum.accumulate(kept_ends)
+                overlaps = (before >= 0) & (latest_end[np.maximum(before, 0)] > starts)
+                starts, ends = starts[~overlaps], ends[~overlaps]
+            spans = np.column_stack([starts, ends])
+            found[detector.name] = np.concatenate([found[detector.name], spans]) if detector.name in found else spans
+            kept_starts = np.concatenate([kept_starts, starts])
+            kept_ends = np.concatenate([kept_ends, ends])
+        return {name: spans[np.argsort(spans[:, 0], kind='stable')] for name, spans in found.items() if len(spans)}
+
+    def summary(self, text: str, max_spans: int = DEFAULT_MAX_SPANS) -> dict:
+        """{тип: {"count", "spans"}} только для найденных типов; spans - первые `max_spans` пар [start, end)."""
+        return {
+            name: {"count": len(spans), "spans": spans[:max_spans].tolist()}
+            for name, spans in self.scan(text).items()
+        }
+
+    def stream(self, max_spans: int = DEFAULT_MAX_SPANS):
+        """Поиск по документу, который поступает сегментами (см. StreamingPiiScan)."""
+        return StreamingPiiScan(self, max_spans)
+
+
+class StreamingPiiScan:
+    """
+    Поиск по документу, который поступает сегментами подряд (feed), с памятью на сегмент. Сегмент
+    проверяется вместе с хвостом предыдущего текста в 2 * STREAM_OVERLAP_CHARS символов, а учитываются
+    вхождения, начинающиеся не ближе STREAM_OVERLAP_CHARS к концу проверенного текста: у каждого
+    есть столько же контекста слева и справа, как при проверке документа целиком. Вхождения в конце
+    документа учитываются в summary(), которое возвращает то же, что PiiScanner.summary для всего документа.
+    """
+
+    def __init__(self, scanner: PiiScanner, max_spans: int = DEFAULT_MAX_SPANS):
+        self.scanner = scanner
+        self.max_spans = max_spans
+        self.counts = Counter()
+        self.spans = {}
+        self._tail = ''
+        self._offset = 0
+        self._reported_until = 0
+        self._reported_end = 0
+        self._finished = False
+
+    def feed(self, segment: str):
+        text = self._tail + segment
+        self._offset += len(segment)
+        self._report(text, self._offset - STREAM_OVERLAP_CHARS)
+        self._tail = text[-2 * STREAM_OVERLAP_CHARS:]
+
+    def _report(self, text: str, until: int):
+        """Учитывает вхождения `text` (заканчивается в позиции документа _offset), начинающиеся до `until`."""
+        if until <= self._reported_until:
+            return
+        shift = self._offset - len(text)
+        names, starts, ends = [], [], []
+        for name, spans in self.scanner.scan(text).items():
+            names.extend([name] * len(spans))
+            starts.append(spans[:, 0] + shift)
+            ends.append(spans[:, 1] + shift)
+        if names:
+            starts, ends = np.concatenate(starts), np.concatenate(ends)
+            for position in np.argsort(starts, kind='stable').tolist():
+                start, end = int(starts[position]), int(ends[position])
+                # Начало до _reported_until - учтено раньше; пересечение с учтенным - за ним
+                if not self._reported_until <= start < until or start < self._reported_end:
+                    continue
+                name = names[position]
+                self.counts[name] += 1
+                spans = self.spans.setdefault(name, [])
+                if len(spans) < self.max_spans:
+                    spans.append([start, end])
+                self._reported_end = end
+        self._reported_until = until
+
+    def summary(self) -> dict:
+        if not self._finished:
+            self._report(self._tail, self._offset)
+            self._finished = True
+        return {
+            detector.name: {"count": self.counts[detector.name], "spans": self.spans[detector.name]}
+            for detector in self.scanner.detectors if self.counts[detector.name]
+        }
@@ -0,0 +1,489 @@
+# ml-engine/scripts/policy_engine.py
+import bisect
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+
+from scripts.keyword_matcher import KeywordAutomaton
+from scripts.model_store import replace_atomically, write_json
+from scripts.regex_set import RegexSet
+from scripts.timestamps import parse_iso_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Операторы условий - как в backend/models/Policy.js
+OPERATORS = (
+    'contains', 'not_contains', 'matches_regex', 'not_matches_regex', 'equals', 'not_equals',
+    'is_one_of', 'is_not_one_of', 'greater_than', 'less_than', 'starts_with', 'ends_with'
+)
+# С какого числа подстрок (contains / not_contains) на поле они ищутся автоматом Ахо-Корасик за один
+# проход, а не проверкой "in" по каждой: до этого порога отдельные проверки быстрее (см. benchmarks/bench_keyword_matcher.py)
+AUTOMATON_MIN_NEEDLES = 128
+# Отрицательный оператор выполняется, если поле есть, а положительный для него не выполнился
+NEGATED_OPERATORS = {
+    'not_contains': 'contains',
+    'not_matches_regex': 'matches_regex',
+    'not_equals': 'equals',
+    'is_not_one_of': 'is_one_of'
+}
+
+
+class PolicyCompileError(ValueError):
+    """Политику нельзя скомпилировать: неизвестный оператор, неверное регулярное выражение или значение."""
+
+
+class CompiledPolicy:
+    """Включенная политика в плане вычисления; результат evaluate()."""
+
+    __slots__ = ('index', 'policy_id', 'name', 'version', 'actions', 'predicates', 'match_any')
+
+    def __init__(self, index, policy_id, name, version, actions, predicates, match_any):
+        self.index = index
+        self.policy_id = policy_id
+        self.name = name
+        self.version = version
+        self.actions = actions
+        self.predicates = predicates
+        # Должны выполниться все условия (ALL) или хотя бы одно (ANY)
+        self.match_any = match_any
+
+    def describe(self) -> dict:
+        return {"policy_id": self.policy_id, "name": self.name, "version": self.version, "actions": self.actions}
+
+
+def _value_key(value):
+    """Ключ точного сравнения: строки без учета регистра; логические значения не совпадают с 0/1."""
+    if isinstance(value, str):
+        return value.casefold()
+    if isinstance(value, bool):
+        return ('bool', value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    return str(value).casefold()
+
+
+def _to_number(value):
+    """Число из числа, числовой строки или даты ISO 8601 (Unix-время); None, если значение не сравнимо."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if not math.isnan(value) else None
+    if isinstance(value, str):
+        try:
+            number = float(value)
+            return number if not math.isnan(number) else None
+        except ValueError:
+            pass
+        try:
+            return parse_iso_timestamp(value)
+        except ValueError:
+            return None
+    return None
+
+
+class _FieldPlan:
+    """
+    Условия всех политик на одно поле события, сгруппированные по оператору:
+    точные значения и списки - словарь значение -> условия, префиксы и суффиксы - словари по длине
+    (пустой префикс или суффикс - в any_string: такие условия выполняются для любой строки),
+    пороги - отсортированные массивы (bisect), подстроки и регулярные выражения - списки.
+    Если подстрок много, они ищутся автоматом (keyword_automaton): номер слова -> [(условие, отрицательное ли)].
+    Регулярные выражения поля проверяются одним набором (regex_set) с тем же отображением в условия.
+    """
+
+    __slots__ = (
+        'exact', 'negated_exact', 'prefixes', 'suffixes', 'any_string', 'substrings', 'negated_substrings',
+        'regexes', 'negated_regexes', 'negated', 'greater', 'greater_predicates', 'less', 'less_predicates',
+        'keyword_automaton', 'keyword_predicates', 'scan_keywords', 'regex_set', 'regex_predicates'
+    )
+
+    def __init__(self):
+        self.exact = {}             # ключ значения -> условия equals / is_one_of
+        self.negated_exact = {}     # ключ значения -> условия not_equals / is_not_one_of
+        self.prefixes = {}          # длина -> {префикс: условия}
+        self.suffixes = {}
+        self.any_string = set()     # условия, выполненные для любого строкового значения
+        self.substrings = []        # (подстрока, условие)
+        self.negated_substrings = []
+        self.regexes = []           # (скомпилированное выражение, условие)
+        self.negated_regexes = []
+        self.negated = set()        # все отрицательные условия поля
+        self.greater = []           # пороги greater_than по возрастанию
+        self.greater_predicates = []
+        self.less = []              # пороги less_than по возрастанию
+        self.less_predicates = []
+        self.keyword_automaton = None
+        self.keyword_predicates = []
+        self.scan_keywords = False
+        self.regex_set = None
+        self.regex_predicates = []
+
+    @property
+    def needles(self) -> list:
+        return [needle for needle, _ in self.substrings + self.negated_substrings if needle]
+
+    def attach_keywords(self, automaton: KeywordAutomaton, scan: bool):
+        """
+        Связывает слова автомата (построенного по needles) с условиями поля. При scan подстроки
+        ищутся автоматом, а в списках остаются только пустые (они содержатся в любой строке).
+        """
+        ids = {keyword: index for index, keyword in enumerate(automaton.keywords)}
+        predicates = [[] for _ in automaton.keywords]
+        for negated, entries in ((False, self.substrings), (True, self.negated_substrings)):
+            for needle, predicate in entries:
+                if needle:
+                    predicates[ids[needle.lower()]].append((predicate, negated))
+        self.keyword_automaton = automaton
+        self.keyword_predicates = predicates
+        if scan:
+            self.substrings = [entry for entry in self.substrings if not entry[0]]
+            self.negated_substrings = [entry for entry in self.negated_substrings if not entry[0]]
+            self.scan_keywords = True
+
+    def attach_regexes(self, sandbox=None, automaton_cache_dir: str = None):
+        """Собирает выражения matches_regex / not_matches_regex поля в RegexSet (одинаковые - один раз)."""
+        patterns = {}
+        for negated, entries in ((False, self.regexes), (True, self.negated_regexes)):
+            for pattern, predicate in entries:
+                patterns.setdefault((pattern.pattern, pattern.flags), (pattern, []))[1].append((predicate, negated))
+        self.regex_set = RegexSet([pattern for pattern, _ in patterns.values()], sandbox=sandbox,
+                                  automaton_cache_dir=automaton_cache_dir)
+        self.regex_predicates = [predicates for _, predicates in patterns.values()]
+
+    def collect(self, values, hits: set):
+        """Добавляет в hits выполненные условия поля для значения (или списка значений) события."""
+        negated_hits = set()
+        for value in values:
+            if value is None:
+                continue
+            key = _value_key(value)
+            predicates = self.exact.get(key)
+            if predicates:
+                hits.update(predicates)
+            predicates = self.negated_exact.get(key)
+            if predicates:
+                negated_hits.update(predicates)
+
+            if isinstance(value, str):
+                folded = key
+                hits.update(self.any_string)
+                for length, by_prefix in self.prefixes.items():
+                    predicates = by_prefix.get(folded[:length])
+                    if predicates:
+                        hits.update(predicates)
+                for length, by_suffix in self.suffixes.items():
+                    predicates = by_suffix.get(folded[-length:]) if length <= len(folded) else None
+                    if predicates:
+                        hits.update(predicates)
+                if self.scan_keywords:
+                    for pattern_id in self.keyword_automaton.found(folded):
+                        for predicate, negated in self.keyword_predicates[pattern_id]:
+                            (negated_hits if negated else hits).add(predicate)
+                for substring, predicate in self.substrings:
+                    if substring in folded:
+                        hits.add(predicate)
+                for substring, predicate in self.negated_substrings:
+                    if substring in folded:
+                        negated_hits.add(predicate)
+                if self.regex_set is not None:
+                    for index in self.regex_set.search(value):
+                        for predicate, negated in self.regex_predicates[index]:
+                            (negated_hits if negated else hits).add(predicate)
+
+            if self.greater or self.less:
+                number = _to_number(value)
+                if number is not None:
+                    # value > порог для всех порогов левее позиции; value < порог - правее
+                    hits.update(self.greater_predicates[:bisect.bisect_left(self.greater, number)])
+                    hits.update(self.less_predicates[bisect.bisect_right(self.less, number):])
+        if self.negated:
+            hits.update(self.negated - negated_hits)
+
+
+def _field_values(event, path):
+    value = event
+    for part in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def policy_set_version(policies) -> str:
+    """Отпечаток набора политик: одинаков для одинакового содержимого независимо от источника."""
+    canonical = json.dumps(policies, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+class PolicyEngine:
+    """
+    Скомпилированный набор политик DLP (backend/models/Policy.js) для вычисления над событиями.
+
+    При компиляции включенные политики разбираются на условия; одинаковые условия разных политик
+    становятся одним предикатом. Предикаты группируются по полю события (_FieldPlan), поэтому
+    вычисление события затрагивает только поля, которые в нем есть: точные сравнения и списки
+    значений - один поиск в словаре на все политики, пороги - bisect по отсортированным порогам,
+    подстроки поля при большом их числе (AUTOMATON_MIN_NEEDLES) ищутся одним автоматом Ахо-Корасик
+    на поле. Автомат строится один раз на версию набора политик; с `automaton_cache_dir` его таблицы
+    сохраняются туда и открываются через mmap, поэтому процессы-воркеры с одним набором политик
+    делят одну копию. Регулярные выражения поля проверяются набором RegexSet: префильтр
+    по обязательным литералам, объединенные альтернации, а опасные и медленные выражения -
+    в песочнице `regex_sandbox` с ограничением времени.
+
+    Политики проверяются только через выполненные предикаты: у политики с логикой ALL есть
+    "якорь" - самый избирательный ее предикат (точные сравнения, префиксы, подстроки лучше порогов,
+    пороги лучше отрицаний; среди равных - реже используемый другими политиками). Политика
+    рассматривается, только если выполнился ее якорь, и тогда остальные ее предикаты проверяются
+    по множеству выполненных. Стоимость пропорциональна числу выполненных якорей, а не числу политик.
+
+    Семантика условий:
+    - условия политики объединяются по AND (conditionLogic = "ANY" - по OR);
+    - условие на отсутствующее поле не выполняется (в т.ч. отрицательное);
+    - строки сравниваются без учета регистра, кроме регулярных выражений;
+    - значение-список в событии: условие выполняется, если выполнено хотя бы для одного элемента,
+      а отрицательное - если положительное не выполнено ни для одного;
+    - значение-список в условии (contains, starts_with, equals, ...) означает "любое из".
+
+    Поле условия с точками ("metadata.filename") адресует вложенные объекты события.
+    """
+
+    def __init__(self, policies=(), version: str = None, automaton_cache_dir: str = None, regex_sandbox=None):
+        self.policies = []
+        self.errors = []
+        self.version = version
+        self.automaton_cache_dir = automaton_cache_dir
+        self._predicate_keys = {}
+        self._predicate_ranks = []
+        self._plans = {}        # поле -> _FieldPlan
+        self._by_top_field = {}  # ключ верхнего уровня события -> [(путь, план)]
+        for policy in policies:
+            self._add_policy(policy)
+        self._anchored = self._build_anchors()
+        for plan in self._plans.values():
+            if len(plan.needles) >= AUTOMATON_MIN_NEEDLES:
+                plan.attach_keywords(KeywordAutomaton.build_cached(plan.needles, automaton_cache_dir), scan=True)
+            if plan.regexes or plan.negated_regexes:
+                plan.attach_regexes(regex_sandbox, automaton_cache_dir)
+
+    def keyword_automaton(self, field: str = 'content'):
+        """
+        Автомат по подстрокам условий contains / not_contains на поле (для поиска ключевых слов
+        в документе, keywords_found); None, если таких условий нет. Для поля с небольшим числом
+        подстрок строится при первом обращении (при гонке потоков - возможно, дважды, с одинаковым результатом).
+        """
+        plan = self._plans.get(field)
+        if plan is None:
+            return None
+        if plan.keyword_automaton is None:
+            needles = plan.needles
+            if not needles:
+                return None
+            plan.attach_keywords(KeywordAutomaton.build_cached(needles, self.automaton_cache_dir), scan=False)
+        return plan.keyword_automaton
+
+    def _build_anchors(self):
+        """Для каждого предиката - политики, которые проверяются при его выполнении: [(индекс, остальные предикаты)]."""
+        usage = [0] * len(self._predicate_ranks)
+        for policy in self.policies:
+            for predicate in policy.predicates:
+                usage[predicate] += 1
+        anchored = [[] for _ in self._predicate_ranks]
+        for policy in self.policies:
+            if policy.match_any:
+                for predicate in policy.predicates:
+                    anchored[predicate].append((policy.index, ()))
+                continue
+            anchor = min(policy.predicates, key=lambda predicate: (self._predicate_ranks[predicate], usage[predicate]))
+            rest = tuple(predicate for predicate in policy.predicates if predicate != anchor)
+            anchored[anchor].append((policy.index, rest))
+        return anchored
+
+    @classmethod
+    def compile(cls, policies, automaton_cache_dir: str = None, regex_sandbox=None):
+        policies = list(policies)
+        engine = cls(policies, version=policy_set_version(policies), automaton_cache_dir=automaton_cache_dir,
+                     regex_sandbox=regex_sandbox)
+        for error in engine.errors:
+            logger.warning(f"Policy '{error['name']}' skipped: {error['error']}")
+        return engine
+
+    def __len__(self):
+        return len(self.policies)
+
+    def _plan(self, field: str) -> _FieldPlan:
+        plan = self._plans.get(field)
+        if plan is None:
+            plan = self._plans[field] = _FieldPlan()
+            path = tuple(field.split('.'))
+            self._by_top_field.setdefault(path[0], []).append((path, plan))
+        return plan
+
+    def _add_policy(self, policy: dict):
+        if not policy.get('isEnabled', True):
+            return
+        name = policy.get('name')
+        try:
+            conditions = policy.get('conditions') or []
+            if not conditions:
+                raise PolicyCompileError("Policy has no conditions")
+            compiled = [self._compile_condition(condition) for condition in conditions]
+        except (PolicyCompileError, re.error, TypeError, ValueError, AttributeError) as e:
+            self.errors.append({"policy_id": policy.get('_id', policy.get('id')), "name": name, "error": str(e)})
+            return
+
+        predicates = []
+        for key, register in compiled:
+            predicate = self._predicate_keys.get(key)
+            if predicate is None:
+                predicate = self._predicate_keys[key] = len(self._predicate_ranks)
+                # Избирательность оператора для выбора якоря: 0 - точные сравнения, подстроки, выражения
+                operator = key[1]
+                self._predicate_ranks.append(
+                    2 if operator in NEGATED_OPERATORS else 1 if operator in ('greater_than', 'less_than') else 0
+                )
+                register(predicate)
+            if predicate not in predicates:
+                predicates.append(predicate)
+        self.policies.append(CompiledPolicy(
+            index=len(self.policies),
+            policy_id=str(policy.get('_id', policy.get('id', name))),
+            name=name,
+            version=policy.get('version'),
+            actions=policy.get('actions') or [],
+            predicates=tuple(predicates),
+            match_any=str(policy.get('conditionLogic', 'ALL')).upper() == 'ANY'
+        ))
+
+    def _compile_condition(self, condition: dict):
+        """Возвращает (ключ предиката для дедупликации, функция регистрации предиката в плане поля)."""
+        field, operator, value = condition.get('field'), condition.get('operator'), condition.get('value')
+        if not field or not isinstance(field, str):
+            raise PolicyCompileError("Condition has no 'field'")
+        if operator not in OPERATORS:
+            raise PolicyCompileError(f"Unknown operator {operator!r}")
+        values = value if isinstance(value, list) else [value]
+        if not values or any(item is None for item in values):
+            raise PolicyCompileError(f"Condition on '{field}' has no value")
+        data_type = condition.get('dataType', 'string')
+        positive = NEGATED_OPERATORS.get(operator, operator)
+        negated = operator in NEGATED_OPERATORS
+        plan = self._plan(field)
+
+        if positive in ('equals', 'is_one_of'):
+            if data_type == 'number':
+                keys = frozenset(float(item) for item in values)
+            elif data_type == 'boolean':
+                keys = frozenset(('bool', item in (True, 'true', 'True', 1)) for item in values)
+            else:
+                keys = frozenset(_value_key(item) for item in values)
+            index = plan.negated_exact if negated else plan.exact
+
+            def register(predicate):
+                for key in keys:
+                    index.setdefault(key, []).append(predicate)
+                if negated:
+                    plan.negated.add(predicate)
+            return (field, operator, keys), register
+
+        if positive == 'contains':
+            needles = tuple(sorted({str(item).casefold() for item in values}))
+            target = plan.negated_substrings if negated else plan.substrings
+
+            def register(predicate):
+                target.extend((needle, predicate) for needle in needles)
+                if negated:
+                    plan.negated.add(predicate)
+            return (field, operator, needles), register
+
+        if positive == 'matches_regex':
+            # Каждый элемент списка - отдельное выражение со своими флагами ((?i) допустим только в начале
+            # выражения, поэтому элементы не склеиваются в одну альтернацию); условие - "любое из"
+            patterns = [re.compile(str(item)) for item in values]
+            target = plan.negated_regexes if negated else plan.regexes
+
+            def register(predicate):
+                target.extend((pattern, predicate) for pattern in patterns)
+                if negated:
+                    plan.negated.add(predicate)
+            return (field, operator, tuple(sorted({(pattern.pattern, pattern.flags) for pattern in patterns}))), register
+
+        if operator in ('starts_with', 'ends_with'):
+            affixes = tuple(sorted({str(item).casefold() for item in values}))
+            by_length = plan.prefixes if operator == 'starts_with' else plan.suffixes
+
+            def register(predicate):
+                for affix in affixes:
+                    if not affix:
+                        plan.any_string.add(predicate)  # пустой префикс/суффикс есть у любой строки
+                        continue
+                    by_length.setdefault(len(affix), {}).setdefault(affix, []).append(predicate)
+            return (field, operator, affixes), register
+
+        # greater_than / less_than: со списком значений - самый мягкий порог
+        thresholds = [_to_number(item) for item in values]
+        if any(threshold is None for threshold in thresholds):
+            raise PolicyCompileError(f"Condition on '{field}' needs a number or ISO 8601 date, got {value!r}")
+        if operator == 'greater_than':
+            threshold, thresholds_list, predicates_list = min(thresholds), plan.greater, plan.greater_predicates
+        else:
+            threshold, thresholds_list, predicates_list = max(thresholds), plan.less, plan.less_predicates
+
+        def register(predicate):
+            position = bisect.bisect_right(thresholds_list, threshold)
+            thresholds_list.insert(position, threshold)
+            predicates_list.insert(position, predicate)
+        return (field, operator, threshold), register
+
+    def matching_predicates(self, event: dict) -> set:
+        hits = set()
+        for key in event:
+            entries = self._by_top_field.get(key)
+            if entries is None:
+                continue
+            for path, plan in entries:
+                value = event[key] if len(path) == 1 else _field_values(event, path)
+                if value is None:
+                    continue
+                plan.collect(value if isinstance(value, list) else (value,), hits)
+        return hits
+
+    def evaluate(self, event: dict) -> list:
+        """Политики (CompiledPolicy), которым соответствует событие, в порядке компиляции."""
+        if not isinstance(event, dict):
+            return []
+        hits = self.matching_predicates(event)
+        matched = set()
+        anchored = self._anchored
+        for predicate in hits:
+            for index, rest in anchored[predicate]:
+                if not rest or hits.issuperset(rest):
+                    matched.add(index)
+        policies = self.policies
+        return [policies[index] for index in sorted(matched)]
+
+    def evaluate_many(self, events) -> list:
+        return [self.evaluate(event) for event in events]
+
+
+def load_policy_engine(path: str, automaton_cache_dir: str = None, regex_sandbox=None) -> PolicyEngine:
+    """
+    Компилирует политики из JSON-файла: массив политик, {"policies": [...]} или ответ
+    GET /api/policies backend ({"data": [...]}). `automaton_cache_dir` - каталог общих для процессов
+    автоматов ключевых слов, `regex_sandbox` - RegexSandbox для опасных выражений (см. PolicyEngine).
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('policies', data.get('data', []))
+    return PolicyEngine.compile(data, automaton_cache_dir=automaton_cache_dir, regex_sandbox=regex_sandbox)
+
+
+def save_policies(policies, path: str):
+    """Атомарно записывает набор политик (ModelRegistry в других процессах подхватит новый файл)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    replace_atomically(directory, '.json', path, lambda tmp_path: write_json(tmp_path, {"policies": list(policies)}))
+    return path
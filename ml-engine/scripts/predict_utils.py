@@ -1,7 +1,12 @@
 # ml-engine/scripts/predict_utils.py
 import numpy as np
+import pandas as pd
+from sklearn.base import is_outlier_detector
 # from scripts.preprocess import preprocess_text # Если предобработка нужна перед predict
 
+# Число строк в одном вызове модели при оценке всей популяции пользователей
+DEFAULT_UEBA_CHUNK_SIZE = 65536
+
 def make_prediction_text_classification(model, texts_to_predict: list[str]):
     """
     Делает предсказание с использованием загруженной модели классификации текста.
@@ -15,50 +20,143 @@ def make_prediction_text_classification(model, texts_to_predict: list[str]):
         tuple: (predictions, probabilities)
                predictions - список предсказанных меток.
                probabilities - список максимальных вероятностей для каждой предсказанной метки.
+
+    Векторизация (TF-IDF) выполняется один раз: вызывается только `predict_proba`,
+    а метки берутся как argmax по `classes_` матрицы вероятностей.
+    Раньше `predict` и `predict_proba` вызывались по очереди, и преобразование
+    текста выполнялось дважды.
     """
-    if not hasattr(model, 'predict') or not hasattr(model, 'predict_proba'):
-        raise ValueError("Model does not have 'predict' or 'predict_proba' methods.")
+    if not hasattr(model, 'predict_proba') or not hasattr(model, 'classes_'):
+        raise ValueError("Model does not have 'predict_proba' method or 'classes_' attribute.")
 
     # Если ваша модель ожидает предобработанный текст и это не часть пайплайна:
     # processed_texts = [preprocess_text(text) for text in texts_to_predict]
-    # predictions = model.predict(processed_texts)
     # probabilities_all_classes = model.predict_proba(processed_texts)
 
     # Если модель (пайплайн) обрабатывает сырой текст:
-    predictions = model.predict(texts_to_predict)
     probabilities_all_classes = model.predict_proba(texts_to_predict)
 
-    # Получаем максимальную вероятность для каждого предсказания
+    # Индекс наиболее вероятного класса совпадает с тем, что вернул бы model.predict
+    best_class_indices = np.argmax(probabilities_all_classes, axis=1)
+    predictions = np.asarray(model.classes_)[best_class_indices]
+
+    # Максимальная вероятность для каждого предсказания
     # (соответствует вероятности предсказанного класса)
-    max_probabilities = np.max(probabilities_all_classes, axis=1)
+    max_probabilities = probabilities_all_classes[np.arange(len(best_class_indices)), best_class_indices]
 
     return predictions, max_probabilities
 
 
+def make_prediction_text_classification_batch(model, texts_to_predict: list[str], chunk_size: int = 64):
+    """
+    Пакетная классификация большого списка документов.
+    Документы обрабатываются векторизованными чанками по `chunk_size` штук,
+    а ошибка в одном документе не роняет весь пакет: если чанк целиком
+    не прошел через модель, его документы переоцениваются по одному.
+
+    Args:
+        model: Обученная модель/пайплайн.
+        texts_to_predict: Список строк для классификации.
+        chunk_size: Количество документов в одном вызове модели.
+
+    Returns:
+        tuple: (results, errors)
+               results - список той же длины, что и texts_to_predict, с парами
+                         (метка, вероятность) или None для документов с ошибкой.
+               errors - словарь {индекс документа: текст ошибки}.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer.")
+
+    results = [None] * len(texts_to_predict)
+    errors = {}
+    for start in range(0, len(texts_to_predict), chunk_size):
+        chunk = texts_to_predict[start:start + chunk_size]
+        try:
+            predictions, probabilities = make_prediction_text_classification(model, chunk)
+        except Exception:
+            # Изолируем проблемный документ: прогоняем чанк поэлементно
+            for offset, text in enumerate(chunk):
+                try:
+                    prediction, probability = make_prediction_text_classification(model, [text])
+                    results[start + offset] = (prediction[0], float(probability[0]))
+                except Exception as e:
+                    errors[start + offset] = str(e)
+            continue
+        for offset, (prediction, probability) in enumerate(zip(predictions, probabilities)):
+            results[start + offset] = (prediction, float(probability))
+
+    return results, errors
+
+
 # Пример для UEBA (потребует адаптации, когда модель будет готова)
 def make_prediction_ueba(model, feature_dataframe):
     """
     Делает предсказание аномалии с использованием модели UEBA.
+
+    Модель вызывается один раз: метки выводятся из той же оценки, что возвращается
+    как anomaly_scores, а не отдельным вызовом `predict`.
+    - Детекторы выбросов (IsolationForest, OneClassSVM, LocalOutlierFactor(novelty=True)):
+      decision_function; -1 (аномалия) там, где оценка < 0 - так же устроен их predict.
+    - Классификаторы с decision_function: бинарный случай - classes_[оценка > 0];
+      в многоклассовом predict может не совпадать с argmax, поэтому он вызывается отдельно.
+    - Классификаторы с predict_proba: argmax по classes_; оценка - вероятность класса "аномалия"
+      (для бинарной классификации) или максимальная вероятность.
     """
     if not hasattr(model, 'predict'):
         raise ValueError("UEBA Model does not have a 'predict' method.")
 
-    predictions = model.predict(feature_dataframe) # Например, 0 - норма, 1 - аномалия
-
-    anomaly_scores = None
     if hasattr(model, 'decision_function'): # Для моделей типа IsolationForest, OneClassSVM
         anomaly_scores = model.decision_function(feature_dataframe)
-    elif hasattr(model, 'predict_proba'): # Если это классификатор, дающий вероятности
-        # Для бинарной классификации, score может быть вероятностью класса "аномалия"
+        if is_outlier_detector(model):
+            predictions = np.where(anomaly_scores < 0, -1, 1)
+        elif hasattr(model, 'classes_') and np.ndim(anomaly_scores) == 1:
+            predictions = np.asarray(model.classes_)[(anomaly_scores > 0).astype(int)]
+        else:
+            predictions = model.predict(feature_dataframe)
+    elif hasattr(model, 'predict_proba') and hasattr(model, 'classes_'): # Если это классификатор, дающий вероятности
         proba = model.predict_proba(feature_dataframe)
+        predictions = np.asarray(model.classes_)[np.argmax(proba, axis=1)]
+        # Для бинарной классификации, score может быть вероятностью класса "аномалия"
         if proba.shape[1] == 2: # Бинарная классификация
             anomaly_scores = proba[:, 1] # Вероятность класса "аномалия"
         else: # Многоклассовая (редко для чистого обнаружения аномалий)
             anomaly_scores = np.max(proba, axis=1)
-
+    else:
+        predictions = model.predict(feature_dataframe) # Например, 0 - норма, 1 - аномалия
+        anomaly_scores = None
 
     return predictions, anomaly_scores
 
+
+def make_prediction_ueba_chunks(model, features, chunk_size: int = DEFAULT_UEBA_CHUNK_SIZE):
+    """
+    Оценка всей популяции (например, ночной пересчет по строкам пользователь-день).
+
+    Признаки один раз собираются в непрерывную матрицу float64 (DataFrame - в порядке
+    столбцов, на которых обучалась модель), затем оцениваются чанками по `chunk_size`
+    строк через make_prediction_ueba. Генератор отдает (start, predictions, anomaly_scores)
+    для строк [start, start + len(predictions)): вызывающий код пишет результаты по мере
+    готовности, и в памяти одновременно находятся только матрица и результаты одного чанка.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer.")
+    feature_names = getattr(model, 'feature_names_in_', None)
+    if hasattr(features, 'columns'):
+        columns = list(feature_names) if feature_names is not None else list(features.columns)
+        matrix = np.ascontiguousarray(features[columns].to_numpy(dtype=np.float64))
+    else:
+        columns = None
+        matrix = np.ascontiguousarray(features, dtype=np.float64)
+
+    for start in range(0, len(matrix), chunk_size):
+        chunk = matrix[start:start + chunk_size]
+        if feature_names is not None:
+            # Модель обучена на DataFrame: обертка над срезом без копирования, чтобы sklearn не предупреждал об именах
+            chunk = pd.DataFrame(chunk, columns=columns, copy=False)
+        predictions, anomaly_scores = make_prediction_ueba(model, chunk)
+        yield start, predictions, anomaly_scores
+
 if __name__ == '__main__':
     # Этот блок не будет выполняться при импорте, но полезен для тестирования функций здесь
     # Загрузите модель, чтобы протестировать make_prediction_text_classification
@@ -0,0 +1,217 @@
+# ml-engine/scripts/prediction_cache.py
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from prometheus_client import Counter
+
+try:
+    import redis  # Необязательная зависимость: общий уровень кэша в Redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_HITS = Counter('ml_engine_prediction_cache_hits_total', 'Prediction cache hits', ['namespace', 'tier'])
+CACHE_MISSES = Counter('ml_engine_prediction_cache_misses_total', 'Prediction cache misses', ['namespace'])
+CACHE_EVICTIONS = Counter(
+    'ml_engine_prediction_cache_evictions_total',
+    'Entries removed from the in-process prediction cache',
+    ['namespace', 'reason']  # reason: capacity | ttl | model_changed
+)
+
+
+def file_fingerprint(path: str) -> str:
+    """Хэш содержимого файла модели: меняется при каждом переобучении/замене файла."""
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализация текста для ключа кэша: схлопывание пробельных символов.
+    Для словных токенизаторов (TfidfVectorizer с analyzer='word') это
+    не меняет результат векторизации, поэтому ответ из кэша совпадает
+    с ответом модели.
+    """
+    return " ".join(text.split())
+
+
+class LocalTTLCache:
+    """Потокобезопасный LRU-кэш в памяти процесса с ограничением по размеру и TTL."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600, namespace: str = 'default'):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                CACHE_EVICTIONS.labels(self.namespace, 'ttl').inc()
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                CACHE_EVICTIONS.labels(self.namespace, 'capacity').inc()
+
+    def clear(self, reason: str = 'model_changed'):
+        with self._lock:
+            if self._data:
+                CACHE_EVICTIONS.labels(self.namespace, reason).inc(len(self._data))
+            self._data.clear()
+
+
+class PredictionCache:
+    """
+    Двухуровневый кэш результатов модели, ключ - хэш нормализованного текста
+    и версия модели.
+
+    - Уровень 1: LocalTTLCache в памяти процесса.
+    - Уровень 2 (необязательный): общий Redis, через который результаты
+      видят все воркеры и реплики.
+
+    `model_version` - функция, возвращающая версию (отпечаток) текущей модели.
+    Версия входит в ключ, поэтому после замены файла модели старые записи
+    в Redis перестают находиться, а локальный уровень очищается целиком.
+    Ошибки Redis не прерывают предсказание: запрос считается промахом.
+    """
+
+    def __init__(self, model_version, max_entries: int = 10000, ttl_seconds: float = 3600,
+                 redis_client=None, redis_ttl_seconds: int = 86400, namespace: str = 'doc_sensitivity'):
+        self.model_version = model_version
+        self.namespace = namespace
+        self.local = LocalTTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds, namespace=namespace)
+        self.redis_client = redis_client
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self._local_version = None
+        self._version_lock = threading.Lock()
+
+    def _current_version(self) -> str:
+        version = self.model_version()
+        if version != self._local_version:
+            with self._version_lock:
+                if version != self._local_version:
+                    self.local.clear('model_changed')
+                    self._local_version = version
+        return version
+
+    def make_key(self, text: str, version: str) -> str:
+        digest = hashlib.blake2b(normalize_text(text).encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+        return f"mlcache:{self.namespace}:{version}:{digest}"
+
+    def get_many(self, texts: list[str], version: str = None):
+        """
+        Возвращает (ключи, значения); для промахов значение равно None.
+        `version` - версия модели, которой будут оценены промахи. Передается, когда
+        запрос уже взял конкретную версию модели, а текущая могла смениться.
+        """
+        # _current_version() вызывается всегда: при смене модели он очищает локальный уровень
+        current_version = self._current_version()
+        version = current_version if version is None else version
+        keys = [self.make_key(text, version) for text in texts]
+        values = [self.local.get(key) for key in keys]
+        for value in values:
+            if value is not None:
+                CACHE_HITS.labels(self.namespace, 'local').inc()
+
+        missing = [index for index, value in enumerate(values) if value is None]
+        if missing and self.redis_client is not None:
+            try:
+                remote_values = self.redis_client.mget([keys[index] for index in missing])
+            except Exception as e:
+                logger.warning(f"Prediction cache: Redis lookup failed: {e}")
+                remote_values = [None] * len(missing)
+            for index, raw in zip(missing, remote_values):
+                if raw is not None:
+                    values[index] = np.frombuffer(raw, dtype=np.float64)
+                    self.local.set(keys[index], values[index])
+                    CACHE_HITS.labels(self.namespace, 'redis').inc()
+
+        misses = sum(1 for value in values if value is None)
+        if misses:
+            CACHE_MISSES.labels(self.namespace).inc(misses)
+        return keys, values
+
+    def set_many(self, keys: list[str], values):
+        for key, value in zip(keys, values):
+            self.local.set(key, value)
+        if self.redis_client is not None and keys:
+            try:
+                pipeline = self.redis_client.pipeline(transaction=False)
+                for key, value in zip(keys, values):
+                    pipeline.setex(key, self.redis_ttl_seconds, np.asarray(value, dtype=np.float64).tobytes())
+                pipeline.execute()
+            except Exception as e:
+                logger.warning(f"Prediction cache: Redis store failed: {e}")
+
+
+class CachedTextModel:
+    """
+    Обертка над моделью классификации текста с кэшем строк predict_proba.
+    Предоставляет `classes_` и `predict_proba`, поэтому прозрачно передается
+    в make_prediction_text_classification и make_prediction_text_classification_batch.
+    Модель вызывается одним векторизованным вызовом только для промахов.
+    `model_version` - версия именно этой модели для ключей кэша (см. PredictionCache.get_many).
+    """
+
+    def __init__(self, model, cache: PredictionCache, model_version: str = None):
+        self.model = model
+        self.cache = cache
+        self.model_version = model_version
+
+    @property
+    def classes_(self):
+        return self.model.classes_
+
+    def predict_proba(self, texts):
+        texts = list(texts)
+        keys, rows = self.cache.get_many(texts, version=self.model_version)
+
+        # Одинаковые тексты внутри одного запроса оцениваются один раз
+        pending = {}
+        for index, row in enumerate(rows):
+            if row is None:
+                pending.setdefault(keys[index], []).append(index)
+        if pending:
+            first_indices = [indices[0] for indices in pending.values()]
+            computed = self.model.predict_proba([texts[index] for index in first_indices])
+            self.cache.set_many(list(pending), list(computed))
+            for indices, row in zip(pending.values(), computed):
+                for index in indices:
+                    rows[index] = row
+
+        return np.vstack(rows) if rows else np.empty((0, len(self.classes_)))
+
+    def predict(self, texts):
+        return np.asarray(self.classes_)[np.argmax(self.predict_proba(texts), axis=1)]
+
+
+def create_redis_client(host: str, port: int, db: int = 0):
+    """Создает клиент Redis для общего уровня кэша или возвращает None, если пакет redis не установлен."""
+    if redis is None:
+        logger.warning("Prediction cache: 'redis' package is not installed, shared cache tier is disabled.")
+        return None
+    return redis.Redis(host=host, port=port, db=db, socket_timeout=0.5, socket_connect_timeout=0.5)
@@ -12,15 +12,26 @@ import string
 # stemmer = PorterStemmer()
 # lemmatizer = WordNetLemmatizer()
 
+# Паттерны и таблица перевода компилируются один раз при импорте модуля
+URL_PATTERN = re.compile(r'(?:http|www)\S+')  # эквивалент r'http\S+|www\S+|https\S+'
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+# Та же таблица, но '@' сохраняется, чтобы после перевода можно было отбросить email-слова
+PUNCTUATION_TABLE_KEEP_AT = str.maketrans('', '', string.punctuation.replace('@', ''))
+
+
 def preprocess_text(text: str) -> str:
     """
     Базовая функция предварительной обработки текста.
     - Приведение к нижнему регистру
+    - Удаление URL-адресов и email-адресов
     - Удаление пунктуации
-    - Удаление чисел (опционально)
     - Удаление лишних пробелов
-    - (Опционально) Удаление стоп-слов
-    - (Опционально) Стемминг или лемматизация
+    - (Опционально) Удаление чисел, стоп-слов, стемминг или лемматизация
+
+    Паттерны скомпилированы при импорте, регулярное выражение для URL запускается
+    только при наличии литералов 'http'/'www', а email-адреса отбрасываются
+    на уровне слов. Обычный документ проходит за lower() + translate() + split()/join()
+    без промежуточных копий от re.sub.
     """
     if not isinstance(text, str):
         return ""
@@ -29,32 +40,42 @@ def preprocess_text(text: str) -> str:
     text = text.lower()
 
     # 2. Удаление URL-адресов
-    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-
-    # 3. Удаление email-адресов
-    text = re.sub(r'\S*@\S*\s?', '', text)
-
-    # 4. Удаление пунктуации
-    text = text.translate(str.maketrans('', '', string.punctuation))
+    if 'http' in text or 'www' in text:
+        text = URL_PATTERN.sub('', text)
 
-    # 5. Удаление чисел (если нужно)
+    # 3. Удаление чисел (если нужно)
     # text = re.sub(r'\d+', '', text)
 
-    # 6. Токенизация (простое разделение по пробелам для примера)
-    words = text.split()
+    # 4. Удаление пунктуации и токенизация по пробелам (split() заодно схлопывает пробелы).
+    # 5. Удаление email-адресов. Исходный r'\S*@\S*\s?' удалял целиком слова (между
+    #    пробельными символами), содержащие '@', поэтому достаточно отфильтровать такие слова.
+    #    Пунктуация пробелов не содержит, и границы слов после translate() не меняются.
+    if '@' in text:
+        words = [word for word in text.translate(PUNCTUATION_TABLE_KEEP_AT).split() if '@' not in word]
+    else:
+        words = text.translate(PUNCTUATION_TABLE).split()
 
-    # 7. Удаление стоп-слов (опционально)
+    # 6. Удаление стоп-слов (опционально)
     # words = [word for word in words if word not in stop_words]
 
-    # 8. Стемминг или лемматизация (выберите одно, если нужно)
+    # 7. Стемминг или лемматизация (выберите одно, если нужно)
     # words = [stemmer.stem(word) for word in words]
     # words = [lemmatizer.lemmatize(word) for word in words]
 
-    # 9. Объединение обратно в строку и удаление лишних пробелов
-    processed_text = " ".join(words).strip()
-    processed_text = re.sub(r'\s+', ' ', processed_text) # Удаление множественных пробелов
+    return " ".join(words)
 
-    return processed_text
+
+def preprocess_texts(texts: list) -> list[str]:
+    """
+    Пакетная предобработка списка документов.
+
+    Args:
+        texts: Список документов (не строки превращаются в пустую строку).
+
+    Returns:
+        list: Список предобработанных строк в том же порядке.
+    """
+    return [preprocess_text(text) for text in texts]
 
 if __name__ == '__main__':
     sample = "This is a Sample Text with Punctuation! And numbers 123. Visit http://example.com or email test@example.org."
@@ -0,0 +1,454 @@
+# ml-engine/scripts/regex_set.py
+import logging
+import os
+import pickle
+import re
+import select
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    from re import _compiler as sre_compile, _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_compile
+    import sre_constants
+    import sre_parse
+
+from scripts.keyword_matcher import KeywordAutomaton
+
+logger = logging.getLogger(__name__)
+
+# Сколько выражений объединяется в одну альтернацию (?:...)|(?:...) без захватывающих групп
+MAX_GROUP_PATTERNS = 32
+# С какого числа обязательных литералов префильтр ищет их автоматом, а не проверкой "in" по каждому
+# (порог как у подстрок условий contains, см. scripts/policy_engine.py)
+AUTOMATON_MIN_LITERALS = 128
+# Сколько позиций совпадения альтернации перебирается в поисках еще не найденных выражений группы;
+# дальше оставшиеся проверяются по отдельности (иначе частое выражение вроде \d - цикл по всем цифрам)
+MAX_GROUP_MATCHES = 64
+DEFAULT_TIMEOUT_SECONDS = 0.5
+SANDBOX_START_TIMEOUT_SECONDS = 30
+
+# Глобальные флаги в начале выражения ((?i), (?s)...): в альтернации они заменяются флагами компиляции
+_GLOBAL_FLAGS = re.compile(r'^(?:\(\?[aiLmsux]+\))+')
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+# Символы, для которых text.lower() не сохраняет вхождение литерала: конечная сигма
+# зависит от соседей, а при IGNORECASE у части букв есть дополнительные варианты (ſ ~ s и т.п.)
+_CONTEXT_CASED = {'Σ', 'σ', 'ς'}
+# (таблица называется _EXTRA_CASES с Python 3.11, раньше - _ignorecase_fixes)
+_EXTRA_CASED = {chr(code) for code in getattr(sre_compile, '_EXTRA_CASES', None) or getattr(sre_compile, '_ignorecase_fixes', {})}
+
+
+def _literal_safe(char: str, ignorecase: bool) -> bool:
+    if char in _CONTEXT_CASED:
+        return False
+    if ignorecase and char.lower() != char.upper():
+        lower, upper = char.lower(), char.upper()
+        return len(lower) == len(upper) == 1 and upper.lower() == lower and lower not in _EXTRA_CASED
+    return True
+
+
+def _best_requirement(requirements):
+    # Лучше - самый длинный из кратчайших литералов требования, затем - меньше вариантов
+    return max(requirements, key=lambda literals: (min(map(len, literals)), -len(literals)), default=None)
+
+
+def _required_literals(items, ignorecase: bool):
+    """
+    Литералы, хотя бы один из которых обязательно входит в любое совпадение (в нижнем регистре),
+    или None, если такого набора нет. Последовательность дает набор из одной самой длинной цепочки
+    литералов (или из обязательного подвыражения), альтернация - объединение наборов ветвей.
+    """
+    requirements = []
+    run = []
+
+    def flush():
+        if run:
+            requirements.append(frozenset([''.join(run).lower()]))
+            run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL and _literal_safe(chr(av), ignorecase):
+            run.append(chr(av))
+            continue
+        flush()
+        requirement = None
+        if op is sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, pattern = av
+            scoped = (ignorecase or bool(add_flags & re.IGNORECASE)) and not del_flags & re.IGNORECASE
+            requirement = _required_literals(pattern, scoped)
+        elif op in _REPEATS or op is getattr(sre_constants, 'POSSESSIVE_REPEAT', None):
+            low, _, pattern = av
+            if low >= 1:
+                requirement = _required_literals(pattern, ignorecase)
+        elif op is sre_constants.BRANCH:
+            branches = [_required_literals(branch, ignorecase) for branch in av[1]]
+            if all(branches):
+                requirement = frozenset().union(*branches)
+        elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+            requirement = _required_literals(av, ignorecase)
+        elif op is sre_constants.ASSERT and av[0] == 1:  # опережающая проверка (?=...)
+            requirement = _required_literals(av[1], ignorecase)
+        if requirement:
+            requirements.append(requirement)
+    flush()
+    return _best_requirement(requirements)
+
+
+def _first_chars(items):
+    """Множество возможных первых символов совпадения или None (любой символ / пустое совпадение)."""
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            return {av}
+        if op is sre_constants.IN:
+            chars = set()
+            for member_op, member_av in av:
+                if member_op is sre_constants.LITERAL:
+                    chars.add(member_av)
+                elif member_op is sre_constants.RANGE and member_av[1] - member_av[0] < 256:
+                    chars.update(range(member_av[0], member_av[1] + 1))
+                else:
+                    return None
+            return chars
+        if op is sre_constants.SUBPATTERN:
+            return _first_chars(av[3])
+        if op in _REPEATS and av[0] >= 1:
+            return _first_chars(av[2])
+        if op is sre_constants.BRANCH:
+            chars = set()
+            for branch in av[1]:
+                branch_chars = _first_chars(branch)
+                if branch_chars is None:
+                    return None
+                chars |= branch_chars
+            return chars
+        return None
+    return None
+
+
+def _backtracking_prone(items, in_repeat: bool = False) -> bool:
+    """
+    Признаки экспоненциального перебора с возвратами: повторение переменной длины внутри
+    повторения ((a+)+, (\\w+\\s?)*) и повторение альтернативы с пересекающимися первыми символами
+    ((a|ab)*). Проверка консервативна: часть безопасных выражений тоже помечается; атомарные
+    группы и притяжательные повторы (без возвратов) не рассматриваются.
+    """
+    for op, av in items:
+        if op in _REPEATS:
+            low, high, pattern = av
+            if in_repeat and high != low:
+                return True
+            if _backtracking_prone(pattern, in_repeat or high > 1):
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _backtracking_prone(av[3], in_repeat):
+                return True
+        elif op is sre_constants.BRANCH:
+            branches = av[1]
+            if in_repeat:
+                seen = set()
+                for branch in branches:
+                    chars = _first_chars(branch)
+                    if chars is None or seen & chars:
+                        return True
+                    seen |= chars
+            if any(_backtracking_prone(branch, in_repeat) for branch in branches):
+                return True
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if _backtracking_prone(av[1], in_repeat):
+                return True
+    return False
+
+
+def _has_backreferences(items) -> bool:
+    for op, av in items:
+        if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            return True
+        if isinstance(av, (list, tuple)):
+            for part in av:
+                if isinstance(part, sre_parse.SubPattern) and _has_backreferences(part):
+                    return True
+                if isinstance(part, (list, tuple)) and any(
+                        isinstance(branch, sre_parse.SubPattern) and _has_backreferences(branch) for branch in part):
+                    return True
+        elif isinstance(av, sre_parse.SubPattern) and _has_backreferences(av):
+            return True
+    return False
+
+
+def analyze_pattern(pattern: re.Pattern):
+    """
+    (обязательные литералы или None, склонно ли выражение к перебору с возвратами,
+    можно ли объединять его с другими в альтернацию).
+
+    Объединяются только выражения без литерального префикса: такое выражение re ищет быстрым
+    поиском префикса, и в альтернации (где эта оптимизация теряется) оно медленнее, чем отдельно.
+    Обратные ссылки и именованные группы в альтернации изменили бы смысл или не скомпилировались бы.
+    """
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    flags = parsed.state.flags
+    literal_prefix = getattr(sre_compile, '_get_literal_prefix', None)
+    groupable = (
+        literal_prefix is not None and not literal_prefix(parsed, flags)[0]
+        and not pattern.groupindex and not _has_backreferences(parsed)
+    )
+    return _required_literals(parsed, bool(flags & re.IGNORECASE)), _backtracking_prone(parsed), groupable
+
+
+def _sandbox_main():
+    """Цикл процесса песочницы: запросы (выражение, флаги, текст, позиция) и ответы - pickle через stdin/stdout."""
+    requests, responses = sys.stdin.buffer, sys.stdout.buffer
+    compiled = {}
+    pickle.dump(True, responses)  # процесс запущен: время запуска не входит в ограничение проверки
+    responses.flush()
+    while True:
+        try:
+            source, flags, text, start = pickle.load(requests)
+        except EOFError:
+            return
+        pattern = compiled.get((source, flags))
+        if pattern is None:
+            pattern = compiled[(source, flags)] = re.compile(source, flags)
+        pickle.dump(pattern.search(text, start) is not None, responses)
+        responses.flush()
+
+
+class RegexSandbox:
+    """
+    Отдельный процесс для проверки выражений с ограничением времени: модуль re нельзя прервать
+    из другого потока, поэтому выражение, не уложившееся в `timeout` секунд, прерывается
+    остановкой процесса (процесс перезапускается при следующем вызове).
+
+    Процесс (python -m scripts.regex_set) запускается при первом вызове - отдельным интерпретатором,
+    а не fork многопоточного родителя и не multiprocessing (тот повторно импортирует главный модуль
+    приложения). Вызовы из разных потоков выполняются по очереди.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        self._process = None
+
+    def _start(self):
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'scripts.regex_set'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        if not self._wait(SANDBOX_START_TIMEOUT_SECONDS):
+            raise OSError("Regex sandbox process did not start")
+        pickle.load(self._process.stdout)
+
+    def _wait(self, timeout: float) -> bool:
+        ready, _, _ = select.select([self._process.stdout], [], [], timeout)
+        return bool(ready)
+
+    def close(self):
+        with self._lock:
+            self._stop()
+
+    def _stop(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process.stdin.close()
+            self._process.stdout.close()
+            self._process = None
+
+    def search(self, pattern: re.Pattern, text: str, start: int = 0):
+        """
+        True / False - есть ли совпадение (с позиции start, как Pattern.search); None - время вышло
+        или процесс песочницы недоступен.
+        """
+        with self._lock:
+            try:
+                if self._process is None or self._process.poll() is not None:
+                    self._stop()
+                    self._start()
+                pickle.dump((pattern.pattern, pattern.flags, text, start), self._process.stdin)
+                self._process.stdin.flush()
+                if self._wait(self.timeout):
+                    return pickle.load(self._process.stdout)
+            except (OSError, EOFError, pickle.UnpicklingError) as e:
+                logger.error(f"Regex sandbox failed: {e}")
+            self._stop()
+            self.timeouts += 1
+            return None
+
+
+class _Group:
+    __slots__ = ('pattern', 'members')
+
+    def __init__(self, pattern, members):
+        self.pattern = pattern
+        self.members = members  # номера выражений группы
+
+
+class RegexSet:
+    """
+    Набор регулярных выражений, для которого за один вызов search(text) определяется,
+    какие из них находят совпадение в тексте.
+
+    - Префильтр: из каждого выражения извлекаются литералы, один из которых обязан входить
+      в совпадение (analyze_pattern); выражение проверяется, только если такой литерал есть
+      в text.lower(). Литералы ищутся проверкой "in" или, если их много, автоматом Ахо-Корасик.
+    - Выражения без литерального префикса с одинаковыми флагами объединены по MAX_GROUP_PATTERNS
+      в альтернации (?:...)|(?:...) без захватывающих групп (с именованными группами re теряет
+      оптимизации альтернаций и работает в разы медленнее отдельных поисков). Поиск альтернации
+      находит первую позицию, где совпадает хоть одно выражение группы; в этой позиции выражения
+      проверяются якорным match, и поиск продолжается со следующей позиции. Нет совпадения
+      альтернации - ни одно выражение группы не совпадает, и это один проход по тексту на группу.
+    - Защита воркеров: выражения, склонные к экспоненциальному перебору (analyze_pattern),
+      проверяются в песочнице (RegexSandbox) с ограничением времени. Выражение или группа,
+      проверка которых в процессе заняла больше `timeout`, тоже переводятся в песочницу
+      (группа - распадается на отдельные выражения). Без песочницы все проверяется в процессе.
+    - Истекшее время считается совпадением: для DLP ложная тревога лучше пропуска.
+    """
+
+    def __init__(self, patterns, sandbox: RegexSandbox = None, timeout: float = None,
+                 automaton_cache_dir: str = None):
+        self.patterns = list(patterns)
+        self.sandbox = sandbox
+        self.timeout = timeout if timeout is not None else (sandbox.timeout if sandbox else DEFAULT_TIMEOUT_SECONDS)
+        self.timeouts = 0
+        self.sandboxed = set()
+        self.unfiltered = set()  # выражения без обязательных литералов - проверяются всегда
+        literal_patterns = {}
+        groupable = []
+        for index, pattern in enumerate(self.patterns):
+            literals, prone, can_group = analyze_pattern(pattern)
+            if prone and sandbox is not None:
+                self.sandboxed.add(index)
+            elif can_group:
+                groupable.append(index)
+            if literals is None:
+                self.unfiltered.add(index)
+            else:
+                for literal in literals:
+                    literal_patterns.setdefault(literal, []).append(index)
+
+        self._literals = list(literal_patterns)
+        self._literal_patterns = [literal_patterns[literal] for literal in self._literals]
+        self._automaton = None
+        if len(self._literals) >= AUTOMATON_MIN_LITERALS:
+            self._automaton = KeywordAutomaton.build_cached(self._literals, automaton_cache_dir)
+            ids = {keyword: index for index, keyword in enumerate(self._automaton.keywords)}
+            by_keyword = [[] for _ in self._automaton.keywords]
+            for literal, indexes in zip(self._literals, self._literal_patterns):
+                by_keyword[ids[literal]].extend(indexes)
+            self._literal_patterns = by_keyword
+
+        self._groups = []
+        self._group_of = {}
+        self._build_groups(groupable)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def _build_groups(self, indexes):
+        by_flags = {}
+        sources = {}
+        for index in indexes:
+            pattern = self.patterns[index]
+            # Флаги (?i) и т.п. уже учтены в pattern.flags, а внутри альтернации они недопустимы
+            source = sources[index] = _GLOBAL_FLAGS.sub('', pattern.pattern)
+            try:
+                re.compile(f'(?:{source})|(?:)', pattern.flags)
+            except re.error:
+                continue
+            by_flags.setdefault(pattern.flags, []).append(index)
+        for flags, members in by_flags.items():
+            for start in range(0, len(members), MAX_GROUP_PATTERNS):
+                chunk = members[start:start + MAX_GROUP_PATTERNS]
+                if len(chunk) < 2:
+                    continue
+                combined = re.compile('|'.join(f'(?:{sources[index]})' for index in chunk), flags)
+                for index in chunk:
+                    self._group_of[index] = len(self._groups)
+                self._groups.append(_Group(combined, chunk))
+
+    def candidates(self, text: str) -> set:
+        """Выражения, прошедшие префильтр по обязательным литералам."""
+        candidates = set(self.unfiltered)
+        if not self._literals:
+            return candidates
+        lowered = text.lower()
+        if self._automaton is not None:
+            for keyword in self._automaton.found(lowered):
+                candidates.update(self._literal_patterns[keyword])
+        else:
+            for literal, indexes in zip(self._literals, self._literal_patterns):
+                if literal in lowered:
+                    candidates.update(indexes)
+        return candidates
+
+    def search(self, text: str) -> set:
+        """Номера выражений, у которых есть совпадение в тексте (или проверка которых не уложилась во время)."""
+        matched = set()
+        grouped = {}
+        for index in self.candidates(text):
+            group = self._group_of.get(index)
+            if group is None:
+                if self._search_one(index, text):
+                    matched.add(index)
+            else:
+                grouped.setdefault(group, []).append(index)
+        for group, members in grouped.items():
+            if len(members) == 1:
+                if self._search_one(members[0], text):
+                    matched.add(members[0])
+            else:
+                matched.update(self._search_group(group, members, text))
+        return matched
+
+    def _search_one(self, index: int, text: str, start: int = 0) -> bool:
+        pattern = self.patterns[index]
+        if index in self.sandboxed:
+            found = self.sandbox.search(pattern, text, start)
+            if found is None:
+                self.timeouts += 1
+                logger.warning(f"Regex {pattern.pattern!r} timed out after {self.timeout}s, treated as a match")
+                return True
+            return found
+        started = time.perf_counter()
+        found = pattern.search(text, start) is not None
+        if time.perf_counter() - started > self.timeout and self.sandbox is not None:
+            self.sandboxed.add(index)
+            logger.warning(f"Regex {pattern.pattern!r} took longer than {self.timeout}s, moved to the sandbox")
+        return found
+
+    def _search_group(self, group_index: int, members, text: str) -> set:
+        combined = self._groups[group_index].pattern
+        patterns = self.patterns
+        remaining = list(members)
+        found = set()
+        position = 0
+        started = time.perf_counter()
+        for _ in range(MAX_GROUP_MATCHES):
+            # До позиции совпадения альтернации не совпадает ни одно выражение группы
+            match = combined.search(text, position)
+            if match is None:
+                break
+            position = match.start()
+            found.update(index for index in remaining if patterns[index].match(text, position))
+            remaining = [index for index in remaining if index not in found]
+            if not remaining:
+                break
+            position += 1
+        else:
+            found.update(index for index in remaining if self._search_one(index, text, position))
+        if time.perf_counter() - started > self.timeout:
+            self._dissolve(group_index)
+        return found
+
+    def _dissolve(self, group_index: int):
+        members = self._groups[group_index].members
+        logger.warning(f"Combined regex group of {len(members)} patterns is slow, checking them one by one")
+        for index in members:
+            self._group_of.pop(index, None)
+
+
+if __name__ == '__main__':
+    _sandbox_main()
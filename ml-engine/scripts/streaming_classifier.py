@@ -0,0 +1,178 @@
+# ml-engine/scripts/streaming_classifier.py
+import codecs
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+
+class StreamingNotSupportedError(ValueError):
+    """Модель не подходит для потоковой классификации (нестандартная структура пайплайна)."""
+
+
+def split_text_pipeline(model):
+    """
+    Разбирает пайплайн вида [('tfidf', TfidfVectorizer|CountVectorizer), ('classifier', ...)]
+    на векторизатор и классификатор. Потоковый режим поддерживает только словный
+    анализатор sklearn, так как n-граммы должны собираться инкрементально.
+    """
+    steps = getattr(model, 'steps', None)
+    if not steps or len(steps) != 2:
+        raise StreamingNotSupportedError("Streaming requires a two-step vectorizer + classifier pipeline.")
+    vectorizer, classifier = steps[0][1], steps[1][1]
+    if not isinstance(vectorizer, CountVectorizer) or vectorizer.analyzer != 'word':
+        raise StreamingNotSupportedError("Streaming requires a word-level CountVectorizer/TfidfVectorizer.")
+    if vectorizer.input != 'content':
+        raise StreamingNotSupportedError("Streaming requires vectorizer.input == 'content'.")
+    if not hasattr(classifier, 'predict_proba'):
+        raise StreamingNotSupportedError("Classifier does not have 'predict_proba' method.")
+    return vectorizer, classifier
+
+
+class StreamingDocumentClassifier:
+    """
+    Потоковая классификация очень больших документов.
+
+    Документ поступает кусками байтов (feed), декодируется инкрементально и
+    режется на сегменты примерно по `segment_chars` символов по границе
+    пробельного символа, чтобы токены не разрывались. Для каждого сегмента
+    выполняется та же цепочка, что и в векторизаторе sklearn (препроцессор,
+    токенизатор, стоп-слова, n-граммы), а n-граммы на стыке сегментов
+    собираются из хвоста предыдущего сегмента. Счетчики терминов
+    накапливаются в массиве размера словаря, поэтому память ограничена
+    размером словаря и одного сегмента, а не размером документа.
+
+    Итоговая метка и вероятность совпадают с разовым вызовом
+    make_prediction_text_classification на всем тексте. При `breakdown=True`
+    дополнительно возвращается оценка каждого сегмента - по ней видно,
+    в какой части документа находится чувствительный фрагмент.
+
+    `segment_scanners` - {поле результата: сканер}: каждый сегмент по порядку передается в
+    scanner.feed(segment), а в итоговый результат попадает scanner.summary() (например, pii_found).
+    """
+
+    def __init__(self, model, segment_chars: int = 1 << 20, breakdown: bool = False, encoding: str = 'utf-8',
+                 model_version: str = None, segment_scanners: dict = None):
+        self.vectorizer, self.classifier = split_text_pipeline(model)
+        self.segment_scanners = dict(segment_scanners or {})
+        # Версия модели, взятой в начале потока: документ дочитывается ею, даже если модель успели заменить
+        self.model_version = model_version
+        self.segment_chars = segment_chars
+        self.breakdown = breakdown
+
+        self._preprocess = self.vectorizer.build_preprocessor()
+        self._tokenize = self.vectorizer.build_tokenizer()
+        self._stop_words = self.vectorizer.get_stop_words()
+        self._min_n, self._max_n = self.vectorizer.ngram_range
+        self._vocabulary = self.vectorizer.vocabulary_
+        self._counts = np.zeros(len(self._vocabulary), dtype=np.int64)
+
+        # Некорректные байты заменяются, а не прерывают разбор многогигабайтной выгрузки
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self._buffer = ''
+        self._tail_tokens = []
+        self._offset = 0
+        self.segments = []
+
+    def feed(self, data):
+        """Добавляет очередной кусок документа (bytes или str)."""
+        text = data if isinstance(data, str) else self._decoder.decode(data)
+        if not text:
+            return
+        self._buffer += text
+        while len(self._buffer) >= self.segment_chars:
+            split_at = self._find_split(self._buffer)
+            if split_at is None:
+                break
+            segment, self._buffer = self._buffer[:split_at], self._buffer[split_at:]
+            self._consume(segment)
+
+    def _find_split(self, buffer: str):
+        # Последний пробельный символ: токены sklearn по умолчанию не содержат пробелов
+        window_start = max(0, len(buffer) - self.segment_chars)
+        for separator in ('\n', ' ', '\t', '\r'):
+            position = buffer.rfind(separator, window_start)
+            if position > 0:
+                return position + 1
+        # Очень длинная строка без пробелов: режем принудительно, чтобы ограничить память
+        if len(buffer) >= 4 * self.segment_chars:
+            return len(buffer) - self.segment_chars
+        return None
+
+    def _consume(self, segment: str):
+        for scanner in self.segment_scanners.values():
+            scanner.feed(segment)
+        tokens = self._tokenize(self._preprocess(segment))
+        if self._stop_words is not None:
+            tokens = [token for token in tokens if token not in self._stop_words]
+
+        # n-граммы, которые заканчиваются в текущем сегменте (включая начатые в хвосте предыдущего)
+        extended = self._tail_tokens + tokens
+        tail_length = len(self._tail_tokens)
+        vocabulary = self._vocabulary
+        indices = []
+        for n in range(self._min_n, self._max_n + 1):
+            first_start = max(0, tail_length - n + 1)
+            for start in range(first_start, len(extended) - n + 1):
+                gram = extended[start] if n == 1 else " ".join(extended[start:start + n])
+                index = vocabulary.get(gram)
+                if index is not None:
+                    indices.append(index)
+        if self._max_n > 1:
+            self._tail_tokens = extended[-(self._max_n - 1):]
+
+        segment_counts = np.bincount(np.asarray(indices, dtype=np.intp), minlength=len(self._counts)) \
+            if indices else None
+        if segment_counts is not None:
+            self._counts += segment_counts
+
+        if self.breakdown:
+            summary = {"start": self._offset, "end": self._offset + len(segment)}
+            if segment_counts is not None:
+                probabilities = self.classifier.predict_proba(self._to_features(segment_counts))[0]
+                best = int(np.argmax(probabilities))
+                summary.update(prediction_label=self.classifier.classes_[best], probability=float(probabilities[best]))
+            else:
+                summary.update(prediction_label=None, probability=None)
+            self.segments.append(summary)
+        self._offset += len(segment)
+
+    def _to_features(self, counts):
+        """Повторяет CountVectorizer.transform + TfidfTransformer.transform для одной строки счетчиков."""
+        nonzero = np.flatnonzero(counts)
+        features = sp.csr_matrix(
+            (counts[nonzero].astype(self.vectorizer.dtype), nonzero, [0, len(nonzero)]),
+            shape=(1, len(counts))
+        )
+        if self.vectorizer.binary:
+            features.data.fill(1)
+        if isinstance(self.vectorizer, TfidfVectorizer):
+            if self.vectorizer.sublinear_tf:
+                np.log(features.data, features.data)
+                features.data += 1
+            if self.vectorizer.use_idf:
+                features.data *= self.vectorizer.idf_[features.indices]
+            if self.vectorizer.norm is not None:
+                features = normalize(features, norm=self.vectorizer.norm, copy=False)
+        return features
+
+    def finish(self) -> dict:
+        """Дочитывает остаток буфера и возвращает итоговую оценку документа."""
+        self._buffer += self._decoder.decode(b'', final=True)
+        if self._buffer or not self.segments:
+            self._consume(self._buffer)
+            self._buffer = ''
+
+        probabilities = self.classifier.predict_proba(self._to_features(self._counts))[0]
+        best = int(np.argmax(probabilities))
+        result = {
+            "prediction_label": self.classifier.classes_[best],
+            "probability": float(probabilities[best]),
+            "characters": self._offset
+        }
+        for name, scanner in self.segment_scanners.items():
+            result[name] = scanner.summary()
+        if self.breakdown:
+            result["segments"] = self.segments
+        return result
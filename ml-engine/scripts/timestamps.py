@@ -0,0 +1,21 @@
+# ml-engine/scripts/timestamps.py
+"""
+Разбор дат ISO 8601 из событий и условий политик.
+
+datetime.fromisoformat до Python 3.11 не принимает суффикс "Z" (UTC), а именно так даты
+сериализует JavaScript (Date.prototype.toISOString в backend): "2024-01-01T00:00:00.000Z".
+"""
+from datetime import datetime, timezone
+
+
+def parse_iso_timestamp(value: str) -> float:
+    """
+    Unix-время в секундах из строки ISO 8601; суффикс "Z" - UTC, время без зоны считается UTC.
+    ValueError, если строка не дата.
+    """
+    if value[-1:] in ('Z', 'z'):
+        value = value[:-1] + '+00:00'
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
@@ -1,5 +1,6 @@
 # ml-engine/scripts/train_model.py
 import os
+import sys
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer # Или CountVectorizer
@@ -11,6 +12,10 @@ import joblib
 
 from preprocess import preprocess_text # Импортируем нашу функцию предобработки
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..')) # Для импорта scripts.* при запуске как скрипта
+from scripts.parallel_pipeline import ParallelBatchPipeline # Параллельная предобработка и оценка на нескольких ядрах
+from scripts.model_store import save_model # Атомарное сохранение в формате для mmap-загрузки
+
 # --- Конфигурация ---
 MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
 MODEL_NAME = 'sample_text_classifier.joblib'
@@ -63,6 +68,9 @@ def train_text_classification_model():
     # перед векторизацией, но для TF-IDF с его встроенными опциями это может быть избыточно
     # для базовых операций. Однако, для более сложной очистки (URL, email) она полезна.
     # df['processed_text'] = df['text'].apply(preprocess_text)
+    # Для большого корпуса - параллельно на всех ядрах (ML_ENGINE_PARALLEL_WORKERS, ML_ENGINE_PARALLEL_CHUNK_SIZE):
+    # with ParallelBatchPipeline() as pipeline:
+    #     df['processed_text'] = pipeline.preprocess(df['text'].tolist())
     # X = df['processed_text']
 
     # Для пайплайна с TfidfVectorizer, он может напрямую работать с 'text'
@@ -93,7 +101,9 @@ def train_text_classification_model():
 
     # 6. Оценка модели
     print("\nEvaluating the model...")
-    y_pred = model_pipeline.predict(X_test)
+    # Оценка тестовой выборки шардируется по процессам (на маленькой выборке идет в текущем процессе)
+    with ParallelBatchPipeline(model=model_pipeline) as pipeline:
+        y_pred, _ = pipeline.predict(X_test.tolist())
     print("Classification Report on Test Set:")
     print(classification_report(y_test, y_pred, zero_division=0))
 
@@ -106,7 +116,10 @@ def train_text_classification_model():
     # 7. Сохранение обученной модели
     print(f"\nSaving the model to {MODEL_PATH}...")
     try:
-        joblib.dump(model_pipeline, MODEL_PATH)
+        # Без сжатия и с непрерывными массивами: воркеры ML-движка отображают их в память (mmap_mode='r').
+        # Работающий ML-движок подхватит новую версию без рестарта (ModelRegistry).
+        # MODEL_VERSION задает версию явно, иначе версия - время сохранения.
+        save_model(model_pipeline, MODEL_PATH, version=os.environ.get("MODEL_VERSION"))
         print("Model saved successfully.")
     except Exception as e:
         print(f"Error saving model: {e}")
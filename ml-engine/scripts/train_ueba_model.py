@@ -0,0 +1,268 @@
+# ml-engine/scripts/train_ueba_model.py
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..')) # Для импорта scripts.* при запуске как скрипта
+from scripts.feature_store import UserFeatureStore
+from scripts.model_store import replace_atomically, save_model, write_json
+from scripts.ueba_engine import FEATURE_NAMES, UebaEngine
+from scripts.user_baselines import UserBaselines
+
+# --- Конфигурация ---
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+MODEL_PATH = os.path.join(MODEL_DIR, 'ueba_model.joblib')
+BASELINES_PATH = os.path.join(MODEL_DIR, 'ueba_baselines.npz')
+CHECKPOINT_DIR = os.path.join(os.path.dirname(__file__), '..', 'state', 'ueba_trainer')
+
+DEFAULT_RESERVOIR_SIZE = 50_000
+# Сколько байт начала файла событий идентифицирует его в контрольной точке: дописывание в конец
+# файла его не меняет, поэтому повторный запуск по дополненному файлу продолжает с места остановки
+SOURCE_HEAD_BYTES = 1 << 20
+# Префикс каталогов поколений контрольной точки (см. OnlineUebaTrainer.checkpoint)
+CHECKPOINT_PREFIX = 'checkpoint-'
+
+
+class OnlineUebaTrainer:
+    """
+    Онлайн-обучение базовой линии UEBA на мини-пакетах новых событий.
+
+    На каждый пакет (partial_fit):
+    - события учитываются в собственном UebaEngine, поэтому признаки считаются
+      так же, как при оценке в /predict/user_anomaly;
+    - признаки затронутых пользователей после пакета обновляют UserBaselines
+      (потоковые среднее/дисперсия и гистограммы-квантили по каждому пользователю);
+    - те же строки попадают в равномерную выборку-резервуар (Algorithm R) фиксированного размера.
+
+    IsolationForest не умеет дообучаться, поэтому глобальная модель переобучается (refit)
+    на резервуаре - это дешево (max_samples=256 деревьев по 256 точек) и не зависит от длины истории.
+
+    checkpoint()/resume() сохраняют и восстанавливают все состояние, чтобы обучение
+    продолжалось после перезапуска с того же места. source - файл событий, из которого читает
+    train_online, и число уже учтенных из него событий: повторный запуск пропускает их.
+    """
+
+    def __init__(self, engine: UebaEngine = None, baselines: UserBaselines = None,
+                 reservoir_size: int = DEFAULT_RESERVOIR_SIZE, contamination='auto', seed: int = 42):
+        self.engine = engine if engine is not None else UebaEngine()
+        self.baselines = baselines if baselines is not None else UserBaselines()
+        self.contamination = contamination
+        self.seed = seed
+        self.reservoir = np.zeros((reservoir_size, len(FEATURE_NAMES)), dtype=np.float64)
+        self.rows_seen = 0
+        self.batches = 0
+        self.events_seen = 0
+        self.invalid_events = 0
+        self.source = None
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def sample(self) -> np.ndarray:
+        """Текущая обучающая выборка (заполненная часть резервуара)."""
+        return self.reservoir[:min(self.rows_seen, len(self.reservoir))]
+
+    def partial_fit(self, events):
+        """Учитывает мини-пакет событий. Возвращает список ошибок невалидных событий."""
+        user_ids, errors = self.engine.ingest(events)
+        self.batches += 1
+        self.events_seen += len(events) - len(errors)
+        self.invalid_events += len(errors)
+        if user_ids:
+            features = self.engine.features(user_ids)
+            self.baselines.update(user_ids, features)
+            self._add_to_reservoir(features)
+        return errors
+
+    def _add_to_reservoir(self, features: np.ndarray):
+        size = len(self.reservoir)
+        positions = self.rows_seen + np.arange(len(features))
+        fill = positions < size
+        self.reservoir[positions[fill]] = features[fill]
+        # Строка с порядковым номером i заменяет случайную строку резервуара с вероятностью size / (i + 1)
+        candidates = self._rng.integers(0, positions[~fill] + 1) if (~fill).any() else np.zeros(0, dtype=np.int64)
+        accepted = candidates < size
+        self.reservoir[candidates[accepted]] = features[~fill][accepted]
+        self.rows_seen += len(features)
+
+    def fit_model(self) -> IsolationForest:
+        """Обучает глобальную модель на текущей выборке."""
+        sample = self.sample
+        if not len(sample):
+            raise ValueError("No training data: feed events with partial_fit() first")
+        model = IsolationForest(
+            n_estimators=100, max_samples=min(256, len(sample)),
+            contamination=self.contamination, random_state=self.seed
+        )
+        model.fit(sample)
+        return model
+
+    def publish(self, model_path: str = MODEL_PATH, baselines_path: str = BASELINES_PATH, version: str = None):
+        """
+        Обучает модель и атомарно публикует ее вместе с базовыми линиями.
+        ModelRegistry в работающем сервисе подхватит новый файл без рестарта.
+        """
+        model = self.fit_model()
+        self.baselines.save(baselines_path)
+        save_model(model, model_path, version=version)
+        return model
+
+    def checkpoint(self, directory: str):
+        """
+        Сохраняет состояние обучения в каталог. Снимок признаков, базовые линии и резервуар пишутся
+        в новый каталог поколения (checkpoint-*), затем trainer.json со ссылкой на него атомарно заменяет
+        прежний: сбой на любом шаге оставляет предыдущую контрольную точку целой и согласованной.
+        Каталоги прежних поколений удаляются после замены.
+        """
+        os.makedirs(directory, exist_ok=True)
+        generation_directory = tempfile.mkdtemp(dir=directory, prefix=CHECKPOINT_PREFIX)
+        generation = os.path.basename(generation_directory)
+        try:
+            self.engine.snapshot(os.path.join(generation_directory, 'features'))
+            self.baselines.save(os.path.join(generation_directory, 'baselines.npz'))
+            with open(os.path.join(generation_directory, 'reservoir.npy'), 'wb') as f:
+                np.save(f, self.sample)
+        except BaseException:
+            shutil.rmtree(generation_directory, ignore_errors=True)
+            raise
+        state = {
+            "generation": generation,
+            "reservoir_size": len(self.reservoir),
+            "rows_seen": self.rows_seen,
+            "batches": self.batches,
+            "events_seen": self.events_seen,
+            "invalid_events": self.invalid_events,
+            "contamination": self.contamination,
+            "seed": self.seed,
+            "rng_state": self._rng.bit_generator.state,
+            "source": self.source,
+            "saved_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        }
+        replace_atomically(directory, '.json', os.path.join(directory, 'trainer.json'), lambda tmp_path: write_json(tmp_path, state))
+        for name in os.listdir(directory):
+            if name.startswith(CHECKPOINT_PREFIX) and name != generation:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        return directory
+
+    @classmethod
+    def resume(cls, directory: str, **engine_kwargs):
+        """Восстанавливает тренер из контрольной точки checkpoint()."""
+        with open(os.path.join(directory, 'trainer.json'), encoding='utf-8') as f:
+            state = json.load(f)
+        # Контрольные точки без поколений хранили файлы прямо в каталоге
+        generation_directory = os.path.join(directory, state.get('generation', ''))
+        trainer = cls(
+            engine=UebaEngine(store=UserFeatureStore.restore(os.path.join(generation_directory, 'features')), **engine_kwargs),
+            baselines=UserBaselines.load(os.path.join(generation_directory, 'baselines.npz')),
+            reservoir_size=state['reservoir_size'],
+            contamination=state['contamination'],
+            seed=state['seed']
+        )
+        sample = np.load(os.path.join(generation_directory, 'reservoir.npy'))
+        trainer.reservoir[:len(sample)] = sample
+        trainer.rows_seen = state['rows_seen']
+        trainer.batches = state['batches']
+        trainer.events_seen = state['events_seen']
+        trainer.invalid_events = state['invalid_events']
+        trainer._rng.bit_generator.state = state['rng_state']
+        trainer.source = state.get('source')
+        return trainer
+
+
+def source_identity(path: str) -> dict:
+    """Идентификатор файла событий для контрольной точки: абсолютный путь и хэш начала файла."""
+    with open(path, 'rb') as f:
+        head = hashlib.blake2b(f.read(SOURCE_HEAD_BYTES), digest_size=16).hexdigest()
+    return {"path": os.path.abspath(path), "head": head}
+
+
+def read_event_batches(path: str, batch_size: int, skip: int = 0):
+    """
+    Читает события из JSON Lines (можно .gz) мини-пакетами по `batch_size`,
+    пропуская первые `skip` событий (непустых строк).
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    batch = []
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                batch.append(None)  # Учитывается как невалидное событие
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def train_online(events_path: str, batch_size: int, checkpoint_dir: str, checkpoint_every: int,
+                 model_path: str = MODEL_PATH, baselines_path: str = BASELINES_PATH, version: str = None):
+    """
+    Обучает модель по файлу событий мини-пакетами, продолжая с контрольной точки, если она есть.
+    Каждые `checkpoint_every` пакетов сохраняет контрольную точку и публикует модель.
+    Если контрольная точка сохранена по этому же файлу, уже учтенные из него события пропускаются
+    (перезапуск после сбоя); другой файл читается с начала как продолжение потока событий.
+    """
+    if os.path.exists(os.path.join(checkpoint_dir, 'trainer.json')):
+        trainer = OnlineUebaTrainer.resume(checkpoint_dir)
+        print(f"Resumed from {checkpoint_dir}: {trainer.batches} batches, {trainer.events_seen} events seen")
+    else:
+        trainer = OnlineUebaTrainer()
+
+    identity = source_identity(events_path)
+    source = trainer.source or {}
+    consumed = source.get("events", 0) if (source.get("path"), source.get("head")) == (identity["path"], identity["head"]) else 0
+    if consumed:
+        print(f"Skipping {consumed} events of {events_path} already in the checkpoint")
+    trainer.source = dict(identity, events=consumed)
+
+    started = time.perf_counter()
+    new_batches = 0
+    for batch in read_event_batches(events_path, batch_size, skip=consumed):
+        trainer.partial_fit(batch)
+        trainer.source["events"] += len(batch)
+        new_batches += 1
+        if new_batches % checkpoint_every == 0:
+            trainer.checkpoint(checkpoint_dir)
+            trainer.publish(model_path, baselines_path, version=version)
+            print(f"Checkpoint after {trainer.batches} batches ({trainer.events_seen} events, {len(trainer.baselines)} users)")
+    if new_batches % checkpoint_every:
+        trainer.checkpoint(checkpoint_dir)
+        trainer.publish(model_path, baselines_path, version=version)
+    elapsed = time.perf_counter() - started
+    print(f"Processed {new_batches} batches in {elapsed:.1f}s; {trainer.invalid_events} invalid events skipped in total")
+    print(f"Model saved to {model_path}, baselines to {baselines_path}")
+    return trainer
+
+
+if __name__ == '__main__':
+    # python scripts/train_ueba_model.py events.jsonl[.gz] [--batch-size 5000] [--checkpoint-every 10]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incrementally train the UEBA baseline from a stream of user activity events.")
+    parser.add_argument('events', help="JSON Lines file with events ({'user_id', 'timestamp', 'bytes', 'destination'}), optionally gzip-compressed")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR)
+    parser.add_argument('--checkpoint-every', type=int, default=10, help="Checkpoint and publish the model every N batches")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    args = parser.parse_args()
+
+    train_online(
+        args.events, args.batch_size, args.checkpoint_dir, args.checkpoint_every,
+        model_path=args.model, baselines_path=args.baselines, version=os.environ.get("MODEL_VERSION")
+    )
@@ -0,0 +1,315 @@
+# ml-engine/scripts/ueba_engine.py
+import atexit
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy as np
+from sklearn.base import is_outlier_detector
+
+from scripts.feature_store import DESTINATION_PRECISION, UserFeatureStore, destination_hash
+from scripts.predict_utils import DEFAULT_UEBA_CHUNK_SIZE, make_prediction_ueba, make_prediction_ueba_chunks
+from scripts.timestamps import parse_iso_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Признаки поведения пользователя в порядке столбцов матрицы, которую получает модель UEBA
+FEATURE_NAMES = ('event_rate', 'data_volume_log', 'off_hours_ratio', 'distinct_destinations')
+
+DEFAULT_HALF_LIFE_SECONDS = float(os.environ.get("ML_ENGINE_UEBA_HALF_LIFE_SECONDS", 86400))
+DEFAULT_DESTINATION_WINDOW_SECONDS = float(os.environ.get("ML_ENGINE_UEBA_DESTINATION_WINDOW_SECONDS", 7 * 86400))
+DEFAULT_DESTINATION_BUCKETS = int(os.environ.get("ML_ENGINE_UEBA_DESTINATION_BUCKETS", 7))
+DEFAULT_DESTINATION_PRECISION = int(os.environ.get("ML_ENGINE_UEBA_DESTINATION_PRECISION", DESTINATION_PRECISION))
+DEFAULT_WORK_HOURS = tuple(int(hour) for hour in os.environ.get("ML_ENGINE_UEBA_WORK_HOURS", "8-19").split('-'))
+DEFAULT_TZ_OFFSET_HOURS = float(os.environ.get("ML_ENGINE_UEBA_TZ_OFFSET_HOURS", 0))
+# Насколько время события может опережать часы сервера: событие из далекого будущего (например,
+# Unix-время в миллисекундах) сдвинуло бы опорное время хранилища признаков для всех пользователей
+MAX_CLOCK_SKEW_SECONDS = float(os.environ.get("ML_ENGINE_UEBA_MAX_CLOCK_SKEW_SECONDS", 86400))
+
+
+class InvalidEventError(ValueError):
+    pass
+
+
+def parse_timestamp(value, now: float = None, max_skew_seconds: float = MAX_CLOCK_SKEW_SECONDS) -> float:
+    """
+    Unix-время в секундах из числа (секунды) или строки ISO 8601; время без зоны считается UTC.
+    Время позже now (по умолчанию - текущее) больше чем на max_skew_seconds - ошибка.
+    """
+    if isinstance(value, bool):
+        raise InvalidEventError("'timestamp' must be a number or an ISO 8601 string")
+    if isinstance(value, (int, float)):
+        if not math.isfinite(value):
+            raise InvalidEventError("'timestamp' must be finite")
+        timestamp = float(value)
+    elif isinstance(value, str):
+        try:
+            timestamp = parse_iso_timestamp(value)
+        except ValueError:
+            raise InvalidEventError(f"Invalid 'timestamp': {value!r}") from None
+    else:
+        raise InvalidEventError("'timestamp' must be a number or an ISO 8601 string")
+    if timestamp > (time.time() if now is None else now) + max_skew_seconds:
+        raise InvalidEventError(f"'timestamp' is too far in the future: {value!r} (expected Unix time in seconds)")
+    return timestamp
+
+
+class UebaEngine:
+    """
+    Потоковый движок UEBA: принимает сырые события активности пользователей
+    и инкрементально поддерживает признаки каждого пользователя, поэтому оценка
+    не пересобирает DataFrame по истории событий.
+
+    Событие: {"user_id": ..., "timestamp": <unix-время или ISO 8601>,
+              "bytes": <объем данных, необязательно>, "destination": <хост/адрес/путь, необязательно>}
+
+    Признаки пользователя (FEATURE_NAMES):
+    - event_rate - затухающее (период полураспада half_life) число событий;
+    - data_volume_log - log1p затухающего объема данных;
+    - off_hours_ratio - доля событий вне рабочих часов (и в выходные);
+    - distinct_destinations - оценка числа разных адресов назначения за destination_window.
+
+    Состояние хранится в столбцовом UserFeatureStore: пакет событий проверяется
+    поштучно, а учитывается векторизованно. Оценка идет пакетом: признаки всех
+    затронутых пользователей собираются в одну матрицу и передаются в make_prediction_ueba
+    одним вызовом, так что стоимость вызова модели делится на все события пакета.
+
+    Если задан identity_index (scripts/identity_index.IdentityIndex), user_id события может быть
+    любым псевдонимом (UPN, SAM, email, имя хоста): пакет псевдонимов разрешается в канонические
+    учетные записи одним векторизованным поиском, неизвестные псевдонимы учитываются как есть.
+
+    Состояние хранится в памяти процесса (с периодическими снимками на диск, см. snapshot()):
+    события одного пользователя должны приходить в один процесс
+    (один воркер с потоками или шардирование по user_id).
+    """
+
+    def __init__(self, half_life_seconds: float = DEFAULT_HALF_LIFE_SECONDS,
+                 destination_window_seconds: float = DEFAULT_DESTINATION_WINDOW_SECONDS,
+                 destination_buckets: int = DEFAULT_DESTINATION_BUCKETS,
+                 destination_precision: int = DEFAULT_DESTINATION_PRECISION,
+                 work_hours: tuple = DEFAULT_WORK_HOURS,
+                 tz_offset_hours: float = DEFAULT_TZ_OFFSET_HOURS,
+                 store: UserFeatureStore = None,
+                 identity_index=None):
+        self.work_start, self.work_end = work_hours
+        self.tz_offset_seconds = tz_offset_hours * 3600
+        self.store = store if store is not None else UserFeatureStore(
+            half_life_seconds=half_life_seconds,
+            destination_window_seconds=destination_window_seconds,
+            destination_buckets=destination_buckets,
+            destination_precision=destination_precision
+        )
+        self.identity_index = identity_index
+        self._lock = threading.Lock()
+        self.snapshot_directory = None
+        self.snapshot_interval = 0
+        self._dirty = False
+        self._snapshot_thread = None
+        self._snapshot_pid = None
+
+    def __len__(self):
+        return len(self.store)
+
+    def is_off_hours(self, timestamps) -> np.ndarray:
+        local = np.asarray(timestamps, dtype=np.float64) + self.tz_offset_seconds
+        hours = np.floor(local / 3600).astype(np.int64) % 24
+        weekdays = (np.floor(local / 86400).astype(np.int64) + 3) % 7  # 1970-01-01 - четверг; 0 - понедельник
+        return (weekdays >= 5) | (hours < self.work_start) | (hours >= self.work_end)
+
+    def update(self, user_ids, timestamps, n_bytes=None, destinations=None):
+        """Учитывает пакет уже проверенных событий, заданных столбцами."""
+        with self._lock:
+            self.store.update(
+                self.store.indices(user_ids),
+                timestamps,
+                n_bytes=n_bytes,
+                off_hours=self.is_off_hours(timestamps),
+                destination_hashes=None if destinations is None else [
+                    -1 if destination is None else destination_hash(destination) for destination in destinations
+                ]
+            )
+            self._dirty = True
+        self._ensure_snapshot_thread()
+
+    def ingest(self, events, identity_index=None):
+        """
+        Учитывает пакет событий. Возвращает (user_ids, errors): затронутые пользователи
+        в порядке первого появления и ошибки невалидных событий [{"index", "error"}].
+        identity_index - индекс псевдонимов для этого пакета (например, снимок из реестра);
+        по умолчанию - self.identity_index.
+        """
+        user_ids, timestamps, volumes, destinations = [], [], [], []
+        errors = []
+        now = time.time()
+        for index, event in enumerate(events):
+            try:
+                if not isinstance(event, dict):
+                    raise InvalidEventError("Event must be an object")
+                user_id = event.get('user_id')
+                if user_id is None or user_id == '':
+                    raise InvalidEventError("Missing 'user_id' in event")
+                timestamp = parse_timestamp(event.get('timestamp'), now)
+                n_bytes = event.get('bytes', 0) or 0
+                if isinstance(n_bytes, bool) or not isinstance(n_bytes, (int, float)) or not 0 <= n_bytes < math.inf:
+                    raise InvalidEventError("'bytes' must be a non-negative number")
+            except InvalidEventError as e:
+                errors.append({"index": index, "error": str(e)})
+                continue
+            destination = event.get('destination')
+            user_ids.append(str(user_id))
+            timestamps.append(timestamp)
+            volumes.append(n_bytes)
+            destinations.append(None if destination is None else str(destination))
+        if identity_index is None:
+            identity_index = self.identity_index
+        if user_ids and identity_index is not None:
+            user_ids = identity_index.canonicalize(user_ids)
+        if user_ids:
+            self.update(user_ids, timestamps, volumes, destinations)
+        return list(dict.fromkeys(user_ids)), errors
+
+    def _features_for_rows(self, rows) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        matrix = np.empty((len(rows), len(FEATURE_NAMES)), dtype=np.float64)
+        event_count = self.store.decayed('event_count', rows)
+        matrix[:, 0] = event_count
+        matrix[:, 1] = np.log1p(self.store.decayed('bytes_total', rows))
+        matrix[:, 2] = np.divide(
+            self.store.decayed('off_hours_count', rows), event_count,
+            out=np.zeros(len(rows)), where=event_count > 0
+        )
+        matrix[:, 3] = self.store.distinct_destinations(rows)
+        return matrix
+
+    def features(self, user_ids) -> np.ndarray:
+        """Матрица признаков (len(user_ids), len(FEATURE_NAMES)); неизвестные пользователи - нули."""
+        matrix = np.zeros((len(user_ids), len(FEATURE_NAMES)), dtype=np.float64)
+        with self._lock:
+            rows = self.store.indices(user_ids, create=False)
+            known = rows >= 0
+            matrix[known] = self._features_for_rows(rows[known])
+        return matrix
+
+    def record(self, user_id: str):
+        """UserRecord с текущим состоянием пользователя или None."""
+        return self.store.record(user_id)
+
+    def snapshot(self, directory: str = None):
+        """Сохраняет состояние в directory (по умолчанию - в каталог из schedule_snapshots)."""
+        directory = directory or self.snapshot_directory
+        with self._lock:
+            self._dirty = False
+            return self.store.snapshot(directory)
+
+    def schedule_snapshots(self, directory: str, interval_seconds: float):
+        """
+        Включает периодические снимки состояния (если были новые события) и снимок при выходе процесса.
+        Поток снимков запускается лениво при первом событии в каждом процессе.
+        """
+        self.snapshot_directory = directory
+        self.snapshot_interval = interval_seconds
+        atexit.register(self._snapshot_if_dirty)
+
+    def _snapshot_if_dirty(self):
+        if self._dirty and self.snapshot_directory:
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"UEBA state snapshot to {self.snapshot_directory} failed: {e}")
+
+    def _ensure_snapshot_thread(self):
+        if self.snapshot_interval <= 0 or not self.snapshot_directory:
+            return
+        if self._snapshot_thread is not None and self._snapshot_pid == os.getpid() and self._snapshot_thread.is_alive():
+            return
+        with self._lock:
+            if self._snapshot_thread is None or self._snapshot_pid != os.getpid() or not self._snapshot_thread.is_alive():
+                self._snapshot_pid = os.getpid()
+                self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name='ueba-snapshot', daemon=True)
+                self._snapshot_thread.start()
+
+    def _snapshot_loop(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            self._snapshot_if_dirty()
+
+    @classmethod
+    def restore(cls, directory: str, **kwargs):
+        """Движок с состоянием из снимка; параметры затухания и окна берутся из снимка."""
+        return cls(store=UserFeatureStore.restore(directory), **kwargs)
+
+    def score(self, model, user_ids):
+        """
+        Оценивает пользователей одним вызовом модели. Возвращает (признаки, is_anomalous, anomaly_score),
+        где больший anomaly_score означает более аномальное поведение.
+        """
+        features = self.features(user_ids)
+        if not len(user_ids):
+            return features, np.zeros(0, dtype=bool), np.zeros(0)
+        return (features, *interpret_ueba_prediction(model, *make_prediction_ueba(model, features)))
+
+    def score_population(self, model, chunk_size: int = DEFAULT_UEBA_CHUNK_SIZE):
+        """
+        Оценивает всех пользователей хранилища (ночной пересчет базовой линии).
+        Генератор отдает (user_ids, признаки, is_anomalous, anomaly_score) по `chunk_size` пользователей.
+        """
+        with self._lock:
+            size = len(self.store)
+            features = self._features_for_rows(np.arange(size))
+            user_ids = list(self.store.user_ids[:size])
+        for start, predictions, scores in make_prediction_ueba_chunks(model, features, chunk_size=chunk_size):
+            end = start + len(predictions)
+            yield (user_ids[start:end], features[start:end], *interpret_ueba_prediction(model, predictions, scores))
+
+
+def interpret_ueba_prediction(model, predictions, scores):
+    """
+    Приводит результат make_prediction_ueba к (is_anomalous, anomaly_score),
+    где больший anomaly_score означает более аномальное поведение.
+    """
+    predictions = np.asarray(predictions)
+    if is_outlier_detector(model):
+        # IsolationForest, OneClassSVM: -1 - аномалия, decision_function < 0 у аномалий
+        is_anomalous = predictions == -1
+        anomaly_scores = -np.asarray(scores, dtype=np.float64) if scores is not None else is_anomalous.astype(np.float64)
+    else:
+        is_anomalous = predictions == 1
+        anomaly_scores = np.asarray(scores, dtype=np.float64) if scores is not None else is_anomalous.astype(np.float64)
+    return is_anomalous, anomaly_scores
+
+
+if __name__ == '__main__':
+    # Ночной пересчет: python -m scripts.ueba_engine features.csv scores.csv [--model models/ueba_model.joblib]
+    # Вход - CSV со строками пользователь-день и столбцами FEATURE_NAMES (плюс любые столбцы-идентификаторы,
+    # которые копируются в выход). Файл читается и оценивается частями, выход пишется по мере готовности.
+    import argparse
+
+    import pandas as pd
+
+    from scripts.model_store import load_model
+
+    parser = argparse.ArgumentParser(description="Score a user-day feature table with the UEBA model.")
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--model', default=os.path.join(os.path.dirname(__file__), '..', 'models', 'ueba_model.joblib'))
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_UEBA_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    total = anomalies = 0
+    header = True
+    for frame in pd.read_csv(args.input, chunksize=args.chunk_size * 4):
+        id_columns = [column for column in frame.columns if column not in FEATURE_NAMES]
+        features = frame[list(FEATURE_NAMES)]
+        for start, predictions, scores in make_prediction_ueba_chunks(model, features, chunk_size=args.chunk_size):
+            is_anomalous, anomaly_scores = interpret_ueba_prediction(model, predictions, scores)
+            output = frame.iloc[start:start + len(predictions)][id_columns].copy()
+            output['anomaly_score'] = anomaly_scores
+            output['is_anomalous'] = is_anomalous
+            output.to_csv(args.output, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            total += len(output)
+            anomalies += int(is_anomalous.sum())
+    print(f"Scored {total} rows, {anomalies} anomalous -> {args.output}")
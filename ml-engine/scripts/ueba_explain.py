@@ -0,0 +1,112 @@
+# ml-engine/scripts/ueba_explain.py
+import numpy as np
+
+from scripts.ueba_engine import FEATURE_NAMES
+
+# Сколько наблюдений должно быть в базовой линии пользователя, чтобы объяснять по ней
+MIN_BASELINE_OBSERVATIONS = 5
+# Нижняя граница стандартного отклонения признака (в порядке FEATURE_NAMES): у пользователя
+# с неизменным поведением std = 0, и любое отклонение давало бы бесконечный z-score
+FEATURE_STD_FLOOR = np.array([1.0, 0.5, 0.05, 1.0])
+DEFAULT_TOP_FACTORS = 3
+
+
+def baseline_zscores(features, means, stds) -> np.ndarray:
+    """z-score каждого признака относительно базовой линии: (значение - среднее) / max(std, FEATURE_STD_FLOOR)."""
+    features = np.asarray(features, dtype=np.float64)
+    floor = FEATURE_STD_FLOOR[:features.shape[1]]
+    return (features - means) / np.fmax(np.nan_to_num(stds, nan=0.0), floor)
+
+
+def isolation_path_contributions(model, features) -> np.ndarray:
+    """
+    Вклад признаков в изоляцию строк лесом изоляции (IsolationForest).
+
+    Разбиение узла с n образцами отправляет строку в потомка с m образцами и "изолирует" ее на
+    log(n / m); типичная обучающая строка в этом узле получает в среднем -(p log p + q log q),
+    где p, q - доли образцов в потомках. Разность (избыточная изоляция) засчитывается признаку
+    разбиения; вклад признака - сумма по пути, усредненная по деревьям. Положительный вклад -
+    признак отделяет строку от обучающих данных быстрее обычного; у нормальных строк вклады около 0.
+
+    Пути всех строк берутся одним вызовом decision_path на дерево, поэтому цикл - по деревьям, а не по строкам.
+    """
+    features = np.asarray(features, dtype=np.float32)
+    n_rows, n_features = features.shape
+    contributions = np.zeros(n_rows * n_features)
+    if not n_rows:
+        return contributions.reshape(n_rows, n_features)
+    for estimator, estimator_features in zip(model.estimators_, model.estimators_features_):
+        tree = estimator.tree_
+        paths = estimator.decision_path(features[:, estimator_features])
+        # Узлы пути идут по возрастанию номера, т.е. от корня к листу; следующий за узлом - его потомок на пути
+        nodes = paths.indices
+        rows = np.repeat(np.arange(n_rows), np.diff(paths.indptr))
+        splits = np.flatnonzero(tree.feature[nodes] >= 0)  # у листьев feature < 0
+        parents = nodes[splits]
+        n_samples = tree.n_node_samples.astype(np.float64)
+        left_share = n_samples[tree.children_left[parents]] / n_samples[parents]
+        expected = -(left_share * np.log(left_share) + (1 - left_share) * np.log(1 - left_share))
+        gains = np.log(n_samples[parents] / n_samples[nodes[splits + 1]])
+        contributions += np.bincount(
+            rows[splits] * n_features + np.asarray(estimator_features)[tree.feature[parents]],
+            weights=gains - expected,
+            minlength=n_rows * n_features
+        )
+    return contributions.reshape(n_rows, n_features) / len(model.estimators_)
+
+
+def contributing_factors(model, features, is_anomalous, user_ids=None, baselines=None,
+                         top_k: int = DEFAULT_TOP_FACTORS) -> list:
+    """
+    Объяснения оценок UEBA: для строк с is_anomalous - до `top_k` признаков с наибольшим вкладом,
+    для остальных - пустые списки (стоимость объяснений растет с числом аномалий, а не с трафиком).
+
+    - Если у пользователя есть базовая линия (UserBaselines, не меньше MIN_BASELINE_OBSERVATIONS
+      наблюдений), вклад - z-score признака относительно нее (method = "baseline_zscore");
+      признаки упорядочены по |z|.
+    - Иначе для леса изоляции - избыточная изоляция по признаку (isolation_path_contributions,
+      method = "isolation_path"); в объяснение попадают только признаки с положительным вкладом.
+    - Иначе объяснение недоступно (пустой список).
+    """
+    is_anomalous = np.asarray(is_anomalous, dtype=bool)
+    factors = [[] for _ in range(len(is_anomalous))]
+    flagged = is_anomalous.nonzero()[0]
+    if not len(flagged):
+        return factors
+    features = np.asarray(features, dtype=np.float64)[flagged]
+    contributions = np.full(features.shape, np.nan)
+    baseline_means = np.full(features.shape, np.nan)
+
+    explained = np.zeros(len(flagged), dtype=bool)
+    if baselines is not None and user_ids is not None:
+        counts, means, stds = baselines.stats([user_ids[row] for row in flagged.tolist()])
+        explained = counts >= MIN_BASELINE_OBSERVATIONS
+        contributions[explained] = baseline_zscores(features[explained], means[explained], stds[explained])
+        baseline_means[explained] = means[explained]
+    use_paths = ~explained
+    if use_paths.any() and hasattr(model, 'estimators_features_'):
+        contributions[use_paths] = isolation_path_contributions(model, features[use_paths])
+    else:
+        use_paths[:] = False
+
+    # z-score важен по модулю (и резкий спад активности подозрителен), вклад в изоляцию - только положительный
+    ranking = np.where(explained[:, None], np.abs(contributions), contributions)
+    order = np.argsort(-np.nan_to_num(ranking, nan=-np.inf), axis=1, kind='stable')[:, :top_k]
+    for position, row in enumerate(flagged.tolist()):
+        if not (explained[position] or use_paths[position]):
+            continue
+        method = "baseline_zscore" if explained[position] else "isolation_path"
+        for feature in order[position].tolist():
+            contribution = float(contributions[position, feature])
+            if not ranking[position, feature] > 0:
+                break
+            factor = {
+                "feature": FEATURE_NAMES[feature],
+                "value": float(features[position, feature]),
+                "contribution": contribution,
+                "method": method
+            }
+            if explained[position]:
+                factor["baseline_mean"] = float(baseline_means[position, feature])
+            factors[row].append(factor)
+    return factors
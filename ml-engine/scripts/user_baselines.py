@@ -0,0 +1,169 @@
+# ml-engine/scripts/user_baselines.py
+import os
+
+import numpy as np
+
+from scripts.model_store import replace_atomically
+from scripts.ueba_engine import FEATURE_NAMES
+
+# Внутренние границы интервалов гистограмм по каждому признаку FEATURE_NAMES (16 интервалов на признак):
+# счетчики - в логарифмической шкале, log-объем и доля - в линейной.
+FEATURE_BIN_EDGES = (
+    np.concatenate([[0.5], np.geomspace(1, 10_000, 14)]),   # event_rate
+    np.linspace(0, 30, 17)[1:-1],                          # data_volume_log
+    np.linspace(0, 1, 17)[1:-1],                           # off_hours_ratio
+    np.concatenate([[0.5], np.geomspace(1, 1_000, 14)]),    # distinct_destinations
+)
+N_BINS = 16
+
+
+class UserBaselines:
+    """
+    Поведенческие базовые линии пользователей, обновляемые мини-пакетами наблюдений признаков.
+
+    Для каждого пользователя и признака:
+    - число наблюдений, среднее и сумма квадратов отклонений (алгоритм Велфорда;
+      пакет сначала сворачивается по пользователям, затем сливается формулой Чана);
+    - гистограмма из N_BINS интервалов с фиксированными границами (FEATURE_BIN_EDGES) -
+      компактный скетч для квантилей (точность - в пределах интервала).
+
+    Все поля - numpy-массивы, строка - плотный индекс пользователя, как в UserFeatureStore.
+    """
+
+    def __init__(self, n_features: int = len(FEATURE_NAMES), capacity: int = 1024):
+        self.n_features = n_features
+        self.user_index = {}
+        self.user_ids = []
+        self._allocate(max(1, capacity))
+
+    def _allocate(self, capacity: int):
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.means = np.zeros((capacity, self.n_features))
+        self.m2 = np.zeros((capacity, self.n_features))
+        self.histograms = np.zeros((capacity, self.n_features, N_BINS), dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.counts)
+
+    def _rows(self, user_ids, create: bool) -> np.ndarray:
+        rows = np.empty(len(user_ids), dtype=np.int64)
+        for position, user_id in enumerate(user_ids):
+            row = self.user_index.get(user_id)
+            if row is None:
+                if create:
+                    row = self.user_index[user_id] = len(self.user_ids)
+                    self.user_ids.append(user_id)
+                else:
+                    row = -1
+            rows[position] = row
+        if len(self.user_ids) > self.capacity:
+            capacity = self.capacity
+            while capacity < len(self.user_ids):
+                capacity *= 2
+            old = (self.counts, self.means, self.m2, self.histograms)
+            self._allocate(capacity)
+            for new_column, old_column in zip((self.counts, self.means, self.m2, self.histograms), old):
+                new_column[:len(old_column)] = old_column
+        return rows
+
+    def update(self, user_ids, features):
+        """Учитывает наблюдения: features[i] - вектор признаков пользователя user_ids[i]."""
+        features = np.asarray(features, dtype=np.float64)
+        if not len(features):
+            return
+        rows = self._rows(user_ids, create=True)
+        groups, inverse, batch_counts = np.unique(rows, return_inverse=True, return_counts=True)
+
+        # Среднее и сумма квадратов отклонений пакета по каждому пользователю
+        batch_sums = np.zeros((len(groups), self.n_features))
+        np.add.at(batch_sums, inverse, features)
+        batch_means = batch_sums / batch_counts[:, None]
+        batch_m2 = np.zeros((len(groups), self.n_features))
+        np.add.at(batch_m2, inverse, (features - batch_means[inverse]) ** 2)
+
+        # Слияние с накопленными значениями (Chan et al.)
+        counts = self.counts[groups]
+        total = counts + batch_counts
+        delta = batch_means - self.means[groups]
+        self.means[groups] += delta * (batch_counts / total)[:, None]
+        self.m2[groups] += batch_m2 + delta ** 2 * (counts * batch_counts / total)[:, None]
+        self.counts[groups] = total
+
+        for feature, edges in enumerate(FEATURE_BIN_EDGES[:self.n_features]):
+            bins = np.searchsorted(edges, features[:, feature], side='right')
+            np.add.at(self.histograms, (rows, feature, bins), 1)
+
+    def stats(self, user_ids):
+        """(counts, means, stds) для пользователей; у неизвестных count = 0, mean = 0, std = nan."""
+        rows = self._rows(user_ids, create=False)
+        known = rows >= 0
+        counts = np.zeros(len(rows), dtype=np.int64)
+        means = np.zeros((len(rows), self.n_features))
+        stds = np.full((len(rows), self.n_features), np.nan)
+        counts[known] = self.counts[rows[known]]
+        means[known] = self.means[rows[known]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stds[known] = np.sqrt(self.m2[rows[known]] / (counts[known] - 1)[:, None])
+        return counts, means, stds
+
+    def quantiles(self, user_ids, q: float) -> np.ndarray:
+        """
+        Квантиль q каждого признака по гистограмме пользователя (линейная интерполяция внутри интервала,
+        признаки неотрицательны; последний интервал открыт - берется его нижняя граница).
+        У неизвестных пользователей - nan.
+        """
+        rows = self._rows(user_ids, create=False)
+        result = np.full((len(rows), self.n_features), np.nan)
+        known = rows >= 0
+        histograms = self.histograms[rows[known]].astype(np.float64)
+        cumulative = np.cumsum(histograms, axis=2)
+        totals = cumulative[:, :, -1:]
+        target = q * totals
+        bins = np.minimum((cumulative < target).sum(axis=2), N_BINS - 1)
+        for feature, edges in enumerate(FEATURE_BIN_EDGES[:self.n_features]):
+            lower = np.concatenate([[0.0], edges])[bins[:, feature]]
+            upper = np.concatenate([edges, [edges[-1]]])[bins[:, feature]]
+            below = np.take_along_axis(cumulative[:, feature], bins[:, feature:feature + 1] - 1, axis=1)[:, 0]
+            below = np.where(bins[:, feature] > 0, below, 0)
+            in_bin = np.take_along_axis(histograms[:, feature], bins[:, feature:feature + 1], axis=1)[:, 0]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                fraction = np.clip((target[:, feature, 0] - below) / in_bin, 0, 1)
+            values = lower + np.nan_to_num(fraction) * (upper - lower)
+            result[known, feature] = np.where(totals[:, feature, 0] > 0, values, np.nan)
+        return result
+
+    def save(self, path: str):
+        """Атомарно сохраняет базовые линии в .npz."""
+        size = len(self)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    user_ids=np.asarray(self.user_ids, dtype=str),
+                    counts=self.counts[:size], means=self.means[:size],
+                    m2=self.m2[:size], histograms=self.histograms[:size]
+                )
+
+        replace_atomically(directory, '.npz', path, write)
+        return path
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            user_ids = data['user_ids'].tolist()
+            baselines = cls(n_features=data['means'].shape[1], capacity=max(1, len(user_ids)))
+            baselines.user_ids = user_ids
+            baselines.user_index = {user_id: row for row, user_id in enumerate(user_ids)}
+            size = len(user_ids)
+            baselines.counts[:size] = data['counts']
+            baselines.means[:size] = data['means']
+            baselines.m2[:size] = data['m2']
+            baselines.histograms[:size] = data['histograms']
+        return baselines
@@ -0,0 +1,448 @@
+# ml-engine/scripts/windows.py
+"""
+Оконные агрегаты по потоку событий активности (например, "байт за последний час"
+против "байт за 30 дней") с ключом по пользователю и/или сущности.
+
+- SlidingWindowAggregator - скользящие окна произвольной длины (кратной слоту) на момент запроса;
+- TumblingWindowAggregator - неперекрывающиеся окна фиксированной длины, выдаются по закрытии;
+- SessionWindowAggregator - сессии, разделенные паузой не меньше gap.
+
+Состояние хранится столбцами numpy с плотным индексом ключа, как в UserFeatureStore.
+Скользящие и фиксированные окна - кольцевые буферы слотов: слот переиспользуется,
+когда приходит событие более нового интервала, поэтому обновление - O(1) на событие
+без отдельной очистки устаревших данных. Пакет событий учитывается векторизованно.
+
+Опоздавшие события: водяной знак (watermark) = максимальное время события минус allowed_lateness.
+Событие старше водяного знака на момент прихода пакета отбрасывается и учитывается в late_events;
+окно (сессия) закрывается, когда водяной знак проходит его конец.
+"""
+import math
+
+import numpy as np
+
+from scripts.ueba_engine import InvalidEventError, parse_timestamp
+
+_EMPTY_BUCKET = np.iinfo(np.int64).min
+
+
+class WindowAggregates:
+    """Агрегаты набора окон в столбцах: ключ, начало и конец окна, число событий и суммы полей."""
+
+    __slots__ = ('fields', 'keys', 'start', 'end', 'count', 'sums')
+
+    def __init__(self, fields, keys, start, end, count, sums):
+        self.fields = tuple(fields)
+        self.keys = list(keys)
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.count = np.asarray(count, dtype=np.int64)
+        self.sums = np.asarray(sums, dtype=np.float64).reshape(len(self.keys), len(self.fields))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def empty(cls, fields):
+        return cls(fields, [], np.zeros(0), np.zeros(0), np.zeros(0), np.zeros((0, len(fields))))
+
+    @classmethod
+    def concatenate(cls, fields, results):
+        results = [result for result in results if len(result)]
+        if not results:
+            return cls.empty(fields)
+        return cls(
+            fields,
+            [key for result in results for key in result.keys],
+            np.concatenate([result.start for result in results]),
+            np.concatenate([result.end for result in results]),
+            np.concatenate([result.count for result in results]),
+            np.concatenate([result.sums for result in results])
+        )
+
+    def to_records(self) -> list[dict]:
+        return [
+            {"key": key, "start": start, "end": end, "count": count, **dict(zip(self.fields, sums))}
+            for key, start, end, count, sums in zip(
+                self.keys, self.start.tolist(), self.end.tolist(), self.count.tolist(), self.sums.tolist()
+            )
+        ]
+
+
+def events_to_columns(events, key_fields=('user_id',), value_fields=('bytes',)):
+    """
+    Переводит события-словари в столбцы для update(): (keys, timestamps, values, errors).
+    Ключ - значение поля при одном key_fields, иначе кортеж значений (например, пользователь и адрес).
+    Невалидные события попадают в errors [{"index", "error"}], как в UebaEngine.ingest.
+    """
+    keys, timestamps, values, errors = [], [], [], []
+    for index, event in enumerate(events):
+        try:
+            if not isinstance(event, dict):
+                raise InvalidEventError("Event must be an object")
+            key = tuple(event.get(field) for field in key_fields)
+            if any(part is None or part == '' for part in key):
+                raise InvalidEventError(f"Missing key field in event (expected {', '.join(key_fields)})")
+            timestamp = parse_timestamp(event.get('timestamp'))
+            row = [event.get(field, 0) or 0 for field in value_fields]
+            if any(isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) for value in row):
+                raise InvalidEventError(f"Value fields must be finite numbers ({', '.join(value_fields)})")
+        except InvalidEventError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        keys.append(key[0] if len(key) == 1 else key)
+        timestamps.append(timestamp)
+        values.append(row)
+    return keys, np.asarray(timestamps, dtype=np.float64), np.asarray(values, dtype=np.float64).reshape(-1, len(value_fields)), errors
+
+
+class _KeyedWindows:
+    """Общая часть агрегаторов: индекс ключей, рост столбцов, водяной знак и массовая загрузка."""
+
+    def __init__(self, fields, allowed_lateness: float, capacity: int):
+        self.fields = tuple(fields)
+        self.allowed_lateness = allowed_lateness
+        self.key_index = {}
+        self.keys = []
+        self.max_event_time = -math.inf
+        self.late_events = 0
+        self._allocate(max(1, capacity))
+
+    def _allocate(self, capacity: int):
+        raise NotImplementedError
+
+    def _columns(self) -> dict:
+        raise NotImplementedError
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def capacity(self) -> int:
+        return len(next(iter(self._columns().values())))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self._columns().values())
+
+    @property
+    def watermark(self) -> float:
+        return self.max_event_time - self.allowed_lateness
+
+    def _rows(self, keys) -> np.ndarray:
+        index = self.key_index
+        rows = np.empty(len(keys), dtype=np.int64)
+        for position, key in enumerate(keys):
+            row = index.get(key)
+            if row is None:
+                row = index[key] = len(self.keys)
+                self.keys.append(key)
+            rows[position] = row
+        if len(self.keys) > self.capacity:
+            capacity = self.capacity
+            while capacity < len(self.keys):
+                capacity *= 2
+            old_columns = self._columns()
+            self._allocate(capacity)
+            for name, column in self._columns().items():
+                column[:len(old_columns[name])] = old_columns[name]
+        return rows
+
+    def _accept(self, keys, timestamps, values):
+        """Отбрасывает опоздавшие события и возвращает (rows, timestamps, values) остальных."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if values is None:
+            values = np.zeros((len(timestamps), len(self.fields)))
+        else:
+            values = np.asarray(values, dtype=np.float64).reshape(len(timestamps), len(self.fields))
+        on_time = timestamps >= self.watermark
+        if not on_time.all():
+            self.late_events += int((~on_time).sum())
+            keys = [key for key, keep in zip(keys, on_time.tolist()) if keep]
+            timestamps, values = timestamps[on_time], values[on_time]
+        if len(timestamps):
+            self.max_event_time = max(self.max_event_time, float(timestamps.max()))
+        return self._rows(keys), timestamps, values
+
+    def update(self, keys, timestamps, values=None) -> WindowAggregates:
+        """
+        Учитывает пакет событий: keys[i] - ключ, timestamps[i] - unix-время, values[i] - значения полей fields.
+        Возвращает окна, закрытые после продвижения водяного знака.
+        """
+        raise NotImplementedError
+
+    def backfill(self, keys, timestamps, values=None, chunk_size: int = 1_000_000) -> WindowAggregates:
+        """
+        Массовая загрузка исторических событий в произвольном порядке: события сортируются
+        по времени и учитываются векторизованными пакетами по `chunk_size`.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        order = np.argsort(timestamps, kind='stable')
+        values = None if values is None else np.asarray(values, dtype=np.float64).reshape(len(timestamps), len(self.fields))[order]
+        keys = [keys[i] for i in order.tolist()]
+        timestamps = timestamps[order]
+        results = []
+        for start in range(0, len(timestamps), chunk_size):
+            end = start + chunk_size
+            results.append(self.update(keys[start:end], timestamps[start:end], None if values is None else values[start:end]))
+        return WindowAggregates.concatenate(self.fields, results)
+
+
+class _RingWindows(_KeyedWindows):
+    """Кольцевой буфер из n_slots интервалов длиной slot_seconds на каждый ключ."""
+
+    def __init__(self, slot_seconds: float, n_slots: int, fields, allowed_lateness: float, capacity: int):
+        self.slot_seconds = slot_seconds
+        self.n_slots = n_slots
+        super().__init__(fields, allowed_lateness, capacity)
+
+    def _allocate(self, capacity: int):
+        # bucket_ids - номер интервала (floor(t / slot_seconds)), которому сейчас принадлежит слот
+        self.bucket_ids = np.full((capacity, self.n_slots), _EMPTY_BUCKET, dtype=np.int64)
+        self.counts = np.zeros((capacity, self.n_slots), dtype=np.int64)
+        self.sums = np.zeros((capacity, self.n_slots, len(self.fields)))
+
+    def _columns(self) -> dict:
+        return {'bucket_ids': self.bucket_ids, 'counts': self.counts, 'sums': self.sums}
+
+    def _add_to_ring(self, rows, timestamps, values):
+        """
+        Учитывает события в кольце. Возвращает вытесненные интервалы (flat, bucket_ids, counts, sums):
+        слоты, которые заняли события более новых интервалов.
+        """
+        buckets = np.floor(timestamps / self.slot_seconds).astype(np.int64)
+        flat = rows * self.n_slots + buckets % self.n_slots
+        bucket_ids = self.bucket_ids.reshape(-1)
+        counts = self.counts.reshape(-1)
+        sums = self.sums.reshape(-1, len(self.fields))
+        before = bucket_ids[flat]
+        np.maximum.at(bucket_ids, flat, buckets)
+        after = bucket_ids[flat]
+        reset, first = np.unique(flat[after != before], return_index=True)
+        evicted = (reset, before[after != before][first], counts[reset].copy(), sums[reset].copy())
+        counts[reset] = 0
+        sums[reset] = 0
+        # События интервала, уже вытесненного из кольца более новым, не учитываются
+        current = buckets == after
+        self.late_events += int((~current).sum())
+        np.add.at(counts, flat[current], 1)
+        np.add.at(sums, flat[current], values[current])
+        return evicted
+
+
+class SlidingWindowAggregator(_RingWindows):
+    """
+    Скользящие окна: aggregate() суммирует слоты, попадающие в последние window_seconds.
+    Точность границы окна - один слот; максимальная длина окна - slot_seconds * n_slots.
+
+    Память - n_slots * (16 + 8 * len(fields)) байт на ключ, поэтому короткие и длинные окна
+    лучше держать в разных агрегаторах: "последний час" - 60 слотов по минуте,
+    "30 дней" - 30 слотов по дню.
+    """
+
+    def __init__(self, slot_seconds: float = 60, n_slots: int = 60, fields=('bytes',),
+                 allowed_lateness: float = 0, capacity: int = 1024):
+        if allowed_lateness >= slot_seconds * n_slots:
+            raise ValueError("allowed_lateness must be shorter than the ring span (slot_seconds * n_slots)")
+        super().__init__(slot_seconds, n_slots, fields, allowed_lateness, capacity)
+
+    def update(self, keys, timestamps, values=None) -> WindowAggregates:
+        rows, timestamps, values = self._accept(keys, timestamps, values)
+        if len(rows):
+            self._add_to_ring(rows, timestamps, values)  # Вытесненные слоты старше окна кольца - просто отбрасываются
+        return WindowAggregates.empty(self.fields)
+
+    def aggregate(self, keys, window_seconds: float, now: float = None) -> WindowAggregates:
+        """
+        Агрегаты за окно (now - window_seconds, now] для каждого ключа; неизвестные ключи - нули.
+        По умолчанию now - время самого нового события.
+        """
+        window_slots = math.ceil(window_seconds / self.slot_seconds)
+        if window_slots > self.n_slots:
+            raise ValueError(f"Window longer than the ring span ({self.slot_seconds * self.n_slots:g}s)")
+        now = self.max_event_time if now is None else now
+        now_bucket = math.floor(now / self.slot_seconds) if math.isfinite(now) else 0
+        rows = np.fromiter((self.key_index.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+        known = rows >= 0
+        bucket_ids = self.bucket_ids[rows[known]]
+        in_window = (bucket_ids > now_bucket - window_slots) & (bucket_ids <= now_bucket)
+        count = np.zeros(len(keys), dtype=np.int64)
+        sums = np.zeros((len(keys), len(self.fields)))
+        count[known] = np.where(in_window, self.counts[rows[known]], 0).sum(axis=1)
+        sums[known] = np.einsum('rs,rsf->rf', in_window, self.sums[rows[known]])
+        end = (now_bucket + 1) * self.slot_seconds
+        return WindowAggregates(
+            self.fields, keys, np.full(len(keys), end - window_slots * self.slot_seconds), np.full(len(keys), end), count, sums
+        )
+
+
+class TumblingWindowAggregator(_RingWindows):
+    """
+    Неперекрывающиеся окна [k * window_seconds, (k + 1) * window_seconds).
+    Окно выдается из update() один раз, когда водяной знак проходит его конец;
+    flush() выдает все еще открытые окна (конец потока или массовой загрузки).
+    """
+
+    def __init__(self, window_seconds: float = 3600, fields=('bytes',), allowed_lateness: float = 0, capacity: int = 1024):
+        # Слотов на одно больше, чем окон в пределах опоздания: слот переиспользуется только окном,
+        # начавшимся после закрытия прежнего, поэтому вытесняемое окно всегда можно выдать
+        self._lateness_windows = math.ceil(allowed_lateness / window_seconds)
+        super().__init__(window_seconds, self._lateness_windows + 2, fields, allowed_lateness, capacity)
+        self.window_seconds = window_seconds
+        self._emitted_bucket = _EMPTY_BUCKET + 1  # Все окна с номером меньше уже выданы
+
+    def _windows(self, rows, buckets, counts, sums) -> WindowAggregates:
+        starts = buckets * self.window_seconds
+        return WindowAggregates(
+            self.fields, [self.keys[row] for row in rows.tolist()], starts, starts + self.window_seconds, counts, sums
+        )
+
+    def _emit(self, until_bucket: int) -> WindowAggregates:
+        """Выдает окна с номерами в [_emitted_bucket, until_bucket); вызывается раз на смену окна."""
+        if until_bucket <= self._emitted_bucket:
+            return WindowAggregates.empty(self.fields)
+        size = len(self.keys)
+        bucket_ids = self.bucket_ids[:size]
+        rows, slots = np.nonzero(
+            (bucket_ids >= self._emitted_bucket) & (bucket_ids < until_bucket) & (self.counts[:size] > 0)
+        )
+        order = np.argsort(bucket_ids[rows, slots], kind='stable')
+        rows, slots = rows[order], slots[order]
+        self._emitted_bucket = until_bucket
+        return self._windows(rows, bucket_ids[rows, slots], self.counts[rows, slots], self.sums[rows, slots])
+
+    def update(self, keys, timestamps, values=None) -> WindowAggregates:
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if not len(timestamps):
+            return WindowAggregates.empty(self.fields)
+        buckets = np.floor(timestamps / self.window_seconds).astype(np.int64)
+        # Пакет, охватывающий не меньше n_slots окон, учитывается частями по времени,
+        # чтобы события одного пакета не вытесняли друг друга из кольца
+        if buckets.max() - buckets.min() >= self.n_slots:
+            order = np.argsort(buckets, kind='stable')
+            sorted_buckets = buckets[order]
+            values = None if values is None else np.asarray(values, dtype=np.float64).reshape(len(timestamps), len(self.fields))
+            results = []
+            start = 0
+            while start < len(order):
+                end = int(np.searchsorted(sorted_buckets, sorted_buckets[start] + self.n_slots))
+                part = order[start:end]
+                results.append(self._update_part(
+                    [keys[i] for i in part.tolist()], timestamps[part], None if values is None else values[part]
+                ))
+                start = end
+            return WindowAggregates.concatenate(self.fields, results)
+        return self._update_part(keys, timestamps, values)
+
+    def _update_part(self, keys, timestamps, values) -> WindowAggregates:
+        rows, timestamps, values = self._accept(keys, timestamps, values)
+        if not len(rows):
+            return WindowAggregates.empty(self.fields)
+        flat, buckets, counts, sums = self._add_to_ring(rows, timestamps, values)
+        # Вытесненное окно уже закрыто водяным знаком (слотов больше, чем окон в пределах опоздания)
+        pending = (buckets >= self._emitted_bucket) & (counts > 0)
+        evicted = self._windows(flat[pending] // self.n_slots, buckets[pending], counts[pending], sums[pending])
+        return WindowAggregates.concatenate(self.fields, [evicted, self._emit(math.floor(self.watermark / self.window_seconds))])
+
+    def flush(self) -> WindowAggregates:
+        """Выдает все открытые окна."""
+        if not math.isfinite(self.max_event_time):
+            return WindowAggregates.empty(self.fields)
+        return self._emit(math.floor(self.max_event_time / self.window_seconds) + 1)
+
+
+class SessionWindowAggregator(_KeyedWindows):
+    """
+    Сессионные окна: события ключа, между которыми пауза меньше gap_seconds, образуют одну сессию.
+    На ключ хранится одна открытая сессия (начало, конец, число событий, суммы).
+
+    Пакет сортируется по (ключ, время) вместе с открытыми сессиями затронутых ключей,
+    границы сессий находятся векторизованно; все сессии ключа, кроме последней, закрываются сразу,
+    последняя остается открытой, пока водяной знак не пройдет ее конец + gap.
+    Опоздавшее событие, которое относилось бы к уже закрытой сессии, открывает новую.
+    """
+
+    def __init__(self, gap_seconds: float = 1800, fields=('bytes',), allowed_lateness: float = 0, capacity: int = 1024):
+        self.gap_seconds = gap_seconds
+        super().__init__(fields, allowed_lateness, capacity)
+        self._next_expiry = math.inf
+
+    def _allocate(self, capacity: int):
+        self.session_start = np.zeros(capacity)
+        self.session_end = np.zeros(capacity)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.sums = np.zeros((capacity, len(self.fields)))
+
+    def _columns(self) -> dict:
+        return {'session_start': self.session_start, 'session_end': self.session_end, 'counts': self.counts, 'sums': self.sums}
+
+    def _sessions(self, rows) -> WindowAggregates:
+        return WindowAggregates(
+            self.fields, [self.keys[row] for row in rows.tolist()],
+            self.session_start[rows], self.session_end[rows], self.counts[rows], self.sums[rows]
+        )
+
+    def update(self, keys, timestamps, values=None) -> WindowAggregates:
+        rows, timestamps, values = self._accept(keys, timestamps, values)
+        if not len(rows):
+            return WindowAggregates.empty(self.fields)
+
+        # Открытые сессии затронутых ключей участвуют в разбиении наравне с событиями
+        touched = np.unique(rows)
+        open_rows = touched[self.counts[touched] > 0]
+        item_rows = np.concatenate([rows, open_rows])
+        begins = np.concatenate([timestamps, self.session_start[open_rows]])
+        ends = np.concatenate([timestamps, self.session_end[open_rows]])
+        counts = np.concatenate([np.ones(len(rows), dtype=np.int64), self.counts[open_rows]])
+        sums = np.concatenate([values, self.sums[open_rows]])
+
+        order = np.lexsort((begins, item_rows))
+        item_rows, begins, ends, counts, sums = item_rows[order], begins[order], ends[order], counts[order], sums[order]
+
+        # Накопленный максимум конца внутри ключа: ключи разнесены сдвигом, поэтому хватает одного accumulate
+        origin = begins.min()
+        offset = ends.max() - origin + self.gap_seconds + 1
+        shifted = item_rows * offset
+        running_end = np.maximum.accumulate(ends - origin + shifted) - shifted + origin
+
+        new_session = np.ones(len(item_rows), dtype=bool)
+        new_session[1:] = (item_rows[1:] != item_rows[:-1]) | (begins[1:] - running_end[:-1] >= self.gap_seconds)
+        starts = np.flatnonzero(new_session)
+        session_rows = item_rows[starts]
+        session_start = begins[starts]
+        session_end = np.maximum.reduceat(ends, starts)
+        session_counts = np.add.reduceat(counts, starts)
+        session_sums = np.add.reduceat(sums, starts, axis=0)
+
+        # Последняя сессия ключа остается открытой, предыдущие закрыты
+        last = np.ones(len(starts), dtype=bool)
+        last[:-1] = session_rows[1:] != session_rows[:-1]
+        closed = WindowAggregates(
+            self.fields, [self.keys[row] for row in session_rows[~last].tolist()],
+            session_start[~last], session_end[~last], session_counts[~last], session_sums[~last]
+        )
+        open_rows = session_rows[last]
+        self.session_start[open_rows] = session_start[last]
+        self.session_end[open_rows] = session_end[last]
+        self.counts[open_rows] = session_counts[last]
+        self.sums[open_rows] = session_sums[last]
+        self._next_expiry = min(self._next_expiry, float(session_end[last].min()) + self.gap_seconds)
+        return WindowAggregates.concatenate(self.fields, [closed, self._expire(self.watermark)])
+
+    def _expire(self, until: float) -> WindowAggregates:
+        """Закрывает сессии, чей конец + gap не позже until."""
+        if until < self._next_expiry:
+            return WindowAggregates.empty(self.fields)
+        size = len(self.keys)
+        is_open = self.counts[:size] > 0
+        expired = np.flatnonzero(is_open & (self.session_end[:size] + self.gap_seconds <= until))
+        result = self._sessions(expired)
+        self.counts[expired] = 0
+        self.sums[expired] = 0
+        still_open = is_open.copy()
+        still_open[expired] = False
+        self._next_expiry = float(self.session_end[:size][still_open].min()) + self.gap_seconds if still_open.any() else math.inf
+        return result
+
+    def flush(self) -> WindowAggregates:
+        """Закрывает все открытые сессии."""
+        return self._expire(math.inf)
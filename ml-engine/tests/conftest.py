@@ -0,0 +1,16 @@
+# ml-engine/tests/conftest.py
+import pytest
+
+from benchmarks.common import build_sample_text_model, build_sample_ueba_model
+
+
+@pytest.fixture(scope="session")
+def text_model():
+    """Небольшой пайплайн TF-IDF + MultinomialNB той же структуры, что и scripts/train_model.py."""
+    return build_sample_text_model(n_samples=60)
+
+
+@pytest.fixture(scope="session")
+def ueba_model():
+    """IsolationForest по признакам UEBA на синтетических "нормальных" пользователях."""
+    return build_sample_ueba_model(n_samples=2000)
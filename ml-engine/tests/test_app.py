@@ -60,6 +60,11 @@ def test_predict_document_sensitivity_valid_input():
     assert "prediction_label" in data
     assert "probability" in data
     assert isinstance(data["probability"], float)
+    # Ключевые слова из условий contains опубликованных политик; без политик - пустой список
+    assert isinstance(data["keywords_found"], list)
+    # Структурированные данные с проверкой контрольных сумм: в тексте без номеров и адресов - пустой словарь
+    assert data["pii_found"] == {}
+    assert data["edm_matches"] == {"matched_records": 0, "records": []}
     # Можно добавить более конкретные проверки, если вы знаете ожидаемые метки
     # Например: assert data["prediction_label"] in ["Confidential", "Internal", "Public"]
 
@@ -89,7 +94,182 @@ def test_predict_document_sensitivity_empty_content():
     assert "prediction_label" in data
     # Ожидаемое поведение для пустого текста зависит от вашей модели (например, "Public")
 
-# Добавьте тесты для /predict/user_anomaly, когда он будет реализован
+def test_predict_document_sensitivity_batch_valid_input():
+    """Тестирует пакетный эндпоинт /predict/document_sensitivity/batch."""
+    payload = {
+        "documents": [
+            {"id": "doc-1", "text_content": "Strictly confidential merger details.", "metadata": {"filename": "merger.docx"}},
+            {"id": "doc-2", "text_content": "Public announcement about our new product."},
+        ]
+    }
+    headers = {'Content-Type': 'application/json'}
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity/batch", data=json.dumps(payload), headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 2
+    assert data["errors"] == []
+    assert [result["id"] for result in data["results"]] == ["doc-1", "doc-2"]
+    assert data["results"][0]["metadata"] == {"filename": "merger.docx"}
+    for result in data["results"]:
+        assert "prediction_label" in result
+        assert isinstance(result["probability"], float)
+
+def test_predict_document_sensitivity_batch_partial_errors():
+    """Невалидный документ попадает в errors и не роняет весь пакет."""
+    payload = {
+        "documents": [
+            {"id": "ok", "text_content": "Internal memo about office relocation."},
+            {"id": "no-text", "metadata": {"filename": "empty.txt"}},
+            {"id": "bad-type", "text_content": 12345},
+        ]
+    }
+    headers = {'Content-Type': 'application/json'}
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity/batch", data=json.dumps(payload), headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [result["id"] for result in data["results"]] == ["ok"]
+    assert [error["id"] for error in data["errors"]] == ["no-text", "bad-type"]
+    assert "Missing 'text_content'" in data["errors"][0]["error"]
+
+def test_predict_document_sensitivity_batch_missing_documents():
+    """Тестирует пакетный эндпоинт без поля documents."""
+    headers = {'Content-Type': 'application/json'}
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity/batch", data=json.dumps({}), headers=headers)
+
+    assert response.status_code == 400
+    assert "Missing 'documents'" in response.json()["error"]
+
+def test_predict_document_sensitivity_stream_matches_single_request():
+    """Потоковый эндпоинт дает тот же результат, что и разовый запрос."""
+    text = " ".join(["Strictly confidential merger and acquisition details."] * 200 + ["Public announcement."] * 200)
+    single = requests.post(f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity", json={"text_content": text}).json()
+
+    def body_chunks():
+        encoded = text.encode("utf-8")
+        for start in range(0, len(encoded), 1000):
+            yield encoded[start:start + 1000]
+
+    response = requests.post(
+        f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity/stream",
+        params={"breakdown": "true", "segment_chars": 2000},
+        data=body_chunks(),  # генератор -> Transfer-Encoding: chunked
+        headers={'Content-Type': 'text/plain'}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["prediction_label"] == single["prediction_label"]
+    assert abs(data["probability"] - single["probability"]) < 1e-9
+    assert data["characters"] == len(text)
+    assert len(data["segments"]) > 1
+    assert data["segments"][-1]["end"] == len(text)
+
+def test_batch_and_stream_report_pii_found():
+    """pii_found, keywords_found и edm_matches - в каждом результате пакета; pii_found - и в потоковом ответе."""
+    text = "Payment details: card 4111 1111 1111 1111, contact ivan.petrov@example.kz. " * 100
+    single = requests.post(f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity", json={"text_content": text}).json()
+    batch = requests.post(
+        f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity/batch",
+        json={"documents": [{"id": "a", "text_content": text}, {"id": "b", "text_content": "Public announcement."}]}
+    ).json()
+    assert batch["results"][0]["pii_found"] == single["pii_found"]
+    assert batch["results"][0]["pii_found"]["credit_card"]["count"] == 100
+    assert batch["results"][1]["pii_found"] == {}
+    for result in batch["results"]:
+        assert isinstance(result["keywords_found"], list) and "matched_records" in result["edm_matches"]
+
+    # Сегменты по 1000 символов режут номера карт и адреса на стыках
+    response = requests.post(
+        f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity/stream",
+        params={"segment_chars": 1000}, data=text.encode("utf-8"), headers={'Content-Type': 'text/plain'}
+    )
+    assert response.status_code == 200
+    assert response.json()["pii_found"] == single["pii_found"]
+
+def test_model_version_reflects_loaded_artifact():
+    """model_version - версия загруженного файла модели, одинаковая во всех эндпоинтах."""
+    single = requests.post(f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity", json={"text_content": "Salary report"}).json()
+    batch = requests.post(
+        f"{ML_ENGINE_BASE_URL}/predict/document_sensitivity/batch",
+        json={"documents": [{"id": "a", "text_content": "Salary report"}]}
+    ).json()
+
+    assert single["model_version"] == batch["model_version"]
+    assert single["model_version"] != "1.0.0"
+
+def test_admin_reload_requires_token():
+    """Без X-Admin-Token перезагрузка модели недоступна."""
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/admin/models/reload", json={"wait": True})
+    assert response.status_code in (401, 403)
+
+def test_admin_identities_requires_token():
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/admin/identities", json={"add": {"ws-1": "jdoe"}})
+    assert response.status_code in (401, 403)
+
+def test_evaluate_policies():
+    """Тестирует /policies/evaluate; без опубликованного набора политик ответ 503."""
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/policies/evaluate", json={"event": {"channel": "usb", "content": "x"}})
+    assert response.status_code in (200, 503)
+    if response.status_code == 200:
+        data = response.json()
+        assert len(data["results"]) == 1 and "policy_set_version" in data
+
+def test_evaluate_policies_invalid_events():
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/policies/evaluate", json={"events": ["not an object"]})
+    assert response.status_code == 400
+
+def test_admin_policies_requires_token():
+    response = requests.put(f"{ML_ENGINE_BASE_URL}/admin/policies", json={"policies": []})
+    assert response.status_code in (401, 403)
+
+def test_predict_user_anomaly_ingests_events():
+    """Тестирует /predict/user_anomaly с сырыми событиями; без модели UEBA ответ 503, но события учитываются."""
+    payload = {"events": [
+        {"user_id": "it-user-1", "timestamp": "2024-01-01T10:00:00Z", "bytes": 2048, "destination": "fileshare"},
+        {"user_id": "it-user-1", "timestamp": "2024-01-01T23:30:00Z", "bytes": 4096, "destination": "usb"},
+        {"user_id": "it-user-2", "timestamp": 1704103200},
+        {"timestamp": 1704103200},
+    ]}
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/predict/user_anomaly", json=payload)
+
+    assert response.status_code in (200, 503)
+    data = response.json()
+    assert data["events_ingested"] == 3
+    assert [error["index"] for error in data["errors"]] == [3]
+    if response.status_code == 200:
+        assert [result["user_id"] for result in data["results"]] == ["it-user-1", "it-user-2"]
+        assert isinstance(data["results"][0]["is_anomalous"], bool)
+        assert data["results"][0]["features"]["distinct_destinations"] >= 2
+        for result in data["results"]:
+            # Объяснения только у аномальных пользователей
+            assert bool(result["contributing_factors"]) <= result["is_anomalous"]
+
+def test_predict_user_anomaly_missing_events():
+    """Тестирует /predict/user_anomaly без событий."""
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/predict/user_anomaly", json={"foo": "bar"})
+    assert response.status_code == 400
+
+def test_ingest_user_events_gzip_ndjson():
+    """Тестирует /ingest/user_events: gzip NDJSON учитывается целиком, в ответе - только пользователи выше порога."""
+    import gzip
+    lines = [json.dumps({"user_id": f"ingest-user-{i % 5}", "timestamp": 1704103200 + i, "bytes": 1000}) for i in range(50)]
+    body = gzip.compress(("\n".join(lines + ["not json"]) + "\n").encode("utf-8"))
+    response = requests.post(
+        f"{ML_ENGINE_BASE_URL}/ingest/user_events", params={"threshold": 1e9}, data=body,
+        headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+    )
+
+    assert response.status_code in (200, 503)
+    data = response.json()
+    assert data["events_received"] == 51 and data["events_ingested"] == 50
+    assert data["error_count"] == 1 and data["errors"][0]["index"] == 50
+    assert data["anomalies"] == []
+
+def test_ingest_user_events_invalid_threshold():
+    response = requests.post(f"{ML_ENGINE_BASE_URL}/ingest/user_events", params={"threshold": "high"}, data=b"")
+    assert response.status_code == 400
 
 # Чтобы запустить тесты:
 # 1. Убедитесь, что ML-сервис запущен (например, `docker-compose up ml-engine` или `python app.py`)
@@ -0,0 +1,92 @@
+# ml-engine/tests/test_edm_index.py
+import csv
+
+import numpy as np
+
+from scripts.edm_index import EdmIndex, MAX_RECORDS_PER_VALUE, normalize_cell
+
+COLUMNS = ['name', 'phone', 'email', 'city']
+ROWS = [
+    ['Иван Петров', '+7 701 123-45-67', 'ivan.petrov@mail.kz', 'Алматы'],
+    ['Анна Ким', '8 (727) 250 11 22', 'anna.kim@mail.kz', 'Алматы'],
+    ['John Smith', '+1 555 010 9999', 'john.smith@example.com', 'Астана'],
+]
+
+
+def test_normalize_cell():
+    assert normalize_cell('Иван ПЕТРОВ') == ['иван', 'петров']
+    # Разделители групп цифр не влияют на значение, адрес почты - один токен
+    assert normalize_cell('+7 (701) 123-45-67') == normalize_cell('77011234567') == ['77011234567']
+    assert normalize_cell('Ivan.Petrov@Mail.kz') == ['ivan.petrov@mail.kz']
+    assert normalize_cell('  ') == []
+
+
+def test_match_requires_several_columns():
+    index = EdmIndex.build(ROWS, COLUMNS, salt=b'test-salt')
+    assert len(index) == 12
+
+    text = "Клиент иван  ПЕТРОВ, тел. 7-701-1234567, проживает в г. Алматы."
+    result = index.match(text)
+    assert result["matched_records"] == 1
+    record = result["records"][0]
+    assert record["record"] == 0 and record["columns"] == ['name', 'phone', 'city']
+    assert [text[start:end] for start, end in record["spans"]] == ['иван  ПЕТРОВ', '7-701-1234567', 'Алматы']
+
+    # Одного столбца мало; город - общий для двух записей и сам по себе запись не выделяет
+    assert index.match("Иван Петров из Астаны")["matched_records"] == 0
+    assert index.match("Алматы, Иван Петров", min_columns=3)["matched_records"] == 0
+    # Номер, слитый с соседними числами через разделитель, находится как часть числа
+    glued = index.match("заказ 12/87272501122/5 для anna.kim@mail.kz")
+    assert [r["record"] for r in glued["records"]] == [1]
+    # Значение, которое заканчивается или начинается числом, слитым с соседним числом документа
+    address = EdmIndex.build([['ул. Абая 20, кв. 11', '150 Main St', 'KZ123']], ['address', 'street', 'account'])
+    text = "адрес ул. Абая 20, кв. 11 876821 и 42 150 Main St"
+    [record] = address.match(text)["records"]
+    assert record["columns"] == ['address', 'street']
+    assert [text[start:end] for start, end in record["spans"]] == ['ул. Абая 20, кв. 11', '150 Main St']
+    assert index.match("")["matched_records"] == 0
+    assert index.match(None)["matched_records"] == 0
+
+
+def test_common_values_skipped():
+    n = MAX_RECORDS_PER_VALUE + 1
+    rows = [[f'user{i}@mail.kz', 'Алматы', 'Казахстан', f'+7 701 {i:07d}'] for i in range(n)]
+    rows.append(['admin@mail.kz', 'Астана', 'Казахстан', '+7 701 9999999'])
+    index = EdmIndex.build(rows, ['email', 'city', 'country', 'phone'])
+    assert index.stats["common_values"] == 2 and index.stats["skipped_common"] == 2 * n + 1
+    assert len(index) == 2 * n + 3
+    assert index.match("user7@mail.kz Алматы Казахстан")["matched_records"] == 0
+    # Общее значение не считается столбцом совпадения: у записи admin - только город и телефон
+    admin = index.match("Астана, Казахстан, +7 701 9999999")["records"]
+    assert [(r["record"], r["columns"]) for r in admin] == [(n, ['city', 'phone'])]
+    assert [r["record"] for r in index.match("user7@mail.kz +7 701 000 00 07")["records"]] == [7]
+
+
+def test_save_load_and_csv(tmp_path):
+    csv_path = tmp_path / 'customers.csv'
+    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(ROWS)
+    index = EdmIndex.from_csv(str(csv_path), columns=['email', 'phone'])
+    assert index.columns == ['email', 'phone'] and len(index) == 6
+
+    path = index.save(str(tmp_path / 'models' / 'customers.edm'))
+    assert b'petrov' not in open(path, 'rb').read()
+    text = "john.smith@example.com, +1 (555) 010-9999; Иван Петров, Алматы"
+    for loaded in (EdmIndex.load(path), EdmIndex.load(path, mmap_mode=None)):
+        assert np.array_equal(loaded.fingerprints, index.fingerprints) and loaded.salt == index.salt
+        assert loaded.match(text) == index.match(text)
+        assert [r["record"] for r in loaded.match(text)["records"]] == [2]
+
+
+def test_match_in_windows(monkeypatch):
+    index = EdmIndex.build(ROWS + [['ул. Абая 20, кв. 11', '150 Main St', 'KZ123', 'Алматы']], COLUMNS)
+    text = ("отчет " * 7 + "Иван Петров +7 701 123-45-67 ул. Абая 20, кв. 11 876821 и 42 150 Main St "
+            "anna.kim@mail.kz 8 (727) 250 11 22 ") * 3
+    expected = index.match(text)
+    assert expected["matched_records"] == 3
+    # Значения на границе окон (в том числе числа, слитые с соседними) находятся так же, как в одном окне
+    for window in (1, 2, 3, 5, 8):
+        monkeypatch.setattr('scripts.edm_index.MATCH_WINDOW_TOKENS', window)
+        assert index.match(text) == expected
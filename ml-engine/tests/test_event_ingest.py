@@ -0,0 +1,64 @@
+# ml-engine/tests/test_event_ingest.py
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.common import make_user_events
+from scripts.event_ingest import IngestLimitExceeded, NdjsonEventIngestor
+from scripts.ueba_engine import UebaEngine
+
+
+def ndjson(events) -> bytes:
+    return "".join(json.dumps(event) + "\n" for event in events).encode("utf-8")
+
+
+def feed_in_blocks(ingestor, body: bytes, block_size: int = 997):
+    for start in range(0, len(body), block_size):
+        ingestor.feed(body[start:start + block_size])
+    return ingestor.finish()
+
+
+def test_streamed_gzip_matches_single_ingest(ueba_model):
+    events = make_user_events(3000, 40, seed=1)
+    ingestor = NdjsonEventIngestor(UebaEngine(), model=ueba_model, threshold=-np.inf, batch_events=256)
+    result = feed_in_blocks(ingestor, gzip.compress(ndjson(events)))
+
+    reference = UebaEngine()
+    user_ids, _ = reference.ingest(events)
+    assert result["events_received"] == result["events_ingested"] == 3000
+    assert len(result["anomalies"]) == 40
+    np.testing.assert_allclose(
+        ingestor.engine.features(user_ids), reference.features(user_ids)
+    )
+    scores = [anomaly["anomaly_score"] for anomaly in result["anomalies"]]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_only_users_above_threshold_are_returned(ueba_model):
+    events = make_user_events(500, 10, seed=2)
+    # Ночная выгрузка на USB-накопители одним пользователем
+    events += [{"user_id": "exfil", "timestamp": 1704067200 + 3 * 3600 + i, "bytes": 5e9, "destination": f"usb{i}"} for i in range(300)]
+    body = ndjson(events)
+    everyone = feed_in_blocks(NdjsonEventIngestor(UebaEngine(), model=ueba_model, threshold=-np.inf), body)
+    assert len(everyone["anomalies"]) == 11
+    assert everyone["anomalies"][0]["user_id"] == "exfil"
+
+    threshold = everyone["anomalies"][1]["anomaly_score"] + 1e-9
+    result = feed_in_blocks(NdjsonEventIngestor(UebaEngine(), model=ueba_model, threshold=threshold), body)
+    assert [anomaly["user_id"] for anomaly in result["anomalies"]] == ["exfil"]
+    assert result["users_scored"] == everyone["users_scored"]
+
+
+def test_invalid_lines_and_concatenated_gzip_members(ueba_model):
+    body = gzip.compress(b'{"user_id": "a", "timestamp": 10}\nnot json\n') + gzip.compress(b'{"user_id": "b"}\n{"user_id": "c", "timestamp": 11}')
+    result = feed_in_blocks(NdjsonEventIngestor(UebaEngine(), model=ueba_model), body, block_size=7)
+    assert result["events_received"] == 4 and result["events_ingested"] == 2
+    assert [error["index"] for error in result["errors"]] == [1, 2]
+
+
+def test_decompressed_size_limit():
+    ingestor = NdjsonEventIngestor(UebaEngine(), max_bytes=10_000)
+    with pytest.raises(IngestLimitExceeded):
+        ingestor.feed(gzip.compress(b"\n" * 1_000_000))
@@ -0,0 +1,88 @@
+# ml-engine/tests/test_feature_store.py
+import numpy as np
+import pytest
+
+from benchmarks.common import make_user_events
+from scripts.feature_store import REBASE_EXPONENT, UserFeatureStore
+from scripts.ueba_engine import UebaEngine
+
+
+def test_result_does_not_depend_on_event_order():
+    events = make_user_events(3000, 50, seed=3, span_seconds=7 * 86400)
+    shuffled = [events[i] for i in np.random.default_rng(0).permutation(len(events))]
+    in_order, out_of_order = UebaEngine(), UebaEngine()
+    in_order.ingest(events)
+    out_of_order.ingest(shuffled)
+
+    user_ids = sorted({event["user_id"] for event in events})
+    # Счетчики совпадают точно; карты адресов - только в пределах окна, поэтому сравниваются первые три признака
+    np.testing.assert_allclose(in_order.features(user_ids)[:, :3], out_of_order.features(user_ids)[:, :3])
+
+
+def test_decay_matches_direct_sum_across_rebase():
+    half_life = 60.0
+    store = UserFeatureStore(half_life_seconds=half_life, capacity=2)
+    timestamps = np.arange(0, half_life * REBASE_EXPONENT * 3, half_life * 7)
+    for timestamp in timestamps:
+        store.update(store.indices(["u"]), [timestamp], n_bytes=[10])
+
+    expected = np.sum(np.exp2(-(timestamps[-1] - timestamps) / half_life))
+    assert store.record("u").event_count == pytest.approx(expected)
+    assert store.record("u").bytes_total == pytest.approx(10 * expected)
+
+
+def test_rebase_far_ahead_decays_old_users_to_zero():
+    # Событие на ~2000 периодов полураспада позже остальных сдвигает опорное время: множители
+    # и суммы прежних пользователей уходят в 0 - их счетчики нули, а не 0/0
+    store = UserFeatureStore(half_life_seconds=60.0)
+    store.update(store.indices(["alice", "bob"]), [1000.0, 1060.0], n_bytes=[10, 20])
+    store.update(store.indices(["carol"]), [1000.0 + 60.0 * 2000], n_bytes=[5])
+    for column in UserFeatureStore.DECAYED_COLUMNS:
+        assert np.isfinite(store.decayed(column, [0, 1, 2])).all()
+    assert list(store.decayed('event_count', [0, 1, 2])) == [0, 0, 1]
+    assert store.record("carol").bytes_total == pytest.approx(5)
+    # Пользователь без событий (строка создана indices) - тоже нули
+    assert store.decayed('event_count', store.indices(["dave"]))[0] == 0
+    assert np.isfinite(UebaEngine(store=store).features(["alice", "bob", "carol", "dave"])).all()
+
+
+def test_capacity_grows_and_records_are_views():
+    store = UserFeatureStore(capacity=2)
+    rows = store.indices([f"user{i}" for i in range(10)])
+    store.update(rows, np.full(10, 1000.0), n_bytes=np.arange(10))
+
+    assert store.capacity >= 10 and len(store) == 10
+    record = store.record("user7")
+    assert record.user_id == "user7" and record.bytes_total == pytest.approx(7)
+    store.update(store.indices(["user7"]), [1000.0], n_bytes=[3])
+    assert record.bytes_total == pytest.approx(10)
+    assert store.record("missing") is None
+    assert list(store.indices(["user1", "missing"], create=False)) == [1, -1]
+
+
+def test_distinct_destinations_do_not_saturate():
+    # Битовая карта на 128 бит насыщалась на ~620 адресах; HyperLogLog сегментов - нет
+    store = UserFeatureStore(destination_window_seconds=3600, destination_buckets=4)
+    for n in (3, 300, 5000):
+        rows = store.indices([f"user{n}"] * n)
+        store.update(rows, np.linspace(0, 3000, n), destination_hashes=np.arange(n) * 7919 + n)
+        assert store.record(f"user{n}").distinct_destinations == pytest.approx(n, rel=0.35)
+    # Сегменты вне окна не учитываются
+    store.update(store.indices(["user3"]), [3600 * 5], destination_hashes=[1])
+    assert store.record("user3").distinct_destinations == pytest.approx(1, rel=0.05)
+
+
+def test_snapshot_and_restore(tmp_path):
+    engine = UebaEngine()
+    events = make_user_events(2000, 100, seed=4)
+    engine.ingest(events[:1000])
+    engine.snapshot(str(tmp_path / "ueba"))
+    engine.snapshot(str(tmp_path / "ueba"))  # повторный снимок заменяет предыдущий
+
+    restored = UebaEngine.restore(str(tmp_path / "ueba"))
+    for target in (engine, restored):
+        target.ingest(events[1000:])
+
+    user_ids = sorted({event["user_id"] for event in events})
+    np.testing.assert_allclose(restored.features(user_ids), engine.features(user_ids))
+    assert len(restored) == len(engine)
@@ -0,0 +1,95 @@
+# ml-engine/tests/test_identity_index.py
+import json
+
+import numpy as np
+
+from scripts.identity_index import IdentityIndex, read_alias_file
+from scripts.model_registry import ModelRegistry
+from scripts.ueba_engine import UebaEngine
+
+
+def test_lookup_is_case_insensitive_and_unknown_passes_through():
+    index = IdentityIndex.from_pairs([
+        ("jdoe@corp.example", "jdoe"), ("CORP\\jdoe", "jdoe"), ("WS-0042", "jdoe"), ("asmith@corp.example", "asmith")
+    ])
+    assert index.canonicalize(["JDoe@Corp.Example ", "corp\\JDOE", "ws-0042", "asmith@corp.example", "nobody"]) == [
+        "jdoe", "jdoe", "jdoe", "asmith", "nobody"
+    ]
+    assert index.lookup(["nobody"]).tolist() == [-1]
+    # Малые пакеты разрешаются скалярным кодом, большие - векторизованно; результаты совпадают
+    aliases = ["jdoe@corp.example", "CORP\\jdoe", "asmith@corp.example", "nobody"]
+    assert index.lookup(aliases * 4).tolist() == index.lookup(aliases).tolist() * 4
+
+
+def test_delta_updates_match_rebuild_and_grow_the_table():
+    rng = np.random.default_rng(0)
+    index = IdentityIndex(capacity=16)
+    expected = {}
+    for _ in range(20):
+        adds = {f"alias{i}": f"user{rng.integers(500)}" for i in rng.integers(0, 5000, 300).tolist()}
+        removes = rng.choice(list(expected), min(len(expected), 100), replace=False).tolist() if expected else []
+        index.apply_delta(adds, removes + ["never-added"])
+        for alias in removes:
+            del expected[alias]
+        expected.update(adds)
+
+    aliases = [f"alias{i}" for i in range(5000)]
+    assert len(index) == len(expected)
+    assert index.canonicalize(aliases) == [expected.get(alias, alias) for alias in aliases]
+    rebuilt = IdentityIndex.from_pairs(expected.items())
+    assert rebuilt.canonicalize(aliases) == index.canonicalize(aliases)
+    assert index.size + index.deleted <= index.capacity * 0.7
+
+
+def test_memory_budget_at_one_million_aliases():
+    index = IdentityIndex.from_pairs((f"user{i}@corp.example", f"user{i // 4}") for i in range(1_000_000))
+    assert len(index) == 1_000_000
+    assert index.memory_bytes <= 32 * 2**20
+    assert index.canonicalize(["USER999999@corp.example"]) == ["user249999"]
+
+
+def test_save_load_and_user_export(tmp_path):
+    users = [
+        {"username": "jdoe", "email": "jdoe@corp.example", "upn": "john.doe@corp.example", "devices": ["WS-1", "LT-7"]},
+        {"username": "asmith", "email": "asmith@corp.example"},
+    ]
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps(users), encoding="utf-8")
+    index = IdentityIndex.from_pairs(read_alias_file(str(path)))
+    index.remove(["LT-7"])
+    restored = IdentityIndex.load(index.save(str(tmp_path / "index.npz")))
+    assert restored.canonicalize(["john.doe@corp.example", "ws-1", "lt-7", "ASMITH@corp.example"]) == [
+        "jdoe", "jdoe", "lt-7", "asmith"
+    ]
+    restored.add(["LT-8"], ["jdoe"])
+    assert restored.canonicalize(["lt-8"]) == ["jdoe"]
+
+
+def test_engine_resolves_aliases_to_one_user():
+    engine = UebaEngine(identity_index=IdentityIndex.from_pairs([("jdoe@corp.example", "jdoe"), ("WS-1", "jdoe")]))
+    user_ids, _ = engine.ingest([
+        {"user_id": "jdoe@corp.example", "timestamp": 1704103200},
+        {"user_id": "ws-1", "timestamp": 1704103260},
+        {"user_id": "guest", "timestamp": 1704103260},
+    ])
+    assert user_ids == ["jdoe", "guest"]
+    assert len(engine) == 2
+
+
+def test_registry_serves_published_index_per_batch(tmp_path):
+    path = str(tmp_path / "identity_index.npz")
+    IdentityIndex.from_pairs([("ws-1", "jdoe")]).save(path)
+    registry = ModelRegistry(path, name="identity_index", loader=IdentityIndex.load)
+    engine = UebaEngine()
+    first = registry.current()
+    # Изменение, опубликованное другим процессом: файл перезаписан, реестр подхватывает новую версию
+    index = IdentityIndex.load(path)
+    index.apply_delta({"lt-7": "jdoe"}, ["ws-1"])
+    index.save(path)
+    second = registry.reload()
+    assert second.version != first.version
+    user_ids, _ = engine.ingest([{"user_id": "ws-1", "timestamp": 1704103200},
+                                 {"user_id": "LT-7", "timestamp": 1704103260}], identity_index=second.model)
+    assert user_ids == ["ws-1", "jdoe"]
+    # Снимок, взятый до публикации, продолжает разрешать по старой версии
+    assert engine.ingest([{"user_id": "ws-1", "timestamp": 1704103300}], identity_index=first.model)[0] == ["jdoe"]
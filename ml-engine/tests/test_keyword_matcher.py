@@ -0,0 +1,91 @@
+# ml-engine/tests/test_keyword_matcher.py
+import random
+import re
+
+import numpy as np
+
+import scripts.keyword_matcher as keyword_matcher
+from scripts.keyword_matcher import KeywordAutomaton
+from scripts.policy_engine import AUTOMATON_MIN_NEEDLES, PolicyEngine
+
+
+def naive_matches(automaton, text):
+    lowered = text.lower()
+    return sorted(
+        (pattern_id, match.start(), match.start() + len(keyword))
+        for pattern_id, keyword in enumerate(automaton.keywords)
+        for match in re.finditer(f'(?={re.escape(keyword)})', lowered)
+    )
+
+
+def found_matches(automaton, text):
+    return sorted(zip(*(part.tolist() for part in automaton.find_all(text))))
+
+
+def test_matches_naive_search_short_and_striped(monkeypatch):
+    # Маленькие полосы и сегменты: вхождения на стыках полос и сегментов
+    monkeypatch.setattr(keyword_matcher, 'MAX_STRIPES', 64)
+    monkeypatch.setattr(keyword_matcher, 'MIN_STRIPE_BYTES', 8)
+    monkeypatch.setattr(keyword_matcher, 'SEGMENT_BYTES', 3000)
+    rng = random.Random(0)
+    alphabet = 'abcАБв '
+    for _ in range(60):
+        keywords = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 6))) for _ in range(rng.randint(1, 15))]
+        text = ''.join(rng.choice(alphabet + 'xyz') for _ in range(rng.choice([40, 6000, 12000])))
+        automaton = KeywordAutomaton.build(keywords)
+        assert found_matches(automaton, text) == naive_matches(automaton, text)
+        assert automaton.found(text) == sorted({match[0] for match in naive_matches(automaton, text)})
+
+
+def test_case_insensitive_scan_and_overlaps():
+    automaton = KeywordAutomaton.build(["SSN", "ssn", "he", "she", "hers", "", "Паспорт"])
+    assert automaton.keywords == ["ssn", "he", "she", "hers", "паспорт"]
+    text = "Ushers: SSN ssn; ПАСПОРТ"
+    assert found_matches(automaton, text) == naive_matches(automaton, text)
+    assert automaton.scan(text, max_positions=1) == [
+        {"keyword": "ssn", "count": 2, "positions": [[8, 11]]},
+        {"keyword": "he", "count": 1, "positions": [[2, 4]]},
+        {"keyword": "she", "count": 1, "positions": [[1, 4]]},
+        {"keyword": "hers", "count": 1, "positions": [[2, 6]]},
+        {"keyword": "паспорт", "count": 1, "positions": [[17, 24]]},
+    ]
+    assert KeywordAutomaton.build([]).scan(text) == []
+
+
+def test_build_cached_shares_mmap_copy(tmp_path):
+    keywords = [f"word{i}" for i in range(50)]
+    first = KeywordAutomaton.build_cached(keywords, str(tmp_path))
+    second = KeywordAutomaton.build_cached(list(reversed(keywords)) + keywords, str(tmp_path))
+    assert isinstance(first.transitions, np.memmap)
+    assert len(list(tmp_path.iterdir())) == 2  # порядок слов - часть набора (номера слов)
+    again = KeywordAutomaton.build_cached(keywords, str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 2 and again.fingerprint == first.fingerprint
+    text = "x word7 word49 word7"
+    assert [first.keywords[i] for i in first.found(text)] == ["word4", "word7", "word49"]
+    assert sorted(second.keywords[i] for i in second.found(text)) == ["word4", "word49", "word7"]
+
+
+def test_policy_engine_uses_automaton_for_many_needles(tmp_path):
+    needles = [f"secret{i:04d}" for i in range(AUTOMATON_MIN_NEEDLES)]
+    policies = [
+        {"_id": "many", "name": "many", "conditions": [{"field": "content", "operator": "contains", "value": needles}]},
+        {"_id": "one", "name": "one", "conditions": [{"field": "content", "operator": "contains", "value": "Secret0005"}]},
+        {"_id": "none", "name": "none", "conditions": [
+            {"field": "content", "operator": "not_contains", "value": ["draft", "public"]}]},
+        {"_id": "file", "name": "file", "conditions": [{"field": "filename", "operator": "contains", "value": "q4"}]},
+    ]
+    engine = PolicyEngine.compile(policies, automaton_cache_dir=str(tmp_path))
+    plan = engine._plans["content"]
+    assert plan.scan_keywords and plan.substrings == [] and engine._plans["filename"].keyword_automaton is None
+
+    def names(event):
+        return [policy.name for policy in engine.evaluate(event)]
+    assert names({"content": "… SECRET0005 …"}) == ["many", "one", "none"]
+    assert names({"content": "secret0100 public draft"}) == ["many"]
+    assert names({"content": "x" * 10000 + "secret0127", "filename": "Q4.xlsx"}) == ["many", "none", "file"]
+
+    # Поиск ключевых слов в документе (keywords_found) - по тому же автомату
+    assert engine.keyword_automaton("content") is plan.keyword_automaton
+    assert engine.keyword_automaton("content").scan("Secret0001 and secret0001")[0]["count"] == 2
+    assert engine.keyword_automaton("filename").keywords == ["q4"]
+    assert engine.keyword_automaton("destination") is None
@@ -0,0 +1,40 @@
+# ml-engine/tests/test_micro_batching.py
+import threading
+
+import pytest
+
+from scripts.micro_batching import MicroBatcher
+
+
+def test_concurrent_requests_are_batched_and_routed_back():
+    """Конкурентные запросы оцениваются общими пакетами, каждый получает свой ответ."""
+    batch_sizes = []
+
+    def predict_batch(items):
+        batch_sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(predict_batch, max_batch_size=8, max_wait_ms=50, name='test')
+    results = {}
+
+    def call(value):
+        results[value] = batcher.predict(value, timeout=5)
+
+    threads = [threading.Thread(target=call, args=(value,)) for value in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {value: value * 2 for value in range(20)}
+    assert sum(batch_sizes) == 20
+    assert max(batch_sizes) <= 8
+    assert len(batch_sizes) < 20
+
+
+def test_per_item_errors_only_fail_their_caller():
+    batcher = MicroBatcher(lambda items: [ValueError("bad") if item < 0 else item for item in items], name='test')
+
+    assert batcher.predict(3, timeout=5) == 3
+    with pytest.raises(ValueError):
+        batcher.predict(-1, timeout=5)
@@ -0,0 +1,101 @@
+# ml-engine/tests/test_model_registry.py
+import json
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.common import build_sample_text_model
+from scripts.model_registry import ModelRegistry
+from scripts.model_store import load_model, metadata_path, save_model
+from scripts.user_baselines import UserBaselines
+
+
+@pytest.fixture(scope="module")
+def text_models():
+    return build_sample_text_model(n_samples=60, seed=1), build_sample_text_model(n_samples=80, seed=2)
+
+
+def test_version_comes_from_metadata(tmp_path, text_models):
+    path = save_model(text_models[0], str(tmp_path / "model.joblib"), version="2024.1")
+    registry = ModelRegistry(path)
+
+    snapshot = registry.current()
+    assert snapshot.version == "2024.1"
+    assert registry.fingerprint == snapshot.fingerprint
+    assert list(snapshot.model.predict(["payroll report"])) == list(text_models[0].predict(["payroll report"]))
+
+
+def test_stale_metadata_falls_back_to_fingerprint(tmp_path, text_models):
+    path = save_model(text_models[0], str(tmp_path / "model.joblib"), version="v1")
+    with open(metadata_path(path), "w", encoding="utf-8") as f:
+        json.dump({"version": "v1", "fingerprint": "0000000000000000"}, f)
+
+    snapshot = ModelRegistry(path).current()
+    assert snapshot.version == snapshot.fingerprint
+
+
+def test_reload_swaps_model_and_keeps_old_snapshot(tmp_path, text_models):
+    path = save_model(text_models[0], str(tmp_path / "model.joblib"), version="v1")
+    registry = ModelRegistry(path, warmup_input=["warm-up"])
+    in_flight = registry.current()
+
+    assert registry.reload() is in_flight  # файл не изменился
+    save_model(text_models[1], path, version="v2")
+    reloaded = registry.reload()
+
+    assert reloaded.version == "v2"
+    assert registry.current() is reloaded
+    # Запрос, взявший снимок до замены, дорабатывает на старой модели
+    assert in_flight.version == "v1"
+    assert list(in_flight.model.predict(["payroll report"])) == list(text_models[0].predict(["payroll report"]))
+
+
+def test_broken_file_keeps_current_version(tmp_path, text_models):
+    path = save_model(text_models[0], str(tmp_path / "model.joblib"), version="v1")
+    registry = ModelRegistry(path)
+    registry.current()
+
+    with open(path, "wb") as f:
+        f.write(b"not a model")
+
+    assert registry.reload().version == "v1"
+    assert registry.current().version == "v1"
+
+
+def test_missing_file_returns_none(tmp_path):
+    assert ModelRegistry(str(tmp_path / "missing.joblib")).current() is None
+
+
+def test_custom_loader(tmp_path):
+    path = tmp_path / "baselines.npz"
+    baselines = UserBaselines()
+    baselines.update(["alice"], [[1.0, 2.0, 0.0, 3.0]])
+    baselines.save(str(path))
+    snapshot = ModelRegistry(str(path), name='baselines', loader=UserBaselines.load).current()
+    assert snapshot.model.user_ids == ["alice"]
+
+
+def test_watcher_picks_up_new_file(tmp_path, text_models):
+    path = save_model(text_models[0], str(tmp_path / "model.joblib"), version="v1")
+    registry = ModelRegistry(path, watch_interval=0.05)
+    assert registry.current().version == "v1"
+
+    save_model(text_models[1], path, version="v2")
+    deadline = time.monotonic() + 5
+    while registry.current().version != "v2" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert registry.current().version == "v2"
+
+
+def test_mmap_load_maps_coefficients_and_predicts_the_same(tmp_path, text_models):
+    path = save_model(text_models[0], str(tmp_path / "model.joblib"))
+    mapped, in_memory = load_model(path, mmap_mode='r'), load_model(path, mmap_mode=None)
+
+    coefficients = mapped.named_steps['classifier'].feature_log_prob_
+    assert isinstance(coefficients, np.memmap) and coefficients.filename == str(tmp_path / "model.joblib")
+    assert not coefficients.flags.writeable
+    assert not isinstance(in_memory.named_steps['classifier'].feature_log_prob_, np.memmap)
+    texts = ["payroll report for q3", "public holiday schedule", "customer passport numbers"]
+    np.testing.assert_array_equal(mapped.predict_proba(texts), in_memory.predict_proba(texts))
+    assert list(mapped.predict(texts)) == list(text_models[0].predict(texts))
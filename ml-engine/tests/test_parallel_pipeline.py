@@ -0,0 +1,37 @@
+# ml-engine/tests/test_parallel_pipeline.py
+import numpy as np
+import pytest
+
+import scripts.parallel_pipeline as parallel_pipeline
+from benchmarks.common import build_sample_text_model, make_document
+from scripts.parallel_pipeline import ParallelBatchPipeline
+from scripts.predict_utils import make_prediction_text_classification
+from scripts.preprocess import preprocess_texts
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_results_are_reassembled_in_order(text_model, workers):
+    texts = [make_document(20 + i % 7, seed=i) + f" Mail{i}@corp.kz!" for i in range(50)]
+
+    with ParallelBatchPipeline(model=text_model, workers=workers, chunk_size=8) as pipeline:
+        labels, probabilities = pipeline.predict(texts)
+        features = pipeline.transform(texts)
+        processed = pipeline.preprocess(texts)
+
+    expected_labels, expected_probabilities = make_prediction_text_classification(text_model, texts)
+    assert list(labels) == list(expected_labels)
+    np.testing.assert_allclose(probabilities, expected_probabilities)
+    assert (features != text_model[:-1].transform(texts)).nnz == 0
+    assert processed == preprocess_texts(texts)
+
+
+def test_in_process_pipelines_use_their_own_model(text_model):
+    other_model = build_sample_text_model(n_samples=80, seed=2)
+    texts = [make_document(30, seed=i) for i in range(20)]
+    first = ParallelBatchPipeline(model=text_model, workers=1)
+    second = ParallelBatchPipeline(model=other_model, workers=1)
+    # Пайплайны в одном процессе не делят модель через глобальную переменную воркера
+    second.predict(texts)
+    np.testing.assert_allclose(first.predict(texts)[1], make_prediction_text_classification(text_model, texts)[1])
+    np.testing.assert_allclose(second.predict(texts)[1], make_prediction_text_classification(other_model, texts)[1])
+    assert parallel_pipeline._worker_model is None
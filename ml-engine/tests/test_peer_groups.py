@@ -0,0 +1,71 @@
+# ml-engine/tests/test_peer_groups.py
+import numpy as np
+import pytest
+
+from scripts.peer_groups import PeerGroupBaselines, grouped_quantiles
+
+
+def test_grouped_quantiles_match_numpy():
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, 7, 5000)
+    values = rng.normal(size=(5000, 3))
+    result = grouped_quantiles(groups, values, 8, (0.05, 0.5, 0.95))
+    for group in range(7):
+        np.testing.assert_allclose(result[:, group], np.quantile(values[groups == group], (0.05, 0.5, 0.95), axis=0))
+    assert np.isnan(result[:, 7]).all()
+
+
+def make_baselines():
+    rng = np.random.default_rng(1)
+    baselines = PeerGroupBaselines()
+    engineers = [f"eng{i}" for i in range(200)]
+    finance = [f"fin{i}" for i in range(100)]
+    baselines.set_membership(engineers, [["engineering"]] * 200)
+    baselines.set_membership(finance, [["finance"]] * 100)
+    baselines.update(engineers, np.column_stack([rng.normal(50, 5, 200), rng.normal(14, 1, 200), rng.random(200) * 0.1, rng.integers(10, 30, 200)]))
+    baselines.update(finance, np.column_stack([rng.normal(10, 2, 100), rng.normal(11, 1, 100), rng.random(100) * 0.1, rng.integers(1, 5, 100)]))
+    return baselines
+
+
+def test_score_against_own_cohort():
+    baselines = make_baselines()
+    baselines.set_membership(["new"], [["finance", "engineering"]])
+    z, scores, groups = baselines.score(["eng1", "fin1", "new", "missing"], features=np.array([
+        [50, 14, 0.05, 20], [50, 14, 0.05, 20], [50, 14, 0.05, 20], [50, 14, 0.05, 20]
+    ]))
+    # Одинаковое поведение обычно для инженера и аномально для сотрудника финансов
+    assert scores[0] < 3 < scores[1]
+    assert groups[:2] == ["engineering", "finance"]
+    # Пользователь из двух групп оценивается по наиболее "своей"
+    assert groups[2] == "engineering" and scores[2] == pytest.approx(scores[0])
+    assert np.isnan(scores[3]) and groups[3] is None
+    stats = baselines.group_stats("finance")
+    assert stats["size"] == 100 and stats["median"]["event_rate"] == pytest.approx(10, abs=1)
+
+
+def test_only_changed_groups_are_recomputed():
+    baselines = make_baselines()
+    assert sorted(baselines.recompute()) == ["engineering", "finance"]
+    assert baselines.recompute() == []
+
+    engineering_median = baselines.medians[baselines.group_index["engineering"]].copy()
+    baselines.update(["fin3"], [[1000, 20, 0.9, 40]])
+    assert baselines.recompute() == ["finance"]
+    np.testing.assert_array_equal(baselines.medians[baselines.group_index["engineering"]], engineering_median)
+
+    baselines.update(["fin3"], [[1000, 20, 0.9, 40]])  # те же признаки - без пересчета
+    assert baselines.recompute() == []
+    baselines.set_membership(["fin3"], [["engineering"]])
+    assert sorted(baselines.recompute()) == ["engineering", "finance"]
+    assert baselines.group_stats("finance")["size"] == 99
+
+
+def test_save_and_load(tmp_path):
+    baselines = make_baselines()
+    baselines.recompute()
+    baselines.update(["eng5"], [[70, 15, 0.2, 25]])
+    restored = PeerGroupBaselines.load(baselines.save(str(tmp_path / "peer_groups.npz")))
+    assert restored.recompute() == ["engineering"]
+    baselines.recompute()
+    for name in ("engineering", "finance"):
+        assert restored.group_stats(name) == baselines.group_stats(name)
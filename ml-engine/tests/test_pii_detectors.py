@@ -0,0 +1,89 @@
+# ml-engine/tests/test_pii_detectors.py
+import random
+
+import numpy as np
+import pytest
+
+import scripts.pii_detectors as pii_detectors_module
+from scripts.pii_detectors import (
+    PiiScanner, iban_valid, kz_iin_valid, luhn_valid, ru_inn_valid, ru_snils_valid, us_ssn_valid,
+)
+
+
+def test_checksums():
+    assert luhn_valid(['4111111111111111', '5500000000000004', '378282246310005']).tolist() == [True, True, True]
+    assert luhn_valid(['4111111111111112', '1234567812345678']).tolist() == [False, False]
+    assert iban_valid(['GB82WEST12345698765432', 'KZ86125KZT5004100100', 'DE89370400440532013000']).all()
+    # Неверная контрольная сумма, длина не для страны, неизвестная страна
+    assert not iban_valid(['GB82WEST12345698765433', 'GB82WEST1234569876543', 'ZZ82WEST12345698765432']).any()
+    assert kz_iin_valid(['900101300007', '900101300008', '901301300007']).tolist() == [True, False, False]
+    assert ru_inn_valid(['7707083893', '500100732259', '7707083894', '500100732258']).tolist() == [
+        True, True, False, False]
+    assert ru_snils_valid(['11223344595', '11223344596', '00100199800']).tolist() == [True, False, False]
+    assert us_ssn_valid(['123456789', '000456789', '666456789', '923456789', '123006789']).tolist() == [
+        True, False, False, False, False]
+
+
+def test_scan_validates_candidates():
+    text = ("card 4111 1111 1111 1111 and 4111 1111 1111 1112, order 12345678901234; "
+            "IBAN GB82 WEST 1234 5698 7654 32, ИИН 900101300007, ИНН 7707083893, СНИЛС 112-233-445 95, "
+            "SSN 123-45-6789, mail ivan.petrov@example.kz, tel +7 701 123 45 67 or (495) 123-45-67 or 8 800 555 35 35, "
+            "api_key = 'q8Zr2LmX9vTb4KwP', password: changeme_please_123, token ghp_" + "q8Zr2LmX9vTb4KwP" * 2 + "a1B2")
+    found = PiiScanner().scan(text)
+    values = {name: [text[start:end] for start, end in spans] for name, spans in found.items()}
+    assert values == {
+        "credit_card": ["4111 1111 1111 1111"],
+        "iban": ["GB82 WEST 1234 5698 7654 32"],
+        "kz_iin": ["900101300007"],
+        "ru_inn": ["7707083893"],
+        "ru_snils": ["112-233-445 95"],
+        "us_ssn": ["123-45-6789"],
+        "email": ["ivan.petrov@example.kz"],
+        "phone": ["+7 701 123 45 67", "(495) 123-45-67", "8 800 555 35 35"],
+        # Значение присваивания - без имени ключа; заглушки не считаются секретами
+        "secret": ["q8Zr2LmX9vTb4KwP", "ghp_" + "q8Zr2LmX9vTb4KwP" * 2 + "a1B2"],
+    }
+
+
+def test_overlaps_resolved_by_detector_order():
+    # 11 цифр СНИЛС подходят и под телефон: фрагмент остается за детектором с контрольной суммой
+    text = "11223344595 / 89161234567"
+    assert PiiScanner(["ru_snils", "phone"]).summary(text) == {
+        "ru_snils": {"count": 1, "spans": [[0, 11]]}, "phone": {"count": 1, "spans": [[14, 25]]}}
+    assert PiiScanner(["phone"]).summary(text)["phone"]["count"] == 2
+    summary = PiiScanner().summary("4111111111111111 " * 20, max_spans=3)
+    assert summary == {"credit_card": {"count": 20, "spans": [[0, 16], [17, 33], [34, 50]]}}
+    with pytest.raises(ValueError):
+        PiiScanner(["passport"])
+
+
+def test_anchor_windows_match_full_text(monkeypatch):
+    rng = random.Random(5)
+    fragments = ["слово", "word", "12.05.2024", "1 250.00", "№ 4411", "4111 1111 1111 1111", "7707083893",
+                 "+7 701 123 45 67", "(495) 123-45-67", "112-233-445 95", "a.b@mail.kz", "x@y", "token: 'q8Zr2LmX9vTb4KwP'",
+                 "GB82 WEST 1234 5698 7654 32", "ab1234567890", "12345678901234567890"]
+    text = "".join(rng.choice(fragments) + rng.choice([" ", "", "\n", ", ", "-"]) for _ in range(5000))
+    assert len(text) > pii_detectors_module.SHORT_TEXT_CHARS
+    windowed = PiiScanner().scan(text)
+    monkeypatch.setattr(pii_detectors_module, "SHORT_TEXT_CHARS", len(text) + 1)
+    full = PiiScanner().scan(text)
+    assert windowed.keys() == full.keys() and all(np.array_equal(windowed[name], full[name]) for name in full)
+
+
+@pytest.mark.parametrize("overlap", [64, pii_detectors_module.STREAM_OVERLAP_CHARS])
+def test_stream_scan_matches_whole_document(monkeypatch, overlap):
+    monkeypatch.setattr(pii_detectors_module, "STREAM_OVERLAP_CHARS", overlap)
+    rng = random.Random(7)
+    fragments = ["слово", "word", "4111 1111 1111 1111", "7707083893", "+7 701 123 45 67", "112-233-445 95",
+                 "ivan.petrov@example.kz", "GB82 WEST 1234 5698 7654 32", "api_key = 'q8Zr2LmX9vTb4KwP'", "1 250.00"]
+    text = " ".join(rng.choice(fragments) for _ in range(3000))
+    scanner = PiiScanner()
+    stream = scanner.stream(max_spans=10000)
+    # Сегменты режутся по пробелу, как в StreamingDocumentClassifier: значения с пробелами попадают на стык
+    position = 0
+    while position < len(text):
+        split = text.find(" ", position + rng.randint(50, 500))
+        end = len(text) if split < 0 else split + 1
+        stream.feed(text[position:end])
+        position = end
+    assert stream.summary() == scanner.summary(text, max_spans=10000)
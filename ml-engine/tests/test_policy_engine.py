@@ -0,0 +1,147 @@
+# ml-engine/tests/test_policy_engine.py
+import json
+import random
+
+from scripts.policy_engine import PolicyEngine, load_policy_engine
+
+
+def policy(name, *conditions, logic=None, enabled=True):
+    result = {"_id": name, "name": name, "isEnabled": enabled, "version": 1,
+              "conditions": [dict(zip(("field", "operator", "value"), condition)) for condition in conditions],
+              "actions": [{"type": "alert", "parameters": {"severity": "High"}}]}
+    if logic:
+        result["conditionLogic"] = logic
+    return result
+
+
+def matched(engine, event):
+    return [compiled.name for compiled in engine.evaluate(event)]
+
+
+def test_operators():
+    engine = PolicyEngine.compile([
+        policy("contains", ("content", "contains", "Confidential")),
+        policy("not_contains", ("content", "not_contains", ["public", "draft"])),
+        policy("regex", ("content", "matches_regex", r"\b\d{3}-\d{2}-\d{4}\b")),
+        policy("not_regex", ("filename", "not_matches_regex", r"\.txt$")),
+        policy("equals", ("destination", "equals", "usb")),
+        policy("not_equals", ("destination", "not_equals", "email")),
+        policy("one_of", ("user_group", "is_one_of", ["Finance", "HR"])),
+        policy("not_one_of", ("user_group", "is_not_one_of", ["IT"])),
+        policy("greater", ("size", "greater_than", 1000)),
+        policy("less", ("size", "less_than", 10)),
+        policy("starts", ("filename", "starts_with", ["report_", "q4"])),
+        policy("ends", ("filename", "ends_with", ".xlsx")),
+        policy("disabled", ("content", "contains", "confidential"), enabled=False),
+    ])
+    assert len(engine) == 12 and engine.errors == []
+    event = {"content": "CONFIDENTIAL ssn 123-45-6789", "filename": "Report_Q1.XLSX", "destination": "USB",
+             "user_group": "hr", "size": 5000}
+    assert matched(engine, event) == [
+        "contains", "not_contains", "regex", "not_regex", "equals", "not_equals", "one_of", "not_one_of",
+        "greater", "starts", "ends"
+    ]
+    assert matched(engine, {"content": "public draft", "filename": "notes.txt", "destination": "email",
+                            "user_group": "IT", "size": 5}) == ["less"]
+    # Условие на отсутствующее поле не выполняется, в том числе отрицательное
+    assert matched(engine, {"size": 5000}) == ["greater"]
+
+
+def test_all_any_lists_and_nested_fields():
+    engine = PolicyEngine.compile([
+        policy("all", ("content", "contains", "secret"), ("metadata.channel", "equals", "email")),
+        policy("any", ("content", "contains", "secret"), ("metadata.channel", "equals", "email"), logic="ANY"),
+        policy("recipients", ("recipients", "ends_with", "@gmail.com")),
+        policy("no_external", ("recipients", "not_contains", "@gmail.com")),
+        policy("created", ("created_at", "greater_than", "2024-01-01T00:00:00Z")),
+    ])
+    assert matched(engine, {"content": "secret", "metadata": {"channel": "Email"}}) == ["all", "any"]
+    assert matched(engine, {"content": "secret", "metadata": {"channel": "usb"}}) == ["any"]
+    assert matched(engine, {"recipients": ["a@corp.example", "b@gmail.com"]}) == ["recipients"]
+    assert matched(engine, {"recipients": ["a@corp.example"], "created_at": "2024-06-01T10:00:00"}) == ["no_external", "created"]
+
+
+def test_date_conditions_in_javascript_iso_format():
+    # Значения dataType: 'date' backend хранит строками Date.toISOString()
+    engine = PolicyEngine.compile([
+        policy("after", ("created_at", "greater_than", "2024-01-01T00:00:00.000Z")),
+        policy("before", ("created_at", "less_than", "2024-03-01T00:00:00.000z")),
+    ])
+    assert engine.errors == [] and len(engine) == 2
+    assert matched(engine, {"created_at": "2024-02-01T12:30:00.000Z"}) == ["after", "before"]
+    assert matched(engine, {"created_at": "2024-06-01T03:00:00+03:00"}) == ["after"]
+    assert matched(engine, {"created_at": "2023-12-31T23:59:59.999Z"}) == ["before"]
+
+
+def test_empty_affix_and_regex_list_with_inline_flags():
+    engine = PolicyEngine.compile([
+        policy("any_name", ("filename", "starts_with", "")),
+        policy("any_tail", ("filename", "ends_with", ["", ".zip"])),
+        policy("regex_list", ("content", "matches_regex", ["(?i)secret", r"\d{4}"])),
+        policy("no_regex", ("content", "not_matches_regex", [r"(?i)draft", "(?s)a.b"])),
+    ])
+    assert engine.errors == [] and len(engine) == 4
+    assert matched(engine, {"filename": "", "content": "SECRET"}) == ["any_name", "any_tail", "regex_list", "no_regex"]
+    # Флаг (?i) относится только к своему элементу списка
+    assert matched(engine, {"filename": 5, "content": "code 2024, Draft"}) == ["regex_list"]
+    assert matched(engine, {"content": "A\nB"}) == ["no_regex"]
+    assert matched(engine, {"content": "a\nb"}) == []
+
+
+def test_invalid_policies_are_reported_and_skipped(tmp_path):
+    policies = [
+        policy("bad_regex", ("content", "matches_regex", "([a-z")),
+        policy("bad_operator", ("content", "resembles", "x")),
+        policy("bad_number", ("size", "greater_than", "lots")),
+        {"name": "empty", "conditions": []},
+        policy("ok", ("content", "contains", "x")),
+    ]
+    path = tmp_path / "policies.json"
+    path.write_text(json.dumps({"success": True, "data": policies}), encoding="utf-8")
+    engine = load_policy_engine(str(path))
+    assert [compiled.name for compiled in engine.policies] == ["ok"]
+    assert [error["name"] for error in engine.errors] == ["bad_regex", "bad_operator", "bad_number", "empty"]
+    assert engine.version == PolicyEngine.compile(policies).version
+
+
+def test_matches_naive_evaluation_on_random_policies():
+    rng = random.Random(0)
+    words = ["alpha", "beta", "gamma", "delta", "omega"]
+    policies = [
+        policy(f"p{i}", *[
+            rng.choice([
+                ("content", "contains", rng.choice(words)),
+                ("content", "not_contains", rng.choice(words)),
+                ("channel", "is_one_of", rng.sample(words, 2)),
+                ("size", "greater_than", rng.randint(0, 100)),
+                ("size", "less_than", rng.randint(0, 100)),
+                ("filename", "starts_with", rng.choice(words)[:2]),
+            ]) for _ in range(rng.randint(1, 3))
+        ]) for i in range(300)
+    ]
+
+    def naive(condition, event):
+        field, operator, value = condition["field"], condition["operator"], condition["value"]
+        if field not in event:
+            return False
+        actual = event[field]
+        if operator == "contains":
+            return value in actual
+        if operator == "not_contains":
+            return value not in actual
+        if operator == "is_one_of":
+            return actual in value
+        if operator == "greater_than":
+            return actual > value
+        if operator == "less_than":
+            return actual < value
+        return actual.startswith(value)
+
+    engine = PolicyEngine.compile(policies)
+    for _ in range(200):
+        event = {"content": " ".join(rng.sample(words, 2)), "channel": rng.choice(words),
+                 "size": rng.randint(0, 100), "filename": rng.choice(words)}
+        for field in rng.sample(list(event), rng.randint(0, 2)):
+            del event[field]
+        expected = [p["name"] for p in policies if all(naive(condition, event) for condition in p["conditions"])]
+        assert matched(engine, event) == expected
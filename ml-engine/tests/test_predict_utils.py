@@ -0,0 +1,95 @@
+# ml-engine/tests/test_predict_utils.py
+import numpy as np
+import pytest
+
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.linear_model import LogisticRegression
+from sklearn.svm import OneClassSVM
+
+from benchmarks.common import make_document
+from scripts.predict_utils import (
+    make_prediction_text_classification,
+    make_prediction_text_classification_batch,
+    make_prediction_ueba,
+    make_prediction_ueba_chunks,
+)
+
+
+def test_single_pass_matches_predict(text_model):
+    """Метки из argmax predict_proba совпадают с model.predict."""
+    texts = [make_document(50, seed=i) for i in range(20)] + ["", "confidential"]
+    predictions, probabilities = make_prediction_text_classification(text_model, texts)
+
+    assert list(predictions) == list(text_model.predict(texts))
+    np.testing.assert_allclose(probabilities, np.max(text_model.predict_proba(texts), axis=1))
+
+
+def test_batch_isolates_bad_documents(text_model):
+    """Ошибка в одном документе не влияет на остальные документы чанка."""
+    texts = ["confidential merger report", None, "public press release"]
+    results, errors = make_prediction_text_classification_batch(text_model, texts, chunk_size=2)
+
+    assert list(errors) == [1]
+    assert results[1] is None
+    assert results[0][0] == text_model.predict([texts[0]])[0]
+    assert results[2][0] == text_model.predict([texts[2]])[0]
+
+
+class CallCounter:
+    """Считает вызовы методов инференса модели."""
+
+    INFERENCE_METHODS = ("predict", "decision_function", "predict_proba", "score_samples")
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = []
+
+    def __getattr__(self, name):
+        attribute = getattr(self.model, name)
+        if name in self.INFERENCE_METHODS:
+            def wrapper(*args, **kwargs):
+                self.calls.append(name)
+                return attribute(*args, **kwargs)
+            return wrapper
+        return attribute
+
+
+@pytest.fixture(scope="module")
+def ueba_data():
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(500, 4))
+    features[:10] *= 8  # выбросы
+    labels = (np.abs(features).sum(axis=1) > 6).astype(int)
+    return features, labels
+
+
+@pytest.mark.parametrize("make_model", [
+    lambda X, y: IsolationForest(n_estimators=20, random_state=0).fit(X),
+    lambda X, y: OneClassSVM(nu=0.05).fit(X),
+    lambda X, y: LogisticRegression().fit(X, y),
+])
+def test_ueba_single_pass_matches_predict(ueba_data, make_model):
+    features, labels = ueba_data
+    model = make_model(features, labels)
+    counter = CallCounter(model)
+
+    predictions, scores = make_prediction_ueba(counter, features)
+
+    assert counter.calls == ["decision_function"]
+    np.testing.assert_array_equal(predictions, model.predict(features))
+    np.testing.assert_allclose(scores, model.decision_function(features))
+
+
+def test_ueba_chunks_cover_population_in_order(ueba_data):
+    features, _ = ueba_data
+    columns = ["a", "b", "c", "d"]
+    model = IsolationForest(n_estimators=20, random_state=0).fit(pd.DataFrame(features, columns=columns))
+    # Столбцы в другом порядке: матрица собирается в порядке обучения модели
+    frame = pd.DataFrame(features, columns=columns)[["d", "c", "b", "a"]]
+
+    chunks = list(make_prediction_ueba_chunks(model, frame, chunk_size=128))
+
+    assert [start for start, _, _ in chunks] == [0, 128, 256, 384]
+    np.testing.assert_array_equal(np.concatenate([p for _, p, _ in chunks]), model.predict(frame[columns]))
+    np.testing.assert_allclose(np.concatenate([s for _, _, s in chunks]), model.decision_function(frame[columns]))
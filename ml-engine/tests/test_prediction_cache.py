@@ -0,0 +1,115 @@
+# ml-engine/tests/test_prediction_cache.py
+import numpy as np
+
+from scripts.predict_utils import make_prediction_text_classification
+from scripts.prediction_cache import CachedTextModel, LocalTTLCache, PredictionCache
+
+
+class FakeRedis:
+    """Минимальная замена redis.Redis для тестов общего уровня кэша."""
+
+    def __init__(self):
+        self.store = {}
+
+    def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def setex(self, key, ttl, value):
+        self.commands.append((key, value))
+
+    def execute(self):
+        for key, value in self.commands:
+            self.client.store[key] = value
+
+
+class CountingModel:
+    """Обертка, считающая тексты, которые дошли до настоящей модели."""
+
+    def __init__(self, model):
+        self.model = model
+        self.scored = 0
+
+    @property
+    def classes_(self):
+        return self.model.classes_
+
+    def predict_proba(self, texts):
+        self.scored += len(texts)
+        return self.model.predict_proba(texts)
+
+
+def test_cached_results_match_model(text_model):
+    counting = CountingModel(text_model)
+    cached = CachedTextModel(counting, PredictionCache(model_version=lambda: "v1"))
+    texts = ["confidential merger report", "public   press release", "confidential merger report"]
+
+    first = make_prediction_text_classification(cached, texts)
+    second = make_prediction_text_classification(cached, ["public press release"])
+
+    expected = make_prediction_text_classification(text_model, texts)
+    assert list(first[0]) == list(expected[0])
+    np.testing.assert_allclose(first[1], expected[1])
+    assert second[0][0] == expected[0][1]
+    # Дубликат и текст, отличающийся только пробелами, повторно не оцениваются
+    assert counting.scored == 2
+
+
+def test_model_change_invalidates_entries(text_model):
+    version = {"value": "v1"}
+    counting = CountingModel(text_model)
+    cached = CachedTextModel(counting, PredictionCache(model_version=lambda: version["value"]))
+
+    cached.predict_proba(["source code for a critical module"])
+    version["value"] = "v2"
+    cached.predict_proba(["source code for a critical module"])
+
+    assert counting.scored == 2
+
+
+def test_in_flight_model_keeps_its_own_version(text_model):
+    version = {"value": "v2"}
+    cache = PredictionCache(model_version=lambda: version["value"])
+    old_model = CountingModel(text_model)
+    # Запрос взял модель v1 до того, как текущей стала v2: ее результаты не должны попасть под ключ v2
+    CachedTextModel(old_model, cache, model_version="v1").predict_proba(["quarterly salary table"])
+    new_model = CountingModel(text_model)
+    CachedTextModel(new_model, cache, model_version="v2").predict_proba(["quarterly salary table"])
+
+    assert old_model.scored == 1
+    assert new_model.scored == 1
+
+
+def test_redis_tier_is_shared_between_processes(text_model):
+    fake_redis = FakeRedis()
+    worker_a = CountingModel(text_model)
+    worker_b = CountingModel(text_model)
+    cache_a = CachedTextModel(worker_a, PredictionCache(model_version=lambda: "v1", redis_client=fake_redis))
+    cache_b = CachedTextModel(worker_b, PredictionCache(model_version=lambda: "v1", redis_client=fake_redis))
+
+    rows_a = cache_a.predict_proba(["user credentials and access keys"])
+    rows_b = cache_b.predict_proba(["user credentials and access keys"])
+
+    np.testing.assert_allclose(rows_a, rows_b)
+    assert worker_a.scored == 1
+    assert worker_b.scored == 0
+
+
+def test_local_tier_evicts_least_recently_used():
+    cache = LocalTTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
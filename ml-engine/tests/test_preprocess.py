@@ -0,0 +1,66 @@
+# ml-engine/tests/test_preprocess.py
+import random
+import re
+import string
+
+import pytest
+
+from scripts.preprocess import preprocess_text, preprocess_texts
+
+
+def legacy_preprocess_text(text):
+    """Исходная многопроходная реализация preprocess_text - эталон для сравнения."""
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\S*@\S*\s?', '', text)
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    words = text.split()
+    processed_text = " ".join(words).strip()
+    processed_text = re.sub(r'\s+', ' ', processed_text)
+    return processed_text
+
+
+GOLDEN_CORPUS = [
+    ("This is a Sample Text with Punctuation! And numbers 123. Visit http://example.com or email test@example.org.",
+     "this is a sample text with punctuation and numbers 123 visit or email"),
+    ("Это Пример текста на русском с пунктуацией! И цифрами 12345.",
+     "это пример текста на русском с пунктуацией и цифрами 12345"),
+    ("", ""),
+    ("   \t\n  ", ""),
+    ("foohttp://x@y bar", "foo bar"),
+    ("a@http://q b", "b"),
+    ("Contact: JOHN.DOE@corp.com,\tphone (555) 123-4567", "contact phone 555 1234567"),
+    ("See www.site.org/path?x=1 and HTTPS://Secure.example/login now", "see and now"),
+    ("tabs\tand\nnewlines\r\nand\x0bvertical\x1cseparators em-space", "tabs and newlines and vertical separators emspace"),
+    ("ΣΟΦΟΣ Straße İstanbul", "σοφος straße i̇stanbul"),
+    ("@@@ @ x@ @y", ""),
+    ("quoted 'single' \"double\" `back` — dash – en", "quoted single double back — dash – en"),
+]
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN_CORPUS)
+def test_golden_corpus(text, expected):
+    assert preprocess_text(text) == expected
+    assert legacy_preprocess_text(text) == expected
+
+
+def test_matches_legacy_on_random_documents():
+    rng = random.Random(7)
+    alphabet = string.ascii_letters + string.digits + string.punctuation + " \t\n" + "абвгдЁ  " + "@" * 3
+    fragments = ["http", "https://", "www.", "@", "mail@host.kz", " ", "\n", "HTTP://A.B"]
+    for _ in range(5000):
+        parts = []
+        for _ in range(rng.randint(0, 20)):
+            if rng.random() < 0.3:
+                parts.append(rng.choice(fragments))
+            else:
+                parts.append("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))))
+        text = "".join(parts)
+        assert preprocess_text(text) == legacy_preprocess_text(text), repr(text)
+
+
+def test_batch_api_preserves_order_and_handles_non_strings():
+    texts = ["Hello, World!", None, "Visit www.example.com today", 42]
+    assert preprocess_texts(texts) == ["hello world", "", "visit today", ""]
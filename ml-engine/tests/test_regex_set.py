@@ -0,0 +1,70 @@
+# ml-engine/tests/test_regex_set.py
+import random
+import re
+
+import scripts.regex_set as regex_set_module
+from scripts.regex_set import RegexSandbox, RegexSet, analyze_pattern
+
+
+def test_analyze_pattern():
+    literals, prone, groupable = analyze_pattern(re.compile(r"\b\d{3}-\d{2}-\d{4}\b"))
+    assert literals == {"-"} and not prone and groupable
+    assert analyze_pattern(re.compile(r"password\s*[:=]\s*\S+"))[:3] == ({"password"}, False, False)
+    # Ветви альтернации дают набор литералов; при IGNORECASE буквы с особыми вариантами (i ~ ı, s ~ ſ) разрывают цепочку
+    assert analyze_pattern(re.compile(r"(?i)confidential|secret"))[0] == {"conf", "ecret"}
+    assert RegexSet([re.compile(r"(?i)confidential|secret")]).search("ſecret") == {0}  # ſ ~ s при IGNORECASE
+    assert analyze_pattern(re.compile(r"(?i)\bпароль\b"))[0] == {"пар"}
+    assert analyze_pattern(re.compile(r"x?\d+"))[0] is None
+    for source in (r"(a+)+$", r"(\w+\s?)*@", r"(a|ab)*c"):
+        assert analyze_pattern(re.compile(source))[1], source
+    assert not analyze_pattern(re.compile(r"(?:\d{3}-)+\d{4}"))[1]
+    # Обратные ссылки и именованные группы не объединяются в альтернации
+    assert not analyze_pattern(re.compile(r"\b(\w)\1"))[2]
+    assert not analyze_pattern(re.compile(r"\b(?P<digit>\d)"))[2]
+
+
+def test_matches_each_pattern(monkeypatch):
+    rng = random.Random(3)
+    atoms = ['a', 'b', 'ab', 'Ab', r'\d', '[ab]', '.', 'c', 'Σ', 'п', r'\b', '^', '$', '(?=b)']
+
+    def random_pattern(depth=0):
+        parts = []
+        for _ in range(rng.randint(1, 4)):
+            kind = rng.random()
+            if kind < 0.6 or depth > 1:
+                parts.append(rng.choice(atoms))
+            elif kind < 0.8:
+                parts.append(f'(?:{random_pattern(depth + 1)}|{random_pattern(depth + 1)})')
+            else:
+                parts.append(f'(?:{random_pattern(depth + 1)}){rng.choice(["+", "*", "?", "{2}"])}')
+        return ('(?i)' if depth == 0 and rng.random() < 0.3 else '') + ''.join(parts)
+
+    for trial in range(200):
+        if trial == 100:
+            # Префильтр автоматом и перебор нескольких позиций альтернации с переходом к отдельным поискам
+            monkeypatch.setattr(regex_set_module, 'AUTOMATON_MIN_LITERALS', 1)
+            monkeypatch.setattr(regex_set_module, 'MAX_GROUP_MATCHES', 2)
+        patterns = []
+        for _ in range(rng.randint(1, 40)):
+            try:
+                patterns.append(re.compile(random_pattern()))
+            except re.error:
+                pass
+        regex_set = RegexSet(patterns)
+        for _ in range(5):
+            text = ''.join(rng.choice('aAbBc1 xпПσΣς\n') for _ in range(rng.randint(0, 30)))
+            assert regex_set.search(text) == {index for index, pattern in enumerate(patterns) if pattern.search(text)}
+
+
+def test_sandbox_stops_catastrophic_backtracking():
+    sandbox = RegexSandbox(timeout=0.5)
+    try:
+        regex_set = RegexSet([re.compile(r"(a+)+$"), re.compile(r"secret\d+")], sandbox=sandbox)
+        assert regex_set.sandboxed == {0}
+        # Истекшее время считается совпадением, процесс песочницы перезапускается
+        assert regex_set.search("a" * 40 + "b secret12") == {0, 1}
+        assert regex_set.timeouts == 1 and sandbox.timeouts == 1
+        assert regex_set.search("aaaa") == {0}
+        assert regex_set.search("bbb secret") == set()
+    finally:
+        sandbox.close()
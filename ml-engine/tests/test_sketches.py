@@ -0,0 +1,107 @@
+# ml-engine/tests/test_sketches.py
+import numpy as np
+import pytest
+
+from scripts.sketches import CountMinSketch, HyperLogLog, HyperLogLogArray, SpaceSaving, TDigest, hash64
+
+
+def test_hash64_is_stable_and_vectorized_for_integers():
+    assert hash64(["host1"])[0] == hash64(np.array(["host1"], dtype=object))[0]
+    assert hash64(["host1", "host2"])[0] != hash64(["host1", "host2"])[1]
+    integers = hash64(np.arange(100000))
+    assert integers.dtype == np.uint64 and len(np.unique(integers)) == 100000
+
+
+@pytest.mark.parametrize("cardinality", [10, 1000, 200000])
+def test_hyperloglog_within_error_bound(cardinality):
+    sketch = HyperLogLog(precision=12).add(np.arange(cardinality))
+    assert sketch.estimate() == pytest.approx(cardinality, rel=4 * sketch.relative_error)
+
+
+def test_hyperloglog_unbiased_near_small_range_cutover():
+    # Около n = 2.5 * 2^p исходная оценка HLL переключается на линейный подсчет и смещена на ~1.5%
+    sketches = HyperLogLogArray(precision=12, capacity=100).add(np.repeat(np.arange(100), 11000), np.arange(1_100_000))
+    errors = sketches.estimate(np.arange(100)) / 11000 - 1
+    assert abs(errors.mean()) < 0.005
+    assert errors.std() < 1.5 * HyperLogLog(precision=12).relative_error
+
+
+def test_hyperloglog_merge_and_serialization():
+    left = HyperLogLog().add([f"host{i}" for i in range(0, 6000)])
+    right = HyperLogLog().add([f"host{i}" for i in range(4000, 10000)])
+    restored = HyperLogLog.from_bytes(left.to_bytes())
+    assert restored.merge(right).estimate() == pytest.approx(10000, rel=0.06)
+    with pytest.raises(ValueError):
+        left.merge(HyperLogLog(precision=10))
+
+
+def test_hyperloglog_array_matches_exact_per_row():
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 50, 100000)
+    values = rng.integers(0, 1000, 100000) + rows * 10000
+    sketches = HyperLogLogArray(precision=10, capacity=4).add(rows, values)
+    exact = np.array([len(np.unique(values[rows == row])) for row in range(50)])
+    np.testing.assert_allclose(sketches.estimate(np.arange(50)), exact, rtol=0.15)
+    restored = HyperLogLogArray.from_bytes(sketches.to_bytes())
+    np.testing.assert_array_equal(restored.registers, sketches.registers)
+    # Объединение строк (пропуски -1) совпадает с оценкой слитого скетча
+    groups = np.array([[0, 1, 2], [3, -1, -1], [-1, -1, -1]])
+    merged = sketches.row(0).merge(sketches.row(1)).merge(sketches.row(2)).estimate()
+    np.testing.assert_allclose(sketches.estimate_union(groups), [merged, sketches.estimate([3])[0], 0])
+
+
+def test_count_min_overestimates_within_bound():
+    rng = np.random.default_rng(1)
+    items = rng.zipf(1.3, 50000) % 5000
+    sketch = CountMinSketch.from_error(epsilon=0.001, delta=0.01).add(items)
+    values, exact = np.unique(items, return_counts=True)
+    estimates = sketch.estimate(values)
+    assert (estimates >= exact).all()
+    assert (estimates - exact).max() <= 0.001 * len(items)
+
+    merged = CountMinSketch.from_bytes(sketch.to_bytes()).merge(sketch)
+    np.testing.assert_array_equal(merged.estimate(values), 2 * estimates)
+
+
+def test_space_saving_finds_heavy_hitters_across_workers():
+    rng = np.random.default_rng(2)
+    file_types = np.array(["pdf", "docx", "xlsx", "zip"] + [f"ext{i}" for i in range(2000)])
+    weights = np.concatenate([[0.2, 0.15, 0.1, 0.05], np.full(2000, 0.5 / 2000)])
+    stream = rng.choice(file_types, 40000, p=weights).tolist()
+
+    workers = [SpaceSaving(capacity=50).add(stream[start:start + 10000]) for start in range(0, 40000, 10000)]
+    merged = SpaceSaving.from_bytes(workers[0].to_bytes())
+    for worker in workers[1:]:
+        merged.merge(worker)
+
+    exact = {item: stream.count(item) for item in ("pdf", "docx", "xlsx", "zip")}
+    assert [item for item, _, _ in merged.top(4)] == ["pdf", "docx", "xlsx", "zip"]
+    for item, count, error in merged.top(4):
+        assert exact[item] <= count <= exact[item] + len(stream) / 50
+        assert count - error <= exact[item]
+    assert merged.total == len(stream)
+
+
+def test_space_saving_tuple_items_survive_serialization():
+    pairs = [("alice", "pdf")] * 5 + [("bob", "zip")] * 3 + [("alice", ("docx", 1))]
+    restored = SpaceSaving.from_bytes(SpaceSaving(capacity=10).add(pairs).to_bytes())
+    assert restored.top(2) == [(("alice", "pdf"), 5, 0), (("bob", "zip"), 3, 0)]
+    assert restored.estimate(("alice", ("docx", 1))) == 1
+    restored.add([("bob", "zip")])
+    assert restored.estimate(("bob", "zip")) == 4
+
+
+def test_tdigest_quantiles_and_merge():
+    rng = np.random.default_rng(3)
+    values = rng.lognormal(11, 1.5, 200000)
+    digests = [TDigest(compression=200).add(part) for part in np.array_split(values, 4)]
+    merged = TDigest.from_bytes(digests[0].to_bytes())
+    for digest in digests[1:]:
+        merged.merge(digest)
+
+    for q in (0.01, 0.5, 0.99, 0.999):
+        estimate = merged.quantile(q)
+        assert abs(np.mean(values <= estimate) - q) < 0.01
+    assert merged.count == len(values)
+    assert merged.cdf(np.median(values)) == pytest.approx(0.5, abs=0.01)
+    assert np.isnan(TDigest().quantile(0.5))
@@ -0,0 +1,34 @@
+# ml-engine/tests/test_streaming_classifier.py
+import random
+
+import pytest
+
+from benchmarks.common import make_document
+from scripts.predict_utils import make_prediction_text_classification
+from scripts.streaming_classifier import StreamingDocumentClassifier, StreamingNotSupportedError
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_streaming_matches_one_shot_prediction(text_model, seed):
+    """Метка и вероятность совпадают с разовым путем при любой нарезке входа."""
+    rng = random.Random(seed)
+    text = make_document(rng.randint(0, 2000), seed=seed).replace(" ", rng.choice([" ", "\n", "  ", " the "]))
+    encoded = (text + " Привет, мир!").encode("utf-8")
+
+    classifier = StreamingDocumentClassifier(text_model, segment_chars=rng.randint(8, 400), breakdown=True)
+    position = 0
+    while position < len(encoded):
+        step = rng.randint(1, 300)  # границы кусков могут попадать внутрь многобайтных символов
+        classifier.feed(encoded[position:position + step])
+        position += step
+    result = classifier.finish()
+
+    labels, probabilities = make_prediction_text_classification(text_model, [encoded.decode("utf-8")])
+    assert result["prediction_label"] == labels[0]
+    assert result["probability"] == pytest.approx(probabilities[0], abs=1e-12)
+    assert result["segments"][-1]["end"] == result["characters"]
+
+
+def test_non_pipeline_model_is_rejected():
+    with pytest.raises(StreamingNotSupportedError):
+        StreamingDocumentClassifier(object())
@@ -0,0 +1,132 @@
+# ml-engine/tests/test_train_ueba_model.py
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.common import make_user_events
+from scripts import train_ueba_model
+from scripts.model_store import load_model
+from scripts.train_ueba_model import OnlineUebaTrainer, train_online
+from scripts.ueba_engine import UebaEngine
+
+
+def test_reservoir_keeps_fixed_size_uniform_sample():
+    trainer = OnlineUebaTrainer(reservoir_size=1000, seed=0)
+    for start in range(0, 20000, 500):
+        trainer._add_to_reservoir(np.arange(start, start + 500, dtype=float)[:, None].repeat(4, axis=1))
+
+    assert trainer.rows_seen == 20000 and len(trainer.sample) == 1000
+    # Равномерная выборка: среднее номера строки около середины потока
+    assert abs(trainer.sample[:, 0].mean() - 10000) < 1000
+
+
+def test_checkpoint_resume_continues_identically(tmp_path):
+    events = make_user_events(6000, 200, seed=5, span_seconds=3 * 86400)
+    batches = [events[start:start + 1000] for start in range(0, len(events), 1000)]
+
+    uninterrupted = OnlineUebaTrainer(reservoir_size=500)
+    for batch in batches:
+        uninterrupted.partial_fit(batch)
+
+    interrupted = OnlineUebaTrainer(reservoir_size=500)
+    for batch in batches[:3]:
+        interrupted.partial_fit(batch)
+    interrupted.checkpoint(str(tmp_path / "checkpoint"))
+    resumed = OnlineUebaTrainer.resume(str(tmp_path / "checkpoint"))
+    for batch in batches[3:]:
+        resumed.partial_fit(batch)
+
+    assert resumed.batches == uninterrupted.batches == 6
+    np.testing.assert_allclose(resumed.sample, uninterrupted.sample)
+    user_ids = ["user1", "user2", "user3"]
+    for original, restored in zip(uninterrupted.baselines.stats(user_ids), resumed.baselines.stats(user_ids)):
+        np.testing.assert_allclose(original, restored)
+
+
+def test_rerun_after_crash_skips_events_in_checkpoint(tmp_path, monkeypatch):
+    events_path = tmp_path / "events.jsonl"
+    events_path.write_text("".join(json.dumps(event) + "\n" for event in make_user_events(6000, 200, seed=8)),
+                           encoding="utf-8")
+
+    def run(name):
+        return train_online(str(events_path), 1000, str(tmp_path / name), checkpoint_every=2,
+                            model_path=str(tmp_path / f"{name}.joblib"), baselines_path=str(tmp_path / f"{name}.npz"))
+
+    uninterrupted = run("uninterrupted")
+
+    # Сбой на пятом пакете: в контрольной точке - первые четыре, перезапуск читает файл с пятого
+    partial_fit = OnlineUebaTrainer.partial_fit
+
+    def crash_on_fifth_batch(trainer, events):
+        if trainer.batches == 4:
+            raise RuntimeError("worker killed")
+        return partial_fit(trainer, events)
+
+    monkeypatch.setattr(OnlineUebaTrainer, "partial_fit", crash_on_fifth_batch)
+    with pytest.raises(RuntimeError):
+        run("interrupted")
+    monkeypatch.undo()
+    resumed = run("interrupted")
+
+    assert resumed.batches == uninterrupted.batches == 6
+    assert resumed.events_seen == uninterrupted.events_seen == 6000 and resumed.source["events"] == 6000
+    np.testing.assert_allclose(resumed.sample, uninterrupted.sample)
+    user_ids = ["user1", "user2", "user3"]
+    for original, restored in zip(uninterrupted.baselines.stats(user_ids), resumed.baselines.stats(user_ids)):
+        np.testing.assert_allclose(original, restored)
+    # Файл прочитан полностью: еще один запуск ничего не добавляет
+    assert run("interrupted").events_seen == 6000
+
+
+def test_crash_while_writing_checkpoint_keeps_previous_one(tmp_path, monkeypatch):
+    events_path = tmp_path / "events.jsonl"
+    events_path.write_text("".join(json.dumps(event) + "\n" for event in make_user_events(6000, 200, seed=9)),
+                           encoding="utf-8")
+
+    def run(name):
+        return train_online(str(events_path), 1000, str(tmp_path / name), checkpoint_every=2,
+                            model_path=str(tmp_path / f"{name}.joblib"), baselines_path=str(tmp_path / f"{name}.npz"))
+
+    uninterrupted = run("uninterrupted")
+
+    # Сбой второй контрольной точки, когда признаки и базовые линии четырех пакетов уже записаны,
+    # а trainer.json - еще нет: перезапуск продолжает с первой (два пакета)
+    replace_atomically = train_ueba_model.replace_atomically
+    calls = []
+
+    def crash_on_second_state(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("worker killed")
+        return replace_atomically(*args)
+
+    monkeypatch.setattr(train_ueba_model, "replace_atomically", crash_on_second_state)
+    with pytest.raises(RuntimeError):
+        run("interrupted")
+    monkeypatch.undo()
+    assert OnlineUebaTrainer.resume(str(tmp_path / "interrupted")).batches == 2
+    resumed = run("interrupted")
+
+    assert resumed.batches == uninterrupted.batches == 6 and resumed.events_seen == 6000
+    user_ids = ["user1", "user2", "user3"]
+    for original, restored in zip(uninterrupted.baselines.stats(user_ids), resumed.baselines.stats(user_ids)):
+        np.testing.assert_allclose(original, restored)
+    np.testing.assert_allclose(resumed.engine.features(user_ids), uninterrupted.engine.features(user_ids))
+    # Остается только каталог текущего поколения
+    assert len([path for path in (tmp_path / "interrupted").iterdir() if path.is_dir()]) == 1
+
+
+def test_published_model_scores_engine_features(tmp_path):
+    trainer = OnlineUebaTrainer(reservoir_size=2000)
+    trainer.partial_fit(make_user_events(5000, 300, seed=6))
+    trainer.partial_fit([{"user_id": "broken"}])
+    assert trainer.invalid_events == 1
+
+    model_path = str(tmp_path / "ueba_model.joblib")
+    trainer.publish(model_path, str(tmp_path / "baselines.npz"), version="test-1")
+    model = load_model(model_path)
+    engine = UebaEngine()
+    user_ids, _ = engine.ingest(make_user_events(200, 20, seed=7))
+    _, is_anomalous, scores = engine.score(model, user_ids)
+    assert len(scores) == len(user_ids) and np.isfinite(scores).all()
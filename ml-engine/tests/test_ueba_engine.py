@@ -0,0 +1,127 @@
+# ml-engine/tests/test_ueba_engine.py
+import math
+
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from benchmarks.common import make_user_events
+from scripts.ueba_engine import FEATURE_NAMES, InvalidEventError, UebaEngine, parse_timestamp
+
+# Понедельник, 2024-01-01 10:00 UTC
+MONDAY_10AM = 1704103200
+
+
+@pytest.fixture(scope="module")
+def ueba_model():
+    rng = np.random.default_rng(0)
+    normal = np.column_stack([
+        rng.uniform(5, 30, 2000),           # event_rate
+        rng.uniform(10, 16, 2000),          # data_volume_log
+        np.where(rng.random(2000) < 0.5, 0, rng.uniform(0, 0.2, 2000)),  # off_hours_ratio
+        rng.integers(1, 10, 2000),          # distinct_destinations
+    ])
+    return IsolationForest(n_estimators=50, random_state=0).fit(normal)
+
+
+def test_features_accumulate_incrementally():
+    engine = UebaEngine(half_life_seconds=3600)
+    events = [
+        {"user_id": "alice", "timestamp": MONDAY_10AM, "bytes": 1000, "destination": "share"},
+        {"user_id": "alice", "timestamp": MONDAY_10AM + 3600, "bytes": 1000, "destination": "usb"},
+        {"user_id": "alice", "timestamp": MONDAY_10AM + 12 * 3600, "destination": "share"},  # 22:00 - вне рабочих часов
+    ]
+    user_ids, errors = engine.ingest(events)
+
+    assert user_ids == ["alice"] and errors == []
+    features = dict(zip(FEATURE_NAMES, engine.features(["alice"])[0]))
+    # Затухание с периодом полураспада в 1 час
+    expected_count = (1 * 0.5 + 1) * 2 ** -11 + 1
+    assert features["event_rate"] == pytest.approx(expected_count)
+    assert features["data_volume_log"] == pytest.approx(math.log1p((1000 * 0.5 + 1000) * 2 ** -11))
+    assert features["off_hours_ratio"] == pytest.approx(1 / expected_count)
+    assert features["distinct_destinations"] == pytest.approx(2, abs=0.1)
+
+
+def test_weekend_and_timezone_are_off_hours():
+    saturday = MONDAY_10AM - 2 * 86400
+    assert list(UebaEngine().is_off_hours([saturday, MONDAY_10AM])) == [True, False]
+    assert UebaEngine(tz_offset_hours=10).is_off_hours([MONDAY_10AM])[0]  # 20:00 по местному времени
+
+
+def test_destinations_outside_window_are_dropped():
+    engine = UebaEngine(destination_window_seconds=3600, destination_buckets=4)
+    engine.update(["bob"] * 4, [MONDAY_10AM + offset for offset in range(4)], destinations=["a", "b", "c", "d"])
+    assert engine.features(["bob"])[0, 3] == pytest.approx(4, abs=0.2)
+
+    engine.update(["bob"], [MONDAY_10AM + 7200], destinations=["e"])
+    assert engine.features(["bob"])[0, 3] == pytest.approx(1, abs=0.1)
+
+
+def test_invalid_events_are_reported_per_index():
+    engine = UebaEngine()
+    user_ids, errors = engine.ingest([
+        {"user_id": "carol", "timestamp": "2024-01-01T10:00:00Z"},
+        {"timestamp": MONDAY_10AM},
+        {"user_id": "dave", "timestamp": "yesterday"},
+        {"user_id": "erin", "timestamp": MONDAY_10AM, "bytes": -5},
+        "not an event",
+    ])
+    assert user_ids == ["carol"]
+    assert [error["index"] for error in errors] == [1, 2, 3, 4]
+
+
+def test_parse_timestamp():
+    # Суффикс "Z" (Date.toISOString в backend) - UTC на любой версии Python
+    assert parse_timestamp("2024-01-01T10:00:00Z") == MONDAY_10AM
+    assert parse_timestamp("2024-01-01T10:00:00.000Z") == MONDAY_10AM
+    assert parse_timestamp("2024-01-01T13:00:00+03:00") == parse_timestamp("2024-01-01T10:00:00") == MONDAY_10AM
+    assert parse_timestamp(MONDAY_10AM) == MONDAY_10AM
+    # Миллисекунды вместо секунд и время дальше допустимого расхождения часов отклоняются
+    with pytest.raises(InvalidEventError, match="future"):
+        parse_timestamp(MONDAY_10AM * 1000)
+    with pytest.raises(InvalidEventError, match="future"):
+        parse_timestamp("2024-01-03T10:00:01Z", now=MONDAY_10AM, max_skew_seconds=86400)
+    assert parse_timestamp("2024-01-02T10:00:00Z", now=MONDAY_10AM, max_skew_seconds=86400) == MONDAY_10AM + 86400
+
+
+def test_future_event_does_not_affect_other_users(ueba_model):
+    engine = UebaEngine()
+    engine.ingest([{"user_id": "alice", "timestamp": MONDAY_10AM + i * 600, "bytes": 1000} for i in range(5)])
+    before = engine.features(["alice"])
+    user_ids, errors = engine.ingest([{"user_id": "mallory", "timestamp": 1_700_000_000_000}])
+    assert user_ids == [] and [error["index"] for error in errors] == [0]
+    assert np.array_equal(engine.features(["alice"]), before)
+    engine.score(ueba_model, ["alice"])
+
+
+def test_score_flags_exfiltration_burst(ueba_model):
+    engine = UebaEngine()
+    engine.update(
+        ["normal"] * 15, [MONDAY_10AM + i * 1200 for i in range(15)],
+        n_bytes=[100_000] * 15, destinations=[f"share{i % 5}" for i in range(15)]
+    )
+    engine.update(
+        ["exfil"] * 400, [MONDAY_10AM + 13 * 3600 + minute for minute in range(400)],
+        n_bytes=[50_000_000] * 400, destinations=[f"host{minute}" for minute in range(400)]
+    )
+
+    features, is_anomalous, scores = engine.score(ueba_model, ["normal", "exfil"])
+
+    assert features.shape == (2, len(FEATURE_NAMES))
+    assert list(is_anomalous) == [False, True]
+    assert scores[1] > scores[0]
+
+
+def test_score_population_matches_per_user_scoring(ueba_model):
+    engine = UebaEngine()
+    events = make_user_events(3000, 250, seed=5)
+    engine.ingest(events)
+
+    chunks = list(engine.score_population(ueba_model, chunk_size=100))
+    user_ids = [user_id for chunk in chunks for user_id in chunk[0]]
+    _, is_anomalous, scores = engine.score(ueba_model, user_ids)
+
+    assert len(chunks) == 3 and sorted(user_ids) == sorted({event["user_id"] for event in events})
+    np.testing.assert_array_equal(np.concatenate([chunk[2] for chunk in chunks]), is_anomalous)
+    np.testing.assert_allclose(np.concatenate([chunk[3] for chunk in chunks]), scores)
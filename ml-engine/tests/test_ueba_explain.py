@@ -0,0 +1,54 @@
+# ml-engine/tests/test_ueba_explain.py
+import numpy as np
+import pytest
+
+from scripts.ueba_engine import FEATURE_NAMES
+from scripts.ueba_explain import MIN_BASELINE_OBSERVATIONS, contributing_factors, isolation_path_contributions
+from scripts.user_baselines import UserBaselines
+
+
+def test_isolation_path_points_at_the_outlying_feature(ueba_model):
+    features = np.array([
+        [20.0, 13.0, 0.1, 10.0],
+        [20.0, 29.0, 0.1, 10.0],   # объем данных далеко за пределами обучающей выборки
+        [20.0, 13.0, 0.1, 900.0],  # число получателей
+        [300.0, 13.0, 0.9, 10.0],  # частота событий и доля нерабочего времени
+    ])
+    contributions = isolation_path_contributions(ueba_model, features)
+    assert np.abs(contributions[0]).max() < 0.3
+    assert contributions[1].argmax() == FEATURE_NAMES.index("data_volume_log")
+    assert contributions[2].argmax() == FEATURE_NAMES.index("distinct_destinations")
+    assert set(np.argsort(contributions[3])[-2:]) == {FEATURE_NAMES.index("event_rate"), FEATURE_NAMES.index("off_hours_ratio")}
+    assert (contributions[1:].max(axis=1) > 0.5).all()
+
+
+def test_only_flagged_rows_are_explained(ueba_model):
+    features = np.array([[20.0, 13.0, 0.1, 10.0], [20.0, 29.0, 0.1, 10.0], [5.0, 10.0, 0.0, 3.0]])
+    factors = contributing_factors(ueba_model, features, [False, True, False], top_k=2)
+    assert factors[0] == [] and factors[2] == []
+    assert 1 <= len(factors[1]) <= 2
+    assert all(factor["contribution"] > 0 for factor in factors[1])
+    assert factors[1][0]["feature"] == "data_volume_log"
+    assert factors[1][0]["method"] == "isolation_path"
+    assert factors[1][0]["value"] == 29.0
+
+
+def test_baseline_zscores_for_users_with_history(ueba_model):
+    rng = np.random.default_rng(0)
+    baselines = UserBaselines()
+    history = np.column_stack([
+        rng.normal(20, 2, 50), rng.normal(13, 1, 50), rng.uniform(0, 0.2, 50), rng.normal(10, 3, 50)
+    ])
+    baselines.update(["alice"] * 50, history)
+    baselines.update(["bob"] * (MIN_BASELINE_OBSERVATIONS - 1), history[:MIN_BASELINE_OBSERVATIONS - 1])
+
+    features = np.array([[20.0, 13.0, 0.1, 40.0], [20.0, 13.0, 0.1, 900.0]])
+    factors = contributing_factors(ueba_model, features, [True, True], ["alice", "bob"], baselines)
+
+    top = factors[0][0]
+    _, means, stds = baselines.stats(["alice"])
+    assert top["feature"] == "distinct_destinations" and top["method"] == "baseline_zscore"
+    assert top["contribution"] == pytest.approx((40.0 - means[0, 3]) / stds[0, 3])
+    assert top["baseline_mean"] == pytest.approx(means[0, 3])
+    # У bob слишком короткая история - объяснение по путям изоляции
+    assert factors[1][0]["method"] == "isolation_path"
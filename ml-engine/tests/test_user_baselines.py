@@ -0,0 +1,49 @@
+# ml-engine/tests/test_user_baselines.py
+import numpy as np
+import pytest
+
+from scripts.user_baselines import UserBaselines
+
+
+def test_incremental_stats_match_full_batch():
+    rng = np.random.default_rng(0)
+    user_ids = rng.choice(["alice", "bob", "carol"], 3000).tolist()
+    features = np.column_stack([rng.uniform(0, 100, 3000), rng.normal(12, 2, 3000), rng.random(3000), rng.integers(0, 40, 3000)])
+
+    baselines = UserBaselines(capacity=1)
+    for start in range(0, 3000, 128):
+        baselines.update(user_ids[start:start + 128], features[start:start + 128])
+
+    counts, means, stds = baselines.stats(["alice", "bob", "carol", "missing"])
+    for position, user_id in enumerate(["alice", "bob", "carol"]):
+        rows = features[np.asarray(user_ids) == user_id]
+        assert counts[position] == len(rows)
+        np.testing.assert_allclose(means[position], rows.mean(axis=0))
+        np.testing.assert_allclose(stds[position], rows.std(axis=0, ddof=1))
+    assert counts[3] == 0 and np.isnan(stds[3]).all()
+
+
+def test_quantiles_within_histogram_resolution():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0, 1, 5000)
+    features = np.column_stack([values * 100, values * 30, values, values * 50])
+    baselines = UserBaselines()
+    baselines.update(["alice"] * 5000, features)
+
+    median = baselines.quantiles(["alice"], 0.5)[0]
+    # Ширина интервала гистограммы для доли вне рабочих часов - 1/16
+    assert median[2] == pytest.approx(np.median(values), abs=1 / 16)
+    assert median[1] == pytest.approx(np.median(values) * 30, abs=30 / 16)
+    assert np.isnan(baselines.quantiles(["missing"], 0.5)).all()
+
+
+def test_save_and_load(tmp_path):
+    baselines = UserBaselines()
+    baselines.update(["alice", "bob", "alice"], np.arange(12, dtype=float).reshape(3, 4))
+    path = baselines.save(str(tmp_path / "baselines.npz"))
+
+    restored = UserBaselines.load(path)
+    assert restored.user_ids == ["alice", "bob"]
+    for original, loaded in zip(baselines.stats(["alice", "bob"]), restored.stats(["alice", "bob"])):
+        np.testing.assert_array_equal(original, loaded)
+    np.testing.assert_array_equal(baselines.quantiles(["alice"], 0.9), restored.quantiles(["alice"], 0.9))
@@ -0,0 +1,107 @@
+# ml-engine/tests/test_windows.py
+import numpy as np
+import pytest
+
+from scripts.windows import (
+    SessionWindowAggregator, SlidingWindowAggregator, TumblingWindowAggregator, events_to_columns
+)
+
+
+def make_stream(n_events=5000, n_keys=20, span=86400, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = np.sort(rng.uniform(0, span, n_events))
+    keys = [f"user{key}" for key in rng.integers(0, n_keys, n_events)]
+    values = rng.integers(1, 1000, n_events).astype(float)
+    return keys, timestamps, values
+
+
+def test_sliding_window_matches_brute_force():
+    keys, timestamps, values = make_stream()
+    aggregator = SlidingWindowAggregator(slot_seconds=60, n_slots=120)
+    for start in range(0, len(keys), 250):
+        aggregator.update(keys[start:start + 250], timestamps[start:start + 250], values[start:start + 250])
+
+    now = timestamps[-1]
+    result = aggregator.aggregate(["user3", "user7", "missing"], 3600)
+    window_start = result.start[0]
+    assert result.end[0] - window_start == 3600 and window_start <= now - 3600 + 60
+    for position, key in enumerate(["user3", "user7"]):
+        mask = (np.asarray(keys) == key) & (timestamps >= window_start)
+        assert result.count[position] == mask.sum()
+        assert result.sums[position, 0] == pytest.approx(values[mask].sum())
+    assert result.count[2] == 0
+
+
+def test_tumbling_windows_emitted_once_after_watermark():
+    keys, timestamps, values = make_stream()
+    aggregator = TumblingWindowAggregator(window_seconds=3600, allowed_lateness=600)
+    emitted = [aggregator.update(keys[start:start + 100], timestamps[start:start + 100], values[start:start + 100])
+               for start in range(0, len(keys), 100)]
+    emitted.append(aggregator.flush())
+
+    records = [record for result in emitted for record in result.to_records()]
+    assert len({(record["key"], record["start"]) for record in records}) == len(records)
+    windows = np.floor(timestamps / 3600)
+    for record in records[:50]:
+        mask = (np.asarray(keys) == record["key"]) & (windows == record["start"] / 3600)
+        assert record["count"] == mask.sum() and record["bytes"] == pytest.approx(values[mask].sum())
+    assert sum(record["count"] for record in records) == len(keys)
+
+
+def test_late_events_are_dropped_behind_watermark():
+    aggregator = TumblingWindowAggregator(window_seconds=60, allowed_lateness=30)
+    aggregator.update(["alice"], [100.0], [1.0])
+    closed = aggregator.update(["alice"], [200.0], [1.0])
+    assert closed.to_records() == [{"key": "alice", "start": 60.0, "end": 120.0, "count": 1, "bytes": 1.0}]
+    aggregator.update(["alice"], [175.0], [1.0])  # в пределах допустимого опоздания
+    aggregator.update(["alice"], [110.0], [1.0])  # окно уже выдано
+    assert aggregator.late_events == 1
+    flushed = aggregator.flush()
+    assert flushed.start.tolist() == [120.0, 180.0] and flushed.count.tolist() == [1, 1]
+
+
+def test_backfill_equals_streaming():
+    keys, timestamps, values = make_stream(n_events=3000, span=7 * 86400)
+    streamed = TumblingWindowAggregator(window_seconds=3600)
+    results = [streamed.update(keys[i:i + 1], timestamps[i:i + 1], values[i:i + 1]) for i in range(len(keys))]
+    results.append(streamed.flush())
+
+    order = np.random.default_rng(1).permutation(len(keys))
+    backfilled = TumblingWindowAggregator(window_seconds=3600)
+    bulk = backfilled.backfill([keys[i] for i in order], timestamps[order], values[order], chunk_size=700)
+    bulk_records = bulk.to_records() + backfilled.flush().to_records()
+    stream_records = [record for result in results for record in result.to_records()]
+    key = lambda record: (record["start"], record["key"])
+    assert sorted(bulk_records, key=key) == sorted(stream_records, key=key)
+
+
+def test_sessions_split_on_gap():
+    aggregator = SessionWindowAggregator(gap_seconds=100)
+    assert len(aggregator.update(["alice", "bob", "alice"], [0.0, 10.0, 50.0], [1.0, 1.0, 2.0])) == 0
+    closed = aggregator.update(["alice", "alice"], [120.0, 400.0], [4.0, 8.0])
+    assert closed.to_records() == [
+        {"key": "alice", "start": 0.0, "end": 120.0, "count": 3, "bytes": 7.0},
+        {"key": "bob", "start": 10.0, "end": 10.0, "count": 1, "bytes": 1.0},
+    ]
+    assert aggregator.flush().to_records() == [{"key": "alice", "start": 400.0, "end": 400.0, "count": 1, "bytes": 8.0}]
+
+
+def test_sessions_bulk_matches_event_by_event():
+    keys, timestamps, values = make_stream(n_events=2000, n_keys=10)
+    bulk = SessionWindowAggregator(gap_seconds=900)
+    bulk_records = bulk.backfill(keys, timestamps, values).to_records() + bulk.flush().to_records()
+    single = SessionWindowAggregator(gap_seconds=900)
+    single_records = [record for i in range(len(keys)) for record in single.update(keys[i:i + 1], timestamps[i:i + 1], values[i:i + 1]).to_records()]
+    single_records += single.flush().to_records()
+    key = lambda record: (record["key"], record["start"])
+    assert sorted(bulk_records, key=key) == sorted(single_records, key=key)
+    assert sum(record["count"] for record in bulk_records) == len(keys)
+
+
+def test_events_to_columns_keys_by_user_and_entity():
+    keys, timestamps, values, errors = events_to_columns(
+        [{"user_id": "alice", "destination": "usb", "timestamp": 10, "bytes": 5}, {"user_id": "bob", "timestamp": 11}],
+        key_fields=("user_id", "destination")
+    )
+    assert keys == [("alice", "usb")] and timestamps.tolist() == [10.0] and values.tolist() == [[5.0]]
+    assert errors[0]["index"] == 1